@@ -0,0 +1,64 @@
+"""
+Copies the root modules the Azure function app imports into its folder. The function folder is
+deployed on its own, so it needs them next to function_app.py, but they are not committed there:
+the root modules are the only source, and this copy step is part of the function's build.
+
+Usage:
+    python Azure_Func_Testing/copy_shared_modules.py            # before func host start / deploy
+    python Azure_Func_Testing/copy_shared_modules.py --check    # exit 1 if a copy is missing or stale
+
+func host start and deploys from VS Code run it first (see wikiagent/.vscode), and the benchmarks
+that load function_app call copy_modules() themselves.
+"""
+# Imports and Installs
+import os
+import sys
+import shutil
+import filecmp
+import argparse
+
+# Constants
+FUNCTION_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(FUNCTION_DIR, 'wikiagent')
+REPO_DIR = os.path.dirname(FUNCTION_DIR)
+# Root modules function_app.py imports, none of them imports another module of the repo
+SHARED_MODULES = (
+    'WikiStartupProfiler.py',
+    'WikiHttpClient.py',
+    'WikiPageExtractor.py',
+    'WikiSingleFlight.py',
+    'WikiBatch.py',
+    'WikiMetrics.py',
+)
+
+
+def stale_modules(app_dir:str=APP_DIR):
+    """
+    Returns the shared modules whose copy in app_dir is missing or differs from the root module.
+    """
+    return [name for name in SHARED_MODULES
+            if not os.path.exists(os.path.join(app_dir, name))
+            or not filecmp.cmp(os.path.join(REPO_DIR, name), os.path.join(app_dir, name), shallow=False)]
+
+
+def copy_modules(app_dir:str=APP_DIR):
+    """
+    Copies the missing or stale shared modules into app_dir. Returns their names.
+    """
+    stale = stale_modules(app_dir)
+    for name in stale:
+        shutil.copyfile(os.path.join(REPO_DIR, name), os.path.join(app_dir, name))
+    return stale
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Copy the shared root modules into the function app')
+    parser.add_argument('--check', action='store_true', help='Only check the copies, exit 1 if one is missing or stale')
+    args = parser.parse_args()
+    if args.check:
+        stale = stale_modules()
+        for name in stale:
+            print(f"ERROR: {os.path.join(APP_DIR, name)} is missing or differs from {os.path.join(REPO_DIR, name)}")
+        sys.exit(1 if stale else 0)
+    copied = copy_modules()
+    print(f"Copied {len(copied)} of {len(SHARED_MODULES)} shared modules into {APP_DIR}" + (f": {', '.join(copied)}" if copied else ''))
@@ -1,10 +1,86 @@
-import azure.functions as func
-import logging
-import requests
-from bs4 import BeautifulSoup
+# Imported first, so the startup profile covers everything below
+from WikiStartupProfiler import PROFILER
+with PROFILER.phase("import azure.functions"):
+    import azure.functions as func
+import os
 import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+# Both defer their heavy imports (requests, lxml / bs4) to first use or the warm-up thread below
+import WikiHttpClient as http_client
+from WikiPageExtractor import extract_page, warm_up as warm_up_parser
+from WikiSingleFlight import SingleFlight
+from WikiBatch import plan_batch, run_batch
+from WikiMetrics import MetricsRegistry, PROMETHEUS_CONTENT_TYPE
 app = func.FunctionApp(http_auth_level=func.AuthLevel.ANONYMOUS)
 
+# Concurrent requests for the same url on this instance share one fetch and parse
+SINGLE_FLIGHT = SingleFlight()
+
+# get_url_content_batch: distinct urls accepted per call, and pages of a call fetched and parsed at the same time
+BATCH_MAX_URLS = int(os.environ.get("WIKI_BATCH_MAX_URLS", 100))
+BATCH_MAX_WORKERS = int(os.environ.get("WIKI_BATCH_MAX_WORKERS", 8))
+
+# Per stage latency and fetch counters of this instance, scraped from /api/metrics. Every request
+# also logs one JSON line with its own stage timings, for Application Insights queries
+METRICS = MetricsRegistry()
+STAGE_SECONDS = METRICS.histogram("wiki_stage_duration_seconds", "Time spent in each hot path stage", ("stage",))
+REQUEST_SECONDS = METRICS.histogram("wiki_request_duration_seconds", "Time to answer a request, per route and status", ("route", "status"))
+PAGES_FETCHED = METRICS.counter("wiki_pages_fetched_total", "Pages fetched from the wiki, coalesced fetches counted once", ("result",))
+BYTES_DOWNLOADED = METRICS.counter("wiki_bytes_downloaded_total", "Bytes of html downloaded from the wiki")
+LINKS_EXTRACTED = METRICS.counter("wiki_links_total", "Links extracted from fetched pages")
+METRICS.collected("wiki_single_flight_calls_total", "Calls per single flight operation",
+                  lambda: {(op,): counts["calls"] for op, counts in SINGLE_FLIGHT.stats()["operations"].items()}, labelnames=("operation",))
+METRICS.collected("wiki_single_flight_coalesced_total", "Calls that joined an identical call already in flight",
+                  lambda: {(op,): counts["coalesced"] for op, counts in SINGLE_FLIGHT.stats()["operations"].items()}, labelnames=("operation",))
+_request_log = threading.local()    # Stage timings of the request handled by this thread
+
+
+@contextmanager
+def stage(name):
+    # Times a stage into the histogram and into the log line of the current request
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        STAGE_SECONDS.observe(seconds, stage=name)
+        stages = getattr(_request_log, "stages", None)
+        if stages is not None:
+            stages[name] = round(stages.get(name, 0) + seconds * 1000, 3)
+
+
+def log_request(route, status, started, **fields):
+    seconds = time.perf_counter() - started
+    REQUEST_SECONDS.observe(seconds, route=route, status=status)
+    logging.info(json.dumps({"event": "request", "route": route, "status": status, "ms": round(seconds * 1000, 3),
+                             "stages": getattr(_request_log, "stages", {}), **fields}))
+
+# Build the shared HTTP session and import the html parser on a background thread, while the host
+# finishes starting and the first request waits on the network, instead of on the request path
+WARM_UP = os.environ.get("WIKI_WARM_UP", "1") == "1"
+
+
+def warm_up():
+    with PROFILER.phase("warm-up: http session"):
+        http_client.get_session()
+    with PROFILER.phase("warm-up: html parser"):
+        warm_up_parser()
+
+
+if WARM_UP:
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+PROFILER.record("import function_app", PROFILER.started)
+
+
+def first_request_done(name, started):
+    # Logs the startup profile once, when the first request of this instance is answered
+    if PROFILER.request_done(name, started):
+        logging.info(f"Startup profile: {json.dumps(PROFILER.report())}")
+
 
 #  sample http trigger function
 
@@ -36,7 +112,20 @@ app = func.FunctionApp(http_auth_level=func.AuthLevel.ANONYMOUS)
 @app.route(route="get_url_content", methods=["POST"])
 def get_url_content(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('Processing request to fetch URL content.')
+    started = time.perf_counter()
+    _request_log.stages = {}
+    status = 500
+    try:
+        response = url_content_response(req)
+        status = response.status_code
+        return response
+    finally:
+        log_request("get_url_content", status, started)
+        _request_log.stages = None
+        first_request_done("get_url_content", started)
+
 
+def url_content_response(req):
     try:
         data = req.get_json()
     except ValueError:
@@ -48,20 +137,9 @@ def get_url_content(req: func.HttpRequest) -> func.HttpResponse:
     if not url:
         return func.HttpResponse("URL is required in the request body.", status_code=400)   
     try:
-         html_content = fetch_html_from_url(url)
-         text_content = html_to_text(html_content)
-         hyperlinks =   extract_hyperlinks(html_content)
-
-         response_body = {
-             "success": True,
-             "url": url,
-            "contentOfPage": text_content,
-            "hyperlinksFromPage": hyperlinks
-        }
-
-
+         response_body = SINGLE_FLIGHT.do(("url_content", url), load_url_content, url)
          return  func.HttpResponse(
-            body=json.dumps(response_body), 
+            body=response_body,
             status_code=200,
             mimetype="application/json")
     
@@ -69,17 +147,109 @@ def get_url_content(req: func.HttpRequest) -> func.HttpResponse:
         logging.error(f"Error fetching URL content: {e}")
         return func.HttpResponse(f"Error fetching URL content: {e}", status_code=500)   
 
-def fetch_html_from_url(url):
-    response = requests.get(url, timeout=10)
-    response.raise_for_status()
-    return response.text
-
+#  Function : To fetch the content of many wiki pages in one call
 
-def html_to_text(html_content):
-    soup = BeautifulSoup(html_content, "html.parser")
-    return soup.get_text(separator=" ", strip=True)
+@app.route(route="get_url_content_batch", methods=["POST"])
+def get_url_content_batch(req: func.HttpRequest) -> func.HttpResponse:
+    logging.info('Processing request to fetch the content of a batch of URLs.')
+    started = time.perf_counter()
+    _request_log.stages = {}
+    status = 500
+    fields = {}
+    try:
+        response = url_content_batch_response(req, fields)
+        status = response.status_code
+        return response
+    finally:
+        log_request("get_url_content_batch", status, started, **fields)
+        _request_log.stages = None
+        first_request_done("get_url_content_batch", started)
+
+
+def url_content_batch_response(req, fields):
+    # Body: {"urls": [...]}. The urls are normalized and de-duplicated, then loaded BATCH_MAX_WORKERS at a time
+    # (sharing in flight loads with get_url_content), so the call takes about as long as its slowest page.
+    # Every distinct url gets a result in the order given; one that fails does not fail the others
+    try:
+        data = req.get_json()
+    except ValueError:
+        return func.HttpResponse("Invalid JSON in request body.", status_code=400)
+    if not data:
+        return func.HttpResponse("No data provided in request body.", status_code=400)
+    try:
+        urls, requested, invalid = plan_batch(data.get('urls'), BATCH_MAX_URLS)
+    except ValueError as e:
+        return func.HttpResponse(f"Invalid urls in request body: {e}", status_code=400)
+    outcomes = run_batch(urls, lambda url: SINGLE_FLIGHT.do(("url_content", url), load_url_content, url),
+                         max_workers=BATCH_MAX_WORKERS)
+    results = []
+    for url, response_body, error in outcomes:
+        if error is None:
+            results.append({**json.loads(response_body), "requested": requested[url]})
+        else:
+            logging.error(f"Error fetching URL content of {url}: {error}")
+            results.append({"success": False, "url": url, "requested": requested[url], "error": f"Error fetching URL content: {error}"})
+    for url, error in invalid.items():
+        results.append({"success": False, "url": url, "requested": [url], "error": error})
+    succeeded = sum(result["success"] for result in results)
+    duplicates = sum(len(given) - 1 for given in requested.values())
+    fields.update(urls=len(results), failed=len(results) - succeeded, duplicates=duplicates)
+    return func.HttpResponse(
+        body=json.dumps({"results": results, "succeeded": succeeded, "failed": len(results) - succeeded, "duplicates": duplicates}),
+        status_code=200,
+        mimetype="application/json")
+
+#  Function : Coalescing counters of this instance
+
+@app.route(route="get_single_flight_stats", methods=["GET"])
+def get_single_flight_stats(req: func.HttpRequest) -> func.HttpResponse:
+    return func.HttpResponse(
+        body=json.dumps(SINGLE_FLIGHT.stats()),
+        status_code=200,
+        mimetype="application/json")
+
+#  Function : Prometheus metrics of this instance (stage latencies, fetch counters, coalescing)
+
+@app.route(route="metrics", methods=["GET"])
+def metrics(req: func.HttpRequest) -> func.HttpResponse:
+    return func.HttpResponse(
+        body=METRICS.render(),
+        status_code=200,
+        headers={"Content-Type": PROMETHEUS_CONTENT_TYPE})
+
+#  Function : Where the cold start of this instance went (phases, first request, slowest imports)
+
+@app.route(route="get_startup_profile", methods=["GET"])
+def get_startup_profile(req: func.HttpRequest) -> func.HttpResponse:
+    return func.HttpResponse(
+        body=json.dumps(PROFILER.report()),
+        status_code=200,
+        mimetype="application/json")
+
+
+def load_url_content(url):
+    html_content = fetch_html_from_url(url)
+    # Text and links come out of a single parse of the page
+    with stage("extract_page"):
+        page = extract_page(html_content, separator=" ")
+    LINKS_EXTRACTED.inc(len(page["links"]))
+    response_body = {
+        "success": True,
+        "url": url,
+        "contentOfPage": page["text"],
+        "hyperlinksFromPage": [link["url"] for link in page["links"]]
+    }
+    return json.dumps(response_body)
 
 
-def extract_hyperlinks(html_content):
-    soup = BeautifulSoup(html_content, "html.parser")
-    return [a.get("href") for a in soup.find_all("a", href=True)]        
\ No newline at end of file
+def fetch_html_from_url(url):
+    try:
+        with stage("fetch"):
+            response = http_client.get(url, timeout=10)
+            response.raise_for_status()
+    except Exception:
+        PAGES_FETCHED.inc(result="error")
+        raise
+    PAGES_FETCHED.inc(result="ok")
+    BYTES_DOWNLOADED.inc(len(response.content))
+    return response.text
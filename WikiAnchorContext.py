@@ -0,0 +1,238 @@
+# Imports and Installs
+import re
+from bisect import bisect_left, bisect_right
+
+# Constants
+BLOCK_ELEMENTS = {
+    "address", "article", "aside", "blockquote", "details", "dialog",
+    "dd", "div", "dl", "dt", "fieldset", "figcaption", "figure",
+    "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header",
+    "hgroup", "hr", "li", "main", "nav", "ol", "p", "pre", "section",
+    "table", "ul", "tr", "td", "th", "thead", "tbody", "tfoot",
+}
+NO_CONTEXT = "(no surrounding text)"
+_SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+')   # Sentence-ending punctuation followed by whitespace
+
+
+def split_sentences(text: str) -> list[str]:
+    """
+    Splits a block of text into sentences using common punctuation
+    boundaries. Handles abbreviations loosely.
+    """
+    # Split on sentence-ending punctuation followed by a space or end-of-string
+    parts = _SENTENCE_BREAK.split(text.strip())
+    return [p.strip() for p in parts if p.strip()]
+
+
+def extract_sentence_containing(text: str, needle: str) -> str:
+    """
+    Splits text into sentences and returns the sentence that contains
+    the needle string (case-insensitive). Returns None if not found.
+    """
+    if not needle:
+        # If there's no needle to match, just return the first sentence
+        sentences = split_sentences(text)
+        return sentences[0] if sentences else None
+
+    sentences = split_sentences(text)
+    needle_lower = needle.lower()
+    for sentence in sentences:
+        if needle_lower in sentence.lower():
+            return sentence
+    return None
+
+
+def closest_sentence(tag) -> str:
+    """
+    Walks up the DOM from the <a> tag until it finds a parent whose
+    text content contains a full sentence (ends with sentence-ending
+    punctuation or is the best available block of text).
+
+    Renders and splits the text of every ancestor it visits, so use
+    AnchorContext for all the links of a page.
+
+    Returns the single sentence that is closest to / contains the link.
+    """
+    # Start with the tag's own text as a fallback
+    fallback = tag.get_text(strip=True) or ""
+
+    node = tag
+    # Traverse upward through ancestors looking for a sentence
+    while node.parent:
+        node = node.parent
+        parent_text = node.get_text(separator=" ", strip=True)
+
+        if not parent_text:
+            continue
+
+        # Try to extract the sentence that contains the link text
+        sentence = extract_sentence_containing(parent_text, fallback)
+        if sentence:
+            return sentence
+
+        # If the parent is a block-level element and has reasonable text, use it
+        if node.name in BLOCK_ELEMENTS and len(parent_text) > len(fallback):
+            # Still try to pull out a single sentence
+            sentence = extract_sentence_containing(parent_text, fallback)
+            if sentence:
+                return sentence
+            # If only one sentence exists in this block, return it directly
+            sentences = split_sentences(parent_text)
+            if len(sentences) == 1:
+                return sentences[0]
+            # Otherwise keep climbing
+
+    # Last resort: return the link's own text or the first sentence found above
+    return fallback or NO_CONTEXT
+
+
+class AnchorContext:
+    """
+    Finds the closest sentence of every link of a page without rendering any element twice.
+
+    The nearest ancestor with text (usually the paragraph, list item or cell) holds the
+    sentence of almost every link, so its sentences are rendered and split once and shared
+    by all the links inside it. Links that have to climb further are answered from one
+    rendering of the whole page: the text every element's get_text(separator=" ", strip=True)
+    would return is a slice of the page's text, so each ancestor costs a bisect over the
+    sentence breaks and a str.find inside its span instead of rendering its whole subtree.
+    It returns exactly what the module level closest_sentence does.
+
+    Build it before the soup is modified, e.g. before scripts are removed for the plain text.
+    """
+
+    def __init__(self, soup):
+        self._soup = soup
+        self._types = soup.interesting_string_types
+        self._sentences = {}    # {id(element): (text length, sentences)}
+        self.text = None        # The page's text, rendered by the first link that climbs
+
+    # Nearest ancestor, rendered once per element
+    def _element_sentences(self, node):
+        cached = self._sentences.get(id(node))
+        if cached is None:
+            text = node.get_text(separator=" ", strip=True)
+            sentences = split_sentences(text) if text else []
+            cached = self._sentences[id(node)] = (len(text), sentences)
+        return cached
+
+    def _closest_in_element(self, node, fallback:str, needle:str):
+        # One step of closest_sentence on the element's own text
+        length, sentences = self._element_sentences(node)
+        if not fallback:
+            return sentences[0]
+        for sentence in sentences:
+            if needle in sentence.lower():
+                return sentence
+        if node.name in BLOCK_ELEMENTS and length > len(fallback) and len(sentences) == 1:
+            return sentences[0]
+        return None
+
+    # Whole page, rendered once
+    def _render_page(self):
+        strings = []
+        self._strings = strings
+        self._starts = {}       # {id(element): number of strings before it}
+        self._spans = {}        # {id(tag): (first string, end string)}, filled as links ask for them
+        for element in self._soup.descendants:
+            self._starts[id(element)] = len(strings)
+            if element.__class__ in self._types:
+                text = element.strip()
+                if text:
+                    strings.append(text)
+
+        self.text = " ".join(strings)
+        # Character offset where every string starts, plus one past the end of the text
+        self._offsets = []
+        position = 0
+        for text in strings:
+            self._offsets.append(position)
+            position += len(text) + 1
+        self._offsets.append(position)
+
+        # Sentences are the stretches between breaks
+        breaks = list(_SENTENCE_BREAK.finditer(self.text))
+        self._break_starts = [m.start() for m in breaks]
+        self._sentence_starts = [0] + [m.end() for m in breaks]
+        self._sentence_ends = self._break_starts + [len(self.text)]
+
+        # Offsets only carry over to the lowercased text if lowercasing maps every character to one
+        # character on its own (final sigma depends on its neighbours)
+        self._lower = self.text.lower()
+        self._exact_lower = len(self._lower) == len(self.text) and 'Σ' not in self.text
+
+    def _char_span(self, node):
+        span = self._spans.get(id(node))
+        if span is None:
+            # The strings of node end where the first element after its subtree starts
+            after = node
+            while after is not None and after.next_sibling is None:
+                after = after.parent
+            first = self._starts.get(id(node), 0)
+            end = len(self._strings) if after is None else self._starts[id(after.next_sibling)]
+            if first == end:
+                span = (0, 0)
+            else:
+                span = (self._offsets[first], self._offsets[end] - 1)
+            self._spans[id(node)] = span
+        return span
+
+    def _sentence_at(self, position:int, start:int, end:int):
+        # The sentence holding position, cut to the element's text [start, end)
+        index = bisect_right(self._sentence_starts, position) - 1
+        return max(self._sentence_starts[index], start), min(self._sentence_ends[index], end)
+
+    def _sentence_containing(self, needle:str, start:int, end:int):
+        # The first sentence of [start, end) that contains needle in full
+        position = self._lower.find(needle, start, end)
+        while position != -1:
+            sentence_start, sentence_end = self._sentence_at(position, start, end)
+            if position + len(needle) <= sentence_end:
+                return self.text[sentence_start:sentence_end]
+            position = self._lower.find(needle, position + 1, end)
+        return None
+
+    def _closest_in_page(self, node, fallback:str, needle:str):
+        # One step of closest_sentence on the element's slice of the page's text
+        if not self._exact_lower or node.interesting_string_types is not self._types:
+            # Elements such as <template> collect other strings than the page does
+            return self._closest_in_element(node, fallback, needle) if self._element_sentences(node)[0] else None
+        start, end = self._char_span(node)
+        if start == end:
+            return None
+        if not fallback:
+            return self.text[slice(*self._sentence_at(start, start, end))]
+        sentence = self._sentence_containing(needle, start, end)
+        if sentence:
+            return sentence
+        # One sentence if no break falls inside the element's text
+        if node.name in BLOCK_ELEMENTS and end - start > len(fallback) \
+                and bisect_left(self._break_starts, end) == bisect_left(self._break_starts, start):
+            return self.text[start:end]
+        return None
+
+    def closest_sentence(self, tag) -> str:
+        """
+        Returns the single sentence that is closest to / contains the link, as closest_sentence(tag) does.
+        """
+        fallback = tag.get_text(strip=True) or ""
+        needle = fallback.lower()
+
+        node = tag.parent
+        while node is not None and not self._element_sentences(node)[0]:
+            node = node.parent
+        if node is None:
+            return fallback or NO_CONTEXT
+        sentence = self._closest_in_element(node, fallback, needle)
+        if sentence:
+            return sentence
+
+        if self.text is None:
+            self._render_page()
+        node = node.parent
+        while node is not None:
+            sentence = self._closest_in_page(node, fallback, needle)
+            if sentence:
+                return sentence
+            node = node.parent
+        return fallback or NO_CONTEXT
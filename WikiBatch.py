@@ -0,0 +1,101 @@
+# Imports and Installs
+import asyncio
+from urllib.parse import urlsplit, urlunsplit
+from concurrent.futures import ThreadPoolExecutor
+
+# Constants
+DEFAULT_MAX_URLS = 100          # Distinct urls accepted in one batch
+DEFAULT_MAX_WORKERS = 8         # Urls of a batch loaded at the same time
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url:str):
+    """
+    Returns the canonical form of an absolute http(s) url, so that spellings of the same page
+    are fetched once: surrounding whitespace, the fragment and a default port are dropped,
+    scheme and host are lowercased and an empty path becomes '/'. Path and query are kept as
+    given, the wiki treats them case sensitively.
+
+    Raises:
+        ValueError: If url is not an absolute http(s) url.
+    """
+    if not isinstance(url, str):
+        raise ValueError("url must be a string")
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        raise ValueError(f"{url!r} is not an absolute http(s) url")
+    host = f'[{parts.hostname}]' if ':' in parts.hostname else parts.hostname
+    if parts.port not in (None, DEFAULT_PORTS[scheme]):
+        host = f'{host}:{parts.port}'
+    if '@' in parts.netloc:
+        host = parts.netloc.rsplit('@', 1)[0] + '@' + host
+    return urlunsplit((scheme, host, parts.path or '/', parts.query, ''))
+
+
+def plan_batch(urls, max_urls:int=DEFAULT_MAX_URLS):
+    """
+    Normalizes and de-duplicates the urls of a batch request.
+
+    Args:
+        urls (list): The urls as given by the client.
+        max_urls (int): Most distinct urls allowed.
+
+    Returns:
+        tuple: (distinct, requested, invalid)
+            distinct (list): Distinct normalized urls, in the order they were first given.
+            requested (dict): {normalized url: [urls as given that normalize to it]}
+            invalid (dict): {url as given: error message} of the entries that are not http(s) urls.
+
+    Raises:
+        ValueError: If urls is not a non-empty list, or holds more than max_urls distinct urls.
+    """
+    if not isinstance(urls, list) or not urls:
+        raise ValueError("urls must be a non-empty list")
+    requested, invalid = {}, {}
+    for url in urls:
+        try:
+            normalized = normalize_url(url)
+        except ValueError as e:
+            invalid[str(url)] = str(e)
+            continue
+        requested.setdefault(normalized, []).append(url)
+    if len(requested) > max_urls:
+        raise ValueError(f"at most {max_urls} distinct urls are allowed, {len(requested)} were given")
+    return list(requested), requested, invalid
+
+
+def run_batch(urls:list, load, max_workers:int=DEFAULT_MAX_WORKERS):
+    """
+    Calls load(url) for every url on a pool of max_workers threads, so the batch takes about as
+    long as its slowest url instead of the sum of all of them. A failing url does not stop the others.
+
+    Returns:
+        list: (url, result, error) for every url in the given order, error is None if load returned
+        and result is None if it raised.
+    """
+    if not urls:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(urls)))) as pool:
+        futures = [pool.submit(load, url) for url in urls]
+        outcomes = []
+        for url, future in zip(urls, futures):
+            error = future.exception()
+            outcomes.append((url, None if error else future.result(), error))
+        return outcomes
+
+
+async def run_batch_async(urls:list, load, max_workers:int=DEFAULT_MAX_WORKERS):
+    """
+    asyncio version of run_batch, for a coroutine function load. At most max_workers urls are loaded at once.
+    """
+    slots = asyncio.Semaphore(max(1, max_workers))
+
+    async def load_one(url):
+        async with slots:
+            try:
+                return url, await load(url), None
+            except Exception as e:
+                return url, None, e
+
+    return list(await asyncio.gather(*(load_one(url) for url in urls)))
@@ -0,0 +1,252 @@
+# Imports and Installs
+import json
+import math
+import hashlib
+import tempfile
+from collections import deque
+from WikiCrawler import WikiCrawler, AsyncWikiCrawler
+
+# Constants
+DEFAULT_EXPECTED_URLS = 1_000_000       # Urls the bloom filters are sized for, the false positive rate holds up to here
+DEFAULT_FALSE_POSITIVE_RATE = 1e-4      # Chance that an unseen url is taken for a seen one (and skipped)
+DEFAULT_FRONTIER_MEMORY_ITEMS = 10_000  # Frontier entries kept in memory, the rest is spilled to disk
+SPILL_READ_BATCH = 1_000                # Frontier entries read back from disk at once
+
+
+class UrlBloomFilter:
+    """
+    Fixed size set of urls that answers `url in filter` with no false negatives and
+    a false positive rate of about false_positive_rate, as long as no more than
+    expected_urls urls were added. Its memory never grows: 1M urls at 1e-4 take 2.3 MiB,
+    where a set of the same urls takes well over 100 MiB. Not thread safe, crawlers only
+    touch it from the thread that extracts links.
+
+    Args:
+        expected_urls (int): Number of urls the filter is sized for.
+        false_positive_rate (float): Target false positive rate at expected_urls urls.
+    """
+
+    def __init__(self, expected_urls:int=DEFAULT_EXPECTED_URLS, false_positive_rate:float=DEFAULT_FALSE_POSITIVE_RATE):
+        if not 0 < false_positive_rate < 1:
+            raise ValueError("false_positive_rate must be between 0 and 1")
+        expected_urls = max(1, expected_urls)
+        self.size = max(8, math.ceil(-expected_urls * math.log(false_positive_rate) / math.log(2) ** 2))    # Bits
+        self.hashes = max(1, round(self.size / expected_urls * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+        self._last_url, self._last_positions = None, None
+
+    def _positions(self, url:str):
+        # Crawlers check `url in filter` right before add(url), so the positions of the last url are reused
+        if url == self._last_url:
+            return self._last_positions
+        digest = int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=16).digest(), 'little')
+        first, second = digest & 0xFFFFFFFFFFFFFFFF, (digest >> 64) | 1
+        positions = [(first + i * second) % self.size for i in range(self.hashes)]
+        self._last_url, self._last_positions = url, positions
+        return positions
+
+    def __contains__(self, url:str):
+        bits = self._bits
+        for position in self._positions(url):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def add(self, url:str):
+        """
+        Adds url. Returns True if it was not in the filter yet (or was a false positive), False otherwise.
+        """
+        bits = self._bits
+        added = False
+        for position in self._positions(url):
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                bits[position >> 3] |= mask
+                added = True
+        self.count += added
+        return added
+
+    def __len__(self):
+        return self.count
+
+    def nbytes(self):
+        return len(self._bits)
+
+    def false_positive_rate(self):
+        """
+        Returns the expected false positive rate at the current number of urls.
+        """
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+
+class SpillingFrontier:
+    """
+    FIFO of (url, depth) entries that keeps at most memory_items of them in memory.
+    Once it is full, new entries are appended to a temporary file and read back in
+    batches when the in-memory part runs empty, so the order stays first in first out.
+
+    Args:
+        memory_items (int): Entries kept in memory.
+        spill_dir (str, optional): Directory of the spill file. The system temp directory if None.
+    """
+
+    def __init__(self, memory_items:int=DEFAULT_FRONTIER_MEMORY_ITEMS, spill_dir:str=None):
+        self.memory_items = max(1, memory_items)
+        self.spill_dir = spill_dir
+        self.spilled = 0            # Entries written to disk over the lifetime of the frontier
+        self._memory = deque()
+        self._file = None
+        self._on_disk = 0           # Entries in the file that were not read back yet
+        self._read_offset = 0
+
+    def __len__(self):
+        return len(self._memory) + self._on_disk
+
+    def append(self, entry:tuple):
+        url, depth = entry
+        if not self._on_disk and len(self._memory) < self.memory_items:
+            self._memory.append(entry)
+            return
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(dir=self.spill_dir)
+        self._file.seek(0, 2)
+        self._file.write(f"{depth}\t{url.replace(chr(10), '%0A')}\n".encode('utf-8'))
+        self._on_disk += 1
+        self.spilled += 1
+
+    def popleft(self):
+        if not self._memory and self._on_disk:
+            self._read_back()
+        return self._memory.popleft()
+
+    def _read_back(self):
+        self._file.seek(self._read_offset)
+        for _ in range(min(SPILL_READ_BATCH, self.memory_items, self._on_disk)):
+            depth, url = self._file.readline().decode('utf-8').rstrip('\n').split('\t', 1)
+            self._memory.append((url, int(depth)))
+            self._on_disk -= 1
+        self._read_offset = self._file.tell()
+        if not self._on_disk:
+            self._file.seek(0)
+            self._file.truncate()
+            self._read_offset = 0
+
+    def clear(self):
+        self._memory.clear()
+        self._on_disk = 0
+        self._read_offset = 0
+        if self._file is not None:
+            self._file.seek(0)
+            self._file.truncate()
+
+    def close(self):
+        self.clear()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class LinkSpool:
+    """
+    Append only list of link dicts kept in a temporary file, read back in order.
+    Holds crawl results that are too large to keep in memory until the response is written.
+
+    Args:
+        spill_dir (str, optional): Directory of the spool file. The system temp directory if None.
+    """
+
+    def __init__(self, spill_dir:str=None):
+        self._file = tempfile.TemporaryFile(dir=spill_dir)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, link:dict):
+        self._file.write(json.dumps(link).encode('utf-8') + b'\n')
+        self.count += 1
+
+    def iter_json(self):
+        """
+        Yields every link as its JSON text, without decoding it.
+        """
+        self._file.flush()
+        self._file.seek(0)
+        for line in self._file:
+            yield line.decode('utf-8').rstrip('\n')
+
+    def __iter__(self):
+        for line in self.iter_json():
+            yield json.loads(line)
+
+    def close(self):
+        self._file.close()
+
+
+class _BoundedCrawlMixin:
+    """
+    Swaps the visited set and frontier queue of a crawler for a UrlBloomFilter and a
+    SpillingFrontier, so the memory of a crawl stays constant however many urls it finds.
+    A false positive of the filter skips a url that was never fetched, about
+    false_positive_rate of them while the crawl stays under expected_urls.
+    """
+
+    def __init__(self, *args, expected_urls:int=DEFAULT_EXPECTED_URLS, false_positive_rate:float=DEFAULT_FALSE_POSITIVE_RATE,
+                 frontier_memory_items:int=DEFAULT_FRONTIER_MEMORY_ITEMS, spill_dir:str=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.expected_urls = expected_urls
+        self.false_positive_rate = false_positive_rate
+        self.frontier_memory_items = frontier_memory_items
+        self.spill_dir = spill_dir
+        self.frontier = None        # Frontier of the latest crawl, to read its spill counters
+
+    def _new_visited(self, urls=()):
+        visited = UrlBloomFilter(self.expected_urls, self.false_positive_rate)
+        for url in urls:
+            visited.add(url)
+        return visited
+
+    def _new_frontier(self):
+        self.frontier = SpillingFrontier(self.frontier_memory_items, self.spill_dir)
+        return self.frontier
+
+
+class BoundedWikiCrawler(_BoundedCrawlMixin, WikiCrawler):
+    """
+    WikiCrawler with a hard memory bound, for crawls of hundreds of thousands of urls.
+
+    Args:
+        expected_urls (int): Urls the visited filter is sized for.
+        false_positive_rate (float): Share of unseen urls the filter may take for seen ones.
+        frontier_memory_items (int): Frontier entries kept in memory before spilling to disk.
+        spill_dir (str, optional): Directory of the spill files. The system temp directory if None.
+        Other arguments are those of WikiCrawler.
+    """
+
+
+class AsyncBoundedWikiCrawler(_BoundedCrawlMixin, AsyncWikiCrawler):
+    """
+    AsyncWikiCrawler with the memory bound of BoundedWikiCrawler.
+    """
+
+
+def unique_links(pages, seen=None):
+    """
+    Flattens the pages of a crawl into its distinct links, each emitted once.
+
+    Args:
+        pages (iterable): (page_url, depth, links) tuples as yielded by a crawler.
+        seen (optional): Container of urls to leave out, supporting `in` and add(). A set if None,
+            pass a UrlBloomFilter to keep the memory constant.
+
+    Yields:
+        dict: {'title', 'url', 'source', 'depth'} for every link, each url only once.
+    """
+    seen = set() if seen is None else seen
+    for page_url, depth, links in pages:
+        for link in links:
+            if link['url'] in seen:
+                continue
+            seen.add(link['url'])
+            yield {'title': link['title'], 'url': link['url'], 'source': page_url, 'depth': depth}
@@ -0,0 +1,181 @@
+# Imports and Installs
+import numpy as np
+
+# Constants
+EXPORT_FORMAT = 1                       # Bumped when the layout of the exported arrays changes
+CONV_LAYER_NAME = 'conv1d_k{}'          # Layer names of build_cnn_model in Intent_Identifier_Models.ipynb
+EMBEDDING_LAYER_NAME = 'embedding'
+DENSE_LAYER_NAME = 'dense'
+OUTPUT_LAYER_NAME = 'intent_output'
+CHUNK_ROWS = 16                         # Queries whose (length, taps * filters) convolution inputs are gathered at once
+
+
+def quantize_int8(weights:np.ndarray):
+    """
+    Symmetric int8 quantization with one scale per output channel (the last axis),
+    or per row for an embedding matrix passed transposed by the caller.
+
+    Returns:
+        tuple: (int8 weights, float32 scales) with weights ~= quantized * scales.
+    """
+    weights = np.asarray(weights, dtype=np.float32)
+    scales = np.abs(weights).reshape(-1, weights.shape[-1]).max(axis=0) / 127
+    scales[scales == 0] = 1
+    quantized = np.clip(np.rint(weights / scales), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def write_cnn_export(path:str, weights:dict, kernel_sizes:list, tokenizer_json:str, labels:list,
+                     max_seq_length:int, quantize:bool=False):
+    """
+    Writes the weights of the 1D-CNN intent model with its tokenizer and labels to one .npz file.
+
+    Args:
+        path (str): File to write.
+        weights (dict): {'embedding': (vocab, dim), 'conv{k}_kernel': (k, dim, filters), 'conv{k}_bias',
+                         'dense_kernel', 'dense_bias', 'output_kernel', 'output_bias'} as float arrays.
+        kernel_sizes (list): Convolution kernel sizes, in the order their outputs are concatenated.
+        tokenizer_json (str): The fitted Keras Tokenizer's to_json().
+        labels (list): Intent labels in label encoder order.
+        max_seq_length (int): Padded sequence length the model was trained with.
+        quantize (bool): Store the embedding and kernels as int8 with per channel scales (~4x smaller).
+    """
+    arrays = {
+        'format': np.array(EXPORT_FORMAT),
+        'kernel_sizes': np.array(kernel_sizes, dtype=np.int32),
+        'max_seq_length': np.array(max_seq_length),
+        'tokenizer_json': np.array(tokenizer_json),
+        'labels': np.array([str(label) for label in labels]),
+    }
+    for name, value in weights.items():
+        value = np.asarray(value, dtype=np.float32)
+        if quantize and name == 'embedding':
+            # One scale per token row
+            quantized, scales = quantize_int8(value.T)
+            arrays['embedding_q'], arrays['embedding_scale'] = quantized.T.copy(), scales
+        elif quantize and name.endswith('_kernel'):
+            arrays[f'{name}_q'], arrays[f'{name}_scale'] = quantize_int8(value)
+        else:
+            arrays[name] = value
+    np.savez_compressed(path, **arrays)
+
+
+def export_cnn_model(model, tokenizer, label_encoder, path:str, max_seq_length:int, kernel_sizes=(3, 4, 5),
+                     quantize:bool=False):
+    """
+    Exports a trained build_cnn_model Keras model for CnnIntentRuntime, see write_cnn_export.
+
+    Args:
+        model (keras.Model): The trained 1D-CNN model.
+        tokenizer (Tokenizer): The Keras Tokenizer the model was trained with.
+        label_encoder (LabelEncoder): The intent label encoder.
+    """
+    weights = {'embedding': model.get_layer(EMBEDDING_LAYER_NAME).get_weights()[0]}
+    for kernel_size in kernel_sizes:
+        weights[f'conv{kernel_size}_kernel'], weights[f'conv{kernel_size}_bias'] = \
+            model.get_layer(CONV_LAYER_NAME.format(kernel_size)).get_weights()
+    weights['dense_kernel'], weights['dense_bias'] = model.get_layer(DENSE_LAYER_NAME).get_weights()
+    weights['output_kernel'], weights['output_bias'] = model.get_layer(OUTPUT_LAYER_NAME).get_weights()
+    write_cnn_export(path, weights, list(kernel_sizes), tokenizer.to_json(), list(label_encoder.classes_),
+                     max_seq_length, quantize=quantize)
+
+
+class CnnIntentRuntime:
+    """
+    Forward pass of the 1D-CNN intent model (embedding -> Conv1D k=3/4/5 -> global max pool
+    -> dense -> softmax) in NumPy, from a file written by export_cnn_model.
+
+    All taps of all convolutions are one matrix, so a batch costs a single matmul for the
+    convolutions, run only over the distinct tokens of the batch (padding and repeated words
+    are projected once) and then shifted and summed per kernel. Global max pooling is taken
+    before the ReLU, which gives the same result on fewer values. Dropout is a no-op at inference.
+
+    An int8 export keeps the embedding as int8 in memory and scales only the rows a batch
+    looks up; the small kernels are scaled back to float32 once at load.
+
+    Args:
+        arrays (dict): The arrays of the export file.
+    """
+
+    def __init__(self, arrays):
+        if int(arrays['format']) != EXPORT_FORMAT:
+            raise ValueError(f"Unsupported CNN export format {int(arrays['format'])}, expected {EXPORT_FORMAT}")
+        self.kernel_sizes = [int(k) for k in arrays['kernel_sizes']]
+        self.max_seq_length = int(arrays['max_seq_length'])
+        self.tokenizer_json = str(arrays['tokenizer_json'])
+        self.labels = [str(label) for label in arrays['labels']]
+        self.quantized = 'embedding_q' in arrays
+
+        if self.quantized:
+            self._embedding = arrays['embedding_q']
+            self._embedding_scale = arrays['embedding_scale']
+        else:
+            self._embedding = arrays['embedding']
+            self._embedding_scale = None
+        kernel = lambda name: (arrays[f'{name}_q'] * arrays[f'{name}_scale']).astype(np.float32) \
+            if f'{name}_q' in arrays else arrays[name]
+
+        convolutions = [kernel(f'conv{k}_kernel') for k in self.kernel_sizes]
+        self.filters = convolutions[0].shape[2]
+        # (dim, sum(k) * filters): column block j of kernel k is its tap j
+        self._conv_kernel = np.ascontiguousarray(np.concatenate(
+            [tap for convolution in convolutions for tap in convolution], axis=1))
+        self._conv_biases = [arrays[f'conv{k}_bias'] for k in self.kernel_sizes]
+        self._dense_kernel, self._dense_bias = kernel('dense_kernel'), arrays['dense_bias']
+        self._output_kernel, self._output_bias = kernel('output_kernel'), arrays['output_bias']
+
+    @classmethod
+    def load(cls, path:str):
+        with np.load(path, allow_pickle=False) as export:
+            return cls({name: export[name] for name in export.files})
+
+    @property
+    def nbytes(self):
+        """
+        Bytes held by the weights.
+        """
+        arrays = [self._embedding, self._conv_kernel, self._dense_kernel, self._dense_bias,
+                  self._output_kernel, self._output_bias, *self._conv_biases]
+        if self._embedding_scale is not None:
+            arrays.append(self._embedding_scale)
+        return sum(array.nbytes for array in arrays)
+
+    def _embed(self, tokens:np.ndarray):
+        if self._embedding_scale is None:
+            return self._embedding[tokens]
+        return self._embedding[tokens].astype(np.float32) * self._embedding_scale[tokens, None]
+
+    def _pool(self, projected:np.ndarray):
+        # Convolution outputs of every kernel, max pooled over time, then ReLU
+        length = projected.shape[1]
+        pooled = []
+        column = 0
+        for kernel_size, bias in zip(self.kernel_sizes, self._conv_biases):
+            steps = length - kernel_size + 1
+            total = projected[:, :steps, column:column + self.filters].copy()
+            for tap in range(1, kernel_size):
+                start = column + tap * self.filters
+                total += projected[:, tap:tap + steps, start:start + self.filters]
+            pooled.append(total.max(axis=1) + bias)
+            column += kernel_size * self.filters
+        return np.maximum(np.concatenate(pooled, axis=1), 0)
+
+    def __call__(self, batch:np.ndarray):
+        """
+        Returns [intent probabilities (len(batch), labels)] for a padded int32 batch, like the Keras model's predict.
+        """
+        batch = np.asarray(batch)
+        rows, length = batch.shape
+        tokens, positions = np.unique(batch, return_inverse=True)
+        token_projections = self._embed(tokens) @ self._conv_kernel
+        positions = positions.reshape(rows, length)
+        features = np.concatenate([self._pool(token_projections[positions[start:start + CHUNK_ROWS]])
+                                   for start in range(0, rows, CHUNK_ROWS)])
+
+        hidden = np.maximum(features @ self._dense_kernel + self._dense_bias, 0)
+        logits = hidden @ self._output_kernel + self._output_bias
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return [exp / exp.sum(axis=1, keepdims=True)]
+
+    def predict(self, batch:np.ndarray):
+        return self(batch)[0]
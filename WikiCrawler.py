@@ -0,0 +1,304 @@
+# Imports and Installs
+import asyncio
+import threading
+from collections import deque
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Constants
+DEFAULT_MAX_WORKERS = 8         # Size of the fetch thread pool
+DEFAULT_PER_HOST_LIMIT = 4      # Concurrent requests allowed against a single host
+
+
+class WikiCrawler:
+    """
+    Frontier-based crawler for wiki pages.
+
+    Pages are fetched concurrently on a bounded thread pool while link extraction
+    runs on the calling thread, so `extract_links` never has to be thread-safe.
+    Visited URLs are tracked in a set, so every URL is fetched at most once
+    (WikiBoundedCrawl swaps it and the frontier for constant memory ones).
+
+    Args:
+        fetch (callable): fetch(url) -> html string. Runs on the worker threads.
+        extract_links (callable): extract_links(html, page_url) -> list of {'title','url'} dicts.
+        max_workers (int): Size of the fetch thread pool.
+        per_host_limit (int): Maximum concurrent fetches against one host.
+        max_depth (int, optional): Maximum link hops to follow from the start page.
+            0 only extracts the start page, None follows every reachable link.
+        max_pages (int, optional): Maximum number of subpages to fetch. None means no limit.
+        on_error (callable, optional): on_error(url, exception), called on the calling thread
+            when a subpage fails to fetch. Failed pages are skipped either way.
+    """
+
+    def __init__(self, fetch, extract_links, max_workers:int=DEFAULT_MAX_WORKERS,
+                 per_host_limit:int=DEFAULT_PER_HOST_LIMIT, max_depth:int=None,
+                 max_pages:int=None, on_error=None):
+        self.fetch = fetch
+        self.extract_links = extract_links
+        self.max_workers = max(1, max_workers)
+        self.per_host_limit = max(1, per_host_limit)
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.on_error = on_error
+        self._host_slots = {}
+        self._host_slots_lock = threading.Lock()
+
+    def _host_slot(self, url:str):
+        """
+        Returns the semaphore capping concurrent fetches for the host of the url.
+        """
+        host = urlsplit(url).netloc
+        with self._host_slots_lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = threading.BoundedSemaphore(self.per_host_limit)
+                self._host_slots[host] = slot
+            return slot
+
+    def _fetch_limited(self, url:str):
+        with self._host_slot(url):
+            return self.fetch(url)
+
+    def _can_follow(self, depth:int):
+        return self.max_depth is None or depth <= self.max_depth
+
+    def _new_visited(self, urls=()):
+        """
+        Returns the container of urls already scheduled, supporting `in` and add().
+        """
+        return set(urls)
+
+    def _new_frontier(self):
+        """
+        Returns the FIFO of (url, depth) still to fetch, supporting append(), popleft(), clear() and len().
+        """
+        return deque()
+
+    def crawl(self, start_url:str, start_html:str=None, start_links:list=None):
+        """
+        Crawls outward from start_url, yielding each page as it is parsed.
+
+        Args:
+            start_url (str): The url the crawl starts from.
+            start_html (str, optional): Already fetched html of start_url, to avoid a second fetch.
+            start_links (list, optional): Already extracted links of start_url, to avoid a second parse.
+
+        Yields:
+            tuple: (page_url, depth, links) where links is the list returned by extract_links.
+        """
+        if start_links is None and start_html is None:
+            start_html = self.fetch(start_url)
+        if start_links is None:
+            start_links = self.extract_links(start_html, start_url)
+        yield start_url, 0, start_links
+        visited = self._new_visited([start_url])
+        frontier = self._new_frontier()
+        self._enqueue(frontier, visited, start_links, 1)
+        yield from self._crawl_frontier(frontier, visited)
+
+    def crawl_from(self, start_urls, skip=()):
+        """
+        Crawls outward from several pages at once, fetching each of them first.
+        Used by incremental syncs, which only refetch the pages that changed.
+
+        Args:
+            start_urls (iterable): The urls to fetch, all at depth 0.
+            skip (container, optional): Urls that are not followed when they are linked,
+                e.g. pages that are already stored and did not change.
+
+        Yields:
+            tuple: (page_url, depth, links) where links is the list returned by extract_links.
+        """
+        start_urls = list(dict.fromkeys(start_urls))
+        visited = self._new_visited(skip)
+        frontier = self._new_frontier()
+        for url in start_urls:
+            visited.add(url)
+            frontier.append((url, 0))
+        yield from self._crawl_frontier(frontier, visited)
+
+    def _enqueue(self, frontier, visited, links:list, depth:int):
+        if not self._can_follow(depth):
+            return
+        for link in links:
+            url = link['url']
+            if url not in visited:
+                visited.add(url)
+                frontier.append((url, depth))
+
+    def _crawl_frontier(self, frontier, visited):
+        pages_scheduled = 0
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        in_flight = {}
+        try:
+            while frontier or in_flight:
+                # Keep the pool saturated without letting the queue of futures grow unbounded
+                while frontier and len(in_flight) < self.max_workers * 2:
+                    if self.max_pages is not None and pages_scheduled >= self.max_pages:
+                        frontier.clear()
+                        break
+                    url, depth = frontier.popleft()
+                    in_flight[pool.submit(self._fetch_limited, url)] = (url, depth)
+                    pages_scheduled += 1
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url, depth = in_flight.pop(future)
+                    try:
+                        html_content = future.result()
+                    except Exception as e:
+                        if self.on_error:
+                            self.on_error(url, e)
+                        continue
+                    links = self.extract_links(html_content, url)
+                    yield url, depth, links
+                    self._enqueue(frontier, visited, links, depth + 1)
+        finally:
+            # Closing the generator early must not wait for the queued fetches, only the
+            # ones already running finish in the background
+            for future in in_flight:
+                future.cancel()
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+class AsyncWikiCrawler:
+    """
+    asyncio version of WikiCrawler, for the async (ASGI) service.
+
+    Pages are fetched as concurrent tasks on the running event loop. Link extraction
+    runs in a worker thread, one page at a time, so it does not block the loop and
+    `extract_links` still never has to be thread-safe.
+
+    Args:
+        fetch (callable): async fetch(url) -> html string.
+        extract_links (callable): extract_links(html, page_url) -> list of {'title','url'} dicts.
+        max_workers (int): Maximum fetches in flight.
+        per_host_limit (int): Maximum concurrent fetches against one host.
+        max_depth (int, optional): Maximum link hops to follow from the start page.
+            0 only extracts the start page, None follows every reachable link.
+        max_pages (int, optional): Maximum number of subpages to fetch. None means no limit.
+        on_error (callable, optional): on_error(url, exception), called when a subpage fails
+            to fetch. Failed pages are skipped either way.
+    """
+
+    def __init__(self, fetch, extract_links, max_workers:int=DEFAULT_MAX_WORKERS,
+                 per_host_limit:int=DEFAULT_PER_HOST_LIMIT, max_depth:int=None,
+                 max_pages:int=None, on_error=None):
+        self.fetch = fetch
+        self.extract_links = extract_links
+        self.max_workers = max(1, max_workers)
+        self.per_host_limit = max(1, per_host_limit)
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.on_error = on_error
+        self._host_slots = {}
+
+    async def _fetch_limited(self, url:str):
+        host = urlsplit(url).netloc
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = self._host_slots[host] = asyncio.Semaphore(self.per_host_limit)
+        async with slot:
+            return await self.fetch(url)
+
+    def _can_follow(self, depth:int):
+        return self.max_depth is None or depth <= self.max_depth
+
+    def _new_visited(self, urls=()):
+        return set(urls)
+
+    def _new_frontier(self):
+        return deque()
+
+    async def crawl(self, start_url:str, start_html:str=None, start_links:list=None):
+        """
+        Crawls outward from start_url, yielding each page as it is parsed.
+        Closing the generator early cancels the fetches still in flight.
+
+        Args:
+            start_url (str): The url the crawl starts from.
+            start_html (str, optional): Already fetched html of start_url, to avoid a second fetch.
+            start_links (list, optional): Already extracted links of start_url, to avoid a second parse.
+
+        Yields:
+            tuple: (page_url, depth, links) where links is the list returned by extract_links.
+        """
+        if start_links is None and start_html is None:
+            start_html = await self.fetch(start_url)
+        visited = self._new_visited([start_url])
+        frontier = self._new_frontier()
+        pages_scheduled = 0
+
+        def enqueue(links, depth):
+            if not self._can_follow(depth):
+                return
+            for link in links:
+                url = link['url']
+                if url not in visited:
+                    visited.add(url)
+                    frontier.append((url, depth))
+
+        if start_links is None:
+            start_links = await asyncio.to_thread(self.extract_links, start_html, start_url)
+        yield start_url, 0, start_links
+        enqueue(start_links, 1)
+
+        in_flight = {}
+        try:
+            while frontier or in_flight:
+                while frontier and len(in_flight) < self.max_workers:
+                    if self.max_pages is not None and pages_scheduled >= self.max_pages:
+                        frontier.clear()
+                        break
+                    url, depth = frontier.popleft()
+                    in_flight[asyncio.ensure_future(self._fetch_limited(url))] = (url, depth)
+                    pages_scheduled += 1
+                if not in_flight:
+                    break
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    url, depth = in_flight.pop(task)
+                    try:
+                        html_content = task.result()
+                    except Exception as e:
+                        if self.on_error:
+                            self.on_error(url, e)
+                        continue
+                    links = await asyncio.to_thread(self.extract_links, html_content, url)
+                    yield url, depth, links
+                    enqueue(links, depth + 1)
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+
+def crawl_links(start_url:str, fetch, extract_links, start_html:str=None, start_links:list=None,
+                max_links:int=None, **crawler_options):
+    """
+    Crawls outward from start_url and returns every extracted link as a flat list.
+
+    Args:
+        start_url (str): The url the crawl starts from.
+        fetch (callable): fetch(url) -> html string.
+        extract_links (callable): extract_links(html, page_url) -> list of {'title','url'} dicts.
+        start_html (str, optional): Already fetched html of start_url.
+        start_links (list, optional): Already extracted links of start_url.
+        max_links (int, optional): Stops crawling once this many links were collected. None means no limit.
+        **crawler_options: Passed on to WikiCrawler (max_workers, per_host_limit, max_depth, max_pages, on_error).
+
+    Returns:
+        list: A list of dicts each containing 'title' and 'url', in discovery order, at most max_links of them.
+    """
+    crawler = WikiCrawler(fetch, extract_links, **crawler_options)
+    links = []
+    pages = crawler.crawl(start_url, start_html, start_links)
+    try:
+        for _, _, page_links in pages:
+            links.extend(page_links)
+            if max_links is not None and len(links) >= max_links:
+                return links[:max_links]
+    finally:
+        pages.close()   # Stops scheduling new fetches once the limit is hit
+    return links
@@ -1,107 +1,200 @@
 # Imports and Installs
+import os
 import re
 import json
+import time
 import requests
-from tqdm import tqdm
+import WikiHttpClient as http_client
 from flask_cors import CORS
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin
-from flask import Flask, jsonify, request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from WikiCrawler import WikiCrawler, crawl_links
+from WikiBoundedCrawl import BoundedWikiCrawler, UrlBloomFilter, LinkSpool, unique_links
+from WikiVersionCache import VersionMapCache
+from WikiReleaseIndex import ReleaseIndex
+from WikiBatch import plan_batch, run_batch
+from WikiPageExtractor import extract_page
+from WikiPageStore import WikiPageStore
+from WikiLinkFilter import load_link_filter, DEFAULT_RULES_PATH
+from WikiSingleFlight import SingleFlight
+from WikiIncrementalSync import IncrementalSync, WikiSyncStore
+from WikiSearchIndex import WikiSearchIndex
+from WikiMicroBatcher import MicroBatcher
+from WikiIntentClassifier import load_intent_classifier
+from WikiMetrics import MetricsRegistry, Counter, PROMETHEUS_CONTENT_TYPE
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 
 # Flask App
 app = Flask(__name__)
 CORS(app)
 
 # Constants
-URLs_TO_DROP = [
-    'https://developer.wikimedia.org/',
-    'https://www.mediawiki.org/',
-    'https://www.wikipedia.org/',
-    'https://foundation.wikimedia.org/wiki/Home',
-    'https://species.wikimedia.org/wiki/Wikispecies:Administrators',
-    'https://hsb.wikipedia.org/wiki/Diskusija_z_wu\u017eiwarjom:J_budissin',
-]
-
-URL_STRINGS_TO_DROP = [
-    'Administrator',
-    'logout',
-    'login',
-    'remove credentials',
-    'export',
-    'contribute',
-    'edit',
-    'http://',
-    'mailto:',
-    'tel:',
-    'file:',
-    'ftp://',
-    'ftps://',
-]
-
-TITLES_TO_DROP = [
-    'log in',
-    'logout',
-    'remove credentials',
-    'export',
-    'contribute',
-    'edit',
-    'history',
-    'view source',
-    'the portal administrator view',
-    'user',
-    'administrator',
-    'random page',
-    'view source',
-    'the portal administrator view'
-]
-
-WIKI_BASE_URL = "https://wiki.alkit.se/<VERSION_NUMBER>/index.php/Main_Page"
+# Link drop rules are shared with WikiParser.ipynb, see link_filter_rules.json
+LINK_FILTER_RULES_PATH = os.environ.get('WIKI_LINK_FILTER_RULES', DEFAULT_RULES_PATH)
+
+# Both can be pointed at another wiki (e.g. benchmarks/stub_wiki.py) through environment variables
+WIKI_BASE_URL = os.environ.get('WIKI_BASE_URL', "https://wiki.alkit.se/<VERSION_NUMBER>/index.php/Main_Page")
 RELEASE_HISTORIES = {
-    'software': "https://wice-sysdoc.alkit.se/index.php/WICE_WCU_Software_Revision_History",    # Approach : Get listed version numbers and generate URLs
-    'portal': 'https://wice-sysdoc.alkit.se/index.php/WICE_Portal_Release_notes',               # No specific approach mentioned for this history
-    'm2m': 'https://wice-sysdoc.alkit.se/index.php/M2M_release_notes',                          # No specific approach mentioned for this history
-    'masterbox': 'https://wice-sysdoc.alkit.se/index.php/MasterBox_release_notes',              # No specific approach mentioned for this history
+    'software': os.environ.get('WIKI_RELEASE_HISTORY_URL', "https://wice-sysdoc.alkit.se/index.php/WICE_WCU_Software_Revision_History"),    # Approach : Get listed version numbers and generate URLs
+    'portal': os.environ.get('WIKI_PORTAL_RELEASE_NOTES_URL', 'https://wice-sysdoc.alkit.se/index.php/WICE_Portal_Release_notes'),  # Indexed by RELEASE_INDEX
+    'm2m': os.environ.get('WIKI_M2M_RELEASE_NOTES_URL', 'https://wice-sysdoc.alkit.se/index.php/M2M_release_notes'),                  # Indexed by RELEASE_INDEX
+    'masterbox': os.environ.get('WIKI_MASTERBOX_RELEASE_NOTES_URL', 'https://wice-sysdoc.alkit.se/index.php/MasterBox_release_notes'),  # Indexed by RELEASE_INDEX
     }
 
-WICE_WIKI_VERSIONS = {}              # {'version_number': 'url'}
-UNAVAILABLE_WICE_WIKI_VERSIONS = {}  # {'version_number': 'url'}
+CRAWL_MAX_WORKERS = 8               # Sub pages fetched concurrently by extract_hyperlinks
+CRAWL_PER_HOST_LIMIT = 4            # Concurrent fetches allowed against a single host
+
+# Memory bounded crawls (bounded=true, or WIKI_CRAWL_BOUNDED=1 for all of them) track visited and returned urls
+# in bloom filters and spill their frontier and results to disk, so a crawl of the whole wiki fits in a small container
+CRAWL_BOUNDED = os.environ.get('WIKI_CRAWL_BOUNDED', '0') == '1'
+CRAWL_EXPECTED_URLS = int(os.environ.get('WIKI_CRAWL_EXPECTED_URLS', 1_000_000))           # Sizes the bloom filters (2.3 MiB each)
+CRAWL_FALSE_POSITIVE_RATE = float(os.environ.get('WIKI_CRAWL_FALSE_POSITIVE_RATE', 1e-4))  # Share of urls wrongly taken as seen
+CRAWL_FRONTIER_MEMORY_ITEMS = int(os.environ.get('WIKI_CRAWL_FRONTIER_ITEMS', 10_000))     # Frontier entries kept in memory
+CRAWL_SPILL_DIR = os.environ.get('WIKI_CRAWL_SPILL_DIR') or None                            # System temp directory if not set
+
+NDJSON_MIMETYPE = 'application/x-ndjson'   # Content type of the streaming /get_url_content response
+
+BATCH_MAX_URLS = int(os.environ.get('WIKI_BATCH_MAX_URLS', 100))        # Distinct urls accepted by one /get_url_content_batch call
+BATCH_MAX_WORKERS = int(os.environ.get('WIKI_BATCH_MAX_WORKERS', 8))    # Pages of a batch fetched and parsed concurrently
+
+PROBE_MAX_WORKERS = 16              # Version urls probed concurrently by check_urls_exist
+PROBE_TIMEOUT_SECONDS = 10          # Timeout of a single HEAD probe
+
+VERSION_MAP_CACHE_PATH = os.environ.get('WIKI_VERSION_MAP_CACHE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'version_map_cache.json'))
+VERSION_MAP_TTL_SECONDS = 6 * 60 * 60   # Version map is revalidated in the background after this
+VERSION_MAP_UNAVAILABLE_TTL_SECONDS = 10 * 60     # Sooner if versions were unavailable, they are probed again then
+
+# Releases of all RELEASE_HISTORIES pages, parsed into sorted records and persisted
+RELEASE_INDEX_PATH = os.environ.get('WIKI_RELEASE_INDEX', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'release_index.json'))
+RELEASE_INDEX_TTL_SECONDS = 6 * 60 * 60     # Release pages are revalidated in the background after this
+
+# Local page store. Set WIKI_PAGE_STORE_DIR to an empty string to disable it,
+# and WIKI_OFFLINE=1 to serve pages only from the store (no network).
+PAGE_STORE_DIR = os.environ.get('WIKI_PAGE_STORE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'page_store'))
+PAGE_STORE_MAX_BYTES = int(os.environ.get('WIKI_PAGE_STORE_MAX_MB', 512)) * 1024 * 1024
+OFFLINE_MODE = os.environ.get('WIKI_OFFLINE', '0') == '1'
+
+# Crawled text and link graph of every version, kept up to date from the wiki's recent changes
+SYNC_DB_PATH = os.environ.get('WIKI_SYNC_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'wiki_sync.sqlite3'))
+
+# BM25 index of the synced pages, one partition per version, updated by every sync
+SEARCH_INDEX_DIR = os.environ.get('WIKI_SEARCH_INDEX_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'search_index'))
+SEARCH_DEFAULT_RESULTS = 10         # Results returned by /search when k is not given
+SEARCH_MAX_RESULTS = 100            # Largest k /search accepts
+
+# Intent model saved by Intent_Identifier_Models.ipynb (save_for_serving), loaded once at startup
+INTENT_MODEL_DIR = os.environ.get('WIKI_INTENT_MODEL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'intent_models'))
+INTENT_MODEL_NAME = os.environ.get('WIKI_INTENT_MODEL', 'joint')           # 'joint' also predicts the brand / model / sensor slots
+INTENT_MAX_BATCH_SIZE = int(os.environ.get('WIKI_INTENT_MAX_BATCH', 64))    # Queries classified by one model call at most
+INTENT_MAX_WAIT_MS = float(os.environ.get('WIKI_INTENT_MAX_WAIT_MS', 2))    # How long a query waits for others to join its batch
+INTENT_TIMEOUT_SECONDS = 5          # A query not classified within this is answered with 503
+INTENT_MAX_QUERY_LENGTH = 1000      # Longer queries are rejected, the model only reads the first words anyway
+
+PAGE_STORE = WikiPageStore(PAGE_STORE_DIR, max_bytes=PAGE_STORE_MAX_BYTES, offline=OFFLINE_MODE) if PAGE_STORE_DIR else None
+LINK_FILTER = load_link_filter(LINK_FILTER_RULES_PATH)
+SINGLE_FLIGHT = SingleFlight()     # Concurrent identical upstream work runs once and is shared
+SYNC_STORE = WikiSyncStore(SYNC_DB_PATH)
+RELEASE_INDEX = ReleaseIndex(RELEASE_HISTORIES, cache_path=RELEASE_INDEX_PATH, ttl=RELEASE_INDEX_TTL_SECONDS)
+SEARCH_INDEX = WikiSearchIndex(SEARCH_INDEX_DIR)
+INTENT_CLASSIFIER = load_intent_classifier(INTENT_MODEL_DIR, INTENT_MODEL_NAME)     # None if no model was saved
+# Concurrent /classify_intent queries share one padded model call
+INTENT_BATCHER = MicroBatcher(INTENT_CLASSIFIER.classify_batch, INTENT_MAX_BATCH_SIZE, INTENT_MAX_WAIT_MS,
+                              name='intent-batcher') if INTENT_CLASSIFIER else None
+
+# Metrics, exposed in the Prometheus text format on /metrics
+METRICS = MetricsRegistry()
+STAGE_SECONDS = METRICS.histogram('wiki_stage_duration_seconds', 'Time spent in each hot path stage', ('stage',))
+REQUEST_SECONDS = METRICS.histogram('wiki_request_duration_seconds', 'Time to answer a request, per route and status', ('route', 'status'))
+PAGES_FETCHED = METRICS.counter('wiki_pages_fetched_total', 'Pages fetched from the wiki or the page store, coalesced fetches counted once', ('result',))
+LINKS_FILTERED = METRICS.counter('wiki_links_total', 'Links extracted from pages, kept or dropped by the link filter', ('decision',))
+URL_PROBES = METRICS.counter('wiki_url_probes_total', 'Version urls probed by check_url_exists', ('result',))
+BATCH_URLS = METRICS.counter('wiki_batch_urls_total', 'Urls sent to /get_url_content_batch, by outcome', ('result',))
+_DIRECT_DOWNLOADED_BYTES = Counter('wiki_direct_downloaded_bytes', 'Bytes downloaded without the page store')
+
+def _downloaded_bytes():
+    if PAGE_STORE is not None:
+        return {(): PAGE_STORE.downloaded_bytes}
+    return {(): _DIRECT_DOWNLOADED_BYTES.value()}
+
+def _single_flight_counts(counter:str):
+    return lambda: {(operation,): counts[counter] for operation, counts in SINGLE_FLIGHT.stats()['operations'].items()}
+
+METRICS.collected('wiki_bytes_downloaded_total', 'Bytes of html downloaded from the wiki (utf-8), pages served from the page store excluded',
+                  _downloaded_bytes)
+METRICS.collected('wiki_page_store_requests_total', 'Page store fetches by how they were served',
+                  lambda: {} if PAGE_STORE is None else {('hit',): PAGE_STORE.hits, ('revalidated',): PAGE_STORE.revalidated,
+                                                         ('miss',): PAGE_STORE.misses},
+                  labelnames=('result',))
+METRICS.collected('wiki_single_flight_calls_total', 'Calls per single flight operation', _single_flight_counts('calls'),
+                  labelnames=('operation',))
+METRICS.collected('wiki_single_flight_coalesced_total', 'Calls that joined an identical call already in flight',
+                  _single_flight_counts('coalesced'), labelnames=('operation',))
+METRICS.collected('wiki_version_map_age_seconds', 'Seconds since the version map was last built or revalidated',
+                  lambda: {(): round(VERSION_MAP_CACHE.age(), 3)} if VERSION_MAP_CACHE.has_data() else {}, kind='gauge')
+METRICS.collected('wiki_intent_batches_total', 'Model calls made by the intent batcher',
+                  lambda: {(): INTENT_BATCHER.batches} if INTENT_BATCHER else {})
+METRICS.collected('wiki_intent_queries_total', 'Queries classified by the intent batcher',
+                  lambda: {(): INTENT_BATCHER.items} if INTENT_BATCHER else {})
 
 # Controller Functions
 def useUrl_Checker(url:str):
     """
-    Checks if the URL should be dropped based on the URL strings and URLs to drop.
+    Checks if the URL should be dropped based on the compiled link filter rules.
     Returns False if the URL should be dropped, True otherwise.
     """
-    for url_string in URL_STRINGS_TO_DROP:
-        if url_string in url:
-            return False
-    for url_to_drop in URLs_TO_DROP:
-        if url.strip() == url_to_drop.strip():
-            return False
-    return True
+    return LINK_FILTER.keep_url(url)
 
 def useTitle_Checker(title:str):
-    """ 
-    Checks if the title should be dropped based on the titles to drop.
+    """
+    Checks if the title should be dropped based on the compiled link filter rules.
     Returns False if the title should be dropped, True otherwise.
     """
-    for title_to_drop in TITLES_TO_DROP:
-        if title.strip() == title_to_drop.strip():
-            return False
-    return True
+    return LINK_FILTER.keep_title(title)
 
-def check_url_exists(url:str):
+def check_url_exists(url:str, timeout:float=PROBE_TIMEOUT_SECONDS):
     """
-    Checks if the url exists by making a HEAD request.
-    Returns True if the url exists, False otherwise.
+    Checks if the url exists by making a HEAD request through the shared http client,
+    which retries connection errors, 429 and 5xx responses with exponential backoff.
+    Returns True if the url exists, False (or the reason as a string) otherwise.
     """
-    response = requests.head(url)
-    if response.status_code == 200:
-        if "Not Found" in response.text:
-            return " Not Found"
+    try:
+        with STAGE_SECONDS.time(stage='check_url_exists'):
+            response = http_client.head(url, timeout=timeout)
+    except requests.exceptions.RequestException as e:
+        URL_PROBES.inc(result='error')
+        return f" {type(e).__name__}"
+    if response.status_code == 200 and "Not Found" not in response.text:
+        URL_PROBES.inc(result='exists')
         return True
+    URL_PROBES.inc(result='missing')
+    if response.status_code == 200:
+        return " Not Found"
     return False
 
+def check_urls_exist(urls:list, max_workers:int=PROBE_MAX_WORKERS, **probe_options):
+    """
+    Probes all urls concurrently with check_url_exists.
+
+    Args:
+        urls (list): The urls to probe.
+        max_workers (int): Number of probes in flight at once.
+        **probe_options: Passed on to check_url_exists (timeout).
+
+    Returns:
+        dict: {'url': result of check_url_exists}
+    """
+    from tqdm import tqdm   # Imported here, only probes need it and it adds ~70 ms to the startup
+
+    results = {}
+    if not urls:
+        return results
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(check_url_exists, url, **probe_options): url for url in urls}
+        for future in tqdm(as_completed(futures), total=len(futures), desc='Probing wiki versions'):
+            results[futures[future]] = future.result()
+    return results
+
 def resolve_relative_url(href:str, current:str, base_url:str=None):
     """
     Placeholder for URL resolver that converts relative URLs to absolute.
@@ -124,56 +217,157 @@ def resolve_relative_url(href:str, current:str, base_url:str=None):
         return urljoin(current, href)
     return urljoin(base_url, href)
 
-def extract_hyperlinks(html_content, source_url:str):
+def extract_page_content(html_content, page_url:str=None, base_url:str=None):
     """
-    Extracts all hyperlinks and their associated text from HTML content.
+    Parses the page once and returns its title, plain text and filtered hyperlinks.
 
     Args:
         html_content (str): HTML string to parse.
+        page_url (str, optional): The url the html was fetched from, used to resolve relative links.
+        base_url (str, optional): The url Main_Page links resolve to. Defaults to page_url.
+
+    Returns:
+        dict: {'title': str, 'text': str, 'links': list of {'title', 'url'} dicts}
+    """
+    with STAGE_SECONDS.time(stage='extract_page'):
+        page = extract_page(
+            html_content,
+            resolve_url=lambda href: resolve_relative_url(href, page_url, base_url or page_url),
+        )
+        links = page['links']
+        page['links'] = LINK_FILTER.filter_links(links)
+    LINKS_FILTERED.inc(len(page['links']), decision='kept')
+    LINKS_FILTERED.inc(len(links) - len(page['links']), decision='dropped')
+    return page
+
+def extract_page_links(html_content, page_url:str, base_url:str=None):
+    """
+    Extracts the hyperlinks of a single page, without following them.
+
+    Args:
+        html_content (str): HTML string to parse.
+        page_url (str): The url the html was fetched from, used to resolve relative links.
+        base_url (str, optional): The url Main_Page links resolve to. Defaults to page_url.
+
+    Returns:
+        list: A list of dicts each containing 'title' (the link text) and 'url' (the link href).
+    """
+    return extract_page_content(html_content, page_url, base_url)['links']
+
+def extract_hyperlinks(html_content, source_url:str, max_depth:int=None, max_pages:int=None,
+                       max_workers:int=CRAWL_MAX_WORKERS, per_host_limit:int=CRAWL_PER_HOST_LIMIT,
+                       start_links:list=None, max_links:int=None):
+    """
+    Extracts all hyperlinks and their associated text from HTML content,
+    then crawls every linked subpage and collects their hyperlinks as well.
+
+    Args:
+        html_content (str): HTML string to parse.
+        source_url (str): The url the html was fetched from.
+        max_depth (int, optional): Maximum link hops to follow from the source page. None follows all.
+        max_pages (int, optional): Maximum number of subpages to fetch. None means no limit.
+        max_workers (int): Number of subpages fetched concurrently.
+        per_host_limit (int): Maximum concurrent fetches against a single host.
+        start_links (list, optional): Links already extracted from html_content, skips parsing it again.
+        max_links (int, optional): Stops crawling once this many links were collected. None means no limit.
 
     Returns:
         list: A list of dicts each containing 'title' (the link text) and 'url' (the link href).
     """
-    soup = BeautifulSoup(html_content, "html.parser")
-    links = []
-    unique_urls = [source_url]
-    parsed_links = [source_url]
-    # Get hyperlinks from main page
-    for anchor in soup.find_all('a', href=True):
-        text = anchor.get_text(strip=True)
-        url = resolve_relative_url(anchor['href'])
-        if useUrl_Checker(url) and useTitle_Checker(text):
-            unique_urls.append(url)
-            links.append({
-                'title': text,
-                'url': url
-            })
-    # Map all hyperlinks from Subpages
-    while len(parsed_links) < len(unique_urls):
-        for url in unique_urls:
-            # Check if the url has already been parsed
-            if url not in parsed_links:
-                # Add the url to the parsed links
-                parsed_links.append(url)
-                # Fetch the html content of the sub page
-                html_content_temp = fetch_html_from_url(url)
-                # Parse the html content of the sub page and extract the hyperlinks
-                # Append hyperlinks to unique urls and final list
-                tempSoup = BeautifulSoup(html_content_temp, "html.parser")
-                for anchor in tempSoup.find_all('a', href=True):
-                    text = anchor.get_text(strip=True)
-                    temp_url = resolve_relative_url(anchor['href'])
-                    if useUrl_Checker(temp_url) and useTitle_Checker(text):
-                        unique_urls.append(temp_url)
-                        links.append({
-                            'title': text,
-                            'url': temp_url
-                        })
-    return links
+    with STAGE_SECONDS.time(stage='extract_hyperlinks'):
+        return crawl_links(
+            source_url,
+            fetch=fetch_html_from_url,
+            extract_links=lambda html, page_url: extract_page_links(html, page_url, source_url),
+            start_html=html_content,
+            start_links=start_links,
+            max_depth=max_depth,
+            max_pages=max_pages,
+            max_links=max_links,
+            max_workers=max_workers,
+            per_host_limit=per_host_limit,
+            on_error=lambda url, e: print(f"ERROR: Could not fetch sub page {url} : {e}"),
+        )
+
+def stream_hyperlinks(html_content, source_url:str, max_depth:int=None, max_links:int=None,
+                      max_workers:int=CRAWL_MAX_WORKERS, per_host_limit:int=CRAWL_PER_HOST_LIMIT,
+                      start_links:list=None, bounded:bool=False):
+    """
+    Crawls like extract_hyperlinks, but yields every distinct link as soon as its page is parsed
+    instead of collecting the whole crawl first. Stops crawling once max_links links were yielded.
+    With bounded, the crawl keeps a constant amount of memory however many urls it finds
+    (see WikiBoundedCrawl), and a few in CRAWL_FALSE_POSITIVE_RATE links may be left out.
+
+    Args:
+        html_content (str): HTML string of the source page.
+        source_url (str): The url the html was fetched from.
+        max_depth (int, optional): Maximum link hops to follow from the source page. None follows all.
+        max_links (int, optional): Maximum number of links to yield. None means no limit.
+        max_workers (int): Number of subpages fetched concurrently.
+        per_host_limit (int): Maximum concurrent fetches against a single host.
+        start_links (list, optional): Links already extracted from html_content, skips parsing it again.
+        bounded (bool): Track urls in bloom filters and spill the frontier to disk.
+
+    Yields:
+        dict: {'title', 'url', 'source', 'depth'} for every link, each url only once.
+    """
+    options = dict(
+        fetch=fetch_html_from_url,
+        extract_links=lambda html, page_url: extract_page_links(html, page_url, source_url),
+        max_workers=max_workers,
+        per_host_limit=per_host_limit,
+        max_depth=max_depth,
+        on_error=lambda url, e: print(f"ERROR: Could not fetch sub page {url} : {e}"),
+    )
+    if bounded:
+        crawler = BoundedWikiCrawler(**options, **bounded_crawl_options())
+        emitted = UrlBloomFilter(CRAWL_EXPECTED_URLS, CRAWL_FALSE_POSITIVE_RATE)
+    else:
+        crawler = WikiCrawler(**options)
+        emitted = set()
+    if max_links is not None and max_links <= 0:
+        return
+    pages = crawler.crawl(source_url, start_html=html_content, start_links=start_links)
+    try:
+        for count, link in enumerate(unique_links(pages, emitted), 1):
+            yield link
+            if max_links is not None and count >= max_links:
+                return
+    finally:
+        pages.close()   # Stops scheduling new fetches when the client disconnects or the limit is hit
+
+def bounded_crawl_options():
+    """
+    Returns the BoundedWikiCrawler arguments configured through the WIKI_CRAWL_* environment variables.
+    """
+    return {
+        'expected_urls': CRAWL_EXPECTED_URLS,
+        'false_positive_rate': CRAWL_FALSE_POSITIVE_RATE,
+        'frontier_memory_items': CRAWL_FRONTIER_MEMORY_ITEMS,
+        'spill_dir': CRAWL_SPILL_DIR,
+    }
+
+def spool_hyperlinks(html_content, source_url:str, max_depth:int=None, max_links:int=None, start_links:list=None):
+    """
+    Runs a memory bounded crawl and spools its distinct links to a temporary file.
+
+    Returns:
+        LinkSpool: {'title', 'url'} of every distinct link, in discovery order. Close it when done.
+    """
+    spool = LinkSpool(CRAWL_SPILL_DIR)
+    try:
+        with STAGE_SECONDS.time(stage='extract_hyperlinks'):
+            for link in stream_hyperlinks(html_content, source_url, max_depth=max_depth, max_links=max_links,
+                                          start_links=start_links, bounded=True):
+                spool.append({'title': link['title'], 'url': link['url']})
+    except BaseException:
+        spool.close()
+        raise
+    return spool
 
 def html_to_text(html_content):
     """
-    Converts HTML content to plain text using BeautifulSoup.
+    Converts HTML content to plain text with the single pass page extractor.
 
     Args:
         html_content (str): HTML string to convert.
@@ -181,13 +375,15 @@ def html_to_text(html_content):
     Returns:
         str: Text content extracted from HTML.
     """
-
-    soup = BeautifulSoup(html_content, "html.parser")
-    return soup.get_text(separator='\n', strip=True)
+    with STAGE_SECONDS.time(stage='html_to_text'):
+        return extract_page(html_content)['text']
 
 def fetch_html_from_url(url):
     """
     Fetches HTML content from the given URL using an HTTP GET request.
+    Goes through the local page store when it is enabled, which revalidates
+    stored pages with a conditional GET (or serves them directly when offline).
+    Concurrent fetches of the same url share one request.
 
     Args:
         url (str): The URL to fetch HTML content from.
@@ -198,66 +394,217 @@ def fetch_html_from_url(url):
     Raises:
         Exception: If the GET request fails or an HTTP error occurs.
     """
-    response = requests.get(url)
-    response.raise_for_status()
-    return response.text
-
-def get_version_map_full(v_type:str='software'):
-    """
-    Fetches the version map full from the given URL using an HTTP GET request.
-    Returns all wice wiki versions
-    """
-    if v_type == 'software':
-        release_history_url = RELEASE_HISTORIES['software']
-        release_history_html = fetch_html_from_url(release_history_url)
-        release_history_soup = BeautifulSoup(release_history_html, "html.parser")
-        # get all cards using the tag <pre>
-        version_numbers = []
-        pre_cards = release_history_soup.find_all('pre')
-        for pre_card in tqdm(pre_cards, desc='Extracting version numbers from software release history'):
-            # Extract version number from the pre_card's text.
-            version_match = re.search(r'Version\s*([\d\.]+)', pre_card.text)
-            if version_match:
-                version_number = version_match.group(1)
-                # Remove the last digit (security update digit) from the version number, if present
-                version_number = '.'.join(version_number.split('.')[:2])
-                # Get the url for the version
-                version_url = WIKI_BASE_URL.replace('<VERSION_NUMBER>', 'wice'+version_number.replace('.', ''))
-                # If version already mapped, skip checks and continue
-                if (version_number in WICE_WIKI_VERSIONS.keys()) or (version_number in UNAVAILABLE_WICE_WIKI_VERSIONS.keys()):
-                    continue
-                # Check if the url exists
-                checkFlag = check_url_exists(version_url)
-                if checkFlag==True:
-                    version_numbers.append(version_number)
-                    WICE_WIKI_VERSIONS[str(version_number)] = version_url
-                else:
-                    # If the url does not exist, skip this version
-                    UNAVAILABLE_WICE_WIKI_VERSIONS[str(version_number)] = str(version_url)+' - '+str(checkFlag)
-                    continue
-                version_numbers.append(version_number)
-                WICE_WIKI_VERSIONS[str(version_number)] = version_url
-            else:
-                # If not found, skip this card
+    with STAGE_SECONDS.time(stage='fetch'):
+        return SINGLE_FLIGHT.do(('fetch', url), _fetch_html_from_url, url)
+
+def _fetch_html_from_url(url):
+    try:
+        if PAGE_STORE is not None:
+            html_content = PAGE_STORE.fetch(url)
+        else:
+            response = http_client.get(url)
+            response.raise_for_status()
+            _DIRECT_DOWNLOADED_BYTES.inc(len(response.content))
+            html_content = response.text
+    except Exception:
+        PAGES_FETCHED.inc(result='error')
+        raise
+    PAGES_FETCHED.inc(result='ok')
+    return html_content
+
+def version_wiki_url(version_number:str):
+    """
+    Returns the wiki url of a major.minor version number, e.g. .../wice29/index.php/Main_Page for '2.9'.
+    """
+    return WIKI_BASE_URL.replace('<VERSION_NUMBER>', 'wice'+version_number.replace('.', ''))
+
+def probe_versions(candidates:dict):
+    """
+    Probes the wiki urls of the candidate versions concurrently in one batch.
+
+    Args:
+        candidates (dict): {'version_number': 'url'} of the versions to probe.
+
+    Returns:
+        tuple: (versions, unavailable) dicts. unavailable maps to 'url - reason'.
+    """
+    versions = {}
+    unavailable = {}
+    check_flags = check_urls_exist(list(candidates.values()))
+    for version_number, version_url in candidates.items():
+        checkFlag = check_flags[version_url]
+        if checkFlag==True:
+            versions[version_number] = version_url
+        else:
+            # If the url does not exist, skip this version
+            unavailable[version_number] = str(version_url)+' - '+str(checkFlag)
+    return versions, unavailable
+
+def reprobe_unavailable_versions(unavailable:dict):
+    """
+    Probes the versions of a previous map that had no wiki again. Returns (versions, unavailable) like probe_versions.
+    """
+    return probe_versions({version_number: version_wiki_url(version_number) for version_number in unavailable})
+
+def build_version_map(release_history_html:str, known_versions:dict=None):
+    """
+    Parses the software release history and probes the wiki url of every listed version.
+    All candidate urls are collected first and probed concurrently in one batch.
+    Versions already in known_versions are not probed again, versions that were unavailable are.
+
+    Args:
+        release_history_html (str): HTML of RELEASE_HISTORIES['software'].
+        known_versions (dict, optional): {'version_number': 'url'} of the current map.
+
+    Returns:
+        tuple: (versions, unavailable) dicts of {'version_number': 'url'}.
+    """
+    from bs4 import BeautifulSoup   # Imported here, pages go through WikiPageExtractor and it adds ~200 ms to the startup
+
+    known_versions = known_versions or {}
+    release_history_soup = BeautifulSoup(release_history_html, "html.parser")
+    versions = {}
+    candidates = {}     # {'version_number': 'url'} of versions that still need a probe
+    # get all cards using the tag <pre>
+    pre_cards = release_history_soup.find_all('pre')
+    for pre_card in pre_cards:
+        # Extract version number from the pre_card's text.
+        version_match = re.search(r'Version\s*([\d\.]+)', pre_card.text)
+        if version_match:
+            version_number = version_match.group(1)
+            # Remove the last digit (security update digit) from the version number, if present
+            version_number = '.'.join(version_number.split('.')[:2])
+            # If version already mapped, skip checks and continue
+            if (version_number in versions.keys()) or (version_number in candidates.keys()):
+                continue
+            if version_number in known_versions.keys():
+                versions[version_number] = known_versions[version_number]
                 continue
-    # TODO: Decide what to do for other Base Urls
-    print('Unavailable versions: ', json.dumps(UNAVAILABLE_WICE_WIKI_VERSIONS, indent=4))
-    return WICE_WIKI_VERSIONS
+            candidates[str(version_number)] = version_wiki_url(version_number)
+        else:
+            # If not found, skip this card
+            continue
+    # Check all new urls in one concurrent batch
+    found, unavailable = probe_versions(candidates)
+    versions.update(found)
+    print('Unavailable versions: ', json.dumps(unavailable, indent=4))
+    return versions, unavailable
+
+VERSION_MAP_CACHE = VersionMapCache(
+    source_url=RELEASE_HISTORIES['software'],
+    build=build_version_map,
+    cache_path=VERSION_MAP_CACHE_PATH,
+    ttl=VERSION_MAP_TTL_SECONDS,
+    reprobe=reprobe_unavailable_versions,
+    unavailable_ttl=VERSION_MAP_UNAVAILABLE_TTL_SECONDS,
+)
+
+def get_version_map_full(force_refresh:bool=False):
+    """
+    Returns all wice wiki versions from the version map cache.
+    The cache is rebuilt from the software release history only when it is empty, forced,
+    or stale and the release history changed (revalidated in the background).
+    Concurrent callers share one rebuild. Only the software releases have a wiki of their own,
+    the portal, m2m and masterbox releases are answered from RELEASE_INDEX (see get_release_index).
+    """
+    return SINGLE_FLIGHT.do(('version_map', force_refresh), VERSION_MAP_CACHE.get, force_refresh=force_refresh)
+
+def get_release_index(force_refresh:bool=False):
+    """
+    Returns the release index of all RELEASE_HISTORIES pages. It is only built on the request path
+    when it is empty or forced, a stale index is revalidated in the background. Concurrent callers share one build.
+    """
+    return SINGLE_FLIGHT.do(('release_index', force_refresh), RELEASE_INDEX.ensure_fresh, force_refresh=force_refresh)
 
 def get_url_to_version(version_number:str):
     """
     Fetches the url for the given version number.
     """
-    version_maps = get_version_map_full()
-    if version_number in version_maps.keys():
-      return version_maps[version_number]
-    else:
-      return None
+    return get_version_map_full().get(version_number)
+
+WIKI_SYNC = IncrementalSync(
+    SYNC_STORE,
+    fetch=fetch_html_from_url,
+    extract_page=extract_page_content,
+    max_workers=CRAWL_MAX_WORKERS,
+    per_host_limit=CRAWL_PER_HOST_LIMIT,
+    on_error=lambda url, e: print(f"ERROR: Could not fetch sub page {url} : {e}"),
+    search_index=SEARCH_INDEX,
+)
+
+def sync_version(version_number:str, full:bool=False):
+    """
+    Brings the stored pages of a version up to date. Only the pages changed since the
+    last sync are fetched again, unless it is the first sync or a full sync is forced.
+
+    Returns:
+        dict: Summary of the sync (see IncrementalSync.sync), or None if the version is unknown.
+    """
+    url = get_url_to_version(version_number)
+    if not url:
+        return None
+    return SINGLE_FLIGHT.do(('sync', version_number, full), WIKI_SYNC.sync, version_number, url, full=full)
+
+def sync_all_versions(full:bool=False):
+    """
+    Syncs every available version, e.g. from a nightly job. A failing version does not stop the others.
+
+    Returns:
+        dict: {'version_number': summary or {'error': message}}
+    """
+    summaries = {}
+    for version_number in list(get_version_map_full()):
+        try:
+            summaries[version_number] = sync_version(version_number, full=full)
+        except Exception as e:
+            print(f"ERROR: Could not sync version {version_number} : {e}")
+            summaries[version_number] = {'error': str(e)}
+    return summaries
+
+def search_version(version_number:str, query:str, k:int=SEARCH_DEFAULT_RESULTS):
+    """
+    Searches the synced pages of a version. A version synced before the search index existed
+    is indexed from the sync store on its first search. Versions that were never synced are
+    turned away before an index is opened for them, the version comes from the client.
+
+    Returns:
+        dict: {'version', 'query', 'total_hits', 'results': [{'url', 'title', 'score', 'snippet'}], 'took_ms'},
+              or None if no page of the version has been synced.
+    """
+    started = time.perf_counter()
+    if version_number not in SYNC_STORE.versions():
+        return None
+    index = SEARCH_INDEX.version(version_number)
+    if not len(index):
+        SINGLE_FLIGHT.do(('index', version_number), index.rebuild, SYNC_STORE.pages(version_number))
+        if not len(index):
+            return None
+    result = index.search(query, k=k)
+    return {'version': version_number, 'query': query, **result, 'took_ms': round((time.perf_counter() - started) * 1000, 3)}
 
 # Endpoints
+@app.before_request
+def startRequestTimer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def recordRequestDuration(response):
+    # Runs for error responses too. Streaming responses are timed until the handler returned them.
+    started = g.get('request_started')
+    if started is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - started, route=request.endpoint or 'unmatched', status=response.status_code)
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """
+    Stage latency histograms, fetch / link / probe counters and cache hit counters in the Prometheus text format.
+    """
+    return Response(METRICS.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
 @app.route('/get_version_map_full')
 def getVersionMapFull():
-    version_maps = get_version_map_full(v_type='software')
+    version_maps = get_version_map_full()
     if version_maps:
         return jsonify(version_maps), 200
     else:
@@ -265,8 +612,7 @@ def getVersionMapFull():
 
 @app.route('/does_version_exist/<version_number>')
 def doesVersionExist(version_number):
-    version_maps = get_version_map_full()
-    if version_number in version_maps.keys():
+    if version_number in get_version_map_full():
         return jsonify({'version_exists': True}), 200
     else:
         return jsonify({'version_exists': False}), 404
@@ -279,18 +625,87 @@ def getUrlToVersion(version_number):
     else:
         return jsonify({'error': 'No url found for version number'}), 404
 
+def get_int_param(data:dict, name:str, args:dict=None):
+    """
+    Reads an optional non-negative integer parameter from the request body or the query string.
+
+    Args:
+        data (dict): The request body.
+        name (str): The parameter name.
+        args (dict, optional): The query string. Defaults to the args of the current Flask request.
+
+    Returns:
+        int: The value, or None if the parameter was not given.
+
+    Raises:
+        ValueError: If the parameter is not a non-negative integer.
+    """
+    args = request.args if args is None else args
+    value = data.get(name, args.get(name))
+    if value is None or value == '':
+        return None
+    value = int(value)
+    if value < 0:
+        raise ValueError(f"{name} must not be negative")
+    return value
+
+def get_bool_param(data:dict, name:str, args:dict=None):
+    """
+    Reads an optional boolean parameter from the request body or the query string (see get_int_param).
+    """
+    args = request.args if args is None else args
+    value = data.get(name, args.get(name, False))
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+def stream_url_content(url:str, html_content, page:dict, max_depth:int=None, max_links:int=None, bounded:bool=False):
+    """
+    Yields the NDJSON lines of a streaming /get_url_content response.
+    The page content comes first, then one line per discovered link, then a summary line.
+    """
+    yield json.dumps({'type': 'content', 'url': url, 'title': page['title'], 'contentOfPage': page['text']}) + '\n'
+    link_count = 0
+    for link in stream_hyperlinks(html_content, url, max_depth=max_depth, max_links=max_links, start_links=page['links'],
+                                  bounded=bounded):
+        link_count += 1
+        yield json.dumps({'type': 'link', **link}) + '\n'
+    print(f"Content of page streamed. {link_count} sublinks also streamed")
+    yield json.dumps({'type': 'end', 'links': link_count}) + '\n'
+
+def spooled_url_content(text_content:str, spool:LinkSpool):
+    """
+    Yields the JSON of a /get_url_content response piece by piece from a link spool, and closes it.
+    """
+    try:
+        yield '{"contentOfPage": ' + json.dumps(text_content) + ', "hyperlinksFromPage": ['
+        for index, link_json in enumerate(spool.iter_json()):
+            yield (', ' if index else '') + link_json
+        yield ']}\n'
+    finally:
+        spool.close()
+
 @app.route('/get_url_content', methods=['POST'])
 def getUrlContent():
     """
     Fetches the content of the given url.
     Returns the content of the page and the hyperlinks from the page.
-    Arguments (Body):
-        url (str): The url of the page to fetch the content of.
+    Arguments (Body or Query):
+        url (str): The url of the page to fetch the content of. Body only.
+        stream (bool, optional): Stream the response as NDJSON instead of one JSON object.
+        max_depth (int, optional): Maximum link hops to follow from the page. All reachable pages if not given.
+        max_links (int, optional): Maximum number of hyperlinks to return.
+        bounded (bool, optional): Crawl with a constant memory budget (see stream_hyperlinks). Every link
+            is then returned once. Defaults to WIKI_CRAWL_BOUNDED.
     Returns (Response):
         contentOfPage (str): The content of the page.
         hyperlinksFromPage (list): The hyperlinks from the page.
+    Returns (Streaming Response, application/x-ndjson):
+        {"type": "content", "url", "title", "contentOfPage"} first,
+        {"type": "link", "title", "url", "source", "depth"} for every distinct link as it is found,
+        {"type": "end", "links"} last.
     """
-    data = request.get_json()
+    data = request.get_json(silent=True)
     if not data:
         print('ERROR: No data provided. Please provide a url in the body of the request.')
         return jsonify({'error': 'No data provided'}), 400
@@ -298,15 +713,349 @@ def getUrlContent():
     if not url:
         print('ERROR: No url provided. Please provide a url in the body of the request.')
         return jsonify({'error': 'No url provided'}), 400
+    try:
+        max_depth = get_int_param(data, 'max_depth')
+        max_links = get_int_param(data, 'max_links')
+    except (TypeError, ValueError) as e:
+        print(f"ERROR: Invalid crawl limits : {e}")
+        return jsonify({'error': 'max_depth and max_links must be non-negative integers'}), 400
     html_content = fetch_html_from_url(url)
-    text_content = html_to_text(html_content)
-    hyperlinks = extract_hyperlinks(html_content)
-    if text_content:
-        print(f"Content of page returned. Sublinks of length {len(hyperlinks)} also returned")
-        return jsonify({'contentOfPage': text_content, 'hyperlinksFromPage': hyperlinks}), 200
-    else:
+    page = extract_page_content(html_content, url)
+    text_content = page['text']
+    if not text_content:
         print(f"ERROR: No content found for url {url}")
         return jsonify({'error': 'No content found for url'}), 404
+    bounded = get_bool_param(data, 'bounded') if 'bounded' in data or 'bounded' in request.args else CRAWL_BOUNDED
+    if get_bool_param(data, 'stream'):
+        return Response(
+            stream_with_context(stream_url_content(url, html_content, page, max_depth, max_links, bounded)),
+            mimetype=NDJSON_MIMETYPE,
+        )
+    if bounded:
+        spool = spool_hyperlinks(html_content, url, max_depth=max_depth, max_links=max_links, start_links=page['links'])
+        print(f"Content of page returned. {len(spool)} distinct sublinks also returned")
+        return Response(spooled_url_content(text_content, spool), mimetype='application/json')
+    # Identical crawls that are already running are joined instead of started again
+    hyperlinks = SINGLE_FLIGHT.do(('crawl', url, max_depth, max_links), extract_hyperlinks, html_content, url,
+                                  max_depth=max_depth, start_links=page['links'], max_links=max_links)
+    print(f"Content of page returned. Sublinks of length {len(hyperlinks)} also returned")
+    return jsonify({'contentOfPage': text_content, 'hyperlinksFromPage': hyperlinks}), 200
+
+def read_batch_request(data:dict, args:dict=None):
+    """
+    Reads the arguments of a /get_url_content_batch call (see getUrlContentBatch).
+
+    Returns:
+        dict: {'urls', 'requested', 'invalid'} as returned by plan_batch, and 'crawl', 'max_depth', 'max_links'.
+
+    Raises:
+        ValueError: If urls is missing, too long, or a crawl limit is not a non-negative integer.
+    """
+    args = request.args if args is None else args
+    urls, requested, invalid = plan_batch(data.get('urls'), BATCH_MAX_URLS)
+    crawl = get_bool_param(data, 'crawl', args) if 'crawl' in data or 'crawl' in args else True
+    try:
+        max_depth = get_int_param(data, 'max_depth', args)
+        max_links = get_int_param(data, 'max_links', args)
+    except (TypeError, ValueError):
+        raise ValueError('max_depth and max_links must be non-negative integers')
+    return {'urls': urls, 'requested': requested, 'invalid': invalid, 'crawl': crawl, 'max_depth': max_depth, 'max_links': max_links}
+
+def load_url_content(url:str, crawl:bool=True, max_depth:int=None, max_links:int=None):
+    """
+    Fetches and parses a single page of a batch, and crawls its sub pages unless crawl is False.
+
+    Returns:
+        dict: {'title', 'contentOfPage', 'hyperlinksFromPage'}
+
+    Raises:
+        LookupError: If the page has no content, or is not in the page store in offline mode.
+        Exception: If the GET request fails or an HTTP error occurs.
+    """
+    html_content = fetch_html_from_url(url)
+    page = extract_page_content(html_content, url)
+    if not page['text']:
+        raise LookupError('No content found for url')
+    if not crawl:
+        hyperlinks = page['links'] if max_links is None else page['links'][:max_links]
+    else:
+        hyperlinks = SINGLE_FLIGHT.do(('crawl', url, max_depth, max_links), extract_hyperlinks, html_content, url,
+                                      max_depth=max_depth, start_links=page['links'], max_links=max_links)
+    return {'title': page['title'], 'contentOfPage': page['text'], 'hyperlinksFromPage': hyperlinks}
+
+def batch_url_content(outcomes:list, requested:dict, invalid:dict):
+    """
+    Builds the /get_url_content_batch response from the (url, result, error) outcomes of run_batch.
+    """
+    results = []
+    for url, result, error in outcomes:
+        if error is None:
+            results.append({'url': url, 'requested': requested[url], **result})
+            continue
+        print(f"ERROR: Could not load {url} : {error}")
+        upstream_status = getattr(getattr(error, 'response', None), 'status_code', None)
+        status = 404 if isinstance(error, LookupError) or upstream_status == 404 else 502
+        results.append({'url': url, 'requested': requested[url], 'error': str(error) or type(error).__name__, 'status': status})
+    for url, error in invalid.items():
+        results.append({'url': url, 'requested': [url], 'error': error, 'status': 400})
+    succeeded = sum('error' not in result for result in results)
+    duplicates = sum(len(urls) - 1 for urls in requested.values())
+    BATCH_URLS.inc(succeeded, result='ok')
+    BATCH_URLS.inc(len(outcomes) - succeeded, result='error')
+    BATCH_URLS.inc(len(invalid), result='invalid')
+    BATCH_URLS.inc(duplicates, result='duplicate')
+    return {'results': results, 'succeeded': succeeded, 'failed': len(results) - succeeded, 'duplicates': duplicates}
+
+@app.route('/get_url_content_batch', methods=['POST'])
+def getUrlContentBatch():
+    """
+    Fetches the content of many urls in one call. The urls are normalized and de-duplicated, then
+    fetched and parsed BATCH_MAX_WORKERS at a time, so the call takes about as long as its slowest page.
+    A url that fails is reported in its result and does not fail the others.
+    Arguments (Body or Query):
+        urls (list): The urls of the pages to fetch, at most BATCH_MAX_URLS distinct ones. Body only.
+        crawl (bool, optional): Crawl the sub pages of every page, as /get_url_content does. Defaults to true,
+            false returns only the links found on each page itself.
+        max_depth (int, optional): Maximum link hops to follow from each page. All reachable pages if not given.
+        max_links (int, optional): Maximum number of hyperlinks to return per page.
+    Returns (Response):
+        results (list): One entry per distinct url, in the order given:
+            {'url', 'requested', 'title', 'contentOfPage', 'hyperlinksFromPage'}, or {'url', 'requested', 'error', 'status'}
+            where requested lists the urls as given that normalized to url, and status is 400 for an invalid url,
+            404 for a page that does not exist or has no content and 502 for any other failed fetch.
+        succeeded (int), failed (int): Number of results with and without content.
+        duplicates (int): Urls left out because another spelling of them was already in the batch.
+    """
+    data = request.get_json(silent=True)
+    if not data:
+        print('ERROR: No data provided. Please provide a list of urls in the body of the request.')
+        return jsonify({'error': 'No data provided'}), 400
+    try:
+        batch = read_batch_request(data)
+    except ValueError as e:
+        print(f"ERROR: Invalid batch : {e}")
+        return jsonify({'error': str(e)}), 400
+    outcomes = run_batch(
+        batch['urls'],
+        lambda url: load_url_content(url, batch['crawl'], batch['max_depth'], batch['max_links']),
+        max_workers=BATCH_MAX_WORKERS,
+    )
+    response = batch_url_content(outcomes, batch['requested'], batch['invalid'])
+    print(f"Content of {response['succeeded']} pages returned, {response['failed']} failed")
+    return jsonify(response), 200
+
+@app.route('/sync_version/<version_number>', methods=['POST'])
+def syncVersion(version_number):
+    """
+    Incrementally syncs the stored pages of a version. Pass full=true (body or query) to recrawl it completely.
+    """
+    data = request.get_json(silent=True) or {}
+    summary = sync_version(version_number, full=get_bool_param(data, 'full'))
+    if summary is None:
+        return jsonify({'error': 'No url found for version number'}), 404
+    print(f"Synced version {version_number}: {summary['fetched']} pages fetched")
+    return jsonify(summary), 200
+
+@app.route('/sync_all_versions', methods=['POST'])
+def syncAllVersions():
+    """
+    Incrementally syncs every available version. Pass full=true (body or query) to recrawl them completely.
+    """
+    data = request.get_json(silent=True) or {}
+    return jsonify(sync_all_versions(full=get_bool_param(data, 'full'))), 200
+
+@app.route('/search')
+def search():
+    """
+    Full-text search over the synced pages of a version, ranked with BM25.
+    Arguments (Query):
+        q (str): The search terms.
+        version (str): The version number to search in.
+        k (int, optional): Number of results. Defaults to SEARCH_DEFAULT_RESULTS, at most SEARCH_MAX_RESULTS.
+    Returns (Response):
+        results (list): {'url', 'title', 'score', 'snippet'} of the best pages, best first.
+        total_hits (int): Number of pages matching any search term.
+    """
+    query = request.args.get('q', '').strip()
+    version_number = request.args.get('version', '').strip()
+    if not query or not version_number:
+        print('ERROR: No query or version provided. Please provide q and version in the query string.')
+        return jsonify({'error': 'q and version are required'}), 400
+    try:
+        k = get_int_param({}, 'k')
+    except (TypeError, ValueError) as e:
+        print(f"ERROR: Invalid result count : {e}")
+        return jsonify({'error': 'k must be a non-negative integer'}), 400
+    k = min(SEARCH_DEFAULT_RESULTS if k is None else k, SEARCH_MAX_RESULTS)
+    result = search_version(version_number, query, k)
+    if result is None:
+        return jsonify({'error': f'Version {version_number} is not indexed, sync it with /sync_version/{version_number}'}), 404
+    return jsonify(result), 200
+
+@app.route('/classify_intent', methods=['GET', 'POST'])
+def classifyIntent():
+    """
+    Classifies the intent of an automotive query and fills its brand, model and sensor slots.
+    Arguments (Query or Body):
+        query (str): The query to classify.
+    Returns (Response):
+        intent (str): The predicted intent.
+        confidence (float): Probability of the intent.
+        slots (dict): {'brand' | 'model' | 'sensor': {'value', 'confidence'}}, value None if the query names none.
+    """
+    data = request.get_json(silent=True) or {}
+    query = str(data.get('query') or request.args.get('query', '')).strip()
+    if not query:
+        print('ERROR: No query provided. Please provide a query in the query string or the body of the request.')
+        return jsonify({'error': 'query is required'}), 400
+    if len(query) > INTENT_MAX_QUERY_LENGTH:
+        return jsonify({'error': f'query is longer than {INTENT_MAX_QUERY_LENGTH} characters'}), 400
+    if INTENT_BATCHER is None:
+        return jsonify({'error': f'No intent model loaded, save one to {INTENT_MODEL_DIR} from Intent_Identifier_Models.ipynb'}), 503
+    try:
+        result = INTENT_BATCHER(query, timeout=INTENT_TIMEOUT_SECONDS)
+    except FutureTimeoutError:
+        print(f"ERROR: Intent classification timed out for query {query!r}")
+        return jsonify({'error': 'Classification timed out, try again later'}), 503
+    return jsonify({'query': query, 'model': INTENT_MODEL_NAME, **result}), 200
+
+@app.route('/get_intent_batch_stats')
+def getIntentBatchStats():
+    """
+    Returns how many model calls /classify_intent made and how many queries they classified.
+    """
+    if INTENT_BATCHER is None:
+        return jsonify({'error': 'No intent model loaded'}), 503
+    return jsonify(INTENT_BATCHER.stats()), 200
+
+@app.route('/get_page_changes')
+def getPageChanges():
+    """
+    Lists the synced versions a page changed in.
+    Arguments (Query):
+        page (str): Title of the page, or its url in any version.
+    Returns (Response):
+        versions (list): {'version', 'change', 'url'} per synced version, change being 'added', 'changed', 'unchanged' or 'removed'.
+        changed_in (list): The versions the page was added, changed or removed in.
+    """
+    page = request.args.get('page', '').strip()
+    if not page:
+        print('ERROR: No page provided. Please provide a page title or url in the query string.')
+        return jsonify({'error': 'page is required'}), 400
+    changes = SYNC_STORE.page_changes(page)
+    if not changes:
+        return jsonify({'error': 'Page not found in any synced version'}), 404
+    changed_in = [change['version'] for change in changes if change['change'] != 'unchanged']
+    return jsonify({'page': page, 'versions': changes, 'changed_in': changed_in}), 200
+
+@app.route('/get_version_diff/<old_version>/<new_version>')
+def getVersionDiff(old_version, new_version):
+    """
+    What changed between two synced versions: the pages added, removed and changed.
+    Pass page (title or url, query) to get the unified diff of that page's text instead.
+    """
+    synced = SYNC_STORE.versions()
+    missing = [version for version in (old_version, new_version) if version not in synced]
+    if missing:
+        return jsonify({'error': f"Version {', '.join(missing)} is not synced"}), 404
+    page = request.args.get('page', '').strip()
+    if page:
+        diff = SYNC_STORE.diff_page(old_version, new_version, page)
+        if diff is None:
+            return jsonify({'error': 'Page not found in either version'}), 404
+        return jsonify({'old_version': old_version, 'new_version': new_version, 'page': page, 'diff': diff}), 200
+    return jsonify({'old_version': old_version, 'new_version': new_version, **SYNC_STORE.diff_versions(old_version, new_version)}), 200
+
+@app.route('/get_sync_storage_stats')
+def getSyncStorageStats():
+    """
+    Returns how many pages are stored for all versions, and how many distinct texts, full or as deltas, hold them.
+    """
+    return jsonify(SYNC_STORE.storage_stats()), 200
+
+@app.route('/get_release_feeds')
+def getReleaseFeeds():
+    """
+    Lists the indexed release feeds with their number of releases and latest version.
+    """
+    return jsonify(get_release_index().summary()), 200
+
+@app.route('/get_latest_release/<feed>')
+def getLatestRelease(feed):
+    """
+    Returns the newest release of a feed ('software', 'portal', 'm2m' or 'masterbox') as {'feed', 'version', 'date', 'changes'}.
+    """
+    if feed not in RELEASE_HISTORIES:
+        return jsonify({'error': f'Unknown feed, use one of {list(RELEASE_HISTORIES)}'}), 404
+    release = get_release_index().feed(feed).latest()
+    if release is None:
+        return jsonify({'error': f'No releases found for {feed}'}), 404
+    return jsonify(release), 200
+
+@app.route('/get_release/<feed>/<version>')
+def getRelease(feed, version):
+    """
+    Returns the release of a feed with exactly this version.
+    """
+    if feed not in RELEASE_HISTORIES:
+        return jsonify({'error': f'Unknown feed, use one of {list(RELEASE_HISTORIES)}'}), 404
+    try:
+        release = get_release_index().feed(feed).release(version)
+    except ValueError:
+        return jsonify({'error': 'version must be a dotted number'}), 400
+    if release is None:
+        return jsonify({'error': f'Version {version} is not listed in the {feed} release history'}), 404
+    return jsonify(release), 200
+
+@app.route('/get_releases/<feed>')
+def getReleases(feed):
+    """
+    Lists the releases of a feed, oldest first.
+    Arguments (Query):
+        from (str, optional): Oldest version to include.
+        to (str, optional): Newest version to include. '2.9' includes every 2.9.x release.
+    """
+    if feed not in RELEASE_HISTORIES:
+        return jsonify({'error': f'Unknown feed, use one of {list(RELEASE_HISTORIES)}'}), 404
+    low, high = request.args.get('from', '').strip(), request.args.get('to', '').strip()
+    try:
+        releases = get_release_index().feed(feed).releases(low or None, high or None)
+    except ValueError:
+        return jsonify({'error': 'from and to must be dotted version numbers'}), 400
+    return jsonify({'feed': feed, 'from': low or None, 'to': high or None, 'releases': releases}), 200
+
+@app.route('/find_release_introducing')
+def findReleaseIntroducing():
+    """
+    Finds the release that introduced a change: the oldest release of every feed whose changes mention q.
+    Arguments (Query):
+        q (str): Words or phrase to look for, e.g. 'CAN FD'.
+        feed (str, optional): Only search this feed.
+    """
+    query = request.args.get('q', '').strip()
+    feed = request.args.get('feed', '').strip() or None
+    if not query:
+        return jsonify({'error': 'q is required'}), 400
+    if feed and feed not in RELEASE_HISTORIES:
+        return jsonify({'error': f'Unknown feed, use one of {list(RELEASE_HISTORIES)}'}), 404
+    releases = get_release_index().introduced(query, feed)
+    if not releases:
+        return jsonify({'error': f'No release mentions {query!r}'}), 404
+    return jsonify({'query': query, 'releases': releases}), 200
+
+@app.route('/refresh_release_index', methods=['POST'])
+def refreshReleaseIndex():
+    """
+    Revalidates all release history pages now and reindexes the ones that changed.
+    """
+    return jsonify(SINGLE_FLIGHT.do(('release_index_refresh',), RELEASE_INDEX.refresh)), 200
+
+@app.route('/get_single_flight_stats')
+def getSingleFlightStats():
+    """
+    Returns how many calls per operation ran, and how many were coalesced into an identical call in flight.
+    """
+    return jsonify(SINGLE_FLIGHT.stats()), 200
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
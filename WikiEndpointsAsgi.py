@@ -0,0 +1,643 @@
+# Production entry point of the wiki endpoints.
+#
+# Serves the routes of WikiEndpoints.py from an ASGI app (Starlette on uvicorn). Upstream
+# fetches go through a pooled aiohttp.ClientSession and the crawl runs on the event loop, so a
+# slow /get_url_content never holds a worker that /does_version_exist needs. Every route
+# group has its own concurrency limit; requests that cannot get a slot within
+# ROUTE_QUEUE_TIMEOUT_SECONDS are answered with 503 instead of queueing forever.
+#
+#
+# Runs a single worker process by default. The sync store is shared through SQLite, but the
+# search index (search_index/) and the version map, release index and single-flight state
+# are held per process: a worker never reloads an index another worker synced, and two
+# workers syncing the same version would write the same index files without a lock. Only
+# raise WIKI_ASGI_WORKERS when /sync_version, /sync_all_versions and /search are not used.
+#
+# Needs:     pip install starlette uvicorn aiohttp
+# Run with:  python WikiEndpointsAsgi.py
+#   or:      uvicorn WikiEndpointsAsgi:app
+# Load test: see benchmarks/load_test.py
+
+# Imports and Installs
+import os
+import json
+import time
+import asyncio
+import aiohttp
+import uvicorn
+import requests
+from contextlib import asynccontextmanager
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+import WikiHttpClient as http_client
+import WikiEndpoints as wiki
+from WikiCrawler import AsyncWikiCrawler
+from WikiBoundedCrawl import AsyncBoundedWikiCrawler, UrlBloomFilter, LinkSpool
+from WikiBatch import run_batch_async
+from WikiMetrics import PROMETHEUS_CONTENT_TYPE
+
+# Constants (all can be tuned through environment variables)
+ASGI_HOST = os.environ.get('WIKI_ASGI_HOST', '127.0.0.1')
+ASGI_PORT = int(os.environ.get('WIKI_ASGI_PORT', 8000))
+ASGI_WORKERS = int(os.environ.get('WIKI_ASGI_WORKERS', 1))    # uvicorn worker processes, sync and search state is per process
+
+ROUTE_CONCURRENCY_LIMITS = {
+    'version': int(os.environ.get('WIKI_ASGI_VERSION_LIMIT', 512)),           # Version map lookups in flight per worker
+    'url_content': int(os.environ.get('WIKI_ASGI_URL_CONTENT_LIMIT', 32)),    # Page fetches / crawls in flight per worker
+    'search': int(os.environ.get('WIKI_ASGI_SEARCH_LIMIT', 64)),              # Index searches and sync store reads in flight per worker
+    'sync': int(os.environ.get('WIKI_ASGI_SYNC_LIMIT', 4)),                   # Version syncs and release index refreshes in flight per worker
+    'classify': int(os.environ.get('WIKI_ASGI_CLASSIFY_LIMIT', 1024)),        # Queries waiting on the intent batcher per worker
+}
+ROUTE_QUEUE_TIMEOUT_SECONDS = float(os.environ.get('WIKI_ASGI_QUEUE_TIMEOUT', 5))   # Wait for a free slot before answering 503
+
+UPSTREAM_MAX_CONNECTIONS = int(os.environ.get('WIKI_ASGI_UPSTREAM_CONNECTIONS', 100))   # Open connections to the wiki per worker
+UPSTREAM_TIMEOUT = aiohttp.ClientTimeout(connect=http_client.DEFAULT_TIMEOUT[0], sock_read=http_client.DEFAULT_TIMEOUT[1])
+
+_upstream = None    # aiohttp.ClientSession, opened by the app lifespan
+
+# Recorded in the registry of WikiEndpoints, so /metrics shows the shared and the async stages together
+REQUESTS_REJECTED = wiki.METRICS.counter('wiki_requests_rejected_total', 'Requests answered with 503 because their route group was full',
+                                         ('group',))
+
+
+class UpstreamResponse:
+    """
+    Fully read upstream response, with the attributes of a requests.Response the shared code uses.
+    """
+
+    def __init__(self, url:str, status_code:int, text:str, headers):
+        self.url = url
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+
+class RouteLimiter:
+    """
+    Caps the requests of a route group that are handled at the same time,
+    and records how long each of its requests took.
+
+    Args:
+        name (str): Name of the route group, used in error messages.
+        limit (int): Maximum requests in flight.
+        queue_timeout (float): Seconds a request waits for a free slot before it is rejected.
+    """
+
+    def __init__(self, name:str, limit:int, queue_timeout:float=ROUTE_QUEUE_TIMEOUT_SECONDS):
+        self.name = name
+        self.limit = limit
+        self.queue_timeout = queue_timeout
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    def __call__(self, endpoint):
+        async def limited_endpoint(request):
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                REQUESTS_REJECTED.inc(group=self.name)
+                print(f"ERROR: Too many concurrent '{self.name}' requests, rejected {request.url.path}")
+                return JSONResponse({'error': 'Server busy, try again later'}, status_code=503,
+                                    headers={'Retry-After': str(int(self.queue_timeout) or 1)})
+            try:
+                response = await endpoint(request)
+            except BaseException:
+                self._semaphore.release()
+                wiki.REQUEST_SECONDS.observe(time.perf_counter() - started, route=endpoint.__name__, status=500)
+                raise
+            wiki.REQUEST_SECONDS.observe(time.perf_counter() - started, route=endpoint.__name__, status=response.status_code)
+            if isinstance(response, StreamingResponse):
+                # Streams hold their slot until the last line was sent or the client went away
+                response.body_iterator = self._release_after(response.body_iterator)
+            else:
+                self._semaphore.release()
+            return response
+        return limited_endpoint
+
+    async def _release_after(self, body_iterator):
+        try:
+            async for chunk in body_iterator:
+                yield chunk
+        finally:
+            self._semaphore.release()
+
+
+VERSION_LIMIT = RouteLimiter('version', ROUTE_CONCURRENCY_LIMITS['version'])
+URL_CONTENT_LIMIT = RouteLimiter('url_content', ROUTE_CONCURRENCY_LIMITS['url_content'])
+SEARCH_LIMIT = RouteLimiter('search', ROUTE_CONCURRENCY_LIMITS['search'])
+SYNC_LIMIT = RouteLimiter('sync', ROUTE_CONCURRENCY_LIMITS['sync'])
+CLASSIFY_LIMIT = RouteLimiter('classify', ROUTE_CONCURRENCY_LIMITS['classify'])
+
+# Controller Functions
+async def upstream_get(url:str, headers:dict=None):
+    """
+    GET through the shared async session, retrying connection errors, 429 and 5xx
+    responses with the same exponential backoff as WikiHttpClient.
+
+    Returns:
+        UpstreamResponse: The response, with its body already read.
+    """
+    for attempt in range(http_client.RETRY_TOTAL + 1):
+        try:
+            async with _upstream.get(url, headers=headers) as response:
+                status_code = response.status
+                if status_code not in http_client.RETRY_STATUS_CODES or attempt == http_client.RETRY_TOTAL:
+                    return UpstreamResponse(url, status_code, await response.text(), response.headers)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if attempt == http_client.RETRY_TOTAL:
+                raise
+        await asyncio.sleep(http_client.RETRY_BACKOFF_FACTOR * (2 ** attempt))
+
+async def fetch_html_from_url(url:str):
+    """
+    Async version of WikiEndpoints.fetch_html_from_url. Goes through the local page store when it is enabled.
+    Concurrent fetches of the same url share one request.
+
+    Raises:
+        Exception: If the GET request fails or an HTTP error occurs.
+    """
+    with wiki.STAGE_SECONDS.time(stage='fetch'):
+        return await wiki.SINGLE_FLIGHT.do_async(('fetch', url), _fetch_html_from_url, url)
+
+async def _fetch_html_from_url(url:str):
+    try:
+        if wiki.PAGE_STORE is not None:
+            html_content = await wiki.PAGE_STORE.fetch_async(url, upstream_get)
+        else:
+            response = await upstream_get(url)
+            response.raise_for_status()
+            wiki._DIRECT_DOWNLOADED_BYTES.inc(len(response.text.encode('utf-8')))
+            html_content = response.text
+    except Exception:
+        wiki.PAGES_FETCHED.inc(result='error')
+        raise
+    wiki.PAGES_FETCHED.inc(result='ok')
+    return html_content
+
+def build_crawler(source_url:str, max_depth:int=None, bounded:bool=False):
+    options = dict(
+        fetch=fetch_html_from_url,
+        extract_links=lambda html, page_url: wiki.extract_page_links(html, page_url, source_url),
+        max_workers=wiki.CRAWL_MAX_WORKERS,
+        per_host_limit=wiki.CRAWL_PER_HOST_LIMIT,
+        max_depth=max_depth,
+        on_error=lambda url, e: print(f"ERROR: Could not fetch sub page {url} : {e}"),
+    )
+    if bounded:
+        return AsyncBoundedWikiCrawler(**options, **wiki.bounded_crawl_options())
+    return AsyncWikiCrawler(**options)
+
+async def extract_hyperlinks(html_content, source_url:str, max_depth:int=None, start_links:list=None,
+                             max_links:int=None):
+    """
+    Async version of WikiEndpoints.extract_hyperlinks. Returns the links of the crawl, duplicates included,
+    and stops crawling once max_links of them were collected.
+    """
+    hyperlinks = []
+    with wiki.STAGE_SECONDS.time(stage='extract_hyperlinks'):
+        pages = build_crawler(source_url, max_depth).crawl(source_url, html_content, start_links)
+        try:
+            async for _, _, links in pages:
+                hyperlinks.extend(links)
+                if max_links is not None and len(hyperlinks) >= max_links:
+                    return hyperlinks[:max_links]
+        finally:
+            await pages.aclose()
+    return hyperlinks
+
+async def stream_hyperlinks(html_content, source_url:str, max_depth:int=None, max_links:int=None, start_links:list=None,
+                           bounded:bool=False):
+    """
+    Async version of WikiEndpoints.stream_hyperlinks. Yields every distinct link as soon as its page is parsed.
+    """
+    if max_links is not None and max_links <= 0:
+        return
+    emitted = UrlBloomFilter(wiki.CRAWL_EXPECTED_URLS, wiki.CRAWL_FALSE_POSITIVE_RATE) if bounded else set()
+    count = 0
+    pages = build_crawler(source_url, max_depth, bounded).crawl(source_url, html_content, start_links)
+    try:
+        async for page_url, depth, links in pages:
+            for link in links:
+                if link['url'] in emitted:
+                    continue
+                emitted.add(link['url'])
+                count += 1
+                yield {'title': link['title'], 'url': link['url'], 'source': page_url, 'depth': depth}
+                if max_links is not None and count >= max_links:
+                    return
+    finally:
+        await pages.aclose()    # Cancels the fetches still in flight
+
+async def stream_url_content(url:str, html_content, page:dict, max_depth:int=None, max_links:int=None, bounded:bool=False):
+    """
+    Yields the NDJSON lines of a streaming /get_url_content response, see WikiEndpoints.stream_url_content.
+    """
+    yield json.dumps({'type': 'content', 'url': url, 'title': page['title'], 'contentOfPage': page['text']}) + '\n'
+    link_count = 0
+    async for link in stream_hyperlinks(html_content, url, max_depth, max_links, page['links'], bounded):
+        link_count += 1
+        yield json.dumps({'type': 'link', **link}) + '\n'
+    print(f"Content of page streamed. {link_count} sublinks also streamed")
+    yield json.dumps({'type': 'end', 'links': link_count}) + '\n'
+
+async def spool_hyperlinks(html_content, source_url:str, max_depth:int=None, max_links:int=None, start_links:list=None):
+    """
+    Async version of WikiEndpoints.spool_hyperlinks.
+    """
+    spool = LinkSpool(wiki.CRAWL_SPILL_DIR)
+    try:
+        with wiki.STAGE_SECONDS.time(stage='extract_hyperlinks'):
+            async for link in stream_hyperlinks(html_content, source_url, max_depth, max_links, start_links, bounded=True):
+                spool.append({'title': link['title'], 'url': link['url']})
+    except BaseException:
+        spool.close()
+        raise
+    return spool
+
+async def load_url_content(url:str, crawl:bool=True, max_depth:int=None, max_links:int=None):
+    """
+    Async version of WikiEndpoints.load_url_content.
+    """
+    html_content = await fetch_html_from_url(url)
+    page = await run_in_threadpool(wiki.extract_page_content, html_content, url)
+    if not page['text']:
+        raise LookupError('No content found for url')
+    if not crawl:
+        hyperlinks = page['links'] if max_links is None else page['links'][:max_links]
+    else:
+        hyperlinks = await wiki.SINGLE_FLIGHT.do_async(('crawl', url, max_depth, max_links), extract_hyperlinks, html_content,
+                                                       url, max_depth=max_depth, start_links=page['links'], max_links=max_links)
+    return {'title': page['title'], 'contentOfPage': page['text'], 'hyperlinksFromPage': hyperlinks}
+
+async def get_version_map():
+    """
+    Returns the version map. Only the very first build runs in a worker thread,
+    afterwards the cache answers immediately and revalidates in the background.
+    """
+    if wiki.VERSION_MAP_CACHE.has_data():
+        return wiki.VERSION_MAP_CACHE.get()
+    return await run_in_threadpool(wiki.get_version_map_full)
+
+async def get_release_index():
+    """
+    Returns the release index, see get_version_map. Only its very first build runs in a worker thread.
+    """
+    if wiki.RELEASE_INDEX.has_data():
+        return wiki.RELEASE_INDEX.ensure_fresh()
+    return await run_in_threadpool(wiki.get_release_index)
+
+async def json_body(request):
+    """
+    Returns the JSON body of request, or {} if it has none, like request.get_json(silent=True) or {} in Flask.
+    """
+    try:
+        return await request.json() or {}
+    except ValueError:
+        return {}
+
+def unknown_feed_response(feed:str):
+    return JSONResponse({'error': f'Unknown feed, use one of {list(wiki.RELEASE_HISTORIES)}'}, status_code=404)
+
+# Endpoints
+@VERSION_LIMIT
+async def getVersionMapFull(request):
+    version_maps = await get_version_map()
+    if version_maps:
+        return JSONResponse(version_maps, status_code=200)
+    else:
+        return JSONResponse({'error': 'No version maps found'}, status_code=404)
+
+@VERSION_LIMIT
+async def doesVersionExist(request):
+    version_maps = await get_version_map()
+    if request.path_params['version_number'] in version_maps:
+        return JSONResponse({'version_exists': True}, status_code=200)
+    else:
+        return JSONResponse({'version_exists': False}, status_code=404)
+
+@VERSION_LIMIT
+async def getUrlToVersion(request):
+    version_maps = await get_version_map()
+    url = version_maps.get(request.path_params['version_number'])
+    if url:
+        return JSONResponse({'url': url}, status_code=200)
+    else:
+        return JSONResponse({'error': 'No url found for version number'}, status_code=404)
+
+@VERSION_LIMIT
+async def getReleaseFeeds(request):
+    return JSONResponse((await get_release_index()).summary(), status_code=200)
+
+@VERSION_LIMIT
+async def getLatestRelease(request):
+    feed = request.path_params['feed']
+    if feed not in wiki.RELEASE_HISTORIES:
+        return unknown_feed_response(feed)
+    release = (await get_release_index()).feed(feed).latest()
+    if release is None:
+        return JSONResponse({'error': f'No releases found for {feed}'}, status_code=404)
+    return JSONResponse(release, status_code=200)
+
+@VERSION_LIMIT
+async def getRelease(request):
+    feed, version = request.path_params['feed'], request.path_params['version']
+    if feed not in wiki.RELEASE_HISTORIES:
+        return unknown_feed_response(feed)
+    try:
+        release = (await get_release_index()).feed(feed).release(version)
+    except ValueError:
+        return JSONResponse({'error': 'version must be a dotted number'}, status_code=400)
+    if release is None:
+        return JSONResponse({'error': f'Version {version} is not listed in the {feed} release history'}, status_code=404)
+    return JSONResponse(release, status_code=200)
+
+@VERSION_LIMIT
+async def getReleases(request):
+    """
+    Same arguments and responses as WikiEndpoints.getReleases.
+    """
+    feed = request.path_params['feed']
+    if feed not in wiki.RELEASE_HISTORIES:
+        return unknown_feed_response(feed)
+    low, high = request.query_params.get('from', '').strip(), request.query_params.get('to', '').strip()
+    try:
+        releases = (await get_release_index()).feed(feed).releases(low or None, high or None)
+    except ValueError:
+        return JSONResponse({'error': 'from and to must be dotted version numbers'}, status_code=400)
+    return JSONResponse({'feed': feed, 'from': low or None, 'to': high or None, 'releases': releases}, status_code=200)
+
+@VERSION_LIMIT
+async def findReleaseIntroducing(request):
+    """
+    Same arguments and responses as WikiEndpoints.findReleaseIntroducing.
+    """
+    query = request.query_params.get('q', '').strip()
+    feed = request.query_params.get('feed', '').strip() or None
+    if not query:
+        return JSONResponse({'error': 'q is required'}, status_code=400)
+    if feed and feed not in wiki.RELEASE_HISTORIES:
+        return unknown_feed_response(feed)
+    releases = (await get_release_index()).introduced(query, feed)
+    if not releases:
+        return JSONResponse({'error': f'No release mentions {query!r}'}, status_code=404)
+    return JSONResponse({'query': query, 'releases': releases}, status_code=200)
+
+@URL_CONTENT_LIMIT
+async def getUrlContent(request):
+    """
+    Same arguments and responses as WikiEndpoints.getUrlContent.
+    """
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    if not data:
+        print('ERROR: No data provided. Please provide a url in the body of the request.')
+        return JSONResponse({'error': 'No data provided'}, status_code=400)
+    url = data.get('url', '')
+    if not url:
+        print('ERROR: No url provided. Please provide a url in the body of the request.')
+        return JSONResponse({'error': 'No url provided'}, status_code=400)
+    try:
+        max_depth = wiki.get_int_param(data, 'max_depth', request.query_params)
+        max_links = wiki.get_int_param(data, 'max_links', request.query_params)
+    except (TypeError, ValueError) as e:
+        print(f"ERROR: Invalid crawl limits : {e}")
+        return JSONResponse({'error': 'max_depth and max_links must be non-negative integers'}, status_code=400)
+    try:
+        html_content = await fetch_html_from_url(url)
+    except Exception as e:
+        print(f"ERROR: Could not fetch {url} : {e}")
+        return JSONResponse({'error': 'Could not fetch url'}, status_code=502)
+    page = await run_in_threadpool(wiki.extract_page_content, html_content, url)
+    text_content = page['text']
+    if not text_content:
+        print(f"ERROR: No content found for url {url}")
+        return JSONResponse({'error': 'No content found for url'}, status_code=404)
+    bounded = wiki.CRAWL_BOUNDED
+    if 'bounded' in data or 'bounded' in request.query_params:
+        bounded = wiki.get_bool_param(data, 'bounded', request.query_params)
+    if wiki.get_bool_param(data, 'stream', request.query_params):
+        return StreamingResponse(stream_url_content(url, html_content, page, max_depth, max_links, bounded),
+                                 media_type=wiki.NDJSON_MIMETYPE)
+    if bounded:
+        spool = await spool_hyperlinks(html_content, url, max_depth, max_links, page['links'])
+        print(f"Content of page returned. {len(spool)} distinct sublinks also returned")
+        return StreamingResponse(iterate_in_threadpool(wiki.spooled_url_content(text_content, spool)), media_type='application/json')
+    hyperlinks = await wiki.SINGLE_FLIGHT.do_async(('crawl', url, max_depth, max_links), extract_hyperlinks, html_content,
+                                                   url, max_depth=max_depth, start_links=page['links'], max_links=max_links)
+    print(f"Content of page returned. Sublinks of length {len(hyperlinks)} also returned")
+    return JSONResponse({'contentOfPage': text_content, 'hyperlinksFromPage': hyperlinks}, status_code=200)
+
+@URL_CONTENT_LIMIT
+async def getUrlContentBatch(request):
+    """
+    Same arguments and responses as WikiEndpoints.getUrlContentBatch. The whole batch holds one url_content slot.
+    """
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    if not data:
+        print('ERROR: No data provided. Please provide a list of urls in the body of the request.')
+        return JSONResponse({'error': 'No data provided'}, status_code=400)
+    try:
+        batch = wiki.read_batch_request(data, request.query_params)
+    except ValueError as e:
+        print(f"ERROR: Invalid batch : {e}")
+        return JSONResponse({'error': str(e)}, status_code=400)
+    outcomes = await run_batch_async(
+        batch['urls'],
+        lambda url: load_url_content(url, batch['crawl'], batch['max_depth'], batch['max_links']),
+        max_workers=wiki.BATCH_MAX_WORKERS,
+    )
+    response = wiki.batch_url_content(outcomes, batch['requested'], batch['invalid'])
+    print(f"Content of {response['succeeded']} pages returned, {response['failed']} failed")
+    return JSONResponse(response, status_code=200)
+
+@SEARCH_LIMIT
+async def search(request):
+    """
+    Same arguments and responses as WikiEndpoints.search. Searches read the memory-mapped index in a worker thread.
+    """
+    query = request.query_params.get('q', '').strip()
+    version_number = request.query_params.get('version', '').strip()
+    if not query or not version_number:
+        print('ERROR: No query or version provided. Please provide q and version in the query string.')
+        return JSONResponse({'error': 'q and version are required'}, status_code=400)
+    try:
+        k = wiki.get_int_param({}, 'k', request.query_params)
+    except (TypeError, ValueError) as e:
+        print(f"ERROR: Invalid result count : {e}")
+        return JSONResponse({'error': 'k must be a non-negative integer'}, status_code=400)
+    k = min(wiki.SEARCH_DEFAULT_RESULTS if k is None else k, wiki.SEARCH_MAX_RESULTS)
+    result = await run_in_threadpool(wiki.search_version, version_number, query, k)
+    if result is None:
+        return JSONResponse({'error': f'Version {version_number} is not indexed, sync it with /sync_version/{version_number}'},
+                            status_code=404)
+    return JSONResponse(result, status_code=200)
+
+@CLASSIFY_LIMIT
+async def classifyIntent(request):
+    """
+    Same arguments and responses as WikiEndpoints.classifyIntent. Waiting on the batcher holds no worker thread.
+    """
+    data = {}
+    if request.method == 'POST':
+        try:
+            data = await request.json() or {}
+        except ValueError:
+            data = {}
+    query = str(data.get('query') or request.query_params.get('query', '')).strip()
+    if not query:
+        print('ERROR: No query provided. Please provide a query in the query string or the body of the request.')
+        return JSONResponse({'error': 'query is required'}, status_code=400)
+    if len(query) > wiki.INTENT_MAX_QUERY_LENGTH:
+        return JSONResponse({'error': f'query is longer than {wiki.INTENT_MAX_QUERY_LENGTH} characters'}, status_code=400)
+    if wiki.INTENT_BATCHER is None:
+        return JSONResponse({'error': f'No intent model loaded, save one to {wiki.INTENT_MODEL_DIR} from Intent_Identifier_Models.ipynb'},
+                            status_code=503)
+    try:
+        result = await asyncio.wait_for(asyncio.wrap_future(wiki.INTENT_BATCHER.submit(query)), wiki.INTENT_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        print(f"ERROR: Intent classification timed out for query {query!r}")
+        return JSONResponse({'error': 'Classification timed out, try again later'}, status_code=503)
+    return JSONResponse({'query': query, 'model': wiki.INTENT_MODEL_NAME, **result}, status_code=200)
+
+@SYNC_LIMIT
+async def syncVersion(request):
+    """
+    Same arguments and responses as WikiEndpoints.syncVersion. The sync runs in a worker thread.
+    """
+    version_number = request.path_params['version_number']
+    data = await json_body(request)
+    summary = await run_in_threadpool(wiki.sync_version, version_number,
+                                      full=wiki.get_bool_param(data, 'full', request.query_params))
+    if summary is None:
+        return JSONResponse({'error': 'No url found for version number'}, status_code=404)
+    print(f"Synced version {version_number}: {summary['fetched']} pages fetched")
+    return JSONResponse(summary, status_code=200)
+
+@SYNC_LIMIT
+async def syncAllVersions(request):
+    """
+    Same arguments and responses as WikiEndpoints.syncAllVersions.
+    """
+    data = await json_body(request)
+    summaries = await run_in_threadpool(wiki.sync_all_versions, full=wiki.get_bool_param(data, 'full', request.query_params))
+    return JSONResponse(summaries, status_code=200)
+
+@SEARCH_LIMIT
+async def getPageChanges(request):
+    """
+    Same arguments and responses as WikiEndpoints.getPageChanges.
+    """
+    page = request.query_params.get('page', '').strip()
+    if not page:
+        print('ERROR: No page provided. Please provide a page title or url in the query string.')
+        return JSONResponse({'error': 'page is required'}, status_code=400)
+    changes = await run_in_threadpool(wiki.SYNC_STORE.page_changes, page)
+    if not changes:
+        return JSONResponse({'error': 'Page not found in any synced version'}, status_code=404)
+    changed_in = [change['version'] for change in changes if change['change'] != 'unchanged']
+    return JSONResponse({'page': page, 'versions': changes, 'changed_in': changed_in}, status_code=200)
+
+@SEARCH_LIMIT
+async def getVersionDiff(request):
+    """
+    Same arguments and responses as WikiEndpoints.getVersionDiff. The diff is computed in a worker thread.
+    """
+    old_version, new_version = request.path_params['old_version'], request.path_params['new_version']
+    synced = await run_in_threadpool(wiki.SYNC_STORE.versions)
+    missing = [version for version in (old_version, new_version) if version not in synced]
+    if missing:
+        return JSONResponse({'error': f"Version {', '.join(missing)} is not synced"}, status_code=404)
+    page = request.query_params.get('page', '').strip()
+    if page:
+        diff = await run_in_threadpool(wiki.SYNC_STORE.diff_page, old_version, new_version, page)
+        if diff is None:
+            return JSONResponse({'error': 'Page not found in either version'}, status_code=404)
+        return JSONResponse({'old_version': old_version, 'new_version': new_version, 'page': page, 'diff': diff}, status_code=200)
+    diff = await run_in_threadpool(wiki.SYNC_STORE.diff_versions, old_version, new_version)
+    return JSONResponse({'old_version': old_version, 'new_version': new_version, **diff}, status_code=200)
+
+@SEARCH_LIMIT
+async def getSyncStorageStats(request):
+    return JSONResponse(await run_in_threadpool(wiki.SYNC_STORE.storage_stats), status_code=200)
+
+@SYNC_LIMIT
+async def refreshReleaseIndex(request):
+    """
+    Same as WikiEndpoints.refreshReleaseIndex. The refresh runs in a worker thread.
+    """
+    summary = await run_in_threadpool(wiki.SINGLE_FLIGHT.do, ('release_index_refresh',), wiki.RELEASE_INDEX.refresh)
+    return JSONResponse(summary, status_code=200)
+
+async def getIntentBatchStats(request):
+    if wiki.INTENT_BATCHER is None:
+        return JSONResponse({'error': 'No intent model loaded'}, status_code=503)
+    return JSONResponse(wiki.INTENT_BATCHER.stats(), status_code=200)
+
+async def getSingleFlightStats(request):
+    return JSONResponse(wiki.SINGLE_FLIGHT.stats(), status_code=200)
+
+async def metrics(request):
+    """
+    Same as WikiEndpoints.metrics, for this worker process.
+    """
+    return Response(wiki.METRICS.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+# ASGI App
+@asynccontextmanager
+async def lifespan(app):
+    global _upstream
+    _upstream = aiohttp.ClientSession(
+        timeout=UPSTREAM_TIMEOUT,
+        headers=http_client.DEFAULT_HEADERS,
+        connector=aiohttp.TCPConnector(limit=UPSTREAM_MAX_CONNECTIONS),
+    )
+    try:
+        yield
+    finally:
+        await _upstream.close()
+
+app = Starlette(
+    routes=[
+        Route('/get_version_map_full', getVersionMapFull),
+        Route('/does_version_exist/{version_number}', doesVersionExist),
+        Route('/get_url_to_version/{version_number}', getUrlToVersion),
+        Route('/get_release_feeds', getReleaseFeeds),
+        Route('/get_latest_release/{feed}', getLatestRelease),
+        Route('/get_release/{feed}/{version}', getRelease),
+        Route('/get_releases/{feed}', getReleases),
+        Route('/find_release_introducing', findReleaseIntroducing),
+        Route('/refresh_release_index', refreshReleaseIndex, methods=['POST']),
+        Route('/get_url_content', getUrlContent, methods=['POST']),
+        Route('/get_url_content_batch', getUrlContentBatch, methods=['POST']),
+        Route('/sync_version/{version_number}', syncVersion, methods=['POST']),
+        Route('/sync_all_versions', syncAllVersions, methods=['POST']),
+        Route('/search', search),
+        Route('/get_page_changes', getPageChanges),
+        Route('/get_version_diff/{old_version}/{new_version}', getVersionDiff),
+        Route('/get_sync_storage_stats', getSyncStorageStats),
+        Route('/classify_intent', classifyIntent, methods=['GET', 'POST']),
+        Route('/get_intent_batch_stats', getIntentBatchStats),
+        Route('/get_single_flight_stats', getSingleFlightStats),
+        Route('/metrics', metrics),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'])],     # Same as CORS(app) in WikiEndpoints
+    lifespan=lifespan,
+)
+
+if __name__ == '__main__':
+    uvicorn.run('WikiEndpointsAsgi:app', host=ASGI_HOST, port=ASGI_PORT, workers=ASGI_WORKERS)
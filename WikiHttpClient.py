@@ -0,0 +1,109 @@
+# Imports and Installs
+import os
+import threading
+# requests and urllib3 take ~250 ms to import, they are imported with the first session (see build_session)
+
+# Constants (pool sizes can be tuned through environment variables / app settings)
+POOL_CONNECTIONS = int(os.environ.get('WIKI_HTTP_POOL_CONNECTIONS', 16))   # Hosts kept in the pool
+POOL_MAXSIZE = int(os.environ.get('WIKI_HTTP_POOL_MAXSIZE', 16))           # Keep-alive connections cap per host
+DEFAULT_TIMEOUT = (5, 30)                   # (connect, read) seconds, used when a call passes no timeout
+RETRY_TOTAL = 3                             # Retries on connection errors, 429 and 5xx
+RETRY_BACKOFF_FACTOR = 0.5                  # Sleeps 0.5s, 1s, 2s, ... between retries
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+DEFAULT_HEADERS = {
+    'Accept-Encoding': 'gzip, deflate',     # Decoded transparently by requests
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def build_session(pool_connections:int=POOL_CONNECTIONS, pool_maxsize:int=POOL_MAXSIZE,
+                  retries:int=RETRY_TOTAL, backoff_factor:float=RETRY_BACKOFF_FACTOR,
+                  timeout=DEFAULT_TIMEOUT):
+    """
+    Builds a keep-alive session with a bounded connection pool and retry/backoff.
+
+    Args:
+        pool_connections (int): Number of per-host pools to keep.
+        pool_maxsize (int): Maximum connections per host. Extra callers wait for a free
+            connection instead of opening new ones, so this is also the per-host cap.
+        retries (int): Retries on connection errors, 429 and 5xx responses.
+        backoff_factor (float): Exponential backoff factor between retries.
+        timeout: Default (connect, read) timeout in seconds.
+
+    Returns:
+        requests.Session: The configured session, applying timeout to every call that does not set one.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    class TimeoutSession(requests.Session):
+        def __init__(self, timeout):
+            super().__init__()
+            self.default_timeout = timeout
+
+        def request(self, method, url, **kwargs):
+            if kwargs.get('timeout') is None:
+                kwargs['timeout'] = self.default_timeout
+            return super().request(method, url, **kwargs)
+
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        respect_retry_after_header=True,
+        raise_on_status=False,      # Hand the last response back so callers can inspect / raise it
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        pool_block=True,
+        max_retries=retry,
+    )
+    session = TimeoutSession(timeout)
+    session.headers.update(DEFAULT_HEADERS)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session():
+    """
+    Returns the process wide shared session, creating it on first use.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = build_session()
+    return _session
+
+
+def configure(**session_options):
+    """
+    Replaces the shared session with one built from the given options (see build_session).
+    """
+    global _session
+    new_session = build_session(**session_options)
+    with _session_lock:
+        old_session, _session = _session, new_session
+    if old_session is not None:
+        old_session.close()
+    return new_session
+
+
+def get(url:str, **kwargs):
+    """
+    GET through the shared session. Accepts the same keyword arguments as requests.get.
+    """
+    return get_session().get(url, **kwargs)
+
+
+def head(url:str, **kwargs):
+    """
+    HEAD through the shared session. Accepts the same keyword arguments as requests.head.
+    """
+    return get_session().head(url, **kwargs)
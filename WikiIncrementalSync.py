@@ -0,0 +1,612 @@
+# Imports and Installs
+import json
+import time
+import zlib
+import sqlite3
+import difflib
+import hashlib
+import threading
+from datetime import datetime, timezone, timedelta
+from urllib.parse import quote, unquote, urlsplit
+import WikiHttpClient as http_client
+from WikiCrawler import WikiCrawler
+
+# Constants
+RC_MAX_AGE_DAYS = 90            # MediaWiki's default $wgRCMaxAge, older watermarks need a full crawl
+RC_BATCH_SIZE = 500             # Changes requested per api.php call (the limit for normal users)
+RC_TYPES = 'edit|new|log'       # Edits, page creations and deletions / moves
+MEDIAWIKI_TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+DELTA_MAX_RATIO = 0.5           # Deltas bigger than this share of the compressed text are stored as full text
+DELTA_MAX_CHAIN = 8             # Deltas applied on top of each other at most to rebuild a text
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sync_state (
+    version TEXT PRIMARY KEY,
+    start_url TEXT NOT NULL,
+    watermark TEXT,
+    last_full_sync REAL,
+    last_sync REAL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    version TEXT NOT NULL,
+    url TEXT NOT NULL,
+    title TEXT,
+    page_key TEXT NOT NULL,         -- Page title, the same in every version
+    content_hash TEXT NOT NULL,     -- Text, in contents
+    html_hash TEXT,                 -- Fetched html with the version path masked, see html_fingerprint
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (version, url)
+);
+CREATE INDEX IF NOT EXISTS pages_by_key ON pages (page_key);
+CREATE INDEX IF NOT EXISTS pages_by_html ON pages (html_hash);
+CREATE TABLE IF NOT EXISTS contents (
+    hash TEXT PRIMARY KEY,          -- content_hash of the text
+    base TEXT,                      -- NULL: data is the zlib text, else data is a zlib delta against this content
+    depth INTEGER NOT NULL,         -- Deltas to apply to rebuild the text
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS links (
+    version TEXT NOT NULL,
+    source TEXT NOT NULL,
+    url TEXT NOT NULL,
+    title TEXT
+);
+CREATE INDEX IF NOT EXISTS links_by_source ON links (version, source);
+"""
+
+
+def api_url_for(page_url:str):
+    """
+    Returns the api.php url of the MediaWiki the page belongs to.
+    e.g. https://wiki.alkit.se/wice296/index.php/Main_Page -> https://wiki.alkit.se/wice296/api.php
+    """
+    prefix, separator, _ = page_url.partition('/index.php')
+    if not separator:
+        raise ValueError(f"{page_url} is not a MediaWiki index.php url")
+    return prefix + '/api.php'
+
+
+def title_to_url(page_url:str, title:str):
+    """
+    Returns the url of the page title on the same wiki as page_url, encoded the way MediaWiki writes its links.
+    """
+    prefix = page_url.partition('/index.php')[0]
+    return f"{prefix}/index.php/{quote(title.replace(' ', '_'), safe=':/()!,;@$*~')}"
+
+
+def url_to_title(url:str):
+    """
+    Returns the page title of a MediaWiki index.php/<Title> url, or None for other urls.
+    """
+    parts = urlsplit(url)
+    _, separator, title = parts.path.partition('/index.php/')
+    if not separator or not title or parts.query:
+        return None
+    return unquote(title).replace('_', ' ')
+
+
+def parse_timestamp(timestamp:str):
+    return datetime.strptime(timestamp, MEDIAWIKI_TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc)
+
+
+def version_key(version:str):
+    """
+    Sort key that orders version numbers numerically, e.g. 2.9 before 2.10.
+    """
+    return tuple((0, int(part), '') if part.isdigit() else (1, 0, part) for part in version.split('.'))
+
+
+def page_key(url:str):
+    """
+    Returns what identifies a page across versions: its title, or the url itself for other urls.
+    """
+    return url_to_title(url) or url
+
+
+def content_hash(text:str):
+    """
+    Hash of the text with whitespace runs collapsed, so pages that only differ in whitespace are stored once.
+    """
+    return hashlib.sha256(' '.join(text.split()).encode('utf-8')).hexdigest()
+
+
+def html_fingerprint(html_content:str, start_url:str):
+    """
+    Hash of a fetched page with its version path (e.g. /wice296/) masked. Pages with the same
+    fingerprint in two versions parse to the same title and text, and to the same links once
+    the version path is swapped.
+    """
+    root = urlsplit(start_url).path.partition('/index.php')[0]
+    if root:
+        html_content = html_content.replace(root + '/', '/<version>/')
+    return hashlib.sha256(html_content.encode('utf-8')).hexdigest()
+
+
+def encode_delta(base:str, text:str):
+    """
+    Line delta of text against base: a list of [start, end] base line ranges to copy and inserted strings.
+    """
+    base_lines = base.splitlines(keepends=True)
+    lines = text.splitlines(keepends=True)
+    delta = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, base_lines, lines, autojunk=False).get_opcodes():
+        if tag == 'equal':
+            delta.append([i1, i2])
+        elif j2 > j1:
+            delta.append(''.join(lines[j1:j2]))
+    return delta
+
+
+def apply_delta(base:str, delta:list):
+    base_lines = base.splitlines(keepends=True)
+    return ''.join(''.join(base_lines[op[0]:op[1]]) if isinstance(op, list) else op for op in delta)
+
+
+def fetch_recent_changes(api_url:str, since:str=None, limit:int=None, get=http_client.get):
+    """
+    Lists the changes of a MediaWiki through api.php?action=query&list=recentchanges, newest first.
+
+    Args:
+        api_url (str): The api.php url of the wiki.
+        since (str, optional): MediaWiki timestamp, only changes at or after it are listed. All retained changes if None.
+        limit (int, optional): Stop after this many changes.
+        get (callable): get(url, params=...) -> response, the shared http client by default.
+
+    Returns:
+        list: {'type', 'title', 'timestamp', 'logtype', 'target_title'} dicts.
+    """
+    params = {
+        'action': 'query',
+        'list': 'recentchanges',
+        'rcprop': 'title|timestamp|loginfo',
+        'rctype': RC_TYPES,
+        'rcdir': 'older',
+        'rclimit': min(limit or RC_BATCH_SIZE, RC_BATCH_SIZE),
+        'format': 'json',
+        'formatversion': 2,
+    }
+    if since:
+        params['rcend'] = since
+    changes = []
+    while True:
+        response = get(api_url, params=params)
+        response.raise_for_status()
+        data = response.json()
+        if 'error' in data:
+            raise RuntimeError(f"MediaWiki api error from {api_url} : {data['error'].get('info', data['error'])}")
+        for change in data.get('query', {}).get('recentchanges', []):
+            changes.append({
+                'type': change.get('type'),
+                'title': change.get('title'),
+                'timestamp': change.get('timestamp'),
+                'logtype': change.get('logtype'),
+                'target_title': (change.get('logparams') or {}).get('target_title'),
+            })
+            if limit is not None and len(changes) >= limit:
+                return changes
+        if 'continue' not in data:
+            return changes
+        params.update(data['continue'])
+
+
+class WikiSyncStore:
+    """
+    SQLite store of the crawled text and link graph of every wiki version, with its sync watermark.
+
+    Versions are mostly identical, so texts are content addressed: a text is stored once
+    however many versions have it, and a new text of a page is stored as a line delta
+    against the page's latest stored text when that is smaller. Comparing versions is a
+    comparison of content hashes.
+
+    Args:
+        path (str): SQLite database file. Created if missing.
+    """
+
+    def __init__(self, path:str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        columns = [row[1] for row in self._db.execute('PRAGMA table_info(pages)')]
+        if 'text' in columns:
+            self._db.execute('ALTER TABLE pages RENAME TO pages_with_text')
+        self._db.executescript(_SCHEMA)
+        if 'text' in columns:
+            self._migrate_texts()
+
+    def _migrate_texts(self):
+        # Stores written before contents existed kept every text in full in the pages table
+        rows = self._db.execute('SELECT version, url, title, text, fetched_at FROM pages_with_text ORDER BY rowid').fetchall()
+        for version, url, title, text, fetched_at in rows:
+            key = page_key(url)
+            self._db.execute(
+                'INSERT INTO pages (version, url, title, page_key, content_hash, html_hash, fetched_at) VALUES (?, ?, ?, ?, ?, NULL, ?)',
+                (version, url, title, key, self._put_content(text or '', self._latest_content(key)), fetched_at)
+            )
+        self._db.execute('DROP TABLE pages_with_text')
+        self._db.commit()
+
+    # Contents, called with the lock held
+    def _latest_content(self, key:str):
+        # The most recently stored text of the page in any version, the natural delta base
+        row = self._db.execute('SELECT content_hash FROM pages WHERE page_key = ? ORDER BY fetched_at DESC LIMIT 1', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _put_content(self, text:str, base_hash:str=None):
+        text_hash = content_hash(text)
+        if self._db.execute('SELECT 1 FROM contents WHERE hash = ?', (text_hash,)).fetchone():
+            return text_hash
+        full = zlib.compress(text.encode('utf-8'))
+        base = self._db.execute('SELECT depth FROM contents WHERE hash = ?', (base_hash,)).fetchone() if base_hash else None
+        if base is not None and base[0] < DELTA_MAX_CHAIN:
+            delta = zlib.compress(json.dumps(encode_delta(self._get_content(base_hash), text)).encode('utf-8'))
+            if len(delta) < DELTA_MAX_RATIO * len(full):
+                self._db.execute('INSERT INTO contents (hash, base, depth, data) VALUES (?, ?, ?, ?)',
+                                 (text_hash, base_hash, base[0] + 1, delta))
+                return text_hash
+        self._db.execute('INSERT INTO contents (hash, base, depth, data) VALUES (?, NULL, 0, ?)', (text_hash, full))
+        return text_hash
+
+    def _get_content(self, text_hash:str):
+        deltas = []
+        while True:
+            base, data = self._db.execute('SELECT base, data FROM contents WHERE hash = ?', (text_hash,)).fetchone()
+            if base is None:
+                break
+            deltas.append(json.loads(zlib.decompress(data)))
+            text_hash = base
+        text = zlib.decompress(data).decode('utf-8')
+        for delta in reversed(deltas):
+            text = apply_delta(text, delta)
+        return text
+
+    # Sync state
+    def get_state(self, version:str):
+        """
+        Returns {'version', 'start_url', 'watermark', 'last_full_sync', 'last_sync'} or None if never synced.
+        """
+        with self._lock:
+            row = self._db.execute(
+                'SELECT version, start_url, watermark, last_full_sync, last_sync FROM sync_state WHERE version = ?', (version,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('version', 'start_url', 'watermark', 'last_full_sync', 'last_sync'), row))
+
+    def set_state(self, version:str, start_url:str, watermark:str, full:bool):
+        now = time.time()
+        with self._lock:
+            previous = self._db.execute('SELECT last_full_sync FROM sync_state WHERE version = ?', (version,)).fetchone()
+            last_full_sync = now if full or previous is None else previous[0]
+            self._db.execute(
+                'INSERT OR REPLACE INTO sync_state (version, start_url, watermark, last_full_sync, last_sync) VALUES (?, ?, ?, ?, ?)',
+                (version, start_url, watermark, last_full_sync, now)
+            )
+            self._db.commit()
+
+    # Pages
+    def put_page(self, version:str, url:str, title:str, text:str, links:list, html_hash:str=None):
+        """
+        Stores the text of a page and replaces its outgoing links.
+
+        A text already stored for any version is not stored again, and a new text is stored as a
+        delta against the page's latest stored text when that is less than half the size.
+        """
+        key = page_key(url)
+        with self._lock:
+            text_hash = self._put_content(text, self._latest_content(key))
+            self._db.execute(
+                'INSERT OR REPLACE INTO pages (version, url, title, page_key, content_hash, html_hash, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (version, url, title, key, text_hash, html_hash, time.time())
+            )
+            self._db.execute('DELETE FROM links WHERE version = ? AND source = ?', (version, url))
+            self._db.executemany(
+                'INSERT INTO links (version, source, url, title) VALUES (?, ?, ?, ?)',
+                [(version, url, link['url'], link['title']) for link in links]
+            )
+            self._db.commit()
+
+    def remove_page(self, version:str, url:str):
+        """
+        Removes a page and its outgoing links. Returns True if the page was stored.
+        """
+        with self._lock:
+            removed = self._db.execute('DELETE FROM pages WHERE version = ? AND url = ?', (version, url)).rowcount
+            self._db.execute('DELETE FROM links WHERE version = ? AND source = ?', (version, url))
+            self._db.commit()
+        return bool(removed)
+
+    def clear(self, version:str):
+        with self._lock:
+            self._db.execute('DELETE FROM pages WHERE version = ?', (version,))
+            self._db.execute('DELETE FROM links WHERE version = ?', (version,))
+            self._db.commit()
+
+    def page_urls(self, version:str):
+        with self._lock:
+            return {row[0] for row in self._db.execute('SELECT url FROM pages WHERE version = ?', (version,))}
+
+    def linked_urls(self, version:str):
+        with self._lock:
+            return {row[0] for row in self._db.execute('SELECT DISTINCT url FROM links WHERE version = ?', (version,))}
+
+    def get_page(self, version:str, url:str):
+        """
+        Returns {'url', 'title', 'text', 'links'} of a stored page, or None.
+        """
+        with self._lock:
+            row = self._db.execute('SELECT title, content_hash FROM pages WHERE version = ? AND url = ?', (version, url)).fetchone()
+            if row is None:
+                return None
+            text = self._get_content(row[1])
+            links = self._db.execute(
+                'SELECT title, url FROM links WHERE version = ? AND source = ? ORDER BY rowid', (version, url)
+            ).fetchall()
+        return {'url': url, 'title': row[0], 'text': text, 'links': [{'title': t, 'url': u} for t, u in links]}
+
+    def pages(self, version:str):
+        """
+        Yields (url, title, text) of every stored page of a version.
+        """
+        with self._lock:
+            rows = self._db.execute('SELECT url, title, content_hash FROM pages WHERE version = ? ORDER BY rowid', (version,)).fetchall()
+        for url, title, text_hash in rows:
+            with self._lock:
+                text = self._get_content(text_hash)
+            yield url, title, text
+
+    def parsed_page(self, html_hash:str, start_url:str):
+        """
+        Returns {'title', 'text', 'links'} of a page stored with the same html fingerprint, in any
+        synced version, with its links moved to the version of start_url. None if there is none.
+        """
+        prefix = start_url.partition('/index.php')[0]
+        with self._lock:
+            row = self._db.execute(
+                'SELECT p.version, p.url, p.title, p.content_hash, s.start_url FROM pages p '
+                'LEFT JOIN sync_state s ON s.version = p.version WHERE p.html_hash = ? LIMIT 1', (html_hash,)
+            ).fetchone()
+            if row is None or row[4] is None:
+                return None
+            version, url, title, text_hash, other_start_url = row
+            text = self._get_content(text_hash)
+            links = self._db.execute(
+                'SELECT title, url FROM links WHERE version = ? AND source = ? ORDER BY rowid', (version, url)
+            ).fetchall()
+        other_prefix = other_start_url.partition('/index.php')[0] + '/'
+        return {'title': title, 'text': text, 'links': [
+            {'title': t, 'url': prefix + '/' + u[len(other_prefix):] if u.startswith(other_prefix) else u} for t, u in links
+        ]}
+
+    def collect_garbage(self):
+        """
+        Deletes the texts no stored page (or delta based on it) uses any more. Returns how many were deleted.
+        """
+        with self._lock:
+            bases = dict(self._db.execute('SELECT hash, base FROM contents'))
+            keep = set()
+            for (text_hash,) in self._db.execute('SELECT DISTINCT content_hash FROM pages'):
+                while text_hash is not None and text_hash not in keep:
+                    keep.add(text_hash)
+                    text_hash = bases.get(text_hash)
+            unused = [(text_hash,) for text_hash in bases if text_hash not in keep]
+            self._db.executemany('DELETE FROM contents WHERE hash = ?', unused)
+            self._db.commit()
+        return len(unused)
+
+    def storage_stats(self):
+        """
+        Returns how the stored texts are kept: {'pages', 'texts', 'full_texts', 'deltas', 'stored_bytes'}.
+        """
+        with self._lock:
+            pages = self._db.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+            texts, deltas, stored_bytes = self._db.execute(
+                'SELECT COUNT(*), COUNT(base), COALESCE(SUM(LENGTH(data)), 0) FROM contents'
+            ).fetchone()
+        return {'pages': pages, 'texts': texts, 'full_texts': texts - deltas, 'deltas': deltas, 'stored_bytes': stored_bytes}
+
+    # Changes across versions
+    def versions(self):
+        """
+        Returns the synced versions, oldest first.
+        """
+        with self._lock:
+            return sorted((row[0] for row in self._db.execute('SELECT version FROM sync_state')), key=version_key)
+
+    def page_changes(self, page:str):
+        """
+        Lists how a page (title or url of any version) changed from one synced version to the next.
+
+        Returns:
+            list: {'version', 'change', 'url'} for every synced version that has the page or just lost it,
+                  oldest first. change is 'added', 'changed', 'unchanged' or 'removed'.
+        """
+        with self._lock:
+            rows = self._db.execute('SELECT version, url, content_hash FROM pages WHERE page_key = ?', (page_key(page),)).fetchall()
+        stored = {version: (url, text_hash) for version, url, text_hash in rows}
+        changes = []
+        previous = None
+        for version in self.versions():
+            url, text_hash = stored.get(version, (None, None))
+            if text_hash is None:
+                if previous is not None:
+                    changes.append({'version': version, 'change': 'removed', 'url': None})
+            elif previous is None:
+                changes.append({'version': version, 'change': 'added', 'url': url})
+            else:
+                changes.append({'version': version, 'change': 'changed' if text_hash != previous else 'unchanged', 'url': url})
+            previous = text_hash
+        return changes
+
+    def diff_versions(self, old_version:str, new_version:str):
+        """
+        Compares the stored pages of two versions by content hash, without loading any text.
+
+        Returns:
+            dict: {'added', 'removed', 'changed'} page titles and the number of 'unchanged' pages.
+        """
+        with self._lock:
+            old = dict(self._db.execute('SELECT page_key, content_hash FROM pages WHERE version = ?', (old_version,)))
+            new = dict(self._db.execute('SELECT page_key, content_hash FROM pages WHERE version = ?', (new_version,)))
+        return {
+            'added': sorted(key for key in new if key not in old),
+            'removed': sorted(key for key in old if key not in new),
+            'changed': sorted(key for key in new if key in old and new[key] != old[key]),
+            'unchanged': sum(1 for key in new if old.get(key) == new[key]),
+        }
+
+    def diff_page(self, old_version:str, new_version:str, page:str):
+        """
+        Returns the unified diff of a page's text between two versions ('' if unchanged), or None if neither has it.
+        """
+        key = page_key(page)
+        texts = {}
+        with self._lock:
+            for version in (old_version, new_version):
+                row = self._db.execute('SELECT content_hash FROM pages WHERE version = ? AND page_key = ?', (version, key)).fetchone()
+                texts[version] = self._get_content(row[0]) if row else None
+        if texts[old_version] is None and texts[new_version] is None:
+            return None
+        return ''.join(difflib.unified_diff(
+            (texts[old_version] or '').splitlines(keepends=True), (texts[new_version] or '').splitlines(keepends=True),
+            fromfile=f'{key} ({old_version})', tofile=f'{key} ({new_version})'
+        ))
+
+    def link_hierarchy(self, version:str):
+        """
+        Returns the stored link graph of a version as {'source url': [{'title', 'url'}, ...]}.
+        """
+        hierarchy = {}
+        with self._lock:
+            rows = self._db.execute('SELECT source, title, url FROM links WHERE version = ? ORDER BY rowid', (version,)).fetchall()
+        for source, title, url in rows:
+            hierarchy.setdefault(source, []).append({'title': title, 'url': url})
+        return hierarchy
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class IncrementalSync:
+    """
+    Keeps the stored text and link graph of each wiki version up to date.
+
+    The first sync of a version crawls it in full from its start page. Later syncs ask
+    the wiki's recentchanges api for everything edited, created, deleted or moved since
+    the version's watermark, refetch only those pages plus any outlinks the previous
+    crawl did not know yet, and patch the store. The watermark is the newest change timestamp the
+    wiki reported, so the wiki's clock is used and no change falls between two syncs.
+
+    Args:
+        store (WikiSyncStore): Where pages, links and watermarks are kept.
+        fetch (callable): fetch(url) -> html string.
+        extract_page (callable): extract_page(html, page_url, base_url) -> {'title', 'text', 'links'} with filtered links.
+        get (callable): get(url, params=...) -> response, used for api.php.
+        max_workers (int): Pages fetched concurrently.
+        per_host_limit (int): Maximum concurrent fetches against one host.
+        rc_max_age_days (int): Recent changes retention of the wiki. Older watermarks fall back to a full crawl.
+        on_error (callable, optional): on_error(url, exception) for pages that fail to fetch.
+        search_index (WikiSearchIndex, optional): Kept in step with the store, page by page.
+    """
+
+    def __init__(self, store:WikiSyncStore, fetch, extract_page, get=http_client.get, max_workers:int=8,
+                 per_host_limit:int=4, rc_max_age_days:int=RC_MAX_AGE_DAYS, on_error=None, search_index=None):
+        self.store = store
+        self.fetch = fetch
+        self.extract_page = extract_page
+        self.get = get
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.rc_max_age_days = rc_max_age_days
+        self.on_error = on_error
+        self.search_index = search_index
+
+    def _crawler(self, version:str, start_url:str, counters:dict):
+        def extract_and_store(html_content, page_url):
+            # A page another version already has (up to the version path) is not parsed again
+            html_hash = html_fingerprint(html_content, start_url)
+            page = self.store.parsed_page(html_hash, start_url)
+            if page is None:
+                page = self.extract_page(html_content, page_url, start_url)
+                counters['parsed'] += 1
+            self.store.put_page(version, page_url, page['title'], page['text'], page['links'], html_hash=html_hash)
+            if self.search_index is not None:
+                self.search_index.add_page(version, page_url, page['title'], page['text'])
+            counters['fetched'] += 1
+            return page['links']
+        return WikiCrawler(self.fetch, extract_and_store, max_workers=self.max_workers,
+                           per_host_limit=self.per_host_limit, on_error=self.on_error)
+
+    def _latest_change(self, api_url:str):
+        changes = fetch_recent_changes(api_url, limit=1, get=self.get)
+        if changes:
+            return changes[0]['timestamp']
+        return datetime.now(timezone.utc).strftime(MEDIAWIKI_TIMESTAMP_FORMAT)
+
+    def _watermark_expired(self, watermark:str):
+        return datetime.now(timezone.utc) - parse_timestamp(watermark) > timedelta(days=self.rc_max_age_days)
+
+    def full_sync(self, version:str, start_url:str):
+        """
+        Crawls the whole version from start_url and replaces everything stored for it.
+        """
+        started = time.perf_counter()
+        # Taken before crawling, so changes made during the crawl are picked up by the next sync
+        watermark = self._latest_change(api_url_for(start_url))
+        counters = {'fetched': 0, 'parsed': 0}
+        self.store.clear(version)
+        if self.search_index is not None:
+            self.search_index.clear(version)
+        for _ in self._crawler(version, start_url, counters).crawl(start_url):
+            pass
+        if self.search_index is not None:
+            self.search_index.commit(version, force=True)
+        self.store.set_state(version, start_url, watermark, full=True)
+        self.store.collect_garbage()
+        return {'version': version, 'full': True, 'changes': None, 'fetched': counters['fetched'],
+                'parsed': counters['parsed'], 'removed': 0, 'watermark': watermark, 'seconds': round(time.perf_counter() - started, 3)}
+
+    def sync(self, version:str, start_url:str, full:bool=False):
+        """
+        Brings the stored pages of a version up to date, incrementally when possible.
+
+        Returns:
+            dict: {'version', 'full', 'changes', 'fetched', 'parsed', 'removed', 'watermark', 'seconds'}
+        """
+        state = self.store.get_state(version)
+        if full or state is None or not state['watermark'] or state['start_url'] != start_url \
+                or self._watermark_expired(state['watermark']):
+            return self.full_sync(version, start_url)
+        started = time.perf_counter()
+        changes = fetch_recent_changes(api_url_for(start_url), since=state['watermark'], get=self.get)
+        stored_urls = self.store.page_urls(version)
+        stored_by_title = {url_to_title(url): url for url in stored_urls}
+        refetch = []        # Urls to fetch again, in the order the changes happened
+        removed = 0
+        for change in reversed(changes):    # Oldest first, so a later change wins
+            title = change['title']
+            url = stored_by_title.get(title)
+            if change['type'] == 'log' and change['logtype'] in ('delete', 'move'):
+                if url is not None and self.store.remove_page(version, url):
+                    removed += 1
+                    stored_urls.discard(url)
+                    if self.search_index is not None:
+                        self.search_index.remove_page(version, url)
+                if change['logtype'] == 'move' and change['target_title'] and url is not None:
+                    refetch.append(title_to_url(start_url, change['target_title']))
+            elif change['type'] == 'new' or url is not None:
+                refetch.append(url or title_to_url(start_url, title))
+        counters = {'fetched': 0, 'parsed': 0}
+        if refetch:
+            # Outlinks the previous crawl already knew (stored, or failed to fetch) are not followed again
+            known_urls = stored_urls | self.store.linked_urls(version)
+            for _ in self._crawler(version, start_url, counters).crawl_from(refetch, skip=known_urls):
+                pass
+        if self.search_index is not None:
+            self.search_index.commit(version)
+        watermark = changes[0]['timestamp'] if changes else state['watermark']
+        self.store.set_state(version, start_url, watermark, full=False)
+        if refetch or removed:
+            self.store.collect_garbage()
+        return {'version': version, 'full': False, 'changes': len(changes), 'fetched': counters['fetched'],
+                'parsed': counters['parsed'], 'removed': removed, 'watermark': watermark, 'seconds': round(time.perf_counter() - started, 3)}
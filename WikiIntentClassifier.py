@@ -0,0 +1,196 @@
+# Imports and Installs
+import os
+import json
+import numpy as np
+from WikiCnnRuntime import CnnIntentRuntime
+
+# Constants
+# Written by save_for_serving in Intent_Identifier_Models.ipynb
+MANIFEST_FILE = 'intent_models.json'    # {'max_seq_length', 'models': {'name': {'file', 'outputs'}}}
+TOKENIZER_FILE = 'tokenizer.json'       # Keras Tokenizer.to_json()
+LABELS_FILE = 'label_encoders.json'     # {'intent' | 'brand' | 'model' | 'sensor': [classes in encoder order]}
+SLOT_NAMES = ('brand', 'model', 'sensor')
+NO_SLOT_VALUE = 'NONE'                  # Slot label the notebook gives queries without that slot
+
+
+class QueryTokenizer:
+    """
+    texts_to_sequences and pad_sequences(padding='post', truncating='post') of a saved
+    Keras Tokenizer, without TensorFlow.
+
+    Args:
+        word_index (dict): {'word': index} of the fitted tokenizer.
+        num_words (int): Only words with an index below this are kept, None keeps all.
+        oov_token (str): Token that replaces unknown words, None drops them.
+        filters (str): Characters replaced by the split character before splitting.
+        lower (bool): Lowercase the text first.
+        split (str): Word separator.
+    """
+
+    def __init__(self, word_index:dict, num_words:int=None, oov_token:str=None,
+                 filters:str='!"#$%&()*+,-./:;<=>?@[\\]^_`{|}~\t\n', lower:bool=True, split:str=' '):
+        self.word_index = word_index
+        self.num_words = num_words
+        self.oov_index = word_index.get(oov_token) if oov_token is not None else None
+        self.lower = lower
+        self.split = split
+        self._translation = str.maketrans({c: split for c in filters})
+        self._cache = {}    # {'word': index or None}, words repeat a lot across queries
+
+    @classmethod
+    def from_json(cls, tokenizer_json:str):
+        """
+        Builds the tokenizer from the output of a Keras Tokenizer's to_json().
+        """
+        config = json.loads(tokenizer_json)['config']
+        word_index = config['word_index']
+        if isinstance(word_index, str):
+            word_index = json.loads(word_index)
+        return cls(word_index, num_words=config.get('num_words'), oov_token=config.get('oov_token'),
+                   filters=config.get('filters', ''), lower=config.get('lower', True), split=config.get('split', ' '))
+
+    def _index(self, word:str):
+        index = self.word_index.get(word)
+        if index is None or (self.num_words and index >= self.num_words):
+            return self.oov_index
+        return index
+
+    def text_to_sequence(self, text:str):
+        if self.lower:
+            text = text.lower()
+        sequence = []
+        for word in text.translate(self._translation).split(self.split):
+            if not word:
+                continue
+            index = self._cache.get(word, -1)
+            if index == -1:
+                index = self._cache[word] = self._index(word)
+            if index is not None:
+                sequence.append(index)
+        return sequence
+
+    def encode(self, texts:list, max_length:int):
+        """
+        Returns the padded int32 matrix (len(texts), max_length) the models take as input.
+        """
+        batch = np.zeros((len(texts), max_length), dtype=np.int32)
+        for row, text in enumerate(texts):
+            sequence = self.text_to_sequence(text)[:max_length]
+            batch[row, :len(sequence)] = sequence
+        return batch
+
+
+class IntentClassifier:
+    """
+    Intent and brand / model / sensor slots of automotive queries, from a model trained
+    in Intent_Identifier_Models.ipynb.
+
+    classify_batch tokenizes and pads all queries into one matrix and runs the model once
+    for them, so concurrent queries should reach it through a MicroBatcher.
+
+    Args:
+        predict (callable): Takes the padded int32 batch, returns one probability matrix per output.
+        tokenizer (QueryTokenizer): The tokenizer the model was trained with.
+        labels (dict): {'output name': [class labels]} of the label encoders.
+        outputs (list): Names of the model's outputs, in order ('intent' first).
+        max_seq_length (int): Sequence length the model was trained with.
+    """
+
+    def __init__(self, predict, tokenizer:QueryTokenizer, labels:dict, outputs:list, max_seq_length:int):
+        self.predict = predict
+        self.tokenizer = tokenizer
+        self.labels = {name: np.asarray(labels[name], dtype=object) for name in outputs}
+        self.outputs = list(outputs)
+        self.max_seq_length = max_seq_length
+
+    @classmethod
+    def load(cls, directory:str, model_name:str='joint'):
+        """
+        Loads a model saved by the notebook, with its tokenizer and label encoders. Imports TensorFlow,
+        unless the model is a NumPy export of the 1D-CNN (.npz, see WikiCnnRuntime).
+
+        Raises:
+            FileNotFoundError: If the directory has no saved models.
+            KeyError: If model_name was not saved.
+        """
+        with open(os.path.join(directory, MANIFEST_FILE), encoding='utf-8') as f:
+            manifest = json.load(f)
+        with open(os.path.join(directory, TOKENIZER_FILE), encoding='utf-8') as f:
+            tokenizer = QueryTokenizer.from_json(f.read())
+        with open(os.path.join(directory, LABELS_FILE), encoding='utf-8') as f:
+            labels = json.load(f)
+        entry = manifest['models'][model_name]
+        if entry['file'].endswith('.npz'):
+            return cls.from_cnn_export(os.path.join(directory, entry['file']))
+
+        import tensorflow as tf
+        model = tf.keras.models.load_model(os.path.join(directory, entry['file']), compile=False)
+        max_seq_length = manifest['max_seq_length']
+        # A traced call skips the per call setup of model.predict, which dominates for small batches
+        call = tf.function(lambda batch: model(batch, training=False),
+                           input_signature=[tf.TensorSpec([None, max_seq_length], tf.int32)])
+
+        def predict(batch):
+            outputs = call(tf.constant(batch))
+            if isinstance(outputs, dict):
+                outputs = [outputs[f'{name}_output'] for name in entry['outputs']]
+            elif not isinstance(outputs, (list, tuple)):
+                outputs = [outputs]
+            return [output.numpy() for output in outputs]
+
+        return cls(predict, tokenizer, labels, entry['outputs'], max_seq_length)
+
+    @classmethod
+    def from_cnn_export(cls, path:str):
+        """
+        Loads a 1D-CNN exported with WikiCnnRuntime.export_cnn_model. Needs only NumPy.
+        """
+        runtime = CnnIntentRuntime.load(path)
+        return cls(runtime, QueryTokenizer.from_json(runtime.tokenizer_json), {'intent': runtime.labels},
+                   ['intent'], runtime.max_seq_length)
+
+    def classify_batch(self, queries:list):
+        """
+        Classifies queries with one model call.
+
+        Returns:
+            list: Per query {'intent', 'confidence', 'slots': {'slot': {'value', 'confidence'}}}.
+                  A slot's value is None when the model predicts no value for it; slots are
+                  empty for models that only predict the intent.
+        """
+        if not queries:
+            return []
+        probabilities = self.predict(self.tokenizer.encode(queries, self.max_seq_length))
+        best = {}
+        for name, output in zip(self.outputs, probabilities):
+            indices = output.argmax(axis=1)
+            best[name] = (self.labels[name][indices], output[np.arange(len(queries)), indices])
+
+        results = []
+        for row in range(len(queries)):
+            intents, confidences = best['intent']
+            slots = {}
+            for name in SLOT_NAMES:
+                if name in best:
+                    values, slot_confidences = best[name]
+                    value = values[row]
+                    slots[name] = {'value': None if value == NO_SLOT_VALUE else str(value),
+                                   'confidence': round(float(slot_confidences[row]), 4)}
+            results.append({'intent': str(intents[row]), 'confidence': round(float(confidences[row]), 4), 'slots': slots})
+        return results
+
+    def classify(self, query:str):
+        return self.classify_batch([query])[0]
+
+
+def load_intent_classifier(directory:str, model_name:str='joint'):
+    """
+    Loads the saved intent classifier, or returns None if none was saved or it cannot be loaded.
+    """
+    if not os.path.exists(os.path.join(directory, MANIFEST_FILE)):
+        return None
+    try:
+        return IntentClassifier.load(directory, model_name)
+    except Exception as e:
+        print(f"ERROR: Could not load intent model '{model_name}' from {directory} : {e}")
+        return None
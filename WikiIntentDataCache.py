@@ -0,0 +1,138 @@
+# Imports and Installs
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+from itertools import chain
+
+# Constants
+CACHE_FORMAT = 1        # Bumped when the layout of a cache entry changes, old entries are then ignored
+# CONFIG entries of Intent_Identifier_Models.ipynb that change the preprocessed data
+PREPROCESS_CONFIG_KEYS = ('MAX_SEQUENCE_LENGTH', 'MAX_VOCAB_SIZE', 'VALIDATION_SPLIT', 'TEST_SPLIT')
+SPLIT_NAMES = ('train', 'val', 'test')
+_HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def file_hash(path:str):
+    """
+    Returns the sha256 of a file's contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(file_path:str, config:dict, seed:int=42):
+    """
+    Returns the key of the preprocessed data of a dataset file: it changes with the file's
+    contents, the preprocessing entries of config and the split seed.
+    """
+    settings = {key: config.get(key) for key in PREPROCESS_CONFIG_KEYS}
+    fingerprint = json.dumps({'format': CACHE_FORMAT, 'data': file_hash(file_path), 'config': settings, 'seed': seed},
+                             sort_keys=True)
+    return hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()[:24]
+
+
+def pad_post(sequences:list, max_length:int):
+    """
+    pad_sequences(sequences, maxlen=max_length, padding='post', truncating='post') as one int32
+    matrix, filled with a single masked assignment instead of row by row.
+    """
+    lengths = np.fromiter((min(len(sequence), max_length) for sequence in sequences), dtype=np.int64, count=len(sequences))
+    padded = np.zeros((len(sequences), max_length), dtype=np.int32)
+    tokens = np.fromiter(chain.from_iterable(sequence[:max_length] for sequence in sequences),
+                         dtype=np.int32, count=int(lengths.sum()))
+    padded[np.arange(max_length) < lengths[:, None]] = tokens
+    return padded
+
+
+def one_hot(indices:np.ndarray, classes:int):
+    """
+    to_categorical(indices, classes) as float32.
+    """
+    return np.eye(classes, dtype=np.float32)[np.asarray(indices)]
+
+
+class IntentDataCache:
+    """
+    Preprocessed intent datasets on disk, one directory per cache key.
+
+    An entry holds the padded token ids (X.npy), the label index of every query per output
+    (labels_<name>.npy), the row indices of the train / val / test splits (split_<name>.npy),
+    the tokenizer JSON and the label classes. Arrays are opened memory-mapped, so loading an
+    entry reads nothing until the rows are used. Entries are written to a temporary directory
+    and renamed into place, so an interrupted run never leaves a partial entry behind.
+
+    Args:
+        directory (str): Directory holding the entries.
+    """
+
+    def __init__(self, directory:str):
+        self.directory = directory
+
+    def path(self, key:str):
+        return os.path.join(self.directory, key)
+
+    def load(self, key:str):
+        """
+        Returns the entry saved under key, or None if there is none.
+
+        Returns:
+            dict: {'X', 'labels': {'name': indices}, 'splits': {'train' | 'val' | 'test': row indices},
+                   'tokenizer_json', 'label_classes': {'name': [classes]}, 'metadata'}, arrays memory-mapped.
+        """
+        path = self.path(key)
+        manifest_path = os.path.join(path, 'manifest.json')
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('format') != CACHE_FORMAT:
+            return None
+        open_array = lambda name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+        with open(os.path.join(path, 'tokenizer.json'), encoding='utf-8') as f:
+            tokenizer_json = f.read()
+        return {
+            'X': open_array('X'),
+            'labels': {name: open_array(f'labels_{name}') for name in manifest['label_classes']},
+            'splits': {name: open_array(f'split_{name}') for name in SPLIT_NAMES},
+            'tokenizer_json': tokenizer_json,
+            'label_classes': manifest['label_classes'],
+            'metadata': manifest['metadata'],
+        }
+
+    def save(self, key:str, X:np.ndarray, labels:dict, splits:dict, tokenizer_json:str, label_classes:dict, metadata:dict):
+        """
+        Saves the preprocessed data of a dataset under key, replacing what was there.
+
+        Args:
+            X (np.ndarray): Padded token ids, one row per query.
+            labels (dict): {'name': label index of every query}.
+            splits (dict): {'train' | 'val' | 'test': row indices into X}.
+            tokenizer_json (str): The fitted Tokenizer's to_json().
+            label_classes (dict): {'name': classes of its label encoder}.
+            metadata (dict): JSON serializable model metadata (vocab_size, max_seq_length, ...).
+        """
+        path = self.path(key)
+        temp_path = path + '.tmp'
+        shutil.rmtree(temp_path, ignore_errors=True)
+        os.makedirs(temp_path)
+        np.save(os.path.join(temp_path, 'X.npy'), np.asarray(X, dtype=np.int32))
+        for name, indices in labels.items():
+            np.save(os.path.join(temp_path, f'labels_{name}.npy'), np.asarray(indices, dtype=np.int32))
+        for name in SPLIT_NAMES:
+            np.save(os.path.join(temp_path, f'split_{name}.npy'), np.asarray(splits[name], dtype=np.int64))
+        with open(os.path.join(temp_path, 'tokenizer.json'), 'w', encoding='utf-8') as f:
+            f.write(tokenizer_json)
+        manifest = {
+            'format': CACHE_FORMAT,
+            'label_classes': {name: [str(label) for label in classes] for name, classes in label_classes.items()},
+            'metadata': metadata,
+        }
+        with open(os.path.join(temp_path, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(temp_path, path)
@@ -0,0 +1,459 @@
+# Imports and Installs
+import os
+import csv
+import time
+import string
+import importlib.util
+import numpy as np
+import multiprocessing as mp
+
+# Constants
+COLUMNS = ('query', 'intent', 'brand', 'model', 'year', 'sensor', 'style')     # Columns of intent_dataset.csv
+EXTRA_COLUMNS = ('raw_query', 'tool', 'format', 'brand_alt', 'model_alt', 'year_alt')
+DEFAULT_BATCH_ROWS = 4096           # Candidate rows sampled at once by a shard
+DEFAULT_CHUNK_ROWS = 100_000        # Rows per output file
+BLOOM_HASHES = 7
+BLOOM_BITS_PER_ROW = 10             # With 7 hashes ~1% of new queries are taken for duplicates and resampled
+YIELD_WINDOW = 20                   # Batches over which a shard measures the share of new queries
+MIN_YIELD = 0.002                   # A shard stops when fewer candidates than this are new, the templates are exhausted
+TYPO_MAP = {"a": "q", "e": "r", "i": "o", "s": "x"}
+TYPO_CHANCE = 0.2                   # Chance that an eligible character is the one replaced
+CLEAN_NOISE_RATE = 0.05             # Share of 'standard' and 'verbose' queries that still get noise
+PYARROW_AVAILABLE = importlib.util.find_spec('pyarrow') is not None    # Only needed for Parquet output
+# Placeholders of the templates, in the order they are packed into a combination key
+KEY_FIELDS = ('brand', 'model', 'year', 'sensor', 'tool', 'format', 'brand_alt', 'model_alt', 'year_alt')
+
+
+class QuerySpec:
+    """
+    The vocabulary of Intent_Data_Generator.ipynb compiled into index arrays, so whole
+    batches of rows are sampled with a few NumPy calls instead of random.choice per field.
+
+    Samples follow the notebook's generator: a uniform brand, then a model of that brand and
+    a year of that model; a second vehicle with the same model and another year, another
+    model of the brand or another brand (keeping the year when the other model has it);
+    a strategy by weight, a uniform intent and a template of the intent (a verbose one for
+    the 'verbose' strategy when the intent has any). The retry loops for the second vehicle
+    are replaced by drawing among the other choices directly.
+
+    A query is identified before it is formatted by its combination key: the template and
+    the values of the placeholders it uses, packed into one integer. Rows with the same key
+    are the same query, so duplicates are dropped without formatting or hashing any text.
+
+    Args:
+        automotive_map (dict): {'brand': {'model': [years]}}.
+        sensors, tools, formats (list): Values of {sensor}, {tool} and {format}.
+        templates (dict): {'intent': [templates]}.
+        verbose_templates (dict): {'intent': [verbose templates]}, for some intents.
+        strategies (list): Strategy names, 'verbose' and 'noisy' have a meaning.
+        weights (list): Probability of each strategy.
+    """
+
+    def __init__(self, automotive_map:dict, sensors:list, tools:list, formats:list, templates:dict,
+                 verbose_templates:dict, strategies=('verbose', 'standard', 'noisy'), weights=(0.20, 0.50, 0.30)):
+        self.brands = list(automotive_map)
+        self.models, self.model_brand, years_by_model = [], [], []
+        self.model_start, self.model_count = [], []
+        for brand_index, (brand, models) in enumerate(automotive_map.items()):
+            self.model_start.append(len(self.models))
+            self.model_count.append(len(models))
+            for model, years in models.items():
+                self.models.append(model)
+                self.model_brand.append(brand_index)
+                years_by_model.append(list(years))
+        self.model_start = np.array(self.model_start)
+        self.model_count = np.array(self.model_count)
+
+        self.year_values = sorted({year for years in years_by_model for year in years})
+        year_index = {year: index for index, year in enumerate(self.year_values)}
+        self.year_start = np.cumsum([0] + [len(years) for years in years_by_model[:-1]])
+        self.year_count = np.array([len(years) for years in years_by_model])
+        self.years = np.array([year_index[year] for years in years_by_model for year in years])   # Indices into year_values
+        self.model_has_year = np.zeros((len(self.models), len(self.year_values)), dtype=bool)
+        for model_index, years in enumerate(years_by_model):
+            self.model_has_year[model_index, [year_index[year] for year in years]] = True
+
+        self.sensors, self.tools, self.formats = list(sensors), list(tools), list(formats)
+        self.intents = list(templates)
+        self.templates = []
+        self.standard_start, self.standard_count, self.verbose_start, self.verbose_count = [], [], [], []
+        for intent in self.intents:
+            for starts, counts, source in ((self.standard_start, self.standard_count, templates),
+                                           (self.verbose_start, self.verbose_count, verbose_templates)):
+                starts.append(len(self.templates))
+                counts.append(len(source.get(intent, [])))
+                self.templates.extend(source.get(intent, []))
+        self.standard_start, self.standard_count = np.array(self.standard_start), np.array(self.standard_count)
+        self.verbose_start, self.verbose_count = np.array(self.verbose_start), np.array(self.verbose_count)
+
+        self.strategies = list(strategies)
+        self.weights = np.asarray(weights, dtype=float) / np.sum(weights)
+        self.verbose_strategy = self.strategies.index('verbose') if 'verbose' in self.strategies else -1
+        self.noisy_strategy = self.strategies.index('noisy') if 'noisy' in self.strategies else -1
+
+        # Models of different brands can share a name ('01'), keys use the name
+        model_names = sorted(set(self.models))
+        self.model_name = np.array([model_names.index(model) for model in self.models])
+        texts = sorted(set(self.templates))
+        self.template_text = np.array([texts.index(template) for template in self.templates], dtype=np.uint64)
+        self.template_uses = np.array([[field in {name for _, name, _, _ in string.Formatter().parse(template) if name}
+                                        for field in KEY_FIELDS] for template in self.templates])
+        sizes = {'brand': len(self.brands), 'model': len(model_names), 'year': len(self.year_values),
+                 'sensor': len(self.sensors), 'tool': len(self.tools), 'format': len(self.formats)}
+        self.key_bits = [max(1, int(sizes[field.replace('_alt', '')] - 1).bit_length()) for field in KEY_FIELDS]
+        if len(texts).bit_length() + sum(self.key_bits) > 64:
+            raise ValueError("The vocabulary is too large to pack a query into a 64 bit combination key")
+
+    @staticmethod
+    def _pick(rng, starts, counts):
+        # One uniform index in [start, start + count) per row
+        return starts + (rng.random(len(starts)) * counts).astype(np.int64)
+
+    @staticmethod
+    def _pick_other(rng, starts, counts, current):
+        # A uniform index in [start, start + count) other than current, or current if it is the only one
+        offsets = (rng.random(len(starts)) * np.maximum(counts - 1, 1)).astype(np.int64)
+        offsets += offsets >= current - starts
+        return np.where(counts > 1, starts + offsets, current)
+
+    def _year_for(self, rng, models, years):
+        # Keep the year if the model was made that year, else a year of the model
+        return np.where(self.model_has_year[models, years], years,
+                        self.years[self._pick(rng, self.year_start[models], self.year_count[models])])
+
+    def sample(self, rng, rows:int):
+        """
+        Samples the field indices of rows candidate queries.
+
+        Returns:
+            dict: {'brand', 'model', 'year', 'brand_alt', 'model_alt', 'year_alt', 'sensor', 'tool', 'format',
+                   'strategy', 'intent', 'template', 'noise', 'noise_kind', 'typo_at'} index arrays.
+        """
+        brands = rng.integers(len(self.brands), size=rows)
+        models = self._pick(rng, self.model_start[brands], self.model_count[brands])
+        year_slots = self._pick(rng, self.year_start[models], self.year_count[models])
+        years = self.years[year_slots]
+
+        # Second vehicle: same model other year, same brand other model, or other brand
+        kind = rng.integers(3, size=rows)
+        other_year = self.years[self._pick_other(rng, self.year_start[models], self.year_count[models], year_slots)]
+        brand_model = self._pick_other(rng, self.model_start[brands], self.model_count[brands], models)
+        other_brands = self._pick_other(rng, np.zeros(rows, dtype=np.int64), np.full(rows, len(self.brands)), brands)
+        other_model = self._pick(rng, self.model_start[other_brands], self.model_count[other_brands])
+        brand_alt = np.where(kind == 2, other_brands, brands)
+        model_alt = np.select([kind == 0, kind == 1], [models, brand_model], other_model)
+        year_alt = np.where(kind == 0, other_year, self._year_for(rng, model_alt, years))
+
+        strategy = rng.choice(len(self.strategies), size=rows, p=self.weights)
+        intent = rng.integers(len(self.intents), size=rows)
+        verbose = (strategy == self.verbose_strategy) & (self.verbose_count[intent] > 0)
+        template = np.where(verbose, self._pick(rng, self.verbose_start[intent], self.verbose_count[intent]),
+                            self._pick(rng, self.standard_start[intent], self.standard_count[intent]))
+        return {
+            'brand': brands, 'model': models, 'year': years,
+            'brand_alt': brand_alt, 'model_alt': model_alt, 'year_alt': year_alt,
+            'sensor': rng.integers(len(self.sensors), size=rows),
+            'tool': rng.integers(len(self.tools), size=rows),
+            'format': rng.integers(len(self.formats), size=rows),
+            'strategy': strategy, 'intent': intent, 'template': template,
+            'noise': (strategy == self.noisy_strategy) | (rng.random(rows) < CLEAN_NOISE_RATE),
+            'noise_kind': rng.random(rows),
+            # The eligible character a typo lands on: the first of the notebook's 20% chances per character that hits
+            'typo_at': rng.geometric(TYPO_CHANCE, size=rows),
+        }
+
+    def combination_keys(self, sample:dict):
+        """
+        Returns the uint64 combination key of every sampled row, equal for rows giving the same raw query.
+        """
+        templates = sample['template']
+        uses = self.template_uses[templates]
+        values = {**sample, 'model': self.model_name[sample['model']], 'model_alt': self.model_name[sample['model_alt']]}
+        keys = self.template_text[templates]
+        for column, (field, bits) in enumerate(zip(KEY_FIELDS, self.key_bits)):
+            keys = (keys << np.uint64(bits)) | np.where(uses[:, column], values[field], 0).astype(np.uint64)
+        return keys
+
+    def format_queries(self, sample:dict, indices):
+        """
+        Returns the raw (noise free) queries of the sampled rows at indices.
+        """
+        brands, models, years = self.brands, self.models, self.year_values
+        sensors, tools, formats, templates = self.sensors, self.tools, self.formats, self.templates
+        return [
+            templates[t].format(brand=brands[b], model=models[m], year=years[y], sensor=sensors[s], tool=tools[o],
+                                format=formats[f], brand_alt=brands[ba], model_alt=models[ma], year_alt=years[ya])
+            for t, b, m, y, s, o, f, ba, ma, ya in zip(*(sample[name][indices].tolist() for name in (
+                'template', 'brand', 'model', 'year', 'sensor', 'tool', 'format', 'brand_alt', 'model_alt', 'year_alt')))
+        ]
+
+    def inject_noise(self, text:str, noise_kind:float, typo_at:int):
+        """
+        inject_noise of the notebook, with its random draws made beforehand.
+        """
+        # 1. Lowercase + No Punctuation (Shorthand)
+        if noise_kind < 0.15:
+            return text.lower().replace("?", "").replace(".", "")
+        # 2. Keyboard Typos
+        if noise_kind < 0.25:
+            for c in text:
+                if c in TYPO_MAP:
+                    typo_at -= 1
+                    if typo_at == 0:
+                        return text.replace(c, TYPO_MAP[c], 1)
+            return text
+        # 3. Omit brand (Internal assumption)
+        if noise_kind < 0.35:
+            for brand in self.brands:
+                text = text.replace(brand + " ", "")
+        return text
+
+    def rows(self, sample:dict, indices, columns=COLUMNS):
+        """
+        Returns {'column': [values]} of the sampled rows at indices, noise applied to their queries.
+        """
+        raw_queries = self.format_queries(sample, indices)
+        values = {}
+        for column in columns:
+            if column == 'query':
+                noisy = zip(raw_queries, sample['noise'][indices].tolist(), sample['noise_kind'][indices].tolist(),
+                            sample['typo_at'][indices].tolist())
+                values[column] = [self.inject_noise(raw, kind, typo_at) if noise else raw
+                                  for raw, noise, kind, typo_at in noisy]
+            elif column == 'raw_query':
+                values[column] = raw_queries
+            elif column in ('year', 'year_alt'):
+                values[column] = [self.year_values[y] for y in sample[column][indices].tolist()]
+            else:
+                names = {'brand': self.brands, 'brand_alt': self.brands, 'model': self.models, 'model_alt': self.models,
+                         'sensor': self.sensors, 'tool': self.tools, 'format': self.formats,
+                         'intent': self.intents, 'style': self.strategies}[column]
+                field = 'strategy' if column == 'style' else column
+                values[column] = [names[index] for index in sample[field][indices].tolist()]
+        return values
+
+
+def _mix64(values:np.ndarray):
+    # splitmix64 finalizer, spreads the bits of a key over the whole word
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+class SharedBloomFilter:
+    """
+    Bloom filter over combination keys in shared memory, used by every shard to keep queries
+    unique across processes in bounded memory (bits_per_item bits per expected query).
+
+    A batch is checked and added under one lock, so two shards never both keep the same
+    query. False positives drop a few new queries, which the shards replace by sampling more.
+
+    Args:
+        capacity (int): Number of queries expected.
+        bits_per_item (int): Filter bits per expected query.
+        hashes (int): Bits set per query.
+    """
+
+    def __init__(self, capacity:int, bits_per_item:int=BLOOM_BITS_PER_ROW, hashes:int=BLOOM_HASHES):
+        self.size = max(64, capacity * bits_per_item + 7) // 8 * 8
+        self.hashes = hashes
+        self._buffer = mp.RawArray('B', self.size // 8)
+        self._lock = mp.Lock()
+
+    @property
+    def _bits(self):
+        return np.frombuffer(self._buffer, dtype=np.uint8)
+
+    def add(self, keys:np.ndarray, limit:int=None):
+        """
+        Adds the uint64 keys that are not in the filter yet (the first of each within the batch too),
+        at most limit of them.
+
+        Returns:
+            np.ndarray: Boolean mask of the keys added, i.e. seen for the first time.
+        """
+        first = np.zeros(len(keys), dtype=bool)
+        first[np.unique(keys, return_index=True)[1]] = True
+        # Double hashing: bit i of a key is h1 + i * h2 (mod size)
+        h1, h2 = _mix64(keys), _mix64(keys ^ np.uint64(0x9E3779B97F4A7C15)) | np.uint64(1)
+        positions = (h1[:, None] + np.arange(self.hashes, dtype=np.uint64) * h2[:, None]) % np.uint64(self.size)
+        bytes_at = (positions >> np.uint64(3)).astype(np.int64)
+        masks = np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8)
+        bits = self._bits
+        with self._lock:
+            added = first & ~((bits[bytes_at] & masks) != 0).all(axis=1)
+            if limit is not None:
+                added[np.flatnonzero(added)[limit:]] = False
+            np.bitwise_or.at(bits, bytes_at[added].ravel(), masks[added].ravel())
+        return added
+
+
+class ChunkWriter:
+    """
+    Streams rows to numbered files of at most chunk_rows rows: part-<shard>-<chunk>.csv, or .parquet
+    (needs pyarrow). CSV rows are written as they come, Parquet rows are held until their file is full.
+    """
+
+    def __init__(self, directory:str, shard:int, file_format:str='csv', chunk_rows:int=DEFAULT_CHUNK_ROWS, columns=COLUMNS):
+        if file_format not in ('csv', 'parquet'):
+            raise ValueError(f"Unknown file format {file_format!r}, use 'csv' or 'parquet'")
+        if file_format == 'parquet' and not PYARROW_AVAILABLE:   # Fail before any row is generated
+            raise ImportError("Parquet output needs pyarrow, install it with 'pip install pyarrow' or use file_format='csv'")
+        self.directory = directory
+        self.shard = shard
+        self.file_format = file_format
+        self.chunk_rows = chunk_rows
+        self.columns = list(columns)
+        self.files = []
+        self._file = None
+        self._writer = None
+        self._pending = {column: [] for column in self.columns}
+        self._in_chunk = 0
+
+    def _next_path(self):
+        path = os.path.join(self.directory, f'part-{self.shard:03d}-{len(self.files):04d}.{self.file_format}')
+        self.files.append(path)
+        return path
+
+    def _finish_chunk(self):
+        if self.file_format == 'csv':
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        elif self._in_chunk:
+            import pyarrow.parquet     # Also binds pyarrow
+            pyarrow.parquet.write_table(pyarrow.table(self._pending), self._next_path())
+            self._pending = {column: [] for column in self.columns}
+        self._in_chunk = 0
+
+    def write(self, values:dict):
+        """
+        Writes {'column': [values]} rows.
+        """
+        count = len(values[self.columns[0]])
+        start = 0
+        while start < count:
+            if self._in_chunk == self.chunk_rows:
+                self._finish_chunk()
+            take = min(count - start, self.chunk_rows - self._in_chunk)
+            if self.file_format == 'csv':
+                if self._file is None:
+                    self._file = open(self._next_path(), 'w', encoding='utf-8', newline='')
+                    self._writer = csv.writer(self._file)
+                    self._writer.writerow(self.columns)
+                self._writer.writerows(zip(*(values[column][start:start + take] for column in self.columns)))
+            else:
+                for column in self.columns:
+                    self._pending[column].extend(values[column][start:start + take])
+            self._in_chunk += take
+            start += take
+
+    def close(self):
+        self._finish_chunk()
+        return self.files
+
+
+def generate_shard(spec:QuerySpec, shard:int, rows:int, seed, bloom:SharedBloomFilter, directory:str,
+                   file_format:str='csv', chunk_rows:int=DEFAULT_CHUNK_ROWS, batch_rows:int=DEFAULT_BATCH_ROWS,
+                   columns=COLUMNS):
+    """
+    Generates rows unique queries into the files of one shard. The shard's candidates only depend
+    on its seed; which of them are kept also depends on what the other shards added first.
+    Stops short of rows when almost no candidate is new any more (the templates are exhausted).
+
+    Returns:
+        dict: {'shard', 'rows', 'candidates', 'files', 'seconds'}
+    """
+    started = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    writer = ChunkWriter(directory, shard, file_format, chunk_rows, columns)
+    written = candidates = 0
+    recent = []     # New queries of the last YIELD_WINDOW batches
+    while written < rows:
+        sample = spec.sample(rng, batch_rows)
+        candidates += batch_rows
+        added = np.flatnonzero(bloom.add(spec.combination_keys(sample), limit=rows - written))
+        if len(added):
+            writer.write(spec.rows(sample, added, columns))
+            written += len(added)
+        recent = recent[1 - YIELD_WINDOW:] + [len(added)]
+        if len(recent) == YIELD_WINDOW and sum(recent) < MIN_YIELD * YIELD_WINDOW * batch_rows:
+            break
+    return {'shard': shard, 'rows': written, 'candidates': candidates, 'files': writer.close(),
+            'seconds': round(time.perf_counter() - started, 3)}
+
+
+def _shard_process(results, *args):
+    try:
+        results.put(generate_shard(*args))
+    except BaseException as e:
+        results.put({'shard': args[1], 'error': f"{type(e).__name__}: {e}"})
+
+
+def generate_sharded(spec:QuerySpec, total_rows:int, directory:str, shards:int=None, seed:int=0, file_format:str='csv',
+                     chunk_rows:int=DEFAULT_CHUNK_ROWS, batch_rows:int=DEFAULT_BATCH_ROWS, columns=COLUMNS):
+    """
+    Generates total_rows unique queries across shard processes into chunked files.
+
+    Every shard gets an even share of the rows and its own seed spawned from seed. Queries are
+    unique across all shards through a shared Bloom filter, and every shard holds at most one
+    batch and one file's worth of rows, so memory stays bounded whatever total_rows is.
+    With shards=1 everything runs in this process and the output only depends on seed.
+
+    Returns:
+        dict: {'rows', 'candidates', 'files', 'seconds', 'shards': [per shard summary]}; 'rows' is
+              short of total_rows only if the templates ran out of new queries.
+
+    Raises:
+        RuntimeError: If a shard process failed.
+    """
+    started = time.perf_counter()
+    shards = max(1, shards or os.cpu_count() or 1)
+    quotas = [total_rows // shards + (shard < total_rows % shards) for shard in range(shards)]
+    seeds = np.random.SeedSequence(seed).spawn(shards)
+    bloom = SharedBloomFilter(total_rows)
+    os.makedirs(directory, exist_ok=True)
+    arguments = [(spec, shard, quotas[shard], seeds[shard], bloom, directory, file_format, chunk_rows, batch_rows, columns)
+                 for shard in range(shards)]
+
+    if shards == 1:
+        summaries = [generate_shard(*arguments[0])]
+    else:
+        results = mp.Queue()
+        processes = [mp.Process(target=_shard_process, args=(results, *shard_arguments), daemon=True)
+                     for shard_arguments in arguments]
+        for process in processes:
+            process.start()
+        summaries = [results.get() for _ in processes]     # Drained before joining, a full queue would block the exit
+        for process in processes:
+            process.join()
+        errors = [summary for summary in summaries if 'error' in summary]
+        if errors:
+            raise RuntimeError(f"Shard {errors[0]['shard']} failed: {errors[0]['error']}")
+        summaries.sort(key=lambda summary: summary['shard'])
+
+    rows = sum(summary['rows'] for summary in summaries)
+    if rows < total_rows:
+        print(f"ERROR: Only {rows} of {total_rows} unique queries could be generated, the templates ran out of new combinations")
+    return {
+        'rows': rows,
+        'candidates': sum(summary['candidates'] for summary in summaries),
+        'files': [path for summary in summaries for path in summary['files']],
+        'seconds': round(time.perf_counter() - started, 3),
+        'shards': summaries,
+    }
+
+
+def concat_csv_parts(files:list, path:str):
+    """
+    Joins chunk CSV files into one CSV with a single header, streaming line by line.
+    """
+    with open(path, 'w', encoding='utf-8', newline='') as output:
+        for index, part in enumerate(files):
+            with open(part, encoding='utf-8', newline='') as f:
+                header = f.readline()
+                if index == 0:
+                    output.write(header)
+                for line in f:
+                    output.write(line)
+    return path
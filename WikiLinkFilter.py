@@ -0,0 +1,185 @@
+# Imports and Installs
+import os
+import re
+import json
+import threading
+from collections import Counter
+
+try:
+    import ahocorasick      # pyahocorasick, optional
+except ImportError:
+    ahocorasick = None
+
+# Constants
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'link_filter_rules.json')
+
+
+class _SubstringMatcher:
+    """
+    Finds which of a fixed set of substrings occurs in a string, in one scan.
+    Uses an Aho-Corasick automaton when pyahocorasick is installed, a single
+    compiled regex alternation otherwise.
+    """
+
+    def __init__(self, substrings):
+        self.substrings = tuple(dict.fromkeys(s for s in substrings if s))
+        self._automaton = None
+        self._search = None
+        if not self.substrings:
+            return
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for substring in self.substrings:
+                self._automaton.add_word(substring, substring)
+            self._automaton.make_automaton()
+        else:
+            # Longest first, so the reported rule is the most specific one at a position
+            ordered = sorted(self.substrings, key=len, reverse=True)
+            self._search = re.compile('|'.join(re.escape(s) for s in ordered)).search
+
+    def first_match(self, value:str):
+        """
+        Returns a substring that occurs in value, or None.
+        """
+        if self._automaton is not None:
+            for _, substring in self._automaton.iter(value):
+                return substring
+            return None
+        if self._search is not None:
+            match = self._search(value)
+            if match:
+                return match.group(0)
+        return None
+
+
+class LinkFilter:
+    """
+    Compiled link drop rules.
+
+    Substring rules are matched in one scan per value, exact url and title rules
+    are frozenset lookups, so a check costs the same no matter how many rules there are.
+    Titles are compared case-insensitively and with surrounding whitespace stripped.
+    Every dropped link is counted against the rule that dropped it.
+
+    Args:
+        url_substrings (list): Drop urls containing any of these.
+        urls (list): Drop urls equal to any of these.
+        titles (list): Drop links whose title equals any of these.
+        title_substrings (list): Drop links whose title contains any of these.
+        allowed_url_prefixes (list): If not empty, drop urls that start with none of these.
+    """
+
+    def __init__(self, url_substrings=(), urls=(), titles=(), title_substrings=(), allowed_url_prefixes=()):
+        self.urls = frozenset(url.strip() for url in urls)
+        self.titles = frozenset(title.strip().casefold() for title in titles)
+        self.allowed_url_prefixes = tuple(allowed_url_prefixes)
+        self._url_substrings = _SubstringMatcher(url_substrings)
+        self._title_substrings = _SubstringMatcher(title.casefold() for title in title_substrings)
+        self.hits = Counter()       # {'rule': number of links it dropped}
+        self.checked = 0
+        self._hits_lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path:str=DEFAULT_RULES_PATH, **overrides):
+        """
+        Loads and compiles the rules of a JSON rules file. Keyword arguments replace rule lists from the file.
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            rules = json.load(f)
+        options = {key: rules.get(key, []) for key in
+                   ('url_substrings', 'urls', 'titles', 'title_substrings', 'allowed_url_prefixes')}
+        options.update(overrides)
+        return cls(**options)
+
+    # Rule checks, each returns the name of the rule that drops the value or None
+    def url_drop_rule(self, url:str):
+        url = url.strip()
+        substring = self._url_substrings.first_match(url)
+        if substring is not None:
+            return f'url contains {substring!r}'
+        if url in self.urls:
+            return f'url is {url!r}'
+        if self.allowed_url_prefixes and not url.startswith(self.allowed_url_prefixes):
+            return 'url outside allowed prefixes'
+        return None
+
+    def title_drop_rule(self, title:str):
+        title = title.strip().casefold()
+        if title in self.titles:
+            return f'title is {title!r}'
+        substring = self._title_substrings.first_match(title)
+        if substring is not None:
+            return f'title contains {substring!r}'
+        return None
+
+    def _record(self, hits:Counter, checked:int):
+        with self._hits_lock:
+            self.hits.update(hits)
+            self.checked += checked
+
+    def keep_url(self, url:str):
+        """
+        Returns False if the url should be dropped, True otherwise.
+        """
+        rule = self.url_drop_rule(url)
+        self._record(Counter({rule: 1}) if rule else Counter(), 1)
+        return rule is None
+
+    def keep_title(self, title:str):
+        """
+        Returns False if the title should be dropped, True otherwise.
+        """
+        rule = self.title_drop_rule(title)
+        self._record(Counter({rule: 1}) if rule else Counter(), 1)
+        return rule is None
+
+    def keep(self, url:str, title:str):
+        """
+        Returns False if the link should be dropped by its url or its title, True otherwise.
+        """
+        rule = self.url_drop_rule(url) or self.title_drop_rule(title)
+        self._record(Counter({rule: 1}) if rule else Counter(), 1)
+        return rule is None
+
+    def filter_links(self, batch:list):
+        """
+        Filters a batch of {'title', 'url'} link dicts.
+        Repeated urls and titles in the batch are only checked once.
+
+        Returns:
+            list: The links of the batch that are kept, in their original order.
+        """
+        url_rules = {}
+        title_rules = {}
+        hits = Counter()
+        kept = []
+        for link in batch:
+            url = link['url']
+            if url not in url_rules:
+                url_rules[url] = self.url_drop_rule(url)
+            rule = url_rules[url]
+            if rule is None:
+                title = link['title']
+                if title not in title_rules:
+                    title_rules[title] = self.title_drop_rule(title)
+                rule = title_rules[title]
+            if rule is None:
+                kept.append(link)
+            else:
+                hits[rule] += 1
+        self._record(hits, len(batch))
+        return kept
+
+    def stats(self):
+        """
+        Returns the number of links checked and the per rule hit counters.
+        """
+        with self._hits_lock:
+            return {'checked': self.checked, 'dropped': sum(self.hits.values()), 'hits': dict(self.hits)}
+
+
+def load_link_filter(path:str=DEFAULT_RULES_PATH, **overrides):
+    """
+    Loads the shared link filter rules. See LinkFilter.from_file.
+    """
+    return LinkFilter.from_file(path, **overrides)
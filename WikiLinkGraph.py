@@ -0,0 +1,303 @@
+# Imports and Installs
+import os
+import sqlite3
+from collections import deque
+
+# Constants
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS titles (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS edges (
+    source INTEGER NOT NULL,
+    target INTEGER NOT NULL,
+    title INTEGER NOT NULL,
+    in_rank INTEGER NOT NULL,   -- Position of source among the sources of target
+    UNIQUE (source, target)
+);
+"""
+
+
+class LinkGraph:
+    """
+    Directed graph of wiki pages and the links between them.
+
+    Urls and link titles are interned to integer ids once. Every page keeps an
+    insertion ordered map of its targets (target id -> title id) and of its sources,
+    so adding, finding and removing a link are O(1), removing a page is O(its degree),
+    and traversals only touch integers. Each (source, target) pair is stored once,
+    with the title of the first link seen between them.
+
+    Removed pages keep their id, so ids handed out stay stable until the graph is saved
+    and loaded again.
+    """
+
+    def __init__(self):
+        self._ids = {}          # {'url': id}
+        self._urls = []         # [url or None if removed] indexed by id
+        self._out = []          # [{target id: title id}] indexed by id
+        self._in = []           # [{source id: None}] indexed by id, ordered set of sources
+        self._title_ids = {}    # {'title': title id}
+        self._titles = []       # [title] indexed by title id
+        self.edge_count = 0
+
+    # Interning
+    def _intern(self, url:str):
+        node = self._ids.get(url)
+        if node is None:
+            node = self._ids[url] = len(self._urls)
+            self._urls.append(url)
+            self._out.append({})
+            self._in.append({})
+        return node
+
+    def _intern_title(self, title:str):
+        title_id = self._title_ids.get(title)
+        if title_id is None:
+            title_id = self._title_ids[title] = len(self._titles)
+            self._titles.append(title)
+        return title_id
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, url:str):
+        return url in self._ids
+
+    # Nodes
+    def add_node(self, url:str):
+        """
+        Adds a page without links. Returns its id.
+        """
+        return self._intern(url)
+
+    def has_node(self, url:str):
+        return url in self._ids
+
+    def node_id(self, url:str):
+        return self._ids.get(url)
+
+    def urls(self):
+        """
+        Returns every page url, in the order the pages were added.
+        """
+        return list(self._ids)
+
+    def remove_node(self, url:str):
+        """
+        Removes a page and every link from or to it. Returns True if the page was in the graph.
+        """
+        node = self._ids.pop(url, None)
+        if node is None:
+            return False
+        for target in self._out[node]:
+            if target != node:
+                del self._in[target][node]
+        for source in self._in[node]:
+            if source != node:
+                del self._out[source][node]
+        self.edge_count -= len(self._out[node]) + len(self._in[node]) - (node in self._out[node])
+        self._out[node] = {}
+        self._in[node] = {}
+        self._urls[node] = None
+        return True
+
+    # Edges
+    def add_edge(self, source:str, target:str, title:str=''):
+        """
+        Adds a link from source to target, adding the pages if needed.
+
+        Returns:
+            bool: True if the link is new, False if the pages were already linked.
+        """
+        source_id = self._intern(source)
+        target_id = self._intern(target)
+        targets = self._out[source_id]
+        if target_id in targets:
+            return False
+        targets[target_id] = self._intern_title(title)
+        self._in[target_id][source_id] = None
+        self.edge_count += 1
+        return True
+
+    def add_links(self, source:str, links:list):
+        """
+        Adds every {'title', 'url'} link of a page. Returns the number of new links.
+        """
+        return sum(self.add_edge(source, link['url'], link['title']) for link in links)
+
+    def has_edge(self, source:str, target:str):
+        source_id = self._ids.get(source)
+        target_id = self._ids.get(target)
+        return source_id is not None and target_id is not None and target_id in self._out[source_id]
+
+    def remove_edge(self, source:str, target:str):
+        """
+        Removes the link from source to target. Returns True if there was one.
+        """
+        if not self.has_edge(source, target):
+            return False
+        source_id = self._ids[source]
+        target_id = self._ids[target]
+        del self._out[source_id][target_id]
+        del self._in[target_id][source_id]
+        self.edge_count -= 1
+        return True
+
+    def remove_out_links(self, source:str):
+        """
+        Removes every link from source, e.g. before a changed page is parsed again.
+        """
+        source_id = self._ids.get(source)
+        if source_id is None:
+            return 0
+        targets = self._out[source_id]
+        for target in targets:
+            del self._in[target][source_id]
+        self._out[source_id] = {}
+        self.edge_count -= len(targets)
+        return len(targets)
+
+    # Queries
+    def out_links(self, url:str):
+        """
+        Returns the links of a page as {'title', 'url'} dicts, in the order they were added.
+        """
+        node = self._ids.get(url)
+        if node is None:
+            return []
+        return [{'title': self._titles[title], 'url': self._urls[target]} for target, title in self._out[node].items()]
+
+    def in_links(self, url:str):
+        """
+        Returns the urls of the pages linking to a page.
+        """
+        node = self._ids.get(url)
+        if node is None:
+            return []
+        return [self._urls[source] for source in self._in[node]]
+
+    def out_degree(self, url:str):
+        node = self._ids.get(url)
+        return 0 if node is None else len(self._out[node])
+
+    def in_degree(self, url:str):
+        node = self._ids.get(url)
+        return 0 if node is None else len(self._in[node])
+
+    def reachable(self, url:str, max_hops:int=None):
+        """
+        Breadth first search from a page.
+
+        Args:
+            url (str): The page to start from.
+            max_hops (int, optional): Only pages at most this many links away. All reachable pages if None.
+
+        Returns:
+            dict: {'url': number of hops} of every reachable page, the start page at 0, in BFS order.
+        """
+        start = self._ids.get(url)
+        if start is None:
+            return {}
+        hops = {start: 0}
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            distance = hops[node]
+            if max_hops is not None and distance >= max_hops:
+                continue
+            for target in self._out[node]:
+                if target not in hops:
+                    hops[target] = distance + 1
+                    queue.append(target)
+        return {self._urls[node]: distance for node, distance in hops.items()}
+
+    def hierarchy(self):
+        """
+        Returns the graph as {'source url': [{'title', 'url'}, ...]} for every page with links (the old LinkHeirarchy).
+        """
+        return {self._urls[node]: self.out_links(self._urls[node]) for node in self._ids.values() if self._out[node]}
+
+    def sub_links(self):
+        """
+        Returns one {'title', 'source', 'url'} record per linked page, for the first link that reached it (the old SubLinks).
+        """
+        records = []
+        for node in self._ids.values():
+            if not self._in[node]:
+                continue
+            source = next(iter(self._in[node]))
+            records.append({
+                'title': self._titles[self._out[source][node]],
+                'source': self._urls[source],
+                'url': self._urls[node],
+            })
+        return records
+
+    # Persistence
+    def save(self, path:str):
+        """
+        Writes the graph to an SQLite file, replacing what it held. Ids are compacted on the way.
+        """
+        temp_path = path + '.tmp'
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        db = sqlite3.connect(temp_path)
+        try:
+            db.executescript(_SCHEMA)
+            new_ids = {node: new_id for new_id, node in enumerate(self._ids.values())}
+            db.executemany('INSERT INTO nodes (id, url) VALUES (?, ?)',
+                           ((new_ids[node], url) for url, node in self._ids.items()))
+            db.executemany('INSERT INTO titles (id, title) VALUES (?, ?)', enumerate(self._titles))
+            # Rows follow the order of each page's links, in_rank keeps the order of each page's sources
+            in_rank = {node: {source: rank for rank, source in enumerate(self._in[node])} for node in self._ids.values()}
+            db.executemany('INSERT INTO edges (source, target, title, in_rank) VALUES (?, ?, ?, ?)',
+                           ((new_ids[source], new_ids[target], title, in_rank[target][source])
+                            for source in self._ids.values() for target, title in self._out[source].items()))
+            db.commit()
+        finally:
+            db.close()
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path:str):
+        """
+        Reads a graph written by save.
+
+        Raises:
+            ValueError: If the node or title ids of the file do not run 0, 1, 2, ... as save writes them.
+        """
+        graph = cls()
+        db = sqlite3.connect(path)
+        try:
+            for node, url in db.execute('SELECT id, url FROM nodes ORDER BY id'):
+                if graph._intern(url) != node:
+                    raise ValueError(f"{path}: node ids are not contiguous")
+            for title_id, title in db.execute('SELECT id, title FROM titles ORDER BY id'):
+                if title_id != len(graph._titles):
+                    raise ValueError(f"{path}: title ids are not contiguous")
+                graph._title_ids.setdefault(title, title_id)
+                graph._titles.append(title)
+            for source, target, title in db.execute('SELECT source, target, title FROM edges ORDER BY rowid'):
+                graph._out[source][target] = title
+                graph.edge_count += 1
+            for target, source in db.execute('SELECT target, source FROM edges ORDER BY target, in_rank'):
+                graph._in[target][source] = None
+        finally:
+            db.close()
+        return graph
+
+    @classmethod
+    def from_hierarchy(cls, hierarchy:dict):
+        """
+        Builds a graph from {'source url': [{'title', 'url'}, ...]}, e.g. WikiSyncStore.link_hierarchy.
+        """
+        graph = cls()
+        for source, links in hierarchy.items():
+            graph.add_links(source, links)
+        return graph
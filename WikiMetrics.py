@@ -0,0 +1,220 @@
+# Imports and Installs
+import os
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# Constants
+METRICS_ENABLED = os.environ.get('WIKI_METRICS', '1') == '1'     # Set WIKI_METRICS=0 to stop recording (exposition stays)
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Upper bounds in seconds, from a parsed page (~1 ms) to a full crawl (~minutes)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames:tuple, values:tuple, extra:str=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """
+    Base of the metric types: a name, its help text and a value per combination of label values.
+    """
+    kind = None
+
+    def __init__(self, name:str, description:str, labelnames:tuple=(), enabled:bool=METRICS_ENABLED):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.enabled = enabled
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels:dict):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes the labels {self.labelnames}, got {tuple(labels)}")
+        return tuple([labels[name] for name in self.labelnames])     # Label values are turned into text when rendered
+
+    def _header(self):
+        return [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    """
+    Monotonically increasing count, e.g. pages fetched or bytes downloaded.
+    """
+    kind = 'counter'
+
+    def inc(self, value:float=1, **labels):
+        if not self.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return sorted(self._values.items(), key=lambda item: tuple(map(str, item[0])))
+
+    def render(self):
+        lines = self._header()
+        for key, value in self.samples():
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed durations over fixed buckets, with their count and sum.
+
+    Args:
+        buckets (tuple): Increasing upper bounds of the buckets in seconds. +Inf is added.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name:str, description:str, labelnames:tuple=(), buckets:tuple=DEFAULT_BUCKETS, enabled:bool=METRICS_ENABLED):
+        super().__init__(name, description, labelnames, enabled)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, seconds:float, **labels):
+        if not self.enabled:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += seconds
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observes the time spent in the with block, also when it raises.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def summary(self, **labels):
+        """
+        Returns {'count', 'sum'} of the observations with the given labels.
+        """
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return {'count': state[2], 'sum': state[1]} if state else {'count': 0, 'sum': 0.0}
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            states = [(key, [list(state[0]), state[1], state[2]]) for key, state in self._values.items()]
+        states.sort(key=lambda item: tuple(map(str, item[0])))
+        for key, (counts, total, count) in states:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labelnames, key, f'le="{_format_value(float(bound))}"')
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class _Collected:
+    """
+    Metric whose samples are read from a callback at exposition time, e.g. the counters
+    a cache already keeps. The callback returns {(label values): value}.
+    """
+
+    def __init__(self, name:str, description:str, kind:str, labelnames:tuple, collect):
+        self.name = name
+        self.description = description
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.kind}']
+        try:
+            samples = self.collect()
+        except Exception as e:
+            print(f"ERROR: Could not collect metric {self.name} : {e}")
+            return lines
+        for key, value in sorted(samples.items(), key=lambda item: str(item[0])):
+            key = key if isinstance(key, tuple) else (key,)
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Process wide set of metrics, rendered in the Prometheus text exposition format.
+    Recording is thread safe and costs a dict lookup and a lock (about a microsecond),
+    so it can stay on the hot path.
+
+    Args:
+        enabled (bool): Record observations. A disabled registry still renders its metrics, all empty.
+    """
+
+    def __init__(self, enabled:bool=METRICS_ENABLED):
+        self.enabled = enabled
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name:str, description:str, labelnames:tuple=()):
+        return self._register(Counter(name, description, labelnames, enabled=self.enabled))
+
+    def histogram(self, name:str, description:str, labelnames:tuple=(), buckets:tuple=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, description, labelnames, buckets, enabled=self.enabled))
+
+    def collected(self, name:str, description:str, collect, labelnames:tuple=(), kind:str='counter'):
+        """
+        Registers a metric read from collect() whenever the metrics are rendered.
+
+        Args:
+            collect (callable): Returns {(label values) or label value: number}.
+            kind (str): 'counter' or 'gauge'.
+        """
+        return self._register(_Collected(name, description, kind, labelnames, collect))
+
+    def render(self):
+        """
+        Returns all metrics in the Prometheus text exposition format (version 0.0.4).
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,127 @@
+# Imports and Installs
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+# Constants
+DEFAULT_MAX_BATCH_SIZE = 64     # Items handed to the batch function at most at once
+DEFAULT_MAX_WAIT_MS = 2.0       # How long the oldest queued item waits for others to join its batch
+
+
+class MicroBatcher:
+    """
+    Groups concurrent single-item calls into batches for a function that handles many items at once.
+
+    Callers submit one item and get a Future. A worker thread takes up to max_batch_size
+    queued items as soon as the batch is full or the oldest of them has waited max_wait_ms,
+    runs function(items) once and hands every caller its own result. While a batch runs,
+    new items queue up, so under load batches fill up by themselves and an idle batcher
+    adds at most max_wait_ms to a single call.
+
+    Args:
+        function (callable): Takes a list of items, returns a list of results in the same order.
+        max_batch_size (int): Largest batch passed to function.
+        max_wait_ms (float): Longest time an item waits for its batch to fill up.
+        name (str): Name of the worker thread.
+    """
+
+    def __init__(self, function, max_batch_size:int=DEFAULT_MAX_BATCH_SIZE, max_wait_ms:float=DEFAULT_MAX_WAIT_MS,
+                 name:str='micro-batcher'):
+        self.function = function
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue = deque()       # (item, future, time queued)
+        self._condition = threading.Condition()
+        self._closed = False
+        self.batches = 0            # Calls made to function
+        self.items = 0              # Items passed to function
+        self.largest_batch = 0
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, item):
+        """
+        Queues an item. Returns a concurrent.futures.Future of its result.
+
+        Raises:
+            RuntimeError: If the batcher was closed.
+        """
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('MicroBatcher is closed')
+            self._queue.append((item, future, time.perf_counter()))
+            if len(self._queue) == 1 or len(self._queue) >= self.max_batch_size:
+                self._condition.notify()
+        return future
+
+    def __call__(self, item, timeout:float=None):
+        """
+        Runs one item through the batcher and waits for its result.
+
+        Raises:
+            concurrent.futures.TimeoutError: If the result is not ready within timeout seconds.
+            Exception: Whatever function raised for the batch of the item.
+        """
+        return self.submit(item).result(timeout)
+
+    def _next_batch(self):
+        with self._condition:
+            while not self._queue and not self._closed:
+                self._condition.wait()
+            if not self._queue:
+                return None
+            # The oldest item sets the deadline, so items that queued while a batch ran go out at once
+            deadline = self._queue[0][2] + self.max_wait
+            while len(self._queue) < self.max_batch_size and not self._closed:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return [self._queue.popleft() for _ in range(min(len(self._queue), self.max_batch_size))]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            batch = [(item, future) for item, future, _ in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+            try:
+                results = self.function([item for item, _ in batch])
+                if len(results) != len(batch):
+                    raise ValueError(f"Batch function returned {len(results)} results for {len(batch)} items")
+            except BaseException as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self):
+        """
+        Returns {'batches', 'items', 'mean_batch_size', 'largest_batch', 'queued'}.
+        """
+        with self._condition:
+            queued = len(self._queue)
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'mean_batch_size': round(self.items / self.batches, 2) if self.batches else 0.0,
+            'largest_batch': self.largest_batch,
+            'queued': queued,
+        }
+
+    def close(self, timeout:float=None):
+        """
+        Stops accepting items, runs the ones already queued and stops the worker.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._worker.join(timeout)
@@ -0,0 +1,148 @@
+# Imports and Installs
+import threading
+import importlib.util
+# The parsers are imported on first use (see _load_lxml / _load_bs4): BeautifulSoup alone takes
+# ~200 ms to import and is only needed when lxml is missing or gives up on a page
+
+# Constants
+BACKENDS = ('lxml', 'bs4')
+LXML_AVAILABLE = importlib.util.find_spec('lxml') is not None     # lxml is optional, BeautifulSoup is always available
+DEFAULT_BACKEND = 'lxml' if LXML_AVAILABLE else 'bs4'
+_SKIPPED_TEXT_TAGS = {'script', 'style', 'template'}     # get_text() leaves these out as well
+
+_lxml = None            # (etree, lxml.html, shared HTMLParser) once imported
+_bs4 = None             # (BeautifulSoup, NavigableString, exact string types get_text() collects) once imported
+_load_lock = threading.Lock()
+
+
+def _load_lxml():
+    global _lxml
+    if _lxml is None:
+        with _load_lock:
+            if _lxml is None:
+                from lxml import etree, html as lxml_html
+                _lxml = (etree, lxml_html, lxml_html.HTMLParser(encoding='utf-8'))
+    return _lxml
+
+
+def _load_bs4():
+    global _bs4
+    if _bs4 is None:
+        with _load_lock:
+            if _bs4 is None:
+                from bs4 import BeautifulSoup, NavigableString, CData
+                _bs4 = (BeautifulSoup, NavigableString, (NavigableString, CData))
+    return _bs4
+
+
+def warm_up(backend:str=None):
+    """
+    Imports the parser of backend (default: DEFAULT_BACKEND) ahead of the first page, e.g. from a
+    background thread while a process is starting.
+    """
+    if (backend or DEFAULT_BACKEND) == 'lxml' and LXML_AVAILABLE:
+        _load_lxml()
+    else:
+        _load_bs4()
+
+
+def _page_from_parts(title, strings, anchors, separator, resolve_url, keep_link):
+    """
+    Builds the page dict from the raw strings and (text, href) anchor pairs of a document.
+    """
+    links = []
+    for text, href in anchors:
+        url = resolve_url(href) if resolve_url else href
+        if keep_link is None or keep_link(url, text):
+            links.append({
+                'title': text,
+                'url': url
+            })
+    return {
+        'title': title,
+        'text': separator.join(strings),
+        'links': links,
+    }
+
+
+def _extract_bs4(html_content, separator, resolve_url, keep_link):
+    BeautifulSoup, NavigableString, text_string_types = _load_bs4()
+    soup = BeautifulSoup(html_content, "html.parser")
+    title = ''
+    strings = []
+    anchors = []
+    # One walk over the tree collects the text, the anchors and the title
+    for node in soup.descendants:
+        if isinstance(node, NavigableString):
+            if type(node) in text_string_types:
+                text = node.strip()
+                if text:
+                    strings.append(text)
+        elif node.name == 'a' and node.has_attr('href'):
+            anchors.append((node.get_text(strip=True), node['href']))
+        elif node.name == 'title' and not title:
+            title = node.get_text(strip=True)
+    return _page_from_parts(title, strings, anchors, separator, resolve_url, keep_link)
+
+
+def _extract_lxml(html_content, separator, resolve_url, keep_link):
+    etree, lxml_html, parser = _load_lxml()
+    if isinstance(html_content, str):
+        html_content = html_content.encode('utf-8')     # lxml rejects str input with an encoding declaration
+    root = lxml_html.document_fromstring(html_content, parser=parser)
+    title = ''
+    strings = []
+    anchors = []
+    open_anchors = []       # (element, href, index of its first string) for every <a> we are inside
+    # Comments and processing instructions only get a 'comment' / 'pi' event, their own text is
+    # left out like get_text() does, but the text after them (their tail) belongs to the page
+    for event, element in etree.iterwalk(root, events=('start', 'end', 'comment', 'pi')):
+        tag = element.tag
+        if event == 'start':
+            if tag == 'a' and element.get('href') is not None:
+                open_anchors.append((element, element.get('href'), len(strings)))
+            elif tag == 'title' and not title:
+                title = (element.text or '').strip()
+            if tag not in _SKIPPED_TEXT_TAGS and element.text:
+                text = element.text.strip()
+                if text:
+                    strings.append(text)
+        else:
+            if open_anchors and open_anchors[-1][0] is element:
+                _, href, first = open_anchors.pop()
+                anchors.append((''.join(strings[first:]), href))
+            if element.tail:
+                text = element.tail.strip()
+                if text:
+                    strings.append(text)
+    return _page_from_parts(title, strings, anchors, separator, resolve_url, keep_link)
+
+
+def extract_page(html_content, resolve_url=None, keep_link=None, separator:str='\n', backend:str=None):
+    """
+    Parses the document once and returns its title, plain text and hyperlinks together.
+
+    The text matches BeautifulSoup's get_text(separator=separator, strip=True) and the link
+    titles match anchor.get_text(strip=True). The lxml backend only differs on markup
+    html.parser keeps but lxml drops, such as CDATA sections.
+
+    Args:
+        html_content (str): HTML string to parse.
+        resolve_url (callable, optional): resolve_url(href) -> absolute url. Hrefs are returned as-is if None.
+        keep_link (callable, optional): keep_link(url, title) -> bool. All links are kept if None.
+        separator (str): String placed between the text fragments of the page.
+        backend (str, optional): 'lxml' or 'bs4'. Defaults to lxml when it is installed.
+
+    Returns:
+        dict: {'title': str, 'text': str, 'links': list of {'title', 'url'} dicts}
+    """
+    backend = backend or DEFAULT_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown html backend '{backend}', expected one of {BACKENDS}")
+    if backend == 'lxml' and LXML_AVAILABLE and html_content:
+        etree = _load_lxml()[0]
+        try:
+            return _extract_lxml(html_content, separator, resolve_url, keep_link)
+        except (etree.ParserError, ValueError):
+            pass    # Fall back to the forgiving html.parser tree below
+    return _extract_bs4(html_content, separator, resolve_url, keep_link)
@@ -0,0 +1,317 @@
+# Imports and Installs
+import os
+import time
+import zlib
+import asyncio
+import sqlite3
+import hashlib
+import threading
+import WikiHttpClient as http_client
+
+# Constants
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024      # Compressed size the store is evicted down to
+DEFAULT_MAX_AGE_SECONDS = 0                # Pages younger than this are served without revalidating
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    content_hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_by_access ON pages (last_access);
+CREATE INDEX IF NOT EXISTS pages_by_hash ON pages (content_hash);
+"""
+
+
+class PageNotInStoreError(LookupError):
+    """
+    Raised in offline mode when a url has never been stored.
+    """
+
+
+class WikiPageStore:
+    """
+    Local page store keyed by url and content hash.
+
+    Page bodies are stored once per distinct content (sha256, zlib compressed) under
+    root/objects, and an SQLite index maps every url to its content hash together with
+    the ETag / Last-Modified the server sent. Fetches revalidate stored pages with a
+    conditional GET, so unchanged pages cost a 304. The store is kept under max_bytes by
+    evicting the least recently used urls. In offline mode pages are only served from
+    the store and the network is never touched.
+
+    Args:
+        root (str): Directory of the store. Created if missing.
+        max_bytes (int): Compressed size the store is evicted down to.
+        offline (bool): Serve only from the store (replay mode).
+        max_age (float): Seconds a stored page is served without revalidating it. 0 always revalidates.
+    """
+
+    def __init__(self, root:str, max_bytes:int=DEFAULT_MAX_BYTES, offline:bool=False,
+                 max_age:float=DEFAULT_MAX_AGE_SECONDS):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.max_age = max_age
+        self.hits = 0           # Served from the store without a network round trip
+        self.revalidated = 0    # Served from the store after a 304
+        self.misses = 0         # Downloaded in full
+        self.downloaded_bytes = 0   # Size of the pages downloaded in full (utf-8)
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, 'index.sqlite3'), check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+
+    # Blobs
+    def _blob_path(self, content_hash:str):
+        return os.path.join(self.root, 'objects', content_hash[:2], content_hash)
+
+    def _write_blob(self, content_hash:str, data:bytes):
+        path = self._blob_path(content_hash)
+        if os.path.exists(path):
+            return os.path.getsize(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        compressed = zlib.compress(data, 6)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(compressed)
+        os.replace(temp_path, path)
+        return len(compressed)
+
+    def _read_blob(self, content_hash:str):
+        with open(self._blob_path(content_hash), 'rb') as f:
+            return zlib.decompress(f.read()).decode('utf-8')
+
+    def _drop_unreferenced_blob(self, content_hash:str):
+        referenced = self._db.execute('SELECT 1 FROM pages WHERE content_hash = ? LIMIT 1', (content_hash,)).fetchone()
+        if referenced:
+            return
+        self._db.execute('DELETE FROM blobs WHERE content_hash = ?', (content_hash,))
+        try:
+            os.remove(self._blob_path(content_hash))
+        except FileNotFoundError:
+            pass
+
+    # Index
+    def get(self, url:str):
+        """
+        Returns the stored page for url, or None if it is not stored.
+
+        Returns:
+            dict: {'url', 'content', 'content_hash', 'etag', 'last_modified', 'fetched_at'}
+        """
+        with self._lock:
+            row = self._db.execute(
+                'SELECT content_hash, etag, last_modified, fetched_at FROM pages WHERE url = ?', (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute('UPDATE pages SET last_access = ? WHERE url = ?', (time.time(), url))
+            self._db.commit()
+        content_hash, etag, last_modified, fetched_at = row
+        try:
+            content = self._read_blob(content_hash)
+        except (OSError, zlib.error):
+            self.remove(url)    # Blob went missing or is corrupt, treat the page as not stored
+            return None
+        return {
+            'url': url,
+            'content': content,
+            'content_hash': content_hash,
+            'etag': etag,
+            'last_modified': last_modified,
+            'fetched_at': fetched_at,
+        }
+
+    def put(self, url:str, content:str, etag:str=None, last_modified:str=None):
+        """
+        Stores the content of url and evicts old pages if the store grew past max_bytes.
+
+        Returns:
+            str: The content hash the page is stored under.
+        """
+        data = content.encode('utf-8')
+        content_hash = hashlib.sha256(data).hexdigest()
+        now = time.time()
+        with self._lock:
+            size = self._write_blob(content_hash, data)
+            previous = self._db.execute('SELECT content_hash FROM pages WHERE url = ?', (url,)).fetchone()
+            self._db.execute('INSERT OR IGNORE INTO blobs (content_hash, size) VALUES (?, ?)', (content_hash, size))
+            self._db.execute(
+                'INSERT OR REPLACE INTO pages (url, content_hash, etag, last_modified, fetched_at, last_access) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (url, content_hash, etag, last_modified, now, now)
+            )
+            if previous and previous[0] != content_hash:
+                self._drop_unreferenced_blob(previous[0])
+            self._evict()
+            self._db.commit()
+        return content_hash
+
+    def touch(self, url:str):
+        """
+        Marks a stored page as revalidated just now.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute('UPDATE pages SET fetched_at = ?, last_access = ? WHERE url = ?', (now, now, url))
+            self._db.commit()
+
+    def remove(self, url:str):
+        """
+        Removes url from the store. The blob is deleted once no url references it.
+        """
+        with self._lock:
+            row = self._db.execute('SELECT content_hash FROM pages WHERE url = ?', (url,)).fetchone()
+            if row is None:
+                return
+            self._db.execute('DELETE FROM pages WHERE url = ?', (url,))
+            self._drop_unreferenced_blob(row[0])
+            self._db.commit()
+
+    def size(self):
+        """
+        Returns the compressed size in bytes of every blob in the store.
+        """
+        return self._db.execute('SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()[0]
+
+    def _evict(self):
+        # Caller holds the lock. Drops least recently used urls until the store fits again.
+        total = self.size()
+        if total <= self.max_bytes:
+            return
+        rows = self._db.execute('SELECT url, content_hash FROM pages ORDER BY last_access').fetchall()
+        for url, content_hash in rows:
+            if total <= self.max_bytes:
+                break
+            self._db.execute('DELETE FROM pages WHERE url = ?', (url,))
+            blob = self._db.execute('SELECT size FROM blobs WHERE content_hash = ?', (content_hash,)).fetchone()
+            self._drop_unreferenced_blob(content_hash)
+            if blob and not self._db.execute('SELECT 1 FROM blobs WHERE content_hash = ?', (content_hash,)).fetchone():
+                total -= blob[0]
+
+    def stats(self):
+        """
+        Returns counters describing the store and how fetches were served.
+        """
+        with self._lock:
+            pages = self._db.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+            blobs = self._db.execute('SELECT COUNT(*) FROM blobs').fetchone()[0]
+            size = self.size()
+            return {
+                'pages': pages,
+                'blobs': blobs,
+                'bytes': size,
+                'hits': self.hits,
+                'revalidated': self.revalidated,
+                'misses': self.misses,
+                'downloaded_bytes': self.downloaded_bytes,
+            }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # Fetching
+    def _count(self, counter:str, amount:int=1):
+        # Fetches run on the crawler's worker threads, a bare += would lose updates
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def _serve_stored(self, url:str, stored:dict):
+        """
+        Returns the stored content of url if it can be served without a request, else None.
+        """
+        if self.offline:
+            if stored is None:
+                raise PageNotInStoreError(f"{url} is not in the page store (offline mode)")
+        elif stored is None or not self.max_age or time.time() - stored['fetched_at'] >= self.max_age:
+            return None
+        self._count('hits')
+        return stored['content']
+
+    @staticmethod
+    def _conditional_headers(stored:dict, headers:dict=None):
+        request_headers = dict(headers or {})
+        if stored is not None:
+            if stored['etag']:
+                request_headers['If-None-Match'] = stored['etag']
+            if stored['last_modified']:
+                request_headers['If-Modified-Since'] = stored['last_modified']
+        return request_headers
+
+    def _record_revalidated(self, url:str):
+        self._count('revalidated')
+        self.touch(url)
+
+    def _record_download(self, url:str, response):
+        self._count('misses')
+        self._count('downloaded_bytes', len(response.text.encode('utf-8')))
+        self.put(url, response.text, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+
+    def fetch(self, url:str, headers:dict=None, timeout=None):
+        """
+        Returns the html of url, from the store when it is still valid.
+
+        Stored pages younger than max_age are returned directly. Older ones are
+        revalidated with a conditional GET and only downloaded again if they changed.
+
+        Args:
+            url (str): The url to fetch.
+            headers (dict, optional): Extra request headers.
+            timeout (optional): Request timeout, the http client default if None.
+
+        Returns:
+            str: The HTML content as a string.
+
+        Raises:
+            PageNotInStoreError: In offline mode, if the url was never stored.
+            Exception: If the GET request fails or an HTTP error occurs.
+        """
+        stored = self.get(url)
+        content = self._serve_stored(url, stored)
+        if content is not None:
+            return content
+        response = http_client.get(url, headers=self._conditional_headers(stored, headers), timeout=timeout)
+        if response.status_code == 304 and stored is not None:
+            self._record_revalidated(url)
+            return stored['content']
+        response.raise_for_status()
+        self._record_download(url, response)
+        return response.text
+
+    async def fetch_async(self, url:str, get, headers:dict=None):
+        """
+        asyncio version of fetch, for the async (ASGI) service.
+        The network request goes through the given async get, store reads and writes run in a worker thread.
+
+        Args:
+            url (str): The url to fetch.
+            get (callable): async get(url, headers) -> response with status_code, text, headers and raise_for_status().
+            headers (dict, optional): Extra request headers.
+
+        Returns:
+            str: The HTML content as a string.
+
+        Raises:
+            PageNotInStoreError: In offline mode, if the url was never stored.
+            Exception: If the GET request fails or an HTTP error occurs.
+        """
+        stored = await asyncio.to_thread(self.get, url)
+        content = self._serve_stored(url, stored)
+        if content is not None:
+            return content
+        response = await get(url, self._conditional_headers(stored, headers))
+        if response.status_code == 304 and stored is not None:
+            await asyncio.to_thread(self._record_revalidated, url)
+            return stored['content']
+        response.raise_for_status()
+        await asyncio.to_thread(self._record_download, url, response)
+        return response.text
@@ -0,0 +1,392 @@
+# Imports and Installs
+import os
+import re
+import json
+import time
+import bisect
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from WikiVersionCache import fetch_if_modified, DEFAULT_TTL_SECONDS
+from WikiPageExtractor import LXML_AVAILABLE
+
+# Constants
+VERSION_PATTERN = re.compile(r'\b(?:version|release|revision|rev|v)\.?\s*:?\s*(\d+(?:\.\d+){1,3})\b', re.IGNORECASE)
+LEADING_VERSION_PATTERN = re.compile(r'^\W*(\d+(?:\.\d+){1,3})\b')      # "2.9.6 - ..." in a table cell or list item
+HEADING_TAGS = ('h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+TOKEN_PATTERN = re.compile(r'\w+')
+_MONTHS = ('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec')
+_MONTH = r'(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?'
+# (pattern, order of the year / month / day groups), month names are matched in English
+DATE_PATTERNS = (
+    (re.compile(r'\b(\d{4})-(\d{1,2})-(\d{1,2})\b'), 'ymd'),
+    (re.compile(r'\b(\d{1,2})[./](\d{1,2})[./](\d{4})\b'), 'dmy'),          # Day first, as written in Sweden
+    (re.compile(r'\b(\d{1,2})(?:st|nd|rd|th)?\s+' + _MONTH + r',?\s+(\d{4})\b', re.IGNORECASE), 'dMy'),
+    (re.compile(r'\b' + _MONTH + r'\s+(\d{1,2})(?:st|nd|rd|th)?,?\s+(\d{4})\b', re.IGNORECASE), 'Mdy'),
+)
+DATE_LABEL_PATTERN = re.compile(r'^\W*(?:date|released|release date|published|released on)?\W*$', re.IGNORECASE)
+
+
+def version_key(version:str):
+    """
+    Returns the sort key of a dotted version number, e.g. (2, 9, 6) for '2.9.6'.
+
+    Raises:
+        ValueError: If version is not a dotted number.
+    """
+    return tuple(int(part) for part in version.strip().split('.'))
+
+
+def parse_date(text:str):
+    """
+    Returns the first date written in text as 'YYYY-MM-DD', and the span it was found at,
+    or (None, None) if text holds no date.
+    """
+    found = None
+    for pattern, order in DATE_PATTERNS:
+        match = pattern.search(text)
+        if match and (found is None or match.start() < found[0].start()):
+            found = (match, order)
+    if found is None:
+        return None, None
+    match, order = found
+    parts = dict(zip(order, match.groups()))
+    month = _MONTHS.index(parts['M'][:3].lower()) + 1 if 'M' in parts else int(parts['m'])
+    try:
+        date = datetime.date(int(parts['y']), month, int(parts['d']))
+    except ValueError:
+        return None, None
+    return date.isoformat(), match.span()
+
+
+def _find_version(text:str):
+    match = VERSION_PATTERN.search(text) or LEADING_VERSION_PATTERN.search(text)
+    return match.group(1) if match else None
+
+
+def _change_lines(text:str, version:str):
+    """
+    The lines of a release card that describe its changes. The version and the date are cut out
+    of the lines that hold them, and lines left with nothing but a label like 'Date:' are dropped.
+    """
+    lines = []
+    for line in text.splitlines():
+        line = ' '.join(line.split())
+        rest = line
+        if version in rest:
+            rest = VERSION_PATTERN.sub('', rest, count=1).replace(version, '', 1)
+        _, span = parse_date(rest)
+        if span:
+            rest = rest[:span[0]] + rest[span[1]:]
+        if rest is line:
+            lines.append(line)
+        elif not DATE_LABEL_PATTERN.match(rest):
+            lines.append(' '.join(rest.split()).strip(' -:()[],'))
+    return [line for line in lines if line]
+
+
+def _record(feed:str, version:str, text:str):
+    date, _ = parse_date(text)
+    return {'feed': feed, 'version': version, 'date': date, 'changes': '\n'.join(_change_lines(text, version))}
+
+
+def _section_text(heading):
+    """
+    Text of a heading and of everything after it up to the next heading of the same or a higher level.
+    Handles both MediaWiki heading layouts, <h2> and <div class="mw-heading"><h2></div>.
+    """
+    level = int(heading.name[1])
+    anchor = heading
+    if heading.parent is not None and 'mw-heading' in (heading.parent.get('class') or []):
+        anchor = heading.parent
+    parts = [heading.get_text(' ', strip=True)]
+    for sibling in anchor.find_next_siblings():
+        inner = sibling
+        if 'mw-heading' in (sibling.get('class') or []):
+            inner = sibling.find(HEADING_TAGS) or sibling
+        if inner.name in HEADING_TAGS and int(inner.name[1]) <= level:
+            break
+        parts.append(sibling.get_text('\n', strip=True))
+    return '\n'.join(parts)
+
+
+def parse_release_history(html:str, feed:str):
+    """
+    Parses a release history or release notes page into one record per release.
+    Releases are found in <pre> cards (the software revision history), in sections under a
+    heading naming the version, and in table rows whose first cell is the version. A release
+    found in several places keeps its first record, completed with the date of the others.
+
+    Args:
+        html (str): HTML of the page.
+        feed (str): Name of the feed, stored in every record.
+
+    Returns:
+        list: {'feed', 'version', 'date', 'changes'} dicts in page order. date is 'YYYY-MM-DD' or None.
+    """
+    from bs4 import BeautifulSoup   # Imported here, like in WikiEndpoints.build_version_map, it slows the startup down
+
+    soup = BeautifulSoup(html, 'lxml' if LXML_AVAILABLE else 'html.parser')
+    for tag in soup(['script', 'style']):
+        tag.decompose()
+    records = {}
+
+    def add(version, text):
+        record = _record(feed, version, text)
+        existing = records.get(version)
+        if existing is None:
+            records[version] = record
+        elif existing['date'] is None:
+            existing['date'] = record['date']
+
+    for pre in soup.find_all('pre'):
+        text = pre.get_text('\n')
+        version = _find_version(text)
+        if version:
+            add(version, text)
+    for heading in soup.find_all(HEADING_TAGS):
+        version = _find_version(heading.get_text(' ', strip=True))
+        if version:
+            add(version, _section_text(heading))
+    for row in soup.find_all('tr'):
+        cells = [cell.get_text('\n', strip=True) for cell in row.find_all(['td', 'th'], recursive=False)]
+        version = _find_version(cells[0]) if cells and row.find('td', recursive=False) else None
+        if version:
+            add(version, '\n'.join(cells))
+    return list(records.values())
+
+
+class FeedIndex:
+    """
+    Releases of one feed sorted by version, with an inverted index of the words of their changes.
+    Immutable once built, so readers never need a lock.
+
+    Args:
+        records (list): Release records of the feed, in any order.
+    """
+
+    def __init__(self, records:list):
+        self.records = sorted(records, key=lambda record: version_key(record['version']))
+        self.keys = [version_key(record['version']) for record in self.records]
+        self.postings = {}      # {'word': [positions in self.records, ascending]}
+        for position, record in enumerate(self.records):
+            for token in set(TOKEN_PATTERN.findall(record['changes'].lower())):
+                self.postings.setdefault(token, []).append(position)
+
+    def __len__(self):
+        return len(self.records)
+
+    def latest(self):
+        return self.records[-1] if self.records else None
+
+    def release(self, version:str):
+        """
+        O(log n) lookup of a release by its exact version. Returns None if it is not listed.
+        """
+        key = version_key(version)
+        position = bisect.bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            return self.records[position]
+        return None
+
+    def releases(self, low:str=None, high:str=None):
+        """
+        Releases from low to high, both included, oldest first. O(log n + results).
+        A high bound of '2.9' also includes 2.9.6 and every other release starting with 2.9.
+        """
+        start = bisect.bisect_left(self.keys, version_key(low)) if low else 0
+        end = bisect.bisect_right(self.keys, version_key(high) + (float('inf'),)) if high else len(self.keys)
+        return self.records[start:end]
+
+    def introduced(self, query:str):
+        """
+        The oldest release whose changes mention query: the words of query are looked up in the
+        inverted index, and the oldest candidate containing the whole phrase wins over one that
+        only contains its words. Returns None if no release mentions all words.
+        """
+        tokens = set(TOKEN_PATTERN.findall(query.lower()))
+        if not tokens:
+            return None
+        postings = sorted((self.postings.get(token, []) for token in tokens), key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        if not candidates:
+            return None
+        phrase = ' '.join(query.lower().split())
+        ordered = sorted(candidates)
+        for position in ordered:
+            if phrase in ' '.join(self.records[position]['changes'].lower().split()):
+                return self.records[position]
+        return self.records[ordered[0]]
+
+
+class ReleaseIndex:
+    """
+    Persisted, sorted index of the releases listed on the release history pages.
+
+    All pages are revalidated concurrently with a conditional GET and only the ones that
+    changed are parsed again. Like VersionMapCache, reads never wait on the upstream once
+    the index has data: a stale index is served while a background thread refreshes it.
+
+    Args:
+        sources (dict): {'feed': 'url'} of the release history pages.
+        cache_path (str, optional): JSON file the index is persisted to. None disables persistence.
+        ttl (int): Seconds before the index is considered stale.
+    """
+
+    def __init__(self, sources:dict, cache_path:str=None, ttl:int=DEFAULT_TTL_SECONDS):
+        self.sources = dict(sources)
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.feeds = {feed: FeedIndex([]) for feed in self.sources}
+        self.state = {feed: {'etag': None, 'last_modified': None, 'fetched_at': 0.0, 'error': None} for feed in self.sources}
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self.load()
+
+    # Persistence
+    def load(self):
+        """
+        Loads a previously persisted index from cache_path, if there is one.
+        Feeds whose url changed since are left empty, so they are fetched again.
+        """
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"ERROR: Could not read release index {self.cache_path} : {e}")
+            return
+        for feed, entry in saved.get('feeds', {}).items():
+            if self.sources.get(feed) != entry.get('url'):
+                continue
+            self.feeds[feed] = FeedIndex(entry.get('records', []))
+            self.state[feed].update({name: entry.get(name) for name in ('etag', 'last_modified')}, fetched_at=entry.get('fetched_at', 0.0))
+
+    def save(self):
+        """
+        Persists the index to cache_path. Written to a temp file first so readers never see a partial file.
+        """
+        if not self.cache_path:
+            return
+        with self._lock:
+            saved = {'feeds': {
+                feed: {'url': self.sources[feed], 'etag': self.state[feed]['etag'], 'last_modified': self.state[feed]['last_modified'],
+                       'fetched_at': self.state[feed]['fetched_at'], 'records': self.feeds[feed].records}
+                for feed in self.sources
+            }}
+        temp_path = self.cache_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(saved, f, indent=1)
+        os.replace(temp_path, self.cache_path)
+
+    # Freshness
+    def age(self):
+        """
+        Seconds since the least recently fetched feed was fetched.
+        """
+        return time.time() - min(state['fetched_at'] for state in self.state.values())
+
+    def is_stale(self):
+        return self.age() > self.ttl
+
+    def has_data(self):
+        return any(state['fetched_at'] for state in self.state.values())
+
+    # Refresh
+    def _refresh_feed(self, feed:str):
+        state = self.state[feed]
+        html, etag, last_modified = fetch_if_modified(self.sources[feed], state['etag'], state['last_modified'])
+        if html is None:
+            return feed, None, etag, last_modified
+        return feed, FeedIndex(parse_release_history(html, feed)), etag, last_modified
+
+    def refresh(self):
+        """
+        Revalidates every feed concurrently and rebuilds the ones whose page changed.
+        A feed that cannot be fetched keeps its previous releases.
+
+        Returns:
+            dict: {'feed': 'rebuilt' | 'not modified' | 'error: message'}
+        """
+        summary = {}
+        with ThreadPoolExecutor(max_workers=len(self.sources) or 1) as pool:
+            futures = {feed: pool.submit(self._refresh_feed, feed) for feed in self.sources}
+            for feed, future in futures.items():
+                try:
+                    _, index, etag, last_modified = future.result()
+                except Exception as e:
+                    print(f"ERROR: Could not refresh the {feed} release history : {e}")
+                    self.state[feed]['error'] = str(e)
+                    summary[feed] = f'error: {e}'
+                    continue
+                with self._lock:
+                    if index is not None:
+                        self.feeds[feed] = index
+                    self.state[feed].update(etag=etag, last_modified=last_modified, fetched_at=time.time(), error=None)
+                summary[feed] = 'rebuilt' if index is not None else 'not modified'
+        self.save()
+        return summary
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"ERROR: Background refresh of release index failed : {e}")
+        finally:
+            self._refreshing = False
+
+    def refresh_async(self):
+        """
+        Starts a background refresh unless one is already running.
+        """
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh_in_background, daemon=True).start()
+
+    def ensure_fresh(self, force_refresh:bool=False):
+        """
+        Refreshes the index first only if it has no data or a refresh is forced, and in the background if it is stale.
+
+        Returns:
+            ReleaseIndex: self, for chaining a query.
+        """
+        if force_refresh or not self.has_data():
+            self.refresh()
+        elif self.is_stale():
+            self.refresh_async()
+        return self
+
+    # Reads
+    def feed(self, feed:str):
+        """
+        Returns the FeedIndex of feed.
+
+        Raises:
+            KeyError: If feed is not one of the sources.
+        """
+        return self.feeds[feed]
+
+    def summary(self):
+        """
+        Returns {'feed': {'url', 'releases', 'latest', 'fetched_at', 'error'}} of every feed.
+        """
+        result = {}
+        for feed, url in self.sources.items():
+            index, state = self.feeds[feed], self.state[feed]
+            latest = index.latest()
+            result[feed] = {'url': url, 'releases': len(index), 'latest': latest['version'] if latest else None,
+                            'fetched_at': state['fetched_at'] or None, 'error': state['error']}
+        return result
+
+    def introduced(self, query:str, feed:str=None):
+        """
+        The oldest release of every feed (or of the given feed) whose changes mention query.
+
+        Returns:
+            list: The matching records, one per feed at most.
+        """
+        feeds = [feed] if feed else list(self.sources)
+        return [record for record in (self.feeds[name].introduced(query) for name in feeds) if record is not None]
@@ -0,0 +1,464 @@
+# Imports and Installs
+import os
+import re
+import sys
+import json
+import math
+import mmap
+import zlib
+import heapq
+import struct
+import threading
+from array import array
+from collections import Counter
+
+# Constants
+BM25_K1 = 1.2                   # Term frequency saturation
+BM25_B = 0.75                   # Document length normalisation
+SNIPPET_CHARS = 200             # Length of the text shown around the first query term
+SNIPPET_LEAD_CHARS = 60         # Text kept before the first query term
+COMPACT_MIN_CHANGES = 200       # Logged changes before they are merged into the segment ...
+COMPACT_CHANGE_RATIO = 0.1      # ... or once they reach this share of the segment's documents
+
+_TOKEN = re.compile(r'\w+')
+_MAGIC = b'WSIX'
+_FORMAT_VERSION = 1
+_HEADER = struct.Struct('<4sIIIQQQQ')     # magic, format, docs, terms, total length, docs / terms / postings offsets
+_DOC = struct.Struct('<QIIQII')           # url offset, url bytes, title bytes (the title follows the url), text offset, text bytes, length
+_TERM = struct.Struct('<QIQI')            # term offset, term bytes, postings offset, document frequency
+
+
+def tokenize(text:str):
+    """
+    Splits text into lowercase word tokens, the same way for pages and queries.
+    """
+    return _TOKEN.findall(text.lower())
+
+
+def make_snippet(text:str, terms, length:int=SNIPPET_CHARS, lead:int=SNIPPET_LEAD_CHARS):
+    """
+    Returns about length characters of text around the first occurrence of any of terms, on word boundaries.
+    """
+    match = None
+    if terms:
+        pattern = r'(?<!\w)(?:' + '|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True)) + r')(?!\w)'
+        match = re.search(pattern, text, re.IGNORECASE)
+    start = 0
+    if match and match.start() > lead:
+        start = text.find(' ', match.start() - lead, match.start())
+        start = match.start() - lead if start == -1 else start + 1
+    end = start + length
+    if end < len(text):
+        space = text.rfind(' ', start, end)
+        end = space if space > start else end
+    snippet = ' '.join(text[start:end].split())
+    return ('...' if start > 0 else '') + snippet + ('...' if end < len(text) else '')
+
+
+class _Segment:
+    """
+    Read-only, memory-mapped index file of one version.
+
+    Layout (little endian): header, one fixed-size record per document, one fixed-size
+    record per term sorted by term, the postings (document ids, then term frequencies,
+    as uint32 arrays) and the strings (urls, titles, terms and zlib compressed texts).
+    Terms are found by binary search over the term records, so only the documents table
+    is read into memory when the segment is opened.
+    """
+
+    def __init__(self, path:str):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, fmt, self.doc_count, self.term_count, self.total_length, self._docs_at, self._terms_at, _ = \
+            _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC or fmt != _FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a search index segment")
+        self.urls = []
+        self.lengths = array('I')
+        for doc_id in range(self.doc_count):
+            url_at, url_bytes, _, _, _, length = self._doc(doc_id)
+            self.urls.append(self._map[url_at:url_at + url_bytes].decode('utf-8'))
+            self.lengths.append(length)
+        self.ids = {url: doc_id for doc_id, url in enumerate(self.urls)}
+
+    def _doc(self, doc_id:int):
+        return _DOC.unpack_from(self._map, self._docs_at + doc_id * _DOC.size)
+
+    def title(self, doc_id:int):
+        url_at, url_bytes, title_bytes, _, _, _ = self._doc(doc_id)
+        return self._map[url_at + url_bytes:url_at + url_bytes + title_bytes].decode('utf-8')
+
+    def compressed_text(self, doc_id:int):
+        _, _, _, text_at, text_bytes, _ = self._doc(doc_id)
+        return self._map[text_at:text_at + text_bytes]
+
+    def text(self, doc_id:int):
+        return zlib.decompress(self.compressed_text(doc_id)).decode('utf-8')
+
+    def _term(self, index:int):
+        term_at, term_bytes, postings_at, frequency = _TERM.unpack_from(self._map, self._terms_at + index * _TERM.size)
+        return self._map[term_at:term_at + term_bytes], postings_at, frequency
+
+    def postings(self, term:str):
+        """
+        Returns (document ids, term frequencies) of a term, empty tuples if no document has it.
+        """
+        key = term.encode('utf-8')
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._term(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self.term_count:
+            return (), ()
+        found, postings_at, frequency = self._term(low)
+        if found != key:
+            return (), ()
+        ids = struct.unpack_from(f'<{frequency}I', self._map, postings_at)
+        frequencies = struct.unpack_from(f'<{frequency}I', self._map, postings_at + 4 * frequency)
+        return ids, frequencies
+
+    def terms(self):
+        """
+        Yields (term, document ids, term frequencies) of every term.
+        """
+        for index in range(self.term_count):
+            key, postings_at, frequency = self._term(index)
+            yield (key.decode('utf-8'),
+                   struct.unpack_from(f'<{frequency}I', self._map, postings_at),
+                   struct.unpack_from(f'<{frequency}I', self._map, postings_at + 4 * frequency))
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    @staticmethod
+    def write(path:str, docs:list, postings:dict):
+        """
+        Writes a segment atomically.
+
+        Args:
+            docs (list): [(url, title, compressed text, length)], the document id is the position.
+            postings (dict): {'term': [(document id, term frequency), ...]} sorted by document id.
+        """
+        terms = sorted(postings, key=lambda term: term.encode('utf-8'))
+        docs_at = _HEADER.size
+        terms_at = docs_at + len(docs) * _DOC.size
+        postings_at = terms_at + len(terms) * _TERM.size
+        postings_bytes = sum(8 * len(postings[term]) for term in terms)
+        strings_at = postings_at + postings_bytes
+
+        doc_records, term_records, postings_parts, strings = [], [], [], []
+        position = strings_at
+        for url, title, text, length in docs:
+            url_bytes, title_bytes = url.encode('utf-8'), title.encode('utf-8')
+            doc_records.append(_DOC.pack(position, len(url_bytes), len(title_bytes),
+                                         position + len(url_bytes) + len(title_bytes), len(text), length))
+            strings += [url_bytes, title_bytes, text]
+            position += len(url_bytes) + len(title_bytes) + len(text)
+        at = postings_at
+        for term in terms:
+            entries = postings[term]
+            term_bytes = term.encode('utf-8')
+            term_records.append(_TERM.pack(position, len(term_bytes), at, len(entries)))
+            strings.append(term_bytes)
+            position += len(term_bytes)
+            postings_parts.append(array('I', [doc_id for doc_id, _ in entries]))
+            postings_parts.append(array('I', [frequency for _, frequency in entries]))
+            at += 8 * len(entries)
+
+        header = _HEADER.pack(_MAGIC, _FORMAT_VERSION, len(docs), len(terms),
+                              sum(doc[3] for doc in docs), docs_at, terms_at, postings_at)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(header)
+            f.writelines(doc_records)
+            f.writelines(term_records)
+            for part in postings_parts:
+                if sys.byteorder == 'big':
+                    part.byteswap()
+                f.write(part.tobytes())
+            f.writelines(strings)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+
+class VersionSearchIndex:
+    """
+    BM25 index of the pages of one wiki version.
+
+    Pages live in a memory-mapped segment (see _Segment) plus the changes made since it
+    was written: pages added or replaced are kept in memory, pages removed or replaced are
+    hidden from the segment, and every change is appended to a log so it survives a
+    restart. Once the changes grow past COMPACT_MIN_CHANGES or COMPACT_CHANGE_RATIO of the
+    segment, commit merges them into a new segment and empties the log.
+
+    Args:
+        directory (str): Where the segment (<version>.seg) and log (<version>.log) are kept.
+        version (str): The version number.
+    """
+
+    def __init__(self, directory:str, version:str):
+        self.version = version
+        name = re.sub(r'[^\w.-]', '_', version)
+        self._segment_path = os.path.join(directory, name + '.seg')
+        self._log_path = os.path.join(directory, name + '.log')
+        self._lock = threading.RLock()
+        self._segment = _Segment(self._segment_path) if os.path.exists(self._segment_path) else None
+        self._hidden = set()        # Segment document ids that were removed or replaced
+        self._added = {}            # {'url': (title, text, length, Counter of terms)} not in the segment yet
+        self._added_postings = {}   # {'term': {'url': term frequency}} of the added pages
+        self._log_changes = 0
+        self._replay_log()
+        self._log = None            # Opened by the first change, an index that is only searched creates no file
+
+    def __len__(self):
+        with self._lock:
+            segment_docs = self._segment.doc_count if self._segment else 0
+            return segment_docs - len(self._hidden) + len(self._added)
+
+    def _replay_log(self):
+        if not os.path.exists(self._log_path):
+            return
+        with open(self._log_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    change = json.loads(line)
+                except ValueError:
+                    break           # Torn last line of a crash, the changes before it are complete
+                if change['op'] == 'add':
+                    self._apply_add(change['url'], change['title'], change['text'])
+                else:
+                    self._apply_remove(change['url'])
+                self._log_changes += 1
+
+    def _apply_remove(self, url:str):
+        removed = False
+        if self._segment is not None and url in self._segment.ids and self._segment.ids[url] not in self._hidden:
+            self._hidden.add(self._segment.ids[url])
+            removed = True
+        added = self._added.pop(url, None)
+        if added is not None:
+            for term in added[3]:
+                del self._added_postings[term][url]
+                if not self._added_postings[term]:
+                    del self._added_postings[term]
+            removed = True
+        return removed
+
+    def _apply_add(self, url:str, title:str, text:str):
+        self._apply_remove(url)
+        terms = Counter(tokenize(text))
+        self._added[url] = (title, text, sum(terms.values()), terms)
+        for term, frequency in terms.items():
+            self._added_postings.setdefault(term, {})[url] = frequency
+
+    def _reset_log(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        if os.path.exists(self._log_path):
+            open(self._log_path, 'w', encoding='utf-8').close()
+        self._log_changes = 0
+
+    def _write_log(self, change:dict):
+        if self._log is None:
+            self._log = open(self._log_path, 'a', encoding='utf-8')
+        self._log.write(json.dumps(change) + '\n')
+        self._log_changes += 1
+
+    def add_page(self, url:str, title:str, text:str):
+        """
+        Adds a page, replacing the page already indexed under url.
+        """
+        with self._lock:
+            self._apply_add(url, title or '', text or '')
+            self._write_log({'op': 'add', 'url': url, 'title': title or '', 'text': text or ''})
+
+    def remove_page(self, url:str):
+        """
+        Removes a page. Returns True if it was indexed.
+        """
+        with self._lock:
+            removed = self._apply_remove(url)
+            if removed:
+                self._write_log({'op': 'remove', 'url': url})
+            return removed
+
+    def clear(self):
+        """
+        Removes every page.
+        """
+        with self._lock:
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+                os.remove(self._segment_path)
+            self._hidden.clear()
+            self._added.clear()
+            self._added_postings.clear()
+            self._reset_log()
+
+    def rebuild(self, pages):
+        """
+        Replaces the index with pages, an iterable of (url, title, text), and writes the segment.
+        """
+        with self._lock:
+            self.clear()
+            for url, title, text in pages:
+                self._apply_add(url, title or '', text or '')
+            self._compact()
+
+    def commit(self, force:bool=False):
+        """
+        Flushes the log, and merges the changes into a new segment when there are enough of them (or force).
+        """
+        with self._lock:
+            if self._log is not None:
+                self._log.flush()
+                os.fsync(self._log.fileno())
+            segment_docs = self._segment.doc_count if self._segment else 0
+            if self._log_changes and (force or self._log_changes >= COMPACT_MIN_CHANGES
+                                      or self._log_changes >= COMPACT_CHANGE_RATIO * segment_docs):
+                self._compact()
+
+    def _compact(self):
+        docs = []
+        postings = {}
+        if self._segment is not None:
+            # Segment documents keep their order and their postings, minus the hidden ones
+            new_ids = {}
+            for doc_id, url in enumerate(self._segment.urls):
+                if doc_id not in self._hidden:
+                    new_ids[doc_id] = len(docs)
+                    docs.append((url, self._segment.title(doc_id), self._segment.compressed_text(doc_id),
+                                 self._segment.lengths[doc_id]))
+            for term, ids, frequencies in self._segment.terms():
+                entries = [(new_ids[doc_id], frequency) for doc_id, frequency in zip(ids, frequencies) if doc_id in new_ids]
+                if entries:
+                    postings[term] = entries
+        for url, (title, text, length, terms) in self._added.items():
+            doc_id = len(docs)
+            docs.append((url, title, zlib.compress(text.encode('utf-8')), length))
+            for term, frequency in terms.items():
+                postings.setdefault(term, []).append((doc_id, frequency))
+
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+        if docs:
+            _Segment.write(self._segment_path, docs, postings)
+            self._segment = _Segment(self._segment_path)
+        elif os.path.exists(self._segment_path):
+            os.remove(self._segment_path)
+        self._hidden.clear()
+        self._added.clear()
+        self._added_postings.clear()
+        self._reset_log()
+
+    def search(self, query:str, k:int=10):
+        """
+        Ranks the pages against query with BM25.
+
+        Returns:
+            dict: {'total_hits', 'results': [{'url', 'title', 'score', 'snippet'}, ...]} with the k best pages.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            segment = self._segment
+            doc_count = len(self)
+            if not terms or not doc_count:
+                return {'total_hits': 0, 'results': []}
+            total_length = sum(added[2] for added in self._added.values())
+            if segment is not None:
+                total_length += segment.total_length - sum(segment.lengths[doc_id] for doc_id in self._hidden)
+            average_length = max(total_length / doc_count, 1)
+
+            scores = {}     # {segment document id or added url: score}
+            for term in terms:
+                ids, frequencies = segment.postings(term) if segment is not None else ((), ())
+                added = self._added_postings.get(term, {})
+                live = [(doc_id, f) for doc_id, f in zip(ids, frequencies) if doc_id not in self._hidden]
+                frequency_of_term = len(live) + len(added)
+                if not frequency_of_term:
+                    continue
+                idf = math.log(1 + (doc_count - frequency_of_term + 0.5) / (frequency_of_term + 0.5))
+                for doc_id, frequency in live:
+                    length = segment.lengths[doc_id]
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (BM25_K1 + 1) / (
+                        frequency + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length))
+                for url, frequency in added.items():
+                    length = self._added[url][2]
+                    scores[url] = scores.get(url, 0.0) + idf * frequency * (BM25_K1 + 1) / (
+                        frequency + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length))
+
+            best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            results = []
+            for key, score in best:
+                if isinstance(key, str):
+                    url, (title, text) = key, self._added[key][:2]
+                else:
+                    url, title, text = segment.urls[key], segment.title(key), segment.text(key)
+                results.append({'url': url, 'title': title, 'score': round(score, 4), 'snippet': make_snippet(text, terms)})
+        return {'total_hits': len(scores), 'results': results}
+
+    def close(self):
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+
+
+class WikiSearchIndex:
+    """
+    Full-text search over the crawled pages, with one VersionSearchIndex per wiki version.
+
+    Args:
+        directory (str): Where the version indexes are kept. Created if missing.
+    """
+
+    def __init__(self, directory:str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def version(self, version:str):
+        """
+        Returns the index of a version, opening it on first use.
+        """
+        with self._lock:
+            index = self._versions.get(version)
+            if index is None:
+                index = self._versions[version] = VersionSearchIndex(self.directory, version)
+            return index
+
+    # The page hooks IncrementalSync calls while it updates a version
+    def add_page(self, version:str, url:str, title:str, text:str):
+        self.version(version).add_page(url, title, text)
+
+    def remove_page(self, version:str, url:str):
+        return self.version(version).remove_page(url)
+
+    def clear(self, version:str):
+        self.version(version).clear()
+
+    def commit(self, version:str, force:bool=False):
+        self.version(version).commit(force=force)
+
+    def search(self, version:str, query:str, k:int=10):
+        return self.version(version).search(query, k=k)
+
+    def close(self):
+        with self._lock:
+            for index in self._versions.values():
+                index.close()
+            self._versions.clear()
@@ -0,0 +1,131 @@
+# Imports and Installs
+import asyncio
+import threading
+from collections import Counter
+
+
+class _Call:
+    """
+    One in-flight computation and the callers waiting on it.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class _AsyncCall:
+    """
+    One in-flight coroutine, run as a task of its own, and the number of callers awaiting it.
+    """
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls into one execution.
+
+    The first caller of a key runs the function, callers arriving with the same key while
+    it is still running wait for it and get the same result (or the same exception).
+    Nothing is cached: once the call finished, the next caller runs the function again.
+    Keys are (operation, ...) tuples; counters are kept per operation.
+    """
+
+    def __init__(self):
+        self._calls = {}            # {key: _Call} of the sync calls in flight
+        self._async_calls = {}      # {key: _AsyncCall} of the async calls in flight
+        self._lock = threading.Lock()
+        self.calls = Counter()      # {'operation': calls made}
+        self.executions = Counter() # {'operation': calls that actually ran the function}
+        self.coalesced = Counter()  # {'operation': calls that waited on another caller instead}
+
+    @staticmethod
+    def _operation(key):
+        return key[0] if isinstance(key, tuple) else key
+
+    def do(self, key, function, *args, **kwargs):
+        """
+        Runs function(*args, **kwargs), unless a call with the same key is already running,
+        in which case it waits for that call and returns its result.
+
+        Raises:
+            Exception: Whatever the function raised, in every caller that shared the call.
+        """
+        operation = self._operation(key)
+        with self._lock:
+            self.calls[operation] += 1
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced[operation] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executions[operation] += 1
+                leader = True
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = function(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(self, key, function, *args, **kwargs):
+        """
+        asyncio version of do, for coroutine functions. Must be awaited on a single event loop.
+
+        The function runs in a task owned by the flight, so a cancelled caller only stops waiting:
+        the others still get the result. The task is cancelled once no caller is left waiting on it.
+        """
+        operation = self._operation(key)
+        call = self._async_calls.get(key)
+        with self._lock:
+            self.calls[operation] += 1
+            if call is not None:
+                self.coalesced[operation] += 1
+            else:
+                self.executions[operation] += 1
+        if call is None:
+            call = self._async_calls[key] = _AsyncCall(asyncio.ensure_future(function(*args, **kwargs)))
+            call.task.add_done_callback(lambda _: self._forget_async(key, call))
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if not call.waiters and not call.task.done():
+                self._forget_async(key, call)   # Later callers start afresh instead of joining a cancelled task
+                call.task.cancel()
+
+    def _forget_async(self, key, call):
+        if self._async_calls.get(key) is call:
+            del self._async_calls[key]
+
+    def stats(self):
+        """
+        Returns the per operation counters and how many calls are in flight right now.
+        """
+        with self._lock:
+            operations = {
+                operation: {
+                    'calls': self.calls[operation],
+                    'executions': self.executions[operation],
+                    'coalesced': self.coalesced[operation],
+                }
+                for operation in self.calls
+            }
+            return {'operations': operations, 'in_flight': len(self._calls) + len(self._async_calls)}
@@ -0,0 +1,191 @@
+# Imports and Installs
+import os
+import sys
+import time
+import threading
+from contextlib import contextmanager
+
+# Constants
+PROFILE_IMPORTS = os.environ.get('WIKI_PROFILE_IMPORTS', '0') == '1'   # Time every module import, like python -X importtime
+TOP_IMPORTS = 25                # Slowest imports listed in a report
+
+
+def process_age_ms():
+    """
+    Returns the milliseconds since this process started (10 ms resolution), or None where /proc is
+    not available. At import time this is what the interpreter and the host spent before our code ran.
+    """
+    try:
+        with open('/proc/self/stat') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return round((uptime - start_ticks / os.sysconf('SC_CLK_TCK')) * 1000, 1)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _TimedLoader:
+    """
+    Wraps a module loader to time the creation and execution of its module.
+    """
+
+    def __init__(self, loader, name:str, timer):
+        self._loader = loader
+        self._name = name
+        self._timer = timer
+
+    def __getattr__(self, attribute):
+        return getattr(self._loader, attribute)
+
+    def create_module(self, spec):
+        return self._timer.timed(self._name, self._loader.create_module, spec)
+
+    def exec_module(self, module):
+        return self._timer.timed(self._name, self._loader.exec_module, module)
+
+
+class _ImportTimer:
+    """
+    sys.meta_path finder that hands out timed loaders. Every module gets its cumulative time
+    and its self time, which leaves out the imports it triggered.
+    """
+
+    def __init__(self):
+        self.times = {}     # {'module': [cumulative seconds, self seconds]}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def find_spec(self, name, path=None, target=None):
+        if getattr(self._local, 'finding', False):
+            return None
+        self._local.finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is not self and hasattr(finder, 'find_spec'):
+                    spec = finder.find_spec(name, path, target)
+                    if spec is not None:
+                        break
+            else:
+                return None
+        finally:
+            self._local.finding = False
+        if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+            spec.loader = _TimedLoader(spec.loader, name, self)
+        return spec
+
+    def timed(self, name:str, function, argument):
+        stack = self._local.__dict__.setdefault('stack', [])
+        started = time.perf_counter()
+        stack.append(0.0)
+        try:
+            return function(argument)
+        finally:
+            total = time.perf_counter() - started
+            nested = stack.pop()
+            if stack:
+                stack[-1] += total
+            with self._lock:
+                times = self.times.setdefault(name, [0.0, 0.0])
+                times[0] += total
+                times[1] += total - nested
+
+
+class StartupProfiler:
+    """
+    Records where the cold start of a process goes: named phases (imports, clients built in
+    the background, ...) and the first request, all relative to when the profiler was created,
+    plus how old the process already was then. With profile_imports every module imported
+    afterwards is timed too.
+
+    Create it before the imports to profile, i.e. import this module first.
+
+    Args:
+        profile_imports (bool): Time every module import. Adds a little overhead to each import.
+    """
+
+    def __init__(self, profile_imports:bool=PROFILE_IMPORTS):
+        self.started = time.perf_counter()
+        self.process_age_ms = process_age_ms()
+        self.phases = []
+        self.first_request = None
+        self._lock = threading.Lock()
+        self._import_timer = None
+        if profile_imports:
+            self._import_timer = _ImportTimer()
+            sys.meta_path.insert(0, self._import_timer)
+
+    def _ms(self, seconds:float):
+        return round(seconds * 1000, 2)
+
+    def record(self, name:str, started:float, ended:float=None):
+        """
+        Records a phase that ran from started to ended (time.perf_counter() values, ended defaults to now).
+        """
+        ended = time.perf_counter() if ended is None else ended
+        with self._lock:
+            self.phases.append({
+                'name': name,
+                'start_ms': self._ms(started - self.started),
+                'ms': self._ms(ended - started),
+                'thread': threading.current_thread().name,
+            })
+
+    @contextmanager
+    def phase(self, name:str):
+        """
+        Records the time spent in the with block as a phase.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, started)
+
+    def request_done(self, name:str, started:float):
+        """
+        Records a request that started at started, if it is the first one.
+
+        Returns:
+            bool: True for the first request.
+        """
+        if self.first_request is not None:
+            return False
+        ended = time.perf_counter()
+        with self._lock:
+            if self.first_request is not None:
+                return False
+            self.first_request = {
+                'name': name,
+                'start_ms': self._ms(started - self.started),
+                'ms': self._ms(ended - started),
+                'done_ms': self._ms(ended - self.started),
+            }
+        return True
+
+    def report(self):
+        """
+        Returns the profile as a JSON serializable dict.
+
+        Returns:
+            dict: {'process_age_at_start_ms', 'uptime_ms', 'phases', 'first_request', 'imports'}, where
+                  'imports' lists the slowest module imports by self time ([] unless profile_imports).
+        """
+        imports = []
+        if self._import_timer is not None:
+            with self._import_timer._lock:
+                times = sorted(self._import_timer.times.items(), key=lambda item: item[1][1], reverse=True)
+            imports = [{'module': name, 'self_ms': self._ms(own), 'cumulative_ms': self._ms(total)}
+                       for name, (total, own) in times[:TOP_IMPORTS]]
+        with self._lock:
+            return {
+                'process_age_at_start_ms': self.process_age_ms,
+                'uptime_ms': self._ms(time.perf_counter() - self.started),
+                'phases': sorted(self.phases, key=lambda phase: phase['start_ms']),
+                'first_request': self.first_request,
+                'imports': imports,
+            }
+
+
+# Process wide profiler, started when this module is first imported
+PROFILER = StartupProfiler()
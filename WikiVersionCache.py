@@ -0,0 +1,204 @@
+# Imports and Installs
+import os
+import json
+import time
+import threading
+import WikiHttpClient as http_client
+
+# Constants
+DEFAULT_TTL_SECONDS = 6 * 60 * 60       # Map is considered fresh for this long
+DEFAULT_UNAVAILABLE_TTL_SECONDS = 10 * 60   # A map with unavailable versions is refreshed (and they are probed again) after this
+DEFAULT_TIMEOUT_SECONDS = 30           # Read timeout of the release history fetch
+
+
+def fetch_if_modified(url:str, etag:str=None, last_modified:str=None, timeout:int=DEFAULT_TIMEOUT_SECONDS):
+    """
+    Fetches the url with a conditional GET.
+
+    Args:
+        url (str): The url to fetch.
+        etag (str, optional): ETag of the cached copy, sent as If-None-Match.
+        last_modified (str, optional): Last-Modified of the cached copy, sent as If-Modified-Since.
+
+    Returns:
+        tuple: (html, etag, last_modified). html is None if the server answered 304 Not Modified.
+
+    Raises:
+        Exception: If the GET request fails or an HTTP error occurs.
+    """
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    response = http_client.get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304:
+        return None, etag, last_modified
+    response.raise_for_status()
+    return response.text, response.headers.get('ETag'), response.headers.get('Last-Modified')
+
+
+class VersionMapCache:
+    """
+    TTL cache for the wiki version map, persisted to disk so it survives restarts.
+
+    Reads never wait on the upstream once a map is available: a stale map is
+    returned immediately while a background thread revalidates it against the
+    release history with a conditional GET. Only a 200 response rebuilds the map.
+
+    Versions without a wiki are not final: a map that has any goes stale after
+    unavailable_ttl, and every refresh probes them again, so a probe that failed
+    on a timeout or a wiki published later is picked up.
+
+    A published map is never changed. Refreshes build new dicts and swap them in,
+    so a map returned by get() can be read while a refresh runs. Callers must not modify it.
+
+    Args:
+        source_url (str): Release history page the map is built from.
+        build (callable): build(html, versions) -> (versions, unavailable) dicts of {'version_number': 'url'}.
+            Gets the current map of available versions, which need no new probe.
+        cache_path (str, optional): JSON file the map is persisted to. None disables persistence.
+        ttl (int): Seconds before a map is considered stale.
+        reprobe (callable, optional): reprobe(unavailable) -> (versions, unavailable), probes the unavailable
+            versions again when the release history did not change.
+        unavailable_ttl (int): Seconds before a map with unavailable versions is considered stale.
+    """
+
+    def __init__(self, source_url:str, build, cache_path:str=None, ttl:int=DEFAULT_TTL_SECONDS,
+                 reprobe=None, unavailable_ttl:int=DEFAULT_UNAVAILABLE_TTL_SECONDS):
+        self.source_url = source_url
+        self.build = build
+        self.reprobe = reprobe
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.unavailable_ttl = unavailable_ttl
+        self.versions = {}
+        self.unavailable = {}
+        self.etag = None
+        self.last_modified = None
+        self.fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self.load()
+
+    # Persistence
+    def load(self):
+        """
+        Loads a previously persisted map from cache_path, if there is one.
+        """
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"ERROR: Could not read version map cache {self.cache_path} : {e}")
+            return
+        if state.get('source_url', self.source_url) != self.source_url:
+            return      # Map of another release history, rebuild it
+        self.versions = dict(state.get('versions', {}))
+        self.unavailable = dict(state.get('unavailable', {}))
+        self.etag = state.get('etag')
+        self.last_modified = state.get('last_modified')
+        self.fetched_at = state.get('fetched_at', 0.0)
+
+    def save(self):
+        """
+        Persists the map to cache_path. Written to a temp file first so readers never see a partial file.
+        """
+        if not self.cache_path:
+            return
+        with self._lock:
+            state = {
+                'source_url': self.source_url,
+                'fetched_at': self.fetched_at,
+                'etag': self.etag,
+                'last_modified': self.last_modified,
+                'versions': self.versions,
+                'unavailable': self.unavailable,
+            }
+        temp_path = self.cache_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=4)
+        os.replace(temp_path, self.cache_path)
+
+    # Freshness
+    def age(self):
+        return time.time() - self.fetched_at
+
+    def is_stale(self):
+        return self.age() > (self.unavailable_ttl if self.unavailable else self.ttl)
+
+    def has_data(self):
+        return bool(self.fetched_at)
+
+    # Refresh
+    def refresh(self):
+        """
+        Revalidates the map against the release history and rebuilds it if the page changed.
+        Otherwise only the unavailable versions are probed again (with reprobe).
+
+        Returns:
+            bool: True if the map was rebuilt, False if the upstream answered 304 Not Modified.
+        """
+        html, etag, last_modified = fetch_if_modified(self.source_url, self.etag, self.last_modified)
+        versions, unavailable = self.versions, self.unavailable
+        rebuilt = html is not None
+        if rebuilt:
+            versions, unavailable = self.build(html, versions)
+        elif unavailable and self.reprobe is not None:
+            found, unavailable = self.reprobe(unavailable)
+            versions = {**versions, **found}
+        with self._lock:
+            self.versions, self.unavailable = versions, unavailable
+            self.etag, self.last_modified = etag, last_modified
+            self.fetched_at = time.time()
+        self.save()
+        return rebuilt
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"ERROR: Background refresh of version map failed : {e}")
+        finally:
+            self._refreshing = False
+
+    def refresh_async(self):
+        """
+        Starts a background refresh unless one is already running.
+        """
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh_in_background, daemon=True).start()
+
+    # Reads
+    def get(self, force_refresh:bool=False):
+        """
+        Returns the version map, refreshing it first only if there is no usable copy.
+
+        Args:
+            force_refresh (bool): Revalidate against the upstream before returning.
+
+        Returns:
+            dict: {'version_number': 'url'} for every available version. Read only.
+        """
+        if force_refresh or not self.has_data():
+            self.refresh()
+        elif self.is_stale():
+            self.refresh_async()
+        return self.versions
+
+    def contains(self, version_number:str):
+        """
+        O(1) check whether the version number is in the map.
+        """
+        return version_number in self.get()
+
+    def url_for(self, version_number:str):
+        """
+        O(1) lookup of the url for the version number. Returns None if it is not in the map.
+        """
+        return self.get().get(version_number)
@@ -0,0 +1,88 @@
+"""
+Benchmarks the link sentence lookup of WikiParser's html_to_text.
+
+Usage:
+    python benchmarks/bench_anchor_context.py [--pages-dir saved_pages/] [--count 50] [--repeat 3]
+
+The old lookup (closest_sentence) renders and splits the text of every ancestor of
+every link. AnchorContext renders each element at most once and answers the links
+that climb past their nearest ancestor from character offsets into one rendering of
+the page. Both run on the same parsed pages; the parse is not timed.
+
+The pages are run twice: as they are, and with the first word of every link in
+italics (<a><i>Page</i> 12</a>). get_text(strip=True) joins such a link's text
+without the space ("Page12"), so it is found in no sentence and climbs to the root.
+
+On the pages as they are, nearly every link finds its sentence in its nearest ancestor,
+which both lookups render once, so their times are within noise of each other (1.06x to
+1.19x over three default runs). The gain is on links that climb: 42x to 61x on the italic
+variant.
+"""
+# Imports and Installs
+import os
+import sys
+import re
+import time
+import argparse
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from WikiAnchorContext import AnchorContext, closest_sentence
+from mediawiki_pages import load_pages
+
+
+# Constants
+_LINK_FIRST_WORD = re.compile(r'(<a href="[^"]*"[^>]*>)(\w+) ')
+
+
+def per_link(soup):
+    return [closest_sentence(tag) for tag in soup.find_all("a", href=True)]
+
+
+def one_pass(soup):
+    context = AnchorContext(soup)
+    return [context.closest_sentence(tag) for tag in soup.find_all("a", href=True)]
+
+
+def time_cpu(function, soups, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.process_time()
+        for soup in soups:
+            function(soup)
+        best = min(best, time.process_time() - start)
+    return best / len(soups) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages-dir', help='Directory of saved MediaWiki .html pages (synthetic pages if omitted)')
+    parser.add_argument('--count', type=int, default=50, help='Number of pages to use')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per variant, the best run is reported')
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages_dir, args.count)
+    print(f"{len(pages)} pages, {sum(len(html) for _, html in pages) / len(pages) / 1024:.1f} KiB average")
+    variants = {
+        'as saved': [html_content for _, html_content in pages],
+        'italic link words': [_LINK_FIRST_WORD.sub(r'\1<i>\2</i> ', html_content) for _, html_content in pages],
+    }
+
+    failed = False
+    print(f"\n{'Pages':<20} {'Links/page':>10} {'Mismatches':>10} {'Old ms/page':>12} {'New ms/page':>12} {'Speedup':>8}")
+    print('-' * 77)
+    for name, htmls in variants.items():
+        soups = [BeautifulSoup(html_content, "html.parser") for html_content in htmls]
+        links = sum(len(soup.find_all("a", href=True)) for soup in soups) / len(soups)
+        # The sentences must be exactly the ones the old lookup found
+        mismatches = sum(per_link(soup) != one_pass(soup) for soup in soups)
+        failed = failed or bool(mismatches)
+        baseline = time_cpu(per_link, soups, args.repeat)
+        cpu = time_cpu(one_pass, soups, args.repeat)
+        print(f"{name:<20} {links:>10.0f} {mismatches:>10} {baseline:>12.2f} {cpu:>12.2f} {baseline / cpu:>7.2f}x")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
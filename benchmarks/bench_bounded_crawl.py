@@ -0,0 +1,166 @@
+"""
+Peak memory of a crawl as it grows, with and without the memory bounded crawl mode.
+
+Usage:
+    python benchmarks/bench_bounded_crawl.py [--pages 10000 50000 200000] [--links-per-page 25] [--list-max-pages 50000]
+
+Every crawl runs in a fresh process over a synthetic wiki held in code: page i links to
+--links-per-page pages spread over the whole wiki and to page i + 1, so every page is
+reachable from Page_0 and is linked about links-per-page times. Three modes are compared:
+
+    crawl_links (before)   extract_hyperlinks' list of every link, duplicates included
+                           (only up to --list-max-pages, it grows by links-per-page dicts a page)
+    exact                  WikiCrawler and unique_links with sets, as /get_url_content?stream=true did
+    bounded                BoundedWikiCrawler, bloom filters and a LinkSpool (bounded=true)
+
+The peak RSS of the bounded crawl must stay flat as the wiki grows, every page must be
+returned exactly once by exact, and once or not at all by bounded, which may leave out
+about false positive rate x pages.
+"""
+# Imports and Installs
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, REPO_DIR)
+
+# Constants
+BASE_URL = 'https://wiki.example/wice296/index.php/'
+MODES = ('crawl_links (before)', 'exact', 'bounded')
+FLAT_TOLERANCE_MIB = 16         # Largest growth of the bounded peak RSS between the smallest and largest crawl
+
+
+def peak_rss_mib():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def synthetic_wiki(pages:int, links_per_page:int):
+    """
+    Returns fetch and extract_links of a wiki of `pages` pages that exists only in code.
+    """
+    stride = max(1, pages // links_per_page)
+
+    def fetch(url):
+        return url     # The "html" is the url, extract_links derives the page's links from it
+
+    def extract_links(html, page_url):
+        index = int(page_url.rsplit('_', 1)[1])
+        targets = [(index * 31 + j * stride + 7) % pages for j in range(links_per_page)] + [(index + 1) % pages]
+        return [{'title': f'Page {target}', 'url': f'{BASE_URL}Page_{target}'} for target in targets]
+
+    return fetch, extract_links
+
+
+def run_one(args):
+    """
+    Child process: crawls the synthetic wiki in one mode, writes the returned urls to --out
+    and prints the measurements as JSON.
+    """
+    from WikiCrawler import WikiCrawler, crawl_links
+    from WikiBoundedCrawl import BoundedWikiCrawler, UrlBloomFilter, LinkSpool, unique_links
+
+    fetch, extract_links = synthetic_wiki(args.pages, args.links_per_page)
+    start_url = f'{BASE_URL}Page_0'
+    baseline = peak_rss_mib()
+    started = time.perf_counter()
+    spilled = 0
+    with open(args.out, 'w') as out:
+        if args.mode == 'crawl_links (before)':
+            links = crawl_links(start_url, fetch, extract_links)
+            returned = len(links)
+            out.writelines(link['url'] + '\n' for link in links)
+        elif args.mode == 'exact':
+            pages = WikiCrawler(fetch, extract_links).crawl(start_url)
+            returned = 0
+            for link in unique_links(pages):
+                out.write(link['url'] + '\n')
+                returned += 1
+        else:
+            crawler = BoundedWikiCrawler(fetch, extract_links, expected_urls=args.expected_urls,
+                                         frontier_memory_items=args.frontier_items)
+            spool = LinkSpool()
+            for link in unique_links(crawler.crawl(start_url), UrlBloomFilter(args.expected_urls)):
+                spool.append({'title': link['title'], 'url': link['url']})
+            spilled = crawler.frontier.spilled
+            returned = len(spool)
+            out.writelines(link['url'] + '\n' for link in spool)
+            spool.close()
+    print(json.dumps({'seconds': time.perf_counter() - started, 'peak_mib': peak_rss_mib(), 'baseline_mib': baseline,
+                      'returned': returned, 'spilled': spilled}))
+
+
+def run_child(mode:str, pages:int, args):
+    out = os.path.join(tempfile.mkdtemp(), 'urls.txt')
+    command = [sys.executable, os.path.abspath(__file__), '--run-one', '--mode', mode, '--pages', str(pages),
+               '--links-per-page', str(args.links_per_page), '--expected-urls', str(args.expected_urls),
+               '--frontier-items', str(args.frontier_items), '--out', out]
+    output = subprocess.run(command, capture_output=True, text=True, check=True, cwd=REPO_DIR).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    with open(out) as f:
+        urls = [line.rstrip('\n') for line in f]
+    os.remove(out)
+    result['distinct'] = len(set(urls))
+    result['duplicates'] = len(urls) - result['distinct']
+    return result
+
+
+def main(args):
+    print(f"synthetic wiki, {args.links_per_page + 1} links per page, bloom filters sized for {args.expected_urls:,} urls, "
+          f"{args.frontier_items:,} frontier entries in memory\n")
+    print(f"{'Pages':>8} {'Mode':<22} {'Peak RSS MiB':>13} {'Returned':>10} {'Distinct':>9} {'Missing':>8} {'Spilled':>9} {'Seconds':>8}")
+    print('-' * 94)
+    failures, bounded_peaks = [], []
+    for pages in args.pages:
+        for mode in MODES:
+            if mode == 'crawl_links (before)' and pages > args.list_max_pages:
+                continue
+            result = run_child(mode, pages, args)
+            missing = pages - result['distinct']
+            print(f"{pages:>8,} {mode:<22} {result['peak_mib']:>13.1f} {result['returned']:>10,} {result['distinct']:>9,} "
+                  f"{missing:>8,} {result['spilled']:>9,} {result['seconds']:>8.1f}")
+            if mode == 'exact' and (missing or result['duplicates']):
+                failures.append(f"exact crawl of {pages} pages: {missing} missing, {result['duplicates']} duplicates")
+            if mode == 'bounded':
+                bounded_peaks.append(result['peak_mib'])
+                allowed = 5 + 5 * 1e-4 * pages      # Default false positive rate of the two filters
+                if result['duplicates'] or missing > allowed:
+                    failures.append(f"bounded crawl of {pages} pages: {missing} missing, {result['duplicates']} duplicates")
+
+    growth = max(bounded_peaks) - min(bounded_peaks)
+    print(f"\nbounded peak RSS grew {growth:.1f} MiB from {args.pages[0]:,} to {args.pages[-1]:,} pages "
+          f"(at most {FLAT_TOLERANCE_MIB} MiB allowed)")
+    if growth > FLAT_TOLERANCE_MIB:
+        failures.append(f"bounded peak RSS grew {growth:.1f} MiB")
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    print(f"all crawls correct and bounded memory flat: {not failures}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Peak memory of bounded and unbounded crawls')
+    parser.add_argument('--pages', type=int, nargs='+', default=[10_000, 50_000, 200_000])
+    parser.add_argument('--links-per-page', type=int, default=25)
+    parser.add_argument('--list-max-pages', type=int, default=50_000, help='Largest wiki crawled with crawl_links')
+    parser.add_argument('--expected-urls', type=int, default=1_000_000)
+    parser.add_argument('--frontier-items', type=int, default=10_000)
+    parser.add_argument('--run-one', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--mode', help=argparse.SUPPRESS)
+    parser.add_argument('--out', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run_one:
+        args.pages = args.pages[0]
+        run_one(args)
+    else:
+        main(args)
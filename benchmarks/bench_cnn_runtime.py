@@ -0,0 +1,223 @@
+"""
+Checks and times the NumPy runtime of the 1D-CNN intent model against Keras.
+
+Usage:
+    python benchmarks/bench_cnn_runtime.py [--model-dir intent_models/] [--queries 2000] [--repeat 5]
+
+Exports the CNN (float32 and int8) and compares the predictions of CnnIntentRuntime
+with the reference on the queries of datasets/intent_dataset.csv, then times batches
+of 1, 32 and 256 queries and measures the cold start (import, load, first query) and
+peak memory of a fresh process serving one query.
+
+The reference is the Keras model: the one saved in --model-dir (cnn.keras), or a
+build_cnn_model with random weights. Without TensorFlow the reference is a direct
+NumPy transcription of the Keras layers (every Conv1D tap over the full padded
+sequence, ReLU before pooling), so only the runtime's restructuring is checked and
+the Keras rows of the tables are skipped.
+"""
+# Imports and Installs
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+sys.path.insert(0, REPO_DIR)
+from WikiCnnRuntime import CnnIntentRuntime, write_cnn_export, export_cnn_model
+from WikiIntentClassifier import QueryTokenizer
+from bench_intent_batching import load_dataset, fit_tokenizer, MAX_SEQUENCE_LENGTH, EMBEDDING_DIM, HIDDEN_UNITS
+
+# Constants
+CNN_FILTERS = 128               # CONFIG of Intent_Identifier_Models.ipynb
+CNN_KERNEL_SIZES = [3, 4, 5]
+BATCH_SIZES = [1, 32, 256]
+TOLERANCE = 1e-4                # Largest probability difference accepted for the float32 export
+
+# Measured in a fresh interpreter, so imports and loading are part of it
+_COLD_START = """
+import sys, time, json
+started = time.perf_counter()
+sys.path.insert(0, {repo!r})
+{load}
+seconds = time.perf_counter() - started
+# VmHWM starts over at exec, unlike ru_maxrss which keeps the parent's peak
+with open('/proc/self/status') as status:
+    peak_kb = next(int(line.split()[1]) for line in status if line.startswith('VmHWM'))
+print(json.dumps({{'seconds': seconds, 'peak_mb': peak_kb / 1024}}))
+"""
+_LOAD_NUMPY = """
+from WikiIntentClassifier import IntentClassifier
+IntentClassifier.from_cnn_export({path!r}).classify('status of LiDAR collection in Jiyue')
+"""
+_LOAD_KERAS = """
+import numpy as np
+import tensorflow as tf
+model = tf.keras.models.load_model({path!r}, compile=False)
+model.predict(np.zeros((1, {length}), dtype=np.int32), verbose=0)
+"""
+
+
+def keras_tokenizer_json(tokenizer:QueryTokenizer):
+    # What Tokenizer.to_json() writes, as far as QueryTokenizer reads it
+    return json.dumps({'class_name': 'Tokenizer', 'config': {
+        'num_words': tokenizer.num_words, 'filters': ''.join(map(chr, tokenizer._translation)), 'lower': True,
+        'split': ' ', 'oov_token': '<OOV>', 'word_index': json.dumps(tokenizer.word_index)}})
+
+
+def random_weights(vocab_size:int, classes:int, seed:int=0):
+    rng = np.random.default_rng(seed)
+    uniform = lambda *shape: rng.uniform(-0.05, 0.05, shape).astype(np.float32)
+    weights = {'embedding': uniform(vocab_size, EMBEDDING_DIM)}
+    for kernel_size in CNN_KERNEL_SIZES:
+        weights[f'conv{kernel_size}_kernel'] = uniform(kernel_size, EMBEDDING_DIM, CNN_FILTERS) * 10
+        weights[f'conv{kernel_size}_bias'] = uniform(CNN_FILTERS)
+    weights['dense_kernel'], weights['dense_bias'] = uniform(CNN_FILTERS * len(CNN_KERNEL_SIZES), HIDDEN_UNITS) * 10, uniform(HIDDEN_UNITS)
+    weights['output_kernel'], weights['output_bias'] = uniform(HIDDEN_UNITS, classes) * 10, uniform(classes)
+    return weights
+
+
+def reference_forward(weights:dict, batch:np.ndarray):
+    # The Keras layers one by one: Embedding, Conv1D(valid, relu), GlobalMaxPooling1D, Concatenate, Dense, Dense(softmax)
+    embedded = weights['embedding'][batch]
+    pooled = []
+    for kernel_size in CNN_KERNEL_SIZES:
+        kernel = weights[f'conv{kernel_size}_kernel']
+        steps = batch.shape[1] - kernel_size + 1
+        convolved = sum(embedded[:, tap:tap + steps] @ kernel[tap] for tap in range(kernel_size)) + weights[f'conv{kernel_size}_bias']
+        pooled.append(np.maximum(convolved, 0).max(axis=1))
+    hidden = np.maximum(np.concatenate(pooled, axis=1) @ weights['dense_kernel'] + weights['dense_bias'], 0)
+    logits = hidden @ weights['output_kernel'] + weights['output_bias']
+    exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def build_keras_cnn(vocab_size:int, classes:int):
+    # build_cnn_model of Intent_Identifier_Models.ipynb
+    from tensorflow.keras import layers, Model, Input
+    input_layer = Input(shape=(MAX_SEQUENCE_LENGTH,), name='input')
+    embedding = layers.Embedding(input_dim=vocab_size, output_dim=EMBEDDING_DIM, name='embedding')(input_layer)
+    branches = [layers.GlobalMaxPooling1D(name=f'maxpool_k{k}')(
+        layers.Conv1D(filters=CNN_FILTERS, kernel_size=k, activation='relu', name=f'conv1d_k{k}')(embedding))
+        for k in CNN_KERNEL_SIZES]
+    dropout = layers.Dropout(0.3, name='dropout')(layers.Concatenate(name='concat_branches')(branches))
+    dense = layers.Dense(HIDDEN_UNITS, activation='relu', name='dense')(dropout)
+    output = layers.Dense(classes, activation='softmax', name='intent_output')(dense)
+    return Model(inputs=input_layer, outputs=output, name='CNN_MultiKernel')
+
+
+def time_batches(predict, batch:np.ndarray, repeat:int):
+    timings = {}
+    for size in BATCH_SIZES:
+        rows = batch[:size]
+        predict(rows)
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            predict(rows)
+            best = min(best, time.perf_counter() - started)
+        timings[size] = best * 1000
+    return timings
+
+
+def cold_start(load_code:str):
+    script = _COLD_START.format(repo=REPO_DIR, load=load_code)
+    output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(args):
+    try:
+        import tensorflow as tf
+    except ImportError:
+        tf = None
+    rows = load_dataset()[:args.queries]
+    labels = sorted({row['intent'] for row in rows})
+    workdir = tempfile.mkdtemp()
+    float_path, int8_path = os.path.join(workdir, 'cnn_numpy.npz'), os.path.join(workdir, 'cnn_int8.npz')
+
+    keras_model, keras_path = None, None
+    if args.model_dir:
+        if tf is None:
+            sys.exit('--model-dir needs TensorFlow')
+        keras_path = os.path.join(args.model_dir, 'cnn.keras')
+        keras_model = tf.keras.models.load_model(keras_path, compile=False)
+        with open(os.path.join(args.model_dir, 'tokenizer.json'), encoding='utf-8') as f:
+            tokenizer_json = f.read()
+        with open(os.path.join(args.model_dir, 'label_encoders.json'), encoding='utf-8') as f:
+            labels = json.load(f)['intent']
+    else:
+        tokenizer = fit_tokenizer([row['query'] for row in rows])
+        tokenizer_json = keras_tokenizer_json(tokenizer)
+    tokenizer = QueryTokenizer.from_json(tokenizer_json)
+    # As preprocess_data sizes the embedding
+    vocab_size = min(len(tokenizer.word_index) + 1, tokenizer.num_words or len(tokenizer.word_index) + 1)
+    batch = tokenizer.encode([row['query'] for row in rows], MAX_SEQUENCE_LENGTH)
+
+    if keras_model is None and tf is not None:
+        keras_model = build_keras_cnn(vocab_size, len(labels))
+        keras_path = os.path.join(workdir, 'cnn.keras')
+        keras_model.save(keras_path)
+    if keras_model is not None:
+        class _Encoder:
+            classes_ = labels
+        class _Tokenizer:
+            to_json = staticmethod(lambda: tokenizer_json)
+        for path, quantize in ((float_path, False), (int8_path, True)):
+            export_cnn_model(keras_model, _Tokenizer, _Encoder, path, MAX_SEQUENCE_LENGTH, CNN_KERNEL_SIZES, quantize=quantize)
+        reference_name = 'Keras'
+        reference = lambda rows: keras_model(rows, training=False).numpy()
+    else:
+        weights = random_weights(vocab_size, len(labels))
+        for path, quantize in ((float_path, False), (int8_path, True)):
+            write_cnn_export(path, weights, CNN_KERNEL_SIZES, tokenizer_json, labels, MAX_SEQUENCE_LENGTH, quantize=quantize)
+        reference_name = 'NumPy reference'
+        reference = lambda rows: reference_forward(weights, rows)
+        print('TensorFlow is not installed: comparing against a NumPy transcription of the Keras layers\n')
+
+    runtimes = {'NumPy float32': CnnIntentRuntime.load(float_path), 'NumPy int8': CnnIntentRuntime.load(int8_path)}
+    expected = reference(batch)
+    print(f"{len(batch)} queries, vocabulary of {vocab_size}, {len(labels)} intents\n")
+    print(f"{'Runtime':<16} {'File KiB':>9} {'Weights MiB':>12} {'Max diff':>10} {'Same intent':>12}")
+    print('-' * 64)
+    failed = False
+    for name, runtime in runtimes.items():
+        predicted = runtime.predict(batch)
+        difference = float(np.abs(predicted - expected).max())
+        agreement = float((predicted.argmax(axis=1) == expected.argmax(axis=1)).mean())
+        if name == 'NumPy float32' and difference > TOLERANCE:
+            failed = True
+        size = os.path.getsize(float_path if name == 'NumPy float32' else int8_path) / 1024
+        print(f"{name:<16} {size:>9.0f} {runtime.nbytes / 1024 / 1024:>12.2f} {difference:>10.2e} {agreement:>11.1%}")
+
+    print(f"\n{'Runtime':<16} " + ' '.join(f"{f'batch {size} ms':>13}" for size in BATCH_SIZES))
+    print('-' * (17 + 14 * len(BATCH_SIZES)))
+    timed = {reference_name: reference, **{name: runtime.predict for name, runtime in runtimes.items()}}
+    for name, predict in timed.items():
+        timings = time_batches(predict, batch, args.repeat)
+        print(f"{name:<16} " + ' '.join(f"{timings[size]:>13.3f}" for size in BATCH_SIZES))
+
+    print(f"\n{'Fresh process':<16} {'Cold start s':>13} {'Peak MiB':>9}")
+    print('-' * 40)
+    starts = {name: _LOAD_NUMPY.format(path=path) for name, path in (('NumPy float32', float_path), ('NumPy int8', int8_path))}
+    if keras_path:
+        starts = {'Keras': _LOAD_KERAS.format(path=keras_path, length=MAX_SEQUENCE_LENGTH), **starts}
+    for name, load_code in starts.items():
+        result = cold_start(load_code)
+        print(f"{name:<16} {result['seconds']:>13.2f} {result['peak_mb']:>9.0f}")
+    if failed:
+        print(f"\nfloat32 export differs from the {reference_name} by more than {TOLERANCE}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='NumPy runtime of the 1D-CNN intent model against Keras')
+    parser.add_argument('--model-dir', help='Directory written by save_for_serving, with cnn.keras (random weights if omitted)')
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    main(parser.parse_args())
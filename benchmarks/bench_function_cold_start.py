@@ -0,0 +1,135 @@
+"""
+Measures the cold start of the Azure Functions wiki agent: fresh processes load function_app
+and answer their first /get_url_content request from the stub wiki.
+
+Usage:
+    python benchmarks/bench_function_cold_start.py [--runs 5] [--latency-ms 100] [--gap-ms 0] [--profile-imports]
+
+Three builds of Azure_Func_Testing/wikiagent are compared:
+
+    eager (before)        requests, urllib3, bs4 and lxml imported with the app, as the app did
+                          before its imports were deferred
+    deferred              heavy imports happen on the first request
+    deferred + warm-up    the session and parser are built on a background thread started at
+                          import (WIKI_WARM_UP=1, the default), overlapping the first fetch
+
+For each, the median over --runs processes of: time until the functions are indexed (app
+ready), the first request, time from start to the first response, and a second request.
+--latency-ms is added to every stub wiki response, standing in for the real wiki's latency,
+and --gap-ms passes between indexing and the first request, standing in for the host's own
+startup work after it loaded the app.
+All builds must return the same response. With --profile-imports, the startup profile of
+the last warm-up run is printed with its slowest imports.
+"""
+# Imports and Installs
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+APP_DIR = os.path.join(REPO_DIR, 'Azure_Func_Testing', 'wikiagent')
+sys.path.insert(0, BENCHMARKS_DIR)
+sys.path.insert(0, os.path.dirname(APP_DIR))
+import stub_wiki
+import copy_shared_modules
+
+# Constants
+# The imports function_app.py made at module level before they were deferred
+EAGER_IMPORTS = 'import requests, urllib3.util.retry, requests.adapters, bs4, lxml.html, lxml.etree'
+BUILDS = {
+    'eager (before)': {'WIKI_WARM_UP': '0', 'eager': True},
+    'deferred': {'WIKI_WARM_UP': '0', 'eager': False},
+    'deferred + warm-up': {'WIKI_WARM_UP': '1', 'eager': False},
+}
+
+_CHILD = """
+import time
+started = time.perf_counter()
+import sys, json
+sys.path.insert(0, {app_dir!r})
+{eager}
+import function_app
+import azure.functions as func
+functions = {{f.get_function_name(): f.get_user_function() for f in function_app.app.get_functions()}}
+ready = time.perf_counter()
+time.sleep({gap_seconds!r})
+
+def call(url):
+    request = func.HttpRequest('POST', '/api/get_url_content', headers={{'Content-Type': 'application/json'}},
+                               body=json.dumps({{'url': url}}).encode('utf-8'))
+    began = time.perf_counter()
+    response = functions['get_url_content'](request)
+    return response, time.perf_counter() - began
+
+first, first_seconds = call({url!r})
+answered = time.perf_counter()
+second, second_seconds = call({second_url!r})
+profile = functions['get_startup_profile'](func.HttpRequest('GET', '/api/get_startup_profile', body=b'')).get_body()
+print(json.dumps({{
+    'ready_ms': (ready - started) * 1000,
+    'first_request_ms': first_seconds * 1000,
+    'first_response_ms': (answered - started) * 1000,
+    'second_request_ms': second_seconds * 1000,
+    'status': first.status_code,
+    'body': first.get_body().decode('utf-8'),
+    'profile': json.loads(profile),
+}}))
+"""
+
+
+def run_build(build:dict, url:str, second_url:str, gap_ms:float, profile_imports:bool):
+    script = _CHILD.format(app_dir=APP_DIR, eager=EAGER_IMPORTS if build['eager'] else '', url=url, second_url=second_url,
+                           gap_seconds=gap_ms / 1000)
+    environment = {**os.environ, 'WIKI_WARM_UP': build['WIKI_WARM_UP'], 'WIKI_PROFILE_IMPORTS': '1' if profile_imports else '0'}
+    output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True, env=environment).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(args):
+    copy_shared_modules.copy_modules(APP_DIR)     # The function's build step, the app imports the root modules from its folder
+    server = stub_wiki.serve(latency_ms=args.latency_ms)
+    base = f'http://127.0.0.1:{server.server_port}/{stub_wiki.wiki_path(stub_wiki.DEFAULT_VERSIONS[0])}/index.php/'
+    url, second_url = base + 'Main_Page', base + 'Page_1'
+
+    measures = ('ready_ms', 'first_request_ms', 'first_response_ms', 'second_request_ms')
+    print(f"{args.runs} fresh processes per build, {args.latency_ms:.0f} ms stub wiki latency, {args.gap_ms:.0f} ms host gap\n")
+    print(f"{'Build':<20} {'App ready ms':>13} {'1st request ms':>15} {'1st response ms':>16} {'2nd request ms':>15}")
+    print('-' * 83)
+    bodies, medians, last = set(), {}, None
+    for name, build in BUILDS.items():
+        runs = [run_build(build, url, second_url, args.gap_ms, args.profile_imports) for _ in range(args.runs)]
+        bodies.update((run['status'], run['body']) for run in runs)
+        medians[name] = {measure: statistics.median(run[measure] for run in runs) for measure in measures}
+        last = runs[-1]
+        print(f"{name:<20} " + ' '.join(f"{medians[name][measure]:>{width}.1f}"
+                                        for measure, width in zip(measures, (13, 15, 16, 15))))
+
+    before, after = medians['eager (before)']['first_response_ms'], medians['deferred + warm-up']['first_response_ms']
+    print(f"\nstart to first response: {before:.0f} ms before, {after:.0f} ms with deferred imports and warm-up "
+          f"({before - after:.0f} ms, {(before - after) / before:.0%} less)")
+    print("\nstartup profile of the last warm-up run:")
+    for phase in last['profile']['phases']:
+        print(f"  {phase['name']:<28} start {phase['start_ms']:>8.1f} ms  took {phase['ms']:>8.1f} ms  ({phase['thread']})")
+    first_request = last['profile']['first_request']
+    print(f"  {'first request':<28} start {first_request['start_ms']:>8.1f} ms  took {first_request['ms']:>8.1f} ms")
+    for entry in last['profile']['imports'][:10]:
+        print(f"  import {entry['module']:<40} self {entry['self_ms']:>7.1f} ms  cumulative {entry['cumulative_ms']:>7.1f} ms")
+
+    identical = len(bodies) == 1 and next(iter(bodies))[0] == 200
+    print(f"\nsame 200 response from every build: {identical}")
+    server.shutdown()
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cold start of the Azure Functions wiki agent')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--latency-ms', type=float, default=100)
+    parser.add_argument('--gap-ms', type=float, default=0, help='Pause between indexing and the first request')
+    parser.add_argument('--profile-imports', action='store_true', help='Time every import (WIKI_PROFILE_IMPORTS=1)')
+    main(parser.parse_args())
@@ -0,0 +1,97 @@
+"""
+Checks and times incremental syncs against the stub MediaWiki.
+
+Usage:
+    python benchmarks/bench_incremental_sync.py [--pages 1000] [--edits 20] [--latency-ms 20]
+
+Syncs a stub wiki version in full, then edits, creates and deletes a few pages and
+syncs again. The incremental sync must leave the store exactly as a fresh full crawl
+of the edited wiki would (same pages, text and links), while fetching only the
+changed pages and their new outlinks.
+"""
+# Imports and Installs
+import os
+import sys
+import random
+import argparse
+import tempfile
+from urllib.parse import urljoin
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS_DIR)
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+import stub_wiki
+from WikiPageExtractor import extract_page
+from WikiIncrementalSync import IncrementalSync, WikiSyncStore
+import WikiHttpClient as http_client
+
+
+def fetch(url):
+    response = http_client.get(url)
+    response.raise_for_status()
+    return response.text
+
+
+def extract_wiki_page(html_content, page_url, base_url):
+    # Keep links to content pages of the stub wiki only, like the service's link filter does on the real one
+    return extract_page(
+        html_content,
+        resolve_url=lambda href: urljoin(page_url, href),
+        keep_link=lambda url, title: url.startswith(base_url.rsplit('/', 1)[0]) and '?' not in url and 'Special:' not in url,
+    )
+
+
+def snapshot(store, version):
+    return {url: store.get_page(version, url) for url in store.page_urls(version)}
+
+
+def main(args):
+    server = stub_wiki.serve(latency_ms=args.latency_ms, pages=args.pages)
+    start_url = f'http://127.0.0.1:{server.server_port}/{stub_wiki.wiki_path(stub_wiki.DEFAULT_VERSIONS[0])}/index.php/Main_Page'
+    version = stub_wiki.DEFAULT_VERSIONS[0]
+    workdir = tempfile.mkdtemp()
+    on_error = lambda url, e: print(f"ERROR: Could not fetch {url} : {e}")
+    sync = IncrementalSync(WikiSyncStore(os.path.join(workdir, 'incremental.sqlite3')), fetch, extract_wiki_page, on_error=on_error)
+
+    first = sync.sync(version, start_url)
+    print(f"full sync        : {first['fetched']:>5} pages fetched in {first['seconds']:.2f}s")
+
+    rng = random.Random(0)
+    titles = [t for t in stub_wiki.StubWikiHandler.pages if t != 'Main_Page']
+    edited = rng.sample(titles, args.edits)
+    for title in edited:
+        stub_wiki.edit_page(title, add_links=[rng.choice(titles)])
+    for i in range(args.created):
+        stub_wiki.create_page(f'New_Page_{i}', linked_from=rng.choice(edited))
+    for title in rng.sample([t for t in titles if t not in edited], args.deleted):
+        stub_wiki.delete_page(title)
+
+    second = sync.sync(version, start_url)
+    print(f"incremental sync : {second['fetched']:>5} pages fetched in {second['seconds']:.2f}s "
+          f"({second['changes']} changes, {second['removed']} removed)")
+
+    # A fresh full crawl of the edited wiki is the reference the incremental store must match
+    fresh = IncrementalSync(WikiSyncStore(os.path.join(workdir, 'fresh.sqlite3')), fetch, extract_wiki_page)
+    reference = fresh.sync(version, start_url)
+    expected = snapshot(fresh.store, version)
+    actual = snapshot(sync.store, version)
+    # Deleted pages stay linked from unchanged pages, so the full crawl tries and fails to fetch them as well
+    missing = set(expected) - set(actual)
+    extra = set(actual) - set(expected)
+    different = [url for url in set(expected) & set(actual) if expected[url] != actual[url]]
+    print(f"reference crawl  : {reference['fetched']:>5} pages fetched in {reference['seconds']:.2f}s")
+    print(f"store vs full crawl: {len(missing)} missing, {len(extra)} extra, {len(different)} different pages")
+    print(f"speedup          : {reference['seconds'] / max(second['seconds'], 1e-9):.1f}x")
+    server.shutdown()
+    if missing or extra or different:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Incremental sync against the stub MediaWiki')
+    parser.add_argument('--pages', type=int, default=1000)
+    parser.add_argument('--edits', type=int, default=20)
+    parser.add_argument('--created', type=int, default=3)
+    parser.add_argument('--deleted', type=int, default=2)
+    parser.add_argument('--latency-ms', type=float, default=20, help='Delay the stub wiki adds to every response')
+    main(parser.parse_args())
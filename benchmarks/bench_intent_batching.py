@@ -0,0 +1,179 @@
+"""
+Measures /classify_intent throughput and latency with and without micro-batching.
+
+Usage:
+    python benchmarks/bench_intent_batching.py [--model-dir intent_models/] [--clients 64] [--seconds 5]
+                                               [--max-batch 64] [--max-wait-ms 2]
+
+Concurrent clients classify queries of datasets/intent_dataset.csv, first each with its
+own model call (what the endpoint would do without the batcher), then through a
+MicroBatcher. With --model-dir the model saved by Intent_Identifier_Models.ipynb is used
+(needs TensorFlow). Without it a NumPy stand-in with the joint model's layers and sizes
+(embedding, Bi-LSTM, shared dense, four heads, random weights) runs instead, which has
+the same shape of cost: a sequential loop over the 50 time steps per call, plus work per
+query. Both modes must return the same classifications.
+"""
+# Imports and Installs
+import os
+import sys
+import csv
+import time
+import argparse
+import threading
+from collections import Counter
+import numpy as np
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+from WikiMicroBatcher import MicroBatcher
+from WikiIntentClassifier import IntentClassifier, QueryTokenizer, SLOT_NAMES
+
+# Constants
+DATASET_PATH = os.path.join(os.path.dirname(BENCHMARKS_DIR), 'datasets', 'intent_dataset.csv')
+MAX_SEQUENCE_LENGTH = 50        # CONFIG of Intent_Identifier_Models.ipynb
+MAX_VOCAB_SIZE = 10000
+EMBEDDING_DIM = 128
+HIDDEN_UNITS = 128
+
+
+def load_dataset(path:str=DATASET_PATH):
+    with open(path, encoding='utf-8', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def fit_tokenizer(queries:list):
+    # Same word order as a Keras Tokenizer fitted on the queries: most frequent first, '<OOV>' at 1
+    tokenizer = QueryTokenizer({}, num_words=MAX_VOCAB_SIZE, oov_token='<OOV>')
+    counts = Counter(word for query in queries for word in query.lower().translate(tokenizer._translation).split() if word)
+    word_index = {'<OOV>': 1}
+    for word, _ in counts.most_common():
+        word_index[word] = len(word_index) + 1
+    return QueryTokenizer(word_index, num_words=MAX_VOCAB_SIZE, oov_token='<OOV>')
+
+
+class StandInJointModel:
+    """
+    NumPy forward pass with the layers and sizes of build_joint_model, with random weights.
+    """
+
+    def __init__(self, vocab_size:int, head_sizes:list, seed:int=0):
+        rng = np.random.default_rng(seed)
+        weight = lambda *shape: (rng.standard_normal(shape) / np.sqrt(shape[0])).astype(np.float32)
+        self.embedding = weight(vocab_size, EMBEDDING_DIM)
+        self.lstm = [(weight(EMBEDDING_DIM, 4 * HIDDEN_UNITS), weight(HIDDEN_UNITS, 4 * HIDDEN_UNITS)) for _ in range(2)]
+        self.shared = weight(2 * HIDDEN_UNITS, HIDDEN_UNITS)
+        self.heads = [(weight(HIDDEN_UNITS, 64), weight(64, size)) for size in head_sizes]
+
+    @staticmethod
+    def _sigmoid(x):
+        return 1 / (1 + np.exp(-x))
+
+    def _lstm(self, inputs, mask, kernel, recurrent, reverse:bool):
+        batch, steps, _ = inputs.shape
+        projected = inputs @ kernel
+        h = np.zeros((batch, HIDDEN_UNITS), dtype=np.float32)
+        c = np.zeros_like(h)
+        outputs = np.zeros((batch, steps, HIDDEN_UNITS), dtype=np.float32)
+        for step in (reversed(range(steps)) if reverse else range(steps)):
+            gates = projected[:, step] + h @ recurrent
+            i, f, g, o = np.split(gates, 4, axis=1)
+            new_c = self._sigmoid(f) * c + self._sigmoid(i) * np.tanh(g)
+            new_h = self._sigmoid(o) * np.tanh(new_c)
+            keep = mask[:, step, None]
+            c = np.where(keep, new_c, c)
+            h = np.where(keep, new_h, h)
+            outputs[:, step] = new_h
+        return outputs
+
+    def __call__(self, batch):
+        mask = batch != 0
+        embedded = self.embedding[batch]
+        sequence = np.concatenate([self._lstm(embedded, mask, *self.lstm[0], reverse=False),
+                                   self._lstm(embedded, mask, *self.lstm[1], reverse=True)], axis=2)
+        pooled = (sequence * mask[:, :, None]).sum(axis=1) / np.maximum(mask.sum(axis=1, keepdims=True), 1)
+        shared = np.maximum(pooled @ self.shared, 0)
+        outputs = []
+        for hidden, output in self.heads:
+            logits = np.maximum(shared @ hidden, 0) @ output
+            exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+            outputs.append(exp / exp.sum(axis=1, keepdims=True))
+        return outputs
+
+
+def stand_in_classifier(rows:list):
+    outputs = ['intent'] + list(SLOT_NAMES)
+    labels = {name: sorted({row[name] or 'NONE' for row in rows}) for name in outputs}
+    tokenizer = fit_tokenizer([row['query'] for row in rows])
+    vocab_size = min(len(tokenizer.word_index) + 1, MAX_VOCAB_SIZE)
+    model = StandInJointModel(vocab_size, [len(labels[name]) for name in outputs])
+    return IntentClassifier(model, tokenizer, labels, outputs, MAX_SEQUENCE_LENGTH)
+
+
+def run_clients(classify, queries:list, clients:int, seconds:float):
+    # Every client classifies queries back to back until the time is up
+    latencies = [[] for _ in range(clients)]
+    results = {}
+    stop = time.perf_counter() + seconds
+
+    def client(index):
+        position = index
+        while time.perf_counter() < stop:
+            query = queries[position % len(queries)]
+            started = time.perf_counter()
+            results[query] = classify(query)
+            latencies[index].append(time.perf_counter() - started)
+            position += clients
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    timings = sorted(latency * 1000 for client_latencies in latencies for latency in client_latencies)
+    return len(timings) / elapsed, timings[len(timings) // 2], timings[int(len(timings) * 0.99)], results
+
+
+def main(args):
+    rows = load_dataset()
+    queries = [row['query'] for row in rows]
+    if args.model_dir:
+        classifier = IntentClassifier.load(args.model_dir, args.model)
+        print(f"model            : {args.model} from {args.model_dir}")
+    else:
+        classifier = stand_in_classifier(rows)
+        print("model            : NumPy stand-in of the joint model (random weights)")
+    classifier.classify_batch(queries[:args.max_batch])     # Warm up
+
+    print(f"{args.clients} clients, {args.seconds:.0f}s per mode, {len(queries)} distinct queries\n")
+    print(f"{'Mode':<14} {'Queries/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'Mean batch':>11}")
+    print('-' * 55)
+    throughput, p50, p99, unbatched = run_clients(classifier.classify, queries, args.clients, args.seconds)
+    print(f"{'per query':<14} {throughput:>10.0f} {p50:>8.2f} {p99:>8.2f} {1:>11.1f}")
+
+    batcher = MicroBatcher(classifier.classify_batch, args.max_batch, args.max_wait_ms)
+    throughput, p50, p99, batched = run_clients(batcher, queries, args.clients, args.seconds)
+    batcher.close()
+    print(f"{'micro-batched':<14} {throughput:>10.0f} {p50:>8.2f} {p99:>8.2f} {batcher.stats()['mean_batch_size']:>11.1f}")
+
+    # Padding rows of other queries must not change a query's classification
+    differing = sum(
+        batched[query]['intent'] != unbatched[query]['intent']
+        or any(batched[query]['slots'][name]['value'] != unbatched[query]['slots'][name]['value'] for name in batched[query]['slots'])
+        for query in batched if query in unbatched
+    )
+    print(f"\nclassifications differing between the modes: {differing}")
+    if differing:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Intent classification with and without micro-batching')
+    parser.add_argument('--model-dir', help='Directory written by save_for_serving (NumPy stand-in if omitted)')
+    parser.add_argument('--model', default='joint', help='Saved model to use')
+    parser.add_argument('--clients', type=int, default=64)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--max-wait-ms', type=float, default=2)
+    main(parser.parse_args())
@@ -0,0 +1,291 @@
+"""
+Measures the training and inference cost of the Bi-LSTM, 1D-CNN and joint intent models on CPU.
+
+Usage:
+    python benchmarks/bench_intent_models.py [--dataset datasets/intent_dataset.csv] [--architectures bilstm,cnn,joint]
+                                             [--vary MAX_SEQUENCE_LENGTH=25,100] [--vary EMBEDDING_DIM=64,256]
+                                             [--vary HIDDEN_UNITS=64,256] [--train-steps 50] [--repeat 20]
+                                             [--output Visualizations/model_benchmarks]
+
+The models are the build_*_model functions of Intent_Identifier_Models.ipynb, built with
+the notebook's CONFIG and then with every --vary value, one setting at a time (the
+defaults vary sequence length, embedding dim and hidden units). Every architecture and
+configuration runs in a fresh CPU-only process, which reports:
+
+    train step ms / samples per s   median fit() step over --train-steps batches of BATCH_SIZE
+                                    fed through tf.data as make_datasets does, after warmup
+    latency ms at batch 1/32/256    median and p95 of a compiled forward pass, as served by
+                                    /classify_intent, over --repeat calls
+    parameters / file KiB           count_params() and the size of the saved .keras file
+    peak RSS MiB                    the process's high-water mark after training and inference
+
+Results go to <output>.json (machine readable, with the environment) and a comparison
+chart to <output>.png, next to the notebook's charts in Visualizations/. Needs TensorFlow;
+the chart needs matplotlib.
+"""
+# Imports and Installs
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import numpy as np
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+sys.path.insert(0, REPO_DIR)
+from WikiIntentDataCache import one_hot
+from bench_intent_batching import load_dataset, fit_tokenizer, DATASET_PATH
+
+# Constants
+NOTEBOOK_PATH = os.path.join(REPO_DIR, 'Intent_Identifier_Models.ipynb')
+OUTPUT_PATH = os.path.join(REPO_DIR, 'Visualizations', 'model_benchmarks')
+ARCHITECTURES = {'bilstm': 'build_bilstm_model', 'cnn': 'build_cnn_model', 'joint': 'build_joint_model'}
+ARCHITECTURE_NAMES = {'bilstm': 'Bi-LSTM', 'cnn': '1D-CNN', 'joint': 'Joint MTL'}     # As in visualize_comparison
+ARCHITECTURE_COLORS = {'bilstm': '#3498db', 'cnn': '#2ecc71', 'joint': '#e74c3c'}
+SLOT_TARGETS = ('brand', 'model', 'sensor')
+DEFAULT_VARIATIONS = {'MAX_SEQUENCE_LENGTH': [25, 100], 'EMBEDDING_DIM': [64, 256], 'HIDDEN_UNITS': [64, 256]}
+BATCH_SIZES = [1, 32, 256]
+WARMUP_STEPS = 5
+
+
+def notebook_config():
+    """
+    Returns the CONFIG dict of the notebook.
+    """
+    with open(NOTEBOOK_PATH, encoding='utf-8') as f:
+        cells = [''.join(cell['source']) for cell in json.load(f)['cells'] if cell['cell_type'] == 'code']
+    namespace = {}
+    exec(next(cell for cell in cells if re.search(r'^CONFIG = \{', cell, re.MULTILINE)), namespace)
+    return namespace['CONFIG']
+
+
+def configurations(config:dict, variations:dict):
+    """
+    Returns [(label, config)]: the notebook's CONFIG, then one entry per varied value.
+    """
+    runs = [('baseline', dict(config))]
+    for key, values in variations.items():
+        for value in values:
+            if value != config[key]:
+                runs.append((f'{key}={value}', {**config, key: value}))
+    return runs
+
+
+def peak_rss_mb():
+    try:
+        # VmHWM starts over at exec, unlike ru_maxrss which keeps the parent's peak
+        with open('/proc/self/status') as status:
+            return next(int(line.split()[1]) for line in status if line.startswith('VmHWM')) / 1024
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def percentile_ms(seconds:list, q:float):
+    return float(np.percentile(seconds, q) * 1000)
+
+
+def run_one(architecture:str, config:dict, dataset:str, train_steps:int, repeat:int):
+    """
+    Builds, trains and times one model in this process. Runs in a child process started by main.
+    """
+    import tempfile
+    import tensorflow as tf
+    from tensorflow import keras
+    from tensorflow.keras import layers, Model, Input
+
+    np.random.seed(42)
+    tf.random.set_seed(42)
+    rows = load_dataset(dataset)
+    queries = [row['query'] for row in rows]
+    tokenizer = fit_tokenizer(queries)
+    X = tokenizer.encode(queries, config['MAX_SEQUENCE_LENGTH'])
+    targets = {}
+    for name in ('intent',) + SLOT_TARGETS:
+        classes, indices = np.unique([row[name] or 'NONE' for row in rows], return_inverse=True)
+        targets[name] = one_hot(indices, len(classes))
+    metadata = {
+        'vocab_size': min(len(tokenizer.word_index) + 1, config['MAX_VOCAB_SIZE']),
+        'max_seq_length': config['MAX_SEQUENCE_LENGTH'],
+        **{f'num_{name}_classes': y.shape[1] for name, y in targets.items()},
+    }
+
+    with open(NOTEBOOK_PATH, encoding='utf-8') as f:
+        cells = [''.join(cell['source']) for cell in json.load(f)['cells'] if cell['cell_type'] == 'code']
+    namespace = {'CONFIG': config, 'keras': keras, 'layers': layers, 'Model': Model, 'Input': Input}
+    exec(next(cell for cell in cells if cell.lstrip().startswith(f'def {ARCHITECTURES[architecture]}(')), namespace)
+    model = namespace[ARCHITECTURES[architecture]](metadata)
+
+    # Training input as make_datasets builds it
+    if architecture == 'joint':
+        y = {f'{name}_output': targets[name] for name in ('intent',) + SLOT_TARGETS}
+    else:
+        y = targets['intent']
+    train = (tf.data.Dataset.from_tensor_slices((X, y)).cache().shuffle(len(X), seed=42, reshuffle_each_iteration=True)
+             .repeat().batch(config['BATCH_SIZE']).prefetch(tf.data.AUTOTUNE))
+
+    class StepTimer(keras.callbacks.Callback):
+        def on_train_batch_begin(self, batch, logs=None):
+            self.started = time.perf_counter()
+
+        def on_train_batch_end(self, batch, logs=None):
+            steps.append(time.perf_counter() - self.started)
+
+    steps = []
+    model.fit(train, epochs=1, steps_per_epoch=WARMUP_STEPS + train_steps, callbacks=[StepTimer()], verbose=0)
+    step_ms = percentile_ms(steps[WARMUP_STEPS:], 50)
+
+    # Inference as IntentClassifier.load serves it: one traced call per batch shape
+    forward = tf.function(lambda batch: model(batch, training=False))
+    latency = {}
+    for size in BATCH_SIZES:
+        batch = tf.constant(np.resize(X, (size, X.shape[1])))
+        forward(batch)
+        calls = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            forward(batch)
+            calls.append(time.perf_counter() - started)
+        latency[str(size)] = {'median_ms': percentile_ms(calls, 50), 'p95_ms': percentile_ms(calls, 95)}
+
+    path = os.path.join(tempfile.mkdtemp(), f'{architecture}.keras')
+    model.save(path)
+    return {
+        'architecture': architecture,
+        'train_step_ms': step_ms,
+        'train_samples_per_s': config['BATCH_SIZE'] / (step_ms / 1000),
+        'latency': latency,
+        'parameters': int(model.count_params()),
+        'file_kib': os.path.getsize(path) / 1024,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def run_child(architecture:str, config:dict, args):
+    # A fresh CPU-only interpreter per model, so peak RSS and TensorFlow state are its own
+    job = json.dumps({'architecture': architecture, 'config': config, 'dataset': args.dataset,
+                      'train_steps': args.train_steps, 'repeat': args.repeat})
+    environment = {**os.environ, 'CUDA_VISIBLE_DEVICES': '-1', 'TF_CPP_MIN_LOG_LEVEL': '2'}
+    completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-one', job],
+                               capture_output=True, text=True, env=environment)
+    if completed.returncode != 0:
+        print(f"ERROR: {architecture} failed:\n{completed.stderr[-2000:]}")
+        return None
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def plot(results:list, path:str):
+    """
+    Bar charts of every measure, one group per configuration and one bar per architecture.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    labels = list(dict.fromkeys(result['label'] for result in results))
+    architectures = [name for name in ARCHITECTURES if any(result['architecture'] == name for result in results)]
+    measures = [
+        ('Training Step (ms)', lambda result: result['train_step_ms']),
+        ('Training Throughput (samples/s)', lambda result: result['train_samples_per_s']),
+        *[(f'Inference Latency, Batch {size} (ms)', lambda result, size=size: result['latency'][str(size)]['median_ms'])
+          for size in BATCH_SIZES],
+        ('Parameters (millions)', lambda result: result['parameters'] / 1e6),
+        ('Saved Model Size (MiB)', lambda result: result['file_kib'] / 1024),
+        ('Peak RSS (MiB)', lambda result: result['peak_rss_mb']),
+    ]
+    columns = 2
+    fig, axes = plt.subplots((len(measures) + 1) // columns, columns, figsize=(18, 4 * ((len(measures) + 1) // columns)))
+    width = 0.8 / len(architectures)
+    positions = np.arange(len(labels))
+    for ax, (title, measure) in zip(axes.ravel(), measures):
+        for offset, architecture in enumerate(architectures):
+            values = {result['label']: measure(result) for result in results if result['architecture'] == architecture}
+            ax.bar(positions + (offset - (len(architectures) - 1) / 2) * width, [values.get(label, 0) for label in labels],
+                   width, label=ARCHITECTURE_NAMES[architecture], color=ARCHITECTURE_COLORS[architecture],
+                   alpha=0.8, edgecolor='black')
+        ax.set_title(title, fontsize=12, fontweight='bold')
+        ax.set_xticks(positions)
+        ax.set_xticklabels(labels, rotation=20, ha='right', fontsize=9)
+        ax.grid(axis='y', alpha=0.3)
+    for ax in axes.ravel()[len(measures):]:
+        ax.axis('off')
+    axes.ravel()[0].legend(fontsize=10)
+    fig.suptitle('Automotive Intent Classification: Training and Inference Cost (CPU)', fontsize=16, fontweight='bold')
+    plt.tight_layout(rect=[0, 0, 1, 0.97])
+    plt.savefig(path, dpi=150, bbox_inches='tight')
+    plt.close()
+
+
+def main(args):
+    if args.run_one:
+        job = json.loads(args.run_one)
+        print(json.dumps(run_one(job['architecture'], job['config'], job['dataset'], job['train_steps'], job['repeat'])))
+        return
+    try:
+        import tensorflow as tf
+    except ImportError:
+        sys.exit('bench_intent_models.py needs TensorFlow: pip install tensorflow')
+
+    variations = DEFAULT_VARIATIONS if args.vary is None else {
+        key: [int(value) for value in values.split(',')] for key, values in (item.split('=', 1) for item in args.vary)}
+    architectures = args.architectures.split(',')
+    unknown = set(architectures) - set(ARCHITECTURES)
+    if unknown:
+        sys.exit(f"Unknown architectures {sorted(unknown)}, choose from {list(ARCHITECTURES)}")
+    results, failed = [], False
+    print(f"{'Configuration':<24} {'Model':<10} {'Step ms':>8} {'Samples/s':>10} "
+          + ' '.join(f"{f'b{size} ms':>8}" for size in BATCH_SIZES) + f" {'Params':>10} {'File KiB':>9} {'RSS MiB':>8}")
+    print('-' * 104)
+    for label, config in configurations(notebook_config(), variations):
+        for architecture in architectures:
+            result = run_child(architecture, config, args)
+            if result is None:
+                failed = True
+                continue
+            result.update({'label': label, 'config': {key: config[key] for key in DEFAULT_VARIATIONS | variations}})
+            results.append(result)
+            print(f"{label:<24} {architecture:<10} {result['train_step_ms']:>8.1f} {result['train_samples_per_s']:>10.0f} "
+                  + ' '.join(f"{result['latency'][str(size)]['median_ms']:>8.2f}" for size in BATCH_SIZES)
+                  + f" {result['parameters']:>10} {result['file_kib']:>9.0f} {result['peak_rss_mb']:>8.0f}")
+
+    report = {
+        'environment': {
+            'tensorflow': tf.__version__, 'python': platform.python_version(), 'machine': platform.machine(),
+            'processor': platform.processor(), 'cpus': os.cpu_count(), 'device': 'CPU',
+        },
+        'dataset': os.path.relpath(args.dataset, REPO_DIR),
+        'batch_size': notebook_config()['BATCH_SIZE'],
+        'train_steps': args.train_steps,
+        'repeat': args.repeat,
+        'results': results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output + '.json', 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}.json")
+    try:
+        plot(results, args.output + '.png')
+        print(f"Chart written to {args.output}.png")
+    except ImportError:
+        print("ERROR: matplotlib is not installed, no chart written")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Training and inference cost of the intent model architectures')
+    parser.add_argument('--dataset', default=DATASET_PATH)
+    parser.add_argument('--architectures', default=','.join(ARCHITECTURES))
+    parser.add_argument('--vary', action='append', metavar='KEY=V1,V2',
+                        help='CONFIG entry and the values to try one at a time (default: sequence length, embedding dim, hidden units)')
+    parser.add_argument('--train-steps', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output', default=OUTPUT_PATH, help='Results path without extension (.json and .png are written)')
+    parser.add_argument('--run-one', help=argparse.SUPPRESS)
+    main(parser.parse_args())
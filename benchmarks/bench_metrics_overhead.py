@@ -0,0 +1,176 @@
+"""
+Measures what the /metrics instrumentation of the wiki endpoints costs on the hot path,
+and checks what it reports.
+
+Usage:
+    python benchmarks/bench_metrics_overhead.py [--requests 30] [--max-depth 0] [--runs 3]
+
+Fresh processes import WikiEndpoints pointed at the stub wiki (page store off) and answer
+--requests /get_url_content calls through the Flask test client, crawling --max-depth
+link hops (the default 0 stays on the stub, whose kept links all leave it). Each runs once
+with metrics recorded (WIKI_METRICS=1, the default) and once without (WIKI_METRICS=0).
+The median request time of both is compared, next to the cost of a single histogram
+observation and counter increment.
+
+The /metrics output of the instrumented run must be valid Prometheus text, every
+histogram's +Inf bucket must equal its count, the fetch stage must have been observed
+once per page fetched (or failed), and the route histogram once per request.
+"""
+# Imports and Installs
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+sys.path.insert(0, REPO_DIR)
+import stub_wiki
+from WikiMetrics import MetricsRegistry
+
+# Constants
+MICRO_ITERATIONS = 200_000
+SAMPLE_LINE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})? (\S+)$')
+
+
+def micro_costs():
+    registry = MetricsRegistry(enabled=True)
+    histogram = registry.histogram('bench_seconds', 'Benchmark histogram', ('stage',))
+    counter = registry.counter('bench_total', 'Benchmark counter', ('result',))
+    costs = {}
+    for name, record in (('histogram observe', lambda: histogram.observe(0.003, stage='fetch')),
+                         ('counter inc', lambda: counter.inc(result='ok')),
+                         ('empty call', lambda: None)):
+        started = time.perf_counter()
+        for _ in range(MICRO_ITERATIONS):
+            record()
+        costs[name] = (time.perf_counter() - started) / MICRO_ITERATIONS * 1e9
+    return costs
+
+
+def run_one(args):
+    """
+    Child process: times the requests and prints them with the /metrics text as JSON.
+    """
+    sys.path.insert(0, REPO_DIR)
+    import WikiEndpoints as wiki
+    client = wiki.app.test_client()
+    body = {'url': args.url, 'max_depth': args.max_depth}
+    client.post('/get_url_content', json=body)      # Warm up imports and the connection pool
+    times = []
+    for _ in range(args.requests):
+        started = time.perf_counter()
+        response = client.post('/get_url_content', json=body)
+        times.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f"/get_url_content answered {response.status_code}")
+    print(json.dumps({'times_ms': times, 'links': len(response.get_json()['hyperlinksFromPage']),
+                      'metrics': client.get('/metrics').get_data(as_text=True)}))
+
+
+def run_child(enabled:bool, url:str, args):
+    environment = dict(
+        os.environ,
+        WIKI_METRICS='1' if enabled else '0',
+        WIKI_PAGE_STORE_DIR='',
+        WIKI_VERSION_MAP_CACHE=os.path.join(tempfile.mkdtemp(), 'version_map_cache.json'),
+    )
+    command = [sys.executable, os.path.abspath(__file__), '--run-one', '--url', url,
+               '--requests', str(args.requests), '--max-depth', str(args.max_depth)]
+    output = subprocess.run(command, capture_output=True, text=True, check=True, env=environment, cwd=REPO_DIR).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def parse_metrics(text:str):
+    """
+    Returns ({(name, labels): value}, invalid lines) of a Prometheus text exposition.
+    """
+    samples, invalid = {}, []
+    for line in text.splitlines():
+        if not line or line.startswith('# HELP ') or line.startswith('# TYPE '):
+            continue
+        match = SAMPLE_LINE.match(line)
+        if not match:
+            invalid.append(line)
+            continue
+        try:
+            samples[(match.group(1), match.group(2) or '')] = float(match.group(3))
+        except ValueError:
+            invalid.append(line)
+    return samples, invalid
+
+
+def check_metrics(text:str, requests:int):
+    samples, invalid = parse_metrics(text)
+    problems = [f"invalid line: {line}" for line in invalid]
+    for (name, labels), count in samples.items():
+        if name.endswith('_count'):
+            bucket_labels = labels[:-1] + ',le="+Inf"}' if labels else '{le="+Inf"}'
+            if samples.get((name[:-len('_count')] + '_bucket', bucket_labels)) != count:
+                problems.append(f"{name}{labels}: +Inf bucket differs from count {count}")
+    fetches = samples.get(('wiki_stage_duration_seconds_count', '{stage="fetch"}'), 0)
+    fetched = sum(samples.get(('wiki_pages_fetched_total', f'{{result="{result}"}}'), 0) for result in ('ok', 'error'))
+    if fetches != fetched or not fetched:
+        problems.append(f"fetch stage observed {fetches:.0f} times for {fetched:.0f} pages fetched")
+    routed = samples.get(('wiki_request_duration_seconds_count', '{route="getUrlContent",status="200"}'), 0)
+    if routed != requests + 1:
+        problems.append(f"route histogram counted {routed:.0f} of {requests + 1} requests")
+    links = {decision: samples.get(('wiki_links_total', f'{{decision="{decision}"}}'), 0) for decision in ('kept', 'dropped')}
+    return samples, links, problems
+
+
+def main(args):
+    server = stub_wiki.serve(latency_ms=0)
+    url = f'http://127.0.0.1:{server.server_port}/{stub_wiki.wiki_path(stub_wiki.DEFAULT_VERSIONS[0])}/index.php/Main_Page'
+
+    costs = micro_costs()
+    print(f"per call: histogram observe {costs['histogram observe']:.0f} ns, counter inc {costs['counter inc']:.0f} ns "
+          f"(empty call {costs['empty call']:.0f} ns)\n")
+
+    medians = {True: [], False: []}
+    last = None
+    for _ in range(args.runs):
+        for enabled in (False, True):
+            result = run_child(enabled, url, args)
+            medians[enabled].append(statistics.median(result['times_ms']))
+            if enabled:
+                last = result
+    server.shutdown()
+    without, with_metrics = statistics.median(medians[False]), statistics.median(medians[True])
+    print(f"/get_url_content, max_depth {args.max_depth} ({last['links']} links), median of {args.runs} x {args.requests} requests:")
+    print(f"  metrics off : {without:8.2f} ms")
+    print(f"  metrics on  : {with_metrics:8.2f} ms  ({(with_metrics - without) / without:+.1%})")
+
+    samples, links, problems = check_metrics(last['metrics'], args.requests)
+    fetch = (samples.get(('wiki_stage_duration_seconds_sum', '{stage="fetch"}'), 0),
+             samples.get(('wiki_stage_duration_seconds_count', '{stage="fetch"}'), 0))
+    parse = (samples.get(('wiki_stage_duration_seconds_sum', '{stage="extract_page"}'), 0),
+             samples.get(('wiki_stage_duration_seconds_count', '{stage="extract_page"}'), 0))
+    print(f"\n/metrics: {len(samples)} samples, {fetch[1]:.0f} fetches ({fetch[0] / max(fetch[1], 1) * 1000:.2f} ms mean), "
+          f"{parse[1]:.0f} parses ({parse[0] / max(parse[1], 1) * 1000:.2f} ms mean), "
+          f"links kept {links['kept']:.0f} / dropped {links['dropped']:.0f}")
+    for problem in problems:
+        print(f"  FAILED: {problem}")
+    print(f"metrics consistent: {not problems}")
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cost and correctness of the /metrics instrumentation')
+    parser.add_argument('--requests', type=int, default=30)
+    parser.add_argument('--max-depth', type=int, default=0)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--run-one', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run_one:
+        run_one(args)
+    else:
+        main(args)
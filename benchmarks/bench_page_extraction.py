@@ -0,0 +1,72 @@
+"""
+Benchmarks single pass page extraction against the old two-parse approach.
+
+Usage:
+    python benchmarks/bench_page_extraction.py [--pages-dir saved_pages/] [--repeat 5]
+
+The old approach parses every page twice with html.parser (html_to_text and the
+link extraction). The new one parses it once with WikiPageExtractor, with the
+lxml backend and with the BeautifulSoup fallback.
+"""
+# Imports and Installs
+import os
+import sys
+import time
+import argparse
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from WikiPageExtractor import extract_page, LXML_AVAILABLE
+from mediawiki_pages import load_pages
+
+
+def two_parse(html_content):
+    """The extraction /get_url_content did before: one parse for the text, one for the links."""
+    text = BeautifulSoup(html_content, "html.parser").get_text(separator='\n', strip=True)
+    links = [{'title': a.get_text(strip=True), 'url': a['href']}
+             for a in BeautifulSoup(html_content, "html.parser").find_all('a', href=True)]
+    return text, links
+
+
+def time_cpu(function, pages, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.process_time()
+        for _, html_content in pages:
+            function(html_content)
+        best = min(best, time.process_time() - start)
+    return best / len(pages) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages-dir', help='Directory of saved MediaWiki .html pages (synthetic pages if omitted)')
+    parser.add_argument('--count', type=int, default=50, help='Number of pages to use')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per variant, the best run is reported')
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages_dir, args.count)
+    print(f"{len(pages)} pages, {sum(len(html) for _, html in pages) / len(pages) / 1024:.1f} KiB average")
+
+    # Make sure every variant returns what the old code returned before timing it
+    backends = ['bs4'] + (['lxml'] if LXML_AVAILABLE else [])
+    mismatches = {backend: 0 for backend in backends}
+    for _, html_content in pages:
+        text, links = two_parse(html_content)
+        for backend in backends:
+            page = extract_page(html_content, backend=backend)
+            if page['text'] != text or page['links'] != links:
+                mismatches[backend] += 1
+    print(f"Pages with output differing from the two-parse baseline: {mismatches}")
+
+    baseline = time_cpu(two_parse, pages, args.repeat)
+    print(f"\n{'Variant':<28} {'CPU ms/page':>12} {'Speedup':>8}")
+    print('-' * 50)
+    print(f"{'two parses (html.parser)':<28} {baseline:>12.2f} {1.0:>7.2f}x")
+    for backend in backends:
+        cpu = time_cpu(lambda html: extract_page(html, backend=backend), pages, args.repeat)
+        print(f"{'extract_page (' + backend + ')':<28} {cpu:>12.2f} {baseline / cpu:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
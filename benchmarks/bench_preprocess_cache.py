@@ -0,0 +1,104 @@
+"""
+Times a preprocessing cache hit against preprocessing the intent dataset again.
+
+Usage:
+    python benchmarks/bench_preprocess_cache.py [--dataset datasets/intent_dataset.csv] [--repeat 5]
+
+A miss runs what load_or_preprocess in Intent_Identifier_Models.ipynb does before the
+cache existed, with NumPy stand-ins for the Keras and sklearn steps: read the CSV, fit
+the vocabulary, turn the queries into padded token ids, encode the labels, split the
+rows and save the entry. A hit hashes the dataset file, opens the entry memory-mapped
+and rebuilds the one-hot split arrays. Both must give the same arrays, and pad_post must
+match padding row by row.
+"""
+# Imports and Installs
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS_DIR)
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+from WikiIntentDataCache import IntentDataCache, cache_key, pad_post, one_hot, SPLIT_NAMES
+from bench_intent_batching import load_dataset, fit_tokenizer, DATASET_PATH
+
+# Constants
+CONFIG = {'MAX_SEQUENCE_LENGTH': 50, 'MAX_VOCAB_SIZE': 10000, 'VALIDATION_SPLIT': 0.15, 'TEST_SPLIT': 0.15}
+TARGETS = ('intent', 'brand', 'model', 'sensor')
+
+
+def pad_rows(sequences, max_length):
+    # pad_sequences(padding='post', truncating='post') one row at a time
+    padded = np.zeros((len(sequences), max_length), dtype=np.int32)
+    for row, sequence in enumerate(sequences):
+        sequence = sequence[:max_length]
+        padded[row, :len(sequence)] = sequence
+    return padded
+
+
+def split_arrays(X, targets, indices):
+    return {part: (X[rows], {name: y[rows] for name, y in targets.items()}) for part, rows in indices.items()}
+
+
+def preprocess(dataset_path, cache, key):
+    rows = load_dataset(dataset_path)
+    queries = [row['query'] for row in rows]
+    tokenizer = fit_tokenizer(queries)
+    X = pad_post([tokenizer.text_to_sequence(query) for query in queries], CONFIG['MAX_SEQUENCE_LENGTH'])
+    label_classes, labels = {}, {}
+    for name in TARGETS:
+        label_classes[name], labels[name] = np.unique([row[name] or 'NONE' for row in rows], return_inverse=True)
+    order = np.random.default_rng(42).permutation(len(rows))
+    test, val = int(len(rows) * CONFIG['TEST_SPLIT']), int(len(rows) * CONFIG['VALIDATION_SPLIT'])
+    indices = {'test': order[:test], 'val': order[test:test + val], 'train': order[test + val:]}
+    cache.save(key, X, labels, indices, '{}', label_classes, {'max_seq_length': CONFIG['MAX_SEQUENCE_LENGTH']})
+    targets = {name: one_hot(labels[name], len(label_classes[name])) for name in TARGETS}
+    return split_arrays(X, targets, indices)
+
+
+def load_cached(dataset_path, cache):
+    cached = cache.load(cache_key(dataset_path, CONFIG))
+    targets = {name: one_hot(indices, len(cached['label_classes'][name])) for name, indices in cached['labels'].items()}
+    return split_arrays(cached['X'], targets, {part: np.asarray(rows) for part, rows in cached['splits'].items()})
+
+
+def best_of(function, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, result
+
+
+def main(args):
+    cache = IntentDataCache(tempfile.mkdtemp())
+    key = cache_key(args.dataset, CONFIG)
+    miss_ms, fresh = best_of(lambda: preprocess(args.dataset, cache, key), args.repeat)
+    hit_ms, cached = best_of(lambda: load_cached(args.dataset, cache), args.repeat)
+
+    same = all(np.array_equal(fresh[part][0], cached[part][0])
+               and all(np.array_equal(fresh[part][1][name], cached[part][1][name]) for name in TARGETS)
+               for part in SPLIT_NAMES)
+    sequences = [list(range(1, 1 + length)) for length in np.random.default_rng(0).integers(0, 80, 5000)]
+    padding_ok = np.array_equal(pad_post(sequences, 50), pad_rows(sequences, 50))
+    rows_ms, _ = best_of(lambda: pad_rows(sequences, 50), args.repeat)
+    post_ms, _ = best_of(lambda: pad_post(sequences, 50), args.repeat)
+
+    print(f"dataset          : {args.dataset}, {sum(len(fresh[part][0]) for part in SPLIT_NAMES)} queries")
+    print(f"preprocess (miss): {miss_ms:8.1f} ms")
+    print(f"cache hit        : {hit_ms:8.1f} ms ({miss_ms / hit_ms:.0f}x)")
+    print(f"padding 5000 rows: {rows_ms:8.1f} ms row by row, {post_ms:.1f} ms pad_post")
+    print(f"cached splits identical: {same}, pad_post identical: {padding_ok}")
+    if not (same and padding_ok):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Preprocessing cache hit against preprocessing again')
+    parser.add_argument('--dataset', default=DATASET_PATH)
+    parser.add_argument('--repeat', type=int, default=5)
+    main(parser.parse_args())
@@ -0,0 +1,147 @@
+"""
+Compares the sharded, vectorized query generator with generate_dataset of Intent_Data_Generator.ipynb.
+
+Usage:
+    python benchmarks/bench_query_generator.py [--reference-rows 20000] [--rows 500000] [--shards 4]
+
+The vocabulary, templates and generator functions are taken from the notebook's cells.
+generate_dataset's loop is timed for --reference-rows rows, then the engine for the same
+rows in one process and for --rows rows across --shards processes. Checks: raw queries
+are unique across all shards, every second vehicle is a different, existing vehicle, the
+style and intent shares match the notebook's loop, and one shard with the same seed
+writes the same files twice.
+"""
+# Imports and Installs
+import os
+import re
+import csv
+import sys
+import json
+import time
+import random
+import argparse
+import filecmp
+import tempfile
+from collections import Counter
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, REPO_DIR)
+from WikiIntentGenerator import QuerySpec, generate_sharded, COLUMNS
+
+# Constants
+NOTEBOOK_PATH = os.path.join(REPO_DIR, 'Intent_Data_Generator.ipynb')
+# Cells defining the vocabulary and the functions generate_dataset calls
+NOTEBOOK_DEFINITIONS = ('AUTOMOTIVE_MAP', 'SENSORS', 'VERBOSE_TEMPLATES', 'TEMPLATES', 'strategies', 'inject_noise',
+                        'select_first_vehicle', 'get_sameModel_diffYear', 'get_sameBrand_diffModel', 'get_diffBrand',
+                        'get_second_vehicle', 'select_query_strategy', 'inject_noise_to_query')
+SHARE_TOLERANCE = 0.02          # Largest style / intent share difference accepted against the notebook's loop
+
+
+def load_notebook():
+    with open(NOTEBOOK_PATH, encoding='utf-8') as f:
+        cells = [''.join(cell['source']) for cell in json.load(f)['cells'] if cell['cell_type'] == 'code']
+    namespace = {'random': random, 'json': json}
+    for name in NOTEBOOK_DEFINITIONS:
+        definition = re.compile(rf'^(def {name}\(|{name} = )', re.MULTILINE)
+        exec(next(cell for cell in cells if definition.search(cell)), namespace)
+    return namespace
+
+
+def notebook_generate(notebook:dict, target_size:int):
+    # generate_dataset's loop, without the progress bar and the DataFrame
+    seen, dataset = set(), []
+    brands = list(notebook['AUTOMOTIVE_MAP'].keys())
+    while len(dataset) < target_size:
+        brand_value, model_value, year_value, sensor_value = notebook['select_first_vehicle'](brands, None)
+        tool_value = random.choice(notebook['SPECIAL_TOOLS'])
+        fmt_value = random.choice(notebook['FORMATS'])
+        brand_alt_value, model_alt_value, year_alt_value = notebook['get_second_vehicle'](brand_value, model_value, year_value)
+        strategy_choice, intent_value, template_value = notebook['select_query_strategy']()
+        raw_query = template_value.format(
+            brand=brand_value, model=model_value, year=year_value,
+            sensor=sensor_value, tool=tool_value, format=fmt_value,
+            model_alt=model_alt_value, brand_alt=brand_alt_value, year_alt=year_alt_value
+        )
+        query = notebook['inject_noise_to_query'](strategy_choice, raw_query)
+        if raw_query not in seen:
+            dataset.append({"query": query, "intent": intent_value, "brand": brand_value, "model": model_value,
+                            "year": year_value, "sensor": sensor_value, "style": strategy_choice})
+            seen.add(raw_query)
+    return dataset
+
+
+def read_rows(files:list):
+    for path in files:
+        with open(path, encoding='utf-8', newline='') as f:
+            yield from csv.DictReader(f)
+
+
+def shares(rows, column:str):
+    counts = Counter(row[column] for row in rows)
+    total = sum(counts.values())
+    return {value: count / total for value, count in counts.items()}
+
+
+def peak_mb():
+    with open('/proc/self/status') as status:
+        return next(int(line.split()[1]) for line in status if line.startswith('VmHWM')) / 1024
+
+
+def main(args):
+    notebook = load_notebook()
+    spec = QuerySpec(notebook['AUTOMOTIVE_MAP'], notebook['SENSORS'], notebook['SPECIAL_TOOLS'], notebook['FORMATS'],
+                     notebook['TEMPLATES'], notebook['VERBOSE_TEMPLATES'], notebook['strategies'], notebook['weights'])
+    automotive_map = notebook['AUTOMOTIVE_MAP']
+    columns = COLUMNS + ('raw_query', 'brand_alt', 'model_alt', 'year_alt')
+    workdir = tempfile.mkdtemp()
+
+    random.seed(0)
+    started = time.perf_counter()
+    reference = notebook_generate(notebook, args.reference_rows)
+    reference_seconds = time.perf_counter() - started
+
+    runs = {}
+    for name, rows, shards in (('engine, 1 process', args.reference_rows, 1), ('engine, 1 process (again)', args.reference_rows, 1),
+                               (f'engine, {args.shards} shards', args.rows, args.shards)):
+        directory = os.path.join(workdir, str(len(runs)))
+        runs[name] = generate_sharded(spec, rows, directory, shards=shards, seed=0, chunk_rows=args.chunk_rows, columns=columns)
+
+    print(f"{'Generator':<28} {'Rows':>9} {'Candidates':>11} {'Seconds':>8} {'Rows/s':>9} {'Files':>6}")
+    print('-' * 76)
+    print(f"{'notebook generate_dataset':<28} {len(reference):>9} {'':>11} {reference_seconds:>8.2f} "
+          f"{len(reference) / reference_seconds:>9.0f} {'':>6}")
+    for name, summary in runs.items():
+        print(f"{name:<28} {summary['rows']:>9} {summary['candidates']:>11} {summary['seconds']:>8.2f} "
+              f"{summary['rows'] / summary['seconds']:>9.0f} {len(summary['files']):>6}")
+
+    large = runs[f'engine, {args.shards} shards']
+    raw_queries, invalid = set(), 0
+    for row in read_rows(large['files']):
+        raw_queries.add(row['raw_query'])
+        year_alt = int(row['year_alt'])
+        if year_alt not in automotive_map[row['brand_alt']].get(row['model_alt'], []) \
+                or (row['brand_alt'], row['model_alt'], row['year_alt']) == (row['brand'], row['model'], row['year']):
+            invalid += 1
+    duplicates = large['rows'] - len(raw_queries)
+    small = list(read_rows(runs['engine, 1 process']['files']))
+    differences = {column: max(abs(shares(reference, column).get(value, 0) - share)
+                               for value, share in shares(small, column).items()) for column in ('style', 'intent')}
+    first, again = runs['engine, 1 process']['files'], runs['engine, 1 process (again)']['files']
+    deterministic = len(first) == len(again) and all(filecmp.cmp(a, b, shallow=False) for a, b in zip(first, again))
+
+    print(f"\nduplicate raw queries across shards: {duplicates}, invalid second vehicles: {invalid}")
+    print(f"largest share difference to the notebook: style {differences['style']:.3f}, intent {differences['intent']:.3f}")
+    print(f"same files from one shard and the same seed: {deterministic}")
+    print(f"peak memory of this process: {peak_mb():.0f} MiB")
+    if duplicates or invalid or not deterministic or max(differences.values()) > SHARE_TOLERANCE:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sharded query generator against the notebook generate_dataset')
+    parser.add_argument('--reference-rows', type=int, default=20000)
+    parser.add_argument('--rows', type=int, default=500000)
+    parser.add_argument('--shards', type=int, default=4)
+    parser.add_argument('--chunk-rows', type=int, default=100000)
+    main(parser.parse_args())
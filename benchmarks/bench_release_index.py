@@ -0,0 +1,151 @@
+"""
+Builds the release index of all four release history pages from the stub wiki and compares
+its queries with answering them by scraping and parsing the pages on every request.
+
+Usage:
+    python benchmarks/bench_release_index.py [--releases 400] [--latency-ms 100] [--queries 2000]
+
+The stub serves the software revision history (<pre> cards) and the portal, m2m and masterbox
+release notes (new style headings, a wikitable, old style headings) with --releases releases
+each, every response delayed by --latency-ms. Measured:
+
+    cold build          fetching and parsing the four pages one after another, and ReleaseIndex.refresh
+                        fetching them concurrently
+    revalidation        a refresh where every page answers 304 Not Modified
+    reload              loading the persisted index in a new process start
+    queries             latest, exact version, version range and "which release introduced X",
+                        from the index and by scraping the page per query as before
+
+Every parsed release must match the stub's releases, and every index answer must equal the
+brute force answer over the parsed records, before and after a reload.
+"""
+# Imports and Installs
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS_DIR)
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+import stub_wiki
+import WikiHttpClient as http_client
+from WikiReleaseIndex import ReleaseIndex, parse_release_history, version_key
+
+# Constants
+SCRAPED_QUERIES = 5         # Queries answered by scraping, each costs a fetch and a parse
+
+
+def time_queries(function, arguments:list):
+    started = time.perf_counter()
+    for argument in arguments:
+        function(argument)
+    return (time.perf_counter() - started) / len(arguments) * 1e6
+
+
+def brute_force(records:list, kind:str, argument):
+    ordered = sorted(records, key=lambda record: version_key(record['version']))
+    if kind == 'latest':
+        return ordered[-1]
+    if kind == 'release':
+        return next((record for record in ordered if record['version'] == argument), None)
+    if kind == 'range':
+        low, high = version_key(argument[0]), version_key(argument[1])
+        return [record for record in ordered if version_key(record['version']) >= low
+                and version_key(record['version'])[:len(high)] <= high]
+    return next((record for record in ordered if argument.lower() in record['changes'].lower()), None)
+
+
+def main(args):
+    server = stub_wiki.serve(latency_ms=args.latency_ms, release_notes_count=args.releases)
+    base = f'http://127.0.0.1:{server.server_port}'
+    sources = {'software': f'{base}/release_history'}
+    sources.update({feed: f'{base}/release_notes/{feed}' for feed in stub_wiki.RELEASE_NOTES_FEEDS})
+    cache_path = os.path.join(tempfile.mkdtemp(), 'release_index.json')
+    http_client.get_session()
+
+    def scrape(feed):
+        return parse_release_history(http_client.get(sources[feed]).text, feed)
+
+    started = time.perf_counter()
+    parsed = {feed: scrape(feed) for feed in sources}
+    sequential = time.perf_counter() - started
+    index = ReleaseIndex(sources, cache_path=cache_path)
+    started = time.perf_counter()
+    summary = index.refresh()
+    concurrent = time.perf_counter() - started
+    started = time.perf_counter()
+    revalidation = index.refresh()
+    revalidated = time.perf_counter() - started
+    started = time.perf_counter()
+    reloaded = ReleaseIndex(sources, cache_path=cache_path)
+    reload_seconds = time.perf_counter() - started
+    releases = sum(len(index.feed(feed)) for feed in sources)
+    print(f"{releases} releases in {len(sources)} feeds, {args.latency_ms:.0f} ms stub latency\n")
+    print(f"cold build, one page after another : {sequential * 1000:8.1f} ms")
+    print(f"cold build, ReleaseIndex.refresh   : {concurrent * 1000:8.1f} ms  ({sequential / concurrent:.1f}x)  {summary}")
+    print(f"revalidation (all 304)             : {revalidated * 1000:8.1f} ms  {revalidation}")
+    print(f"reload of the persisted index      : {reload_seconds * 1000:8.1f} ms  ({os.path.getsize(cache_path) / 1024:.0f} KiB)")
+
+    failures = []
+    for feed in stub_wiki.RELEASE_NOTES_FEEDS:
+        truth = sorted((version, str(date), '\n'.join(changes)) for version, date, changes in stub_wiki.release_notes(feed, args.releases))
+        if sorted((r['version'], r['date'], r['changes']) for r in index.feed(feed).records) != truth:
+            failures.append(f"{feed}: parsed releases differ from the stub's")
+    if [r['version'] for r in reversed(index.feed('software').records)] != list(stub_wiki.DEFAULT_VERSIONS):
+        failures.append("software: parsed versions differ from the stub's")
+
+    rng = random.Random(1)
+    feeds = list(sources)
+    queries = {
+        'latest': [rng.choice(feeds) for _ in range(args.queries)],
+        'release': [(feed, rng.choice(index.feed(feed).records)['version']) for feed in (rng.choice(feeds) for _ in range(args.queries))],
+        'range': [],
+        'introduced': [(rng.choice(feeds), rng.choice(stub_wiki.FEATURES)) for _ in range(args.queries)],
+    }
+    for _ in range(args.queries):
+        feed = rng.choice(feeds)
+        low, high = sorted(rng.sample([r['version'] for r in index.feed(feed).records], 2), key=version_key)
+        queries['range'].append((feed, (low, '.'.join(high.split('.')[:2]))))
+
+    answer = {
+        'latest': lambda target, feed: target.feed(feed).latest(),
+        'release': lambda target, query: target.feed(query[0]).release(query[1]),
+        'range': lambda target, query: target.feed(query[0]).releases(*query[1]),
+        'introduced': lambda target, query: target.feed(query[0]).introduced(query[1]),
+    }
+    print(f"\n{'Query':<12} {'Index us':>10} {'Scraping ms':>12}")
+    print('-' * 36)
+    for kind, arguments in queries.items():
+        index_us = time_queries(lambda query: answer[kind](index, query), arguments)
+        scraped = []
+        for query in arguments[:SCRAPED_QUERIES]:
+            feed = query if kind == 'latest' else query[0]
+            started = time.perf_counter()
+            brute_force(scrape(feed), kind, None if kind == 'latest' else query[1])
+            scraped.append(time.perf_counter() - started)
+        print(f"{kind:<12} {index_us:>10.1f} {statistics.median(scraped) * 1000:>12.1f}")
+        for query in arguments:
+            feed, argument = (query, None) if kind == 'latest' else query
+            expected = brute_force(parsed[feed], kind, argument)
+            if answer[kind](index, query) != expected or answer[kind](reloaded, query) != expected:
+                failures.append(f"{kind} {query}: index answer differs from brute force")
+                break
+
+    server.shutdown()
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    print(f"\nparsed releases and all index answers correct: {not failures}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Release history index against scraping per query')
+    parser.add_argument('--releases', type=int, default=400, help='Releases on each release notes page')
+    parser.add_argument('--latency-ms', type=float, default=100)
+    parser.add_argument('--queries', type=int, default=2000)
+    main(parser.parse_args())
@@ -0,0 +1,98 @@
+"""
+Checks and times the search index against the stub MediaWiki.
+
+Usage:
+    python benchmarks/bench_search_index.py [--pages 1000] [--queries 500] [--edits 20]
+
+Syncs a stub wiki version with the search index attached and times queries against
+it. Then edits, creates and deletes a few pages and syncs incrementally. The updated
+index must rank every query exactly like an index rebuilt from scratch out of the
+synced store, whether its changes are still in the log or already merged into the
+segment.
+"""
+# Imports and Installs
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS_DIR)
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+import stub_wiki
+from mediawiki_pages import _WORDS
+from WikiSearchIndex import WikiSearchIndex
+from WikiIncrementalSync import IncrementalSync, WikiSyncStore
+from bench_incremental_sync import fetch, extract_wiki_page
+
+
+def random_queries(count:int, seed:int=0):
+    rng = random.Random(seed)
+    words = list(_WORDS) + [f'page {i}' for i in range(50)] + ['edited paragraph', 'new page']
+    return [' '.join(rng.sample(words, rng.randint(1, 3))) for _ in range(count)]
+
+
+def time_queries(index, version, queries):
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        index.search(version, query, k=10)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.99)]
+
+
+def rankings(index, version, queries):
+    return [[(r['url'], r['score']) for r in index.search(version, query, k=10)['results']] for query in queries]
+
+
+def main(args):
+    server = stub_wiki.serve(latency_ms=0, pages=args.pages)
+    version = stub_wiki.DEFAULT_VERSIONS[0]
+    start_url = f'http://127.0.0.1:{server.server_port}/{stub_wiki.wiki_path(version)}/index.php/Main_Page'
+    workdir = tempfile.mkdtemp()
+    index = WikiSearchIndex(os.path.join(workdir, 'search_index'))
+    sync = IncrementalSync(WikiSyncStore(os.path.join(workdir, 'sync.sqlite3')), fetch, extract_wiki_page, search_index=index)
+    queries = random_queries(args.queries)
+
+    first = sync.sync(version, start_url)
+    size = os.path.getsize(os.path.join(index.directory, f'{version}.seg'))
+    print(f"full sync        : {first['fetched']} pages indexed, segment of {size / 1024 / 1024:.1f} MiB")
+    p50, p99 = time_queries(index, version, queries)
+    print(f"queries          : p50 {p50:.2f} ms, p99 {p99:.2f} ms over {len(queries)} queries")
+
+    rng = random.Random(1)
+    titles = [t for t in stub_wiki.StubWikiHandler.pages if t != 'Main_Page']
+    edited = rng.sample(titles, args.edits)
+    for title in edited:
+        stub_wiki.edit_page(title, add_links=[rng.choice(titles)])
+    for i in range(3):
+        stub_wiki.create_page(f'New_Page_{i}', linked_from=rng.choice(edited))
+    for title in rng.sample([t for t in titles if t not in edited], 2):
+        stub_wiki.delete_page(title)
+    second = sync.sync(version, start_url)
+    print(f"incremental sync : {second['fetched']} pages re-indexed, {second['removed']} removed in {second['seconds']:.2f}s")
+
+    reference = WikiSearchIndex(os.path.join(workdir, 'reference_index'))
+    reference.version(version).rebuild(sync.store.pages(version))
+    expected = rankings(reference, version, queries)
+    logged = rankings(index, version, queries)
+    index.commit(version, force=True)
+    merged = rankings(index, version, queries)
+    p50, p99 = time_queries(index, version, queries)
+    differing = sum(a != b for a, b in zip(expected, logged)) + sum(a != b for a, b in zip(expected, merged))
+    print(f"queries          : p50 {p50:.2f} ms, p99 {p99:.2f} ms after merging the changes")
+    print(f"rankings differing from a rebuilt index: {differing}")
+    server.shutdown()
+    if differing:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Search index against the stub MediaWiki')
+    parser.add_argument('--pages', type=int, default=1000)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--edits', type=int, default=20)
+    main(parser.parse_args())
@@ -0,0 +1,147 @@
+"""
+Measures how SingleFlight coalesces concurrent identical calls, and checks that a caller
+which stops waiting does not take the shared call down with it.
+
+Usage:
+    python benchmarks/bench_single_flight.py [--callers 50] [--latency-ms 100] [--runs 3]
+
+--callers threads (do) and tasks (do_async) ask for the same key at once, every execution
+of the function takes --latency-ms. Compared with calling the function once per caller.
+
+Checked:
+
+    results             every caller gets the result of the one execution
+    leader cancelled    the first caller of a key is cancelled, the callers that joined it
+                        still get the result and the function ran once
+    all cancelled       once every caller is cancelled the shared call is cancelled too,
+                        and the next caller of the key runs the function again
+"""
+# Imports and Installs
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from WikiSingleFlight import SingleFlight
+
+
+def run_threads(callers:int, call):
+    results = [None] * callers
+
+    def worker(i):
+        results[i] = call()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(callers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, results
+
+
+async def run_tasks(callers:int, call):
+    started = time.perf_counter()
+    results = await asyncio.gather(*(call() for _ in range(callers)))
+    return time.perf_counter() - started, results
+
+
+async def check_cancellation(latency:float):
+    """
+    Returns a list of problems with cancelled callers of do_async.
+    """
+    problems = []
+    flight = SingleFlight()
+    executions, cancelled = [], []
+
+    async def slow(value):
+        executions.append(value)
+        try:
+            await asyncio.sleep(latency)
+        except asyncio.CancelledError:
+            cancelled.append(value)
+            raise
+        return value
+
+    leader = asyncio.ensure_future(flight.do_async(('page', 'a'), slow, 'a'))
+    await asyncio.sleep(0)
+    waiter = asyncio.ensure_future(flight.do_async(('page', 'a'), slow, 'a'))
+    await asyncio.sleep(0)
+    leader.cancel()
+    try:
+        result = await waiter
+        if result != 'a':
+            problems.append(f"leader cancelled: waiter got {result!r}")
+    except asyncio.CancelledError:
+        problems.append("leader cancelled: waiter raised CancelledError")
+    if not leader.cancelled():
+        problems.append("leader cancelled: the leader itself was not cancelled")
+    if executions != ['a'] or cancelled:
+        problems.append(f"leader cancelled: {len(executions)} executions, {len(cancelled)} cancelled")
+
+    executions.clear()
+    callers = [asyncio.ensure_future(flight.do_async(('page', 'b'), slow, 'b')) for _ in range(3)]
+    await asyncio.sleep(0)
+    for caller in callers:
+        caller.cancel()
+    await asyncio.gather(*callers, return_exceptions=True)
+    await asyncio.sleep(0)
+    if cancelled != ['b']:
+        problems.append("all cancelled: the shared call was not cancelled")
+    if await flight.do_async(('page', 'b'), slow, 'b') != 'b' or len(executions) != 2:
+        problems.append("all cancelled: the next caller did not run the function again")
+    if flight.stats()['in_flight']:
+        problems.append(f"{flight.stats()['in_flight']} calls still in flight after all callers returned")
+    return problems
+
+
+def main(args):
+    latency = args.latency_ms / 1000
+    failures = []
+
+    def slow_sync():
+        time.sleep(latency)
+        return object()
+
+    async def slow_async():
+        await asyncio.sleep(latency)
+        return object()
+
+    print(f"{args.callers} concurrent identical calls, {args.latency_ms:.0f} ms per execution, median of {args.runs} runs\n")
+    print(f"{'Mode':<12} {'Direct ms':>10} {'Executions':>11} {'SingleFlight ms':>16} {'Executions':>11}")
+    print('-' * 64)
+    for mode in ('do', 'do_async'):
+        direct, coalesced, executions = [], [], []
+        for _ in range(args.runs):
+            flight = SingleFlight()
+            if mode == 'do':
+                direct.append(run_threads(args.callers, slow_sync)[0])
+                seconds, results = run_threads(args.callers, lambda: flight.do(('page', 'a'), slow_sync))
+            else:
+                direct.append(asyncio.run(run_tasks(args.callers, slow_async))[0])
+                seconds, results = asyncio.run(run_tasks(args.callers, lambda: flight.do_async(('page', 'a'), slow_async)))
+            coalesced.append(seconds)
+            executions.append(flight.executions['page'])
+            if len({id(result) for result in results}) != 1:
+                failures.append(f"{mode}: callers got {len({id(result) for result in results})} different results")
+        print(f"{mode:<12} {statistics.median(direct) * 1000:>10.1f} {args.callers:>11} "
+              f"{statistics.median(coalesced) * 1000:>16.1f} {statistics.median(executions):>11.0f}")
+
+    failures.extend(asyncio.run(check_cancellation(latency)))
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    print(f"\nshared results, cancelled callers leave the others' call running: {not failures}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='SingleFlight coalescing and cancellation')
+    parser.add_argument('--callers', type=int, default=50)
+    parser.add_argument('--latency-ms', type=float, default=100)
+    parser.add_argument('--runs', type=int, default=3)
+    main(parser.parse_args())
@@ -0,0 +1,217 @@
+"""
+Compares fetching the pages of one agent question with a /get_url_content call per page and
+with a single /get_url_content_batch call, in the Flask app and in the Azure function app.
+
+Usage:
+    python benchmarks/bench_url_content_batch.py [--urls 20] [--latency-ms 100] [--workers 8] [--runs 3]
+
+A fresh process per app answers, against the stub wiki with --latency-ms added to every
+response:
+
+    one call per page (before)    --urls POST /get_url_content calls, one after another
+                                  (max_depth 0, the pages' own links)
+    batch                         one POST /get_url_content_batch (crawl false) with the same
+                                  urls, plus a second spelling of every third url (fragment,
+                                  upper case scheme and host, surrounding spaces), a page the
+                                  wiki does not have and a string that is not a url
+
+The batch must return every distinct url once with the same content and links as its own
+call, count the extra spellings as duplicates, report the missing page as 404 and the bad
+url as 400 without failing the rest. Its time is compared with the sum of the single calls
+and with the slowest single call, the best a batch can do with enough workers.
+"""
+# Imports and Installs
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+APP_DIR = os.path.join(REPO_DIR, 'Azure_Func_Testing', 'wikiagent')
+sys.path.insert(0, BENCHMARKS_DIR)
+sys.path.insert(0, os.path.dirname(APP_DIR))
+import stub_wiki
+import copy_shared_modules
+
+# Constants
+APPS = ('flask', 'function')
+INVALID_URL = 'not a url'
+
+
+def spellings(url:str):
+    """
+    Returns another spelling of url that normalizes to it.
+    """
+    scheme, rest = url.split('://', 1)
+    host, path = rest.split('/', 1)
+    return [f'{url}#History', f'{scheme.upper()}://{host.upper()}/{path}', f'  {url} ']
+
+
+def flask_client():
+    sys.path.insert(0, REPO_DIR)
+    import WikiEndpoints as wiki
+    client = wiki.app.test_client()
+
+    def single(url):
+        response = client.post('/get_url_content', json={'url': url, 'max_depth': 0})
+        body = response.get_json()
+        return response.status_code, {'text': body['contentOfPage'], 'links': [link['url'] for link in body['hyperlinksFromPage']]}
+
+    def batch(urls):
+        response = client.post('/get_url_content_batch', json={'urls': urls, 'crawl': False})
+        body = response.get_json()
+        results = {}
+        for result in body['results']:
+            if 'error' in result:
+                results[result['url']] = {'status': result['status'], 'requested': result['requested']}
+            else:
+                results[result['url']] = {'text': result['contentOfPage'], 'links': [link['url'] for link in result['hyperlinksFromPage']],
+                                          'requested': result['requested']}
+        return response.status_code, body['duplicates'], results
+
+    return single, batch
+
+
+def function_client():
+    sys.path.insert(0, APP_DIR)
+    import function_app
+    import azure.functions as func
+    functions = {f.get_function_name(): f.get_user_function() for f in function_app.app.get_functions()}
+
+    def call(name, body):
+        response = functions[name](func.HttpRequest('POST', f'/api/{name}', headers={'Content-Type': 'application/json'},
+                                                    body=json.dumps(body).encode('utf-8')))
+        return response.status_code, json.loads(response.get_body())
+
+    def single(url):
+        status, body = call('get_url_content', {'url': url})
+        return status, {'text': body['contentOfPage'], 'links': body['hyperlinksFromPage']}
+
+    def batch(urls):
+        status, body = call('get_url_content_batch', {'urls': urls})
+        results = {}
+        for result in body['results']:
+            if result['success']:
+                results[result['url']] = {'text': result['contentOfPage'], 'links': result['hyperlinksFromPage'],
+                                          'requested': result['requested']}
+            else:
+                missing = '404' in result['error']
+                results[result['url']] = {'status': 404 if missing else 400 if result['url'] == INVALID_URL else 502,
+                                          'requested': result['requested']}
+        return status, body['duplicates'], results
+
+    return single, batch
+
+
+def run_one(args):
+    """
+    Child process: answers the single calls and the batch in one app, prints timings and results as JSON.
+    """
+    single, batch = flask_client() if args.app == 'flask' else function_client()
+    urls = json.loads(args.urls_json)
+    single(args.warm_up_url)      # Imports, parser and connection pool
+    pages, single_ms = {}, []
+    started = time.perf_counter()
+    for url in urls['distinct']:
+        began = time.perf_counter()
+        status, pages[url] = single(url)
+        single_ms.append((time.perf_counter() - began) * 1000)
+        if status != 200:
+            raise RuntimeError(f"get_url_content answered {status} for {url}")
+    sequential_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    status, duplicates, results = batch(urls['batch'])
+    batch_ms = (time.perf_counter() - started) * 1000
+    print(json.dumps({'sequential_ms': sequential_ms, 'single_ms': single_ms, 'batch_ms': batch_ms, 'status': status,
+                      'duplicates': duplicates, 'pages': pages, 'results': results}))
+
+
+def run_child(app:str, urls:dict, warm_up_url:str, args):
+    temp_dir = tempfile.mkdtemp()
+    environment = dict(
+        os.environ,
+        WIKI_BATCH_MAX_WORKERS=str(args.workers),
+        WIKI_PAGE_STORE_DIR='',
+        WIKI_VERSION_MAP_CACHE=os.path.join(temp_dir, 'version_map_cache.json'),
+        WIKI_RELEASE_INDEX=os.path.join(temp_dir, 'release_index.json'),
+        WIKI_WARM_UP='0',
+    )
+    command = [sys.executable, os.path.abspath(__file__), '--run-one', '--app', app, '--urls-json', json.dumps(urls),
+               '--warm-up-url', warm_up_url]
+    output = subprocess.run(command, capture_output=True, text=True, check=True, env=environment, cwd=REPO_DIR).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def check(result:dict, urls:dict, missing_url:str, extra_spellings:int):
+    problems = []
+    results = result['results']
+    expected = set(urls['distinct']) | {missing_url, INVALID_URL}
+    if result['status'] != 200 or set(results) != expected:
+        problems.append(f"batch answered {result['status']} with {len(results)} results for {len(expected)} distinct urls")
+    if result['duplicates'] != extra_spellings:
+        problems.append(f"batch counted {result['duplicates']} duplicates, {extra_spellings} were sent")
+    for url, page in result['pages'].items():
+        got = results.get(url, {})
+        if got.get('text') != page['text'] or got.get('links') != page['links']:
+            problems.append(f"{url}: batch content differs from its own call")
+            break
+    if results.get(missing_url, {}).get('status') != 404:
+        problems.append(f"missing page reported as {results.get(missing_url)}")
+    if results.get(INVALID_URL, {}).get('status') != 400:
+        problems.append(f"invalid url reported as {results.get(INVALID_URL)}")
+    return problems
+
+
+def main(args):
+    copy_shared_modules.copy_modules(APP_DIR)     # The function's build step, the app imports the root modules from its folder
+    server = stub_wiki.serve(latency_ms=args.latency_ms, pages=max(200, args.urls + 1))
+    port = server.server_port
+    base = f'http://127.0.0.1:{port}/{stub_wiki.wiki_path(stub_wiki.DEFAULT_VERSIONS[0])}/index.php/'
+    warm_up_url = f'http://127.0.0.1:{port}/{stub_wiki.wiki_path(stub_wiki.DEFAULT_VERSIONS[1])}/index.php/Main_Page'
+    distinct = [base + f'Page_{i}' for i in range(1, args.urls + 1)]
+    missing_url = base + 'No_Such_Page'
+    extra = [spellings(url)[i % 3] for i, url in enumerate(distinct[::3])]
+    urls = {'distinct': distinct, 'batch': distinct + extra + [missing_url, INVALID_URL]}
+
+    print(f"{args.urls} pages ({len(urls['batch'])} urls in the batch), {args.latency_ms:.0f} ms stub latency, "
+          f"{args.workers} batch workers, median of {args.runs} runs\n")
+    print(f"{'App':<10} {'One call per page ms':>21} {'Slowest page ms':>16} {'Batch ms':>10} {'Speedup':>8}")
+    print('-' * 69)
+    failures = []
+    for app in APPS:
+        runs = [run_child(app, urls, warm_up_url, args) for _ in range(args.runs)]
+        sequential = statistics.median(run['sequential_ms'] for run in runs)
+        slowest = statistics.median(max(run['single_ms']) for run in runs)
+        batch = statistics.median(run['batch_ms'] for run in runs)
+        print(f"{app:<10} {sequential:>21.1f} {slowest:>16.1f} {batch:>10.1f} {sequential / batch:>7.1f}x")
+        for run in runs:
+            failures.extend(f"{app}: {problem}" for problem in check(run, urls, missing_url, len(extra)))
+    server.shutdown()
+
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    print(f"\nbatch results match the single calls, duplicates and failures reported per url: {not failures}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='One call per page against one batch call')
+    parser.add_argument('--urls', type=int, default=20, help='Distinct pages in the batch')
+    parser.add_argument('--latency-ms', type=float, default=100)
+    parser.add_argument('--workers', type=int, default=8, help='WIKI_BATCH_MAX_WORKERS of the apps')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--run-one', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--app', help=argparse.SUPPRESS)
+    parser.add_argument('--urls-json', help=argparse.SUPPRESS)
+    parser.add_argument('--warm-up-url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run_one:
+        run_one(args)
+    else:
+        main(args)
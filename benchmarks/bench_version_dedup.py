@@ -0,0 +1,73 @@
+"""
+Checks and measures the cross-version storage of the sync store against the stub MediaWiki.
+
+Usage:
+    python benchmarks/bench_version_dedup.py [--pages 1000] [--edits 20]
+
+Syncs three stub wiki versions, oldest first, editing a few pages between them. Every
+version serves mostly the same pages, so the store should keep one text per distinct
+page content (or a small delta against the page's previous text) and reuse the parse
+of pages whose html only differs by the version path. The stored bytes are compared
+to compressing every page of every version on its own, and the changes the store
+reports between versions must be exactly the edited pages.
+"""
+# Imports and Installs
+import os
+import sys
+import zlib
+import random
+import argparse
+import tempfile
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS_DIR)
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+import stub_wiki
+from WikiIncrementalSync import IncrementalSync, WikiSyncStore
+from bench_incremental_sync import fetch, extract_wiki_page
+
+
+def main(args):
+    server = stub_wiki.serve(latency_ms=0, pages=args.pages)
+    versions = ['2.7.0', '2.8.1', '2.9.6']
+    workdir = tempfile.mkdtemp()
+    sync = IncrementalSync(WikiSyncStore(os.path.join(workdir, 'sync.sqlite3')), fetch, extract_wiki_page)
+
+    rng = random.Random(1)
+    titles = [t for t in stub_wiki.StubWikiHandler.pages if t != 'Main_Page']
+    edited = {}
+    naive_bytes = 0
+    failed = False
+    for index, version in enumerate(versions):
+        if index:
+            edited[version] = set(rng.sample(titles, args.edits))
+            for title in edited[version]:
+                stub_wiki.edit_page(title, text=f'Edited paragraph for {version}.')
+        start_url = f'http://127.0.0.1:{server.server_port}/{stub_wiki.wiki_path(version)}/index.php/Main_Page'
+        summary = sync.sync(version, start_url, full=True)
+        naive_bytes += sum(len(zlib.compress(text.encode('utf-8'))) for _, _, text in sync.store.pages(version))
+        print(f"sync {version:<6}: {summary['fetched']} pages fetched, {summary['parsed']} parsed in {summary['seconds']:.2f}s")
+
+    stats = sync.store.storage_stats()
+    print(f"\nstored pages     : {stats['pages']} across {len(versions)} versions")
+    print(f"distinct texts   : {stats['texts']} ({stats['full_texts']} full, {stats['deltas']} deltas)")
+    print(f"stored bytes     : {stats['stored_bytes'] / 1024:.1f} KiB, "
+          f"{naive_bytes / 1024:.1f} KiB compressing every page of every version ({naive_bytes / max(stats['stored_bytes'], 1):.1f}x)")
+
+    for old_version, new_version in zip(versions, versions[1:]):
+        diff = sync.store.diff_versions(old_version, new_version)
+        expected = sorted(title.replace('_', ' ') for title in edited[new_version])
+        ok = diff['changed'] == expected and not diff['added'] and not diff['removed']
+        failed = failed or not ok
+        print(f"{old_version} -> {new_version}: {len(diff['changed'])} changed, {diff['unchanged']} unchanged"
+              f"{'' if ok else f' (expected {len(expected)} changed)'}")
+    server.shutdown()
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cross-version storage against the stub MediaWiki')
+    parser.add_argument('--pages', type=int, default=1000)
+    parser.add_argument('--edits', type=int, default=20)
+    main(parser.parse_args())
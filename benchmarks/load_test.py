@@ -0,0 +1,159 @@
+"""
+Load test of the wiki endpoints against a local stub wiki.
+
+Usage:
+    python benchmarks/load_test.py [--server asgi|flask] [--concurrency 200] [--duration 20] [--latency-ms 50]
+    python benchmarks/load_test.py --target http://127.0.0.1:8000     # an already running service
+
+Starts benchmarks/stub_wiki.py in process and the service under test as a subprocess
+pointed at the stub, then keeps `concurrency` clients busy for `duration` seconds with
+a mix of version lookups and /get_url_content calls (max_depth 0). Prints requests/sec
+and latency percentiles per route.
+"""
+# Imports and Installs
+import os
+import sys
+import time
+import random
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import aiohttp
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+import stub_wiki
+
+# Constants
+VERSION_LOOKUP_SHARE = 0.8      # Share of requests that are version lookups, the rest fetch page content
+STARTUP_TIMEOUT_SECONDS = 60
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_service(server:str, port:int, stub_port:int, workers:int):
+    """
+    Starts the service under test as a subprocess, pointed at the stub wiki.
+    """
+    env = dict(
+        os.environ,
+        WIKI_RELEASE_HISTORY_URL=f'http://127.0.0.1:{stub_port}/release_history',
+        WIKI_BASE_URL=f'http://127.0.0.1:{stub_port}/<VERSION_NUMBER>/index.php/Main_Page',
+        WIKI_VERSION_MAP_CACHE=os.path.join(tempfile.mkdtemp(), 'version_map_cache.json'),
+        WIKI_PAGE_STORE_DIR='',     # Every page request goes to the stub
+    )
+    if server == 'asgi':
+        command = [sys.executable, '-m', 'uvicorn', 'WikiEndpointsAsgi:app', '--port', str(port),
+                   '--workers', str(workers), '--log-level', 'warning']
+    else:
+        command = [sys.executable, '-m', 'flask', '--app', 'WikiEndpoints', 'run', '--port', str(port)]
+    return subprocess.Popen(command, cwd=REPO_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def wait_until_up(session:aiohttp.ClientSession, target:str):
+    deadline = time.monotonic() + STARTUP_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        try:
+            async with session.get(f'{target}/get_version_map_full') as response:
+                if response.status == 200:
+                    return await response.json()
+        except aiohttp.ClientConnectionError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError(f"Service at {target} did not come up")
+
+
+async def run_load(target:str, concurrency:int, duration:float, page_urls:list, versions:list):
+    latencies = {'version': [], 'url_content': []}
+    errors = {'version': 0, 'url_content': 0}
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=60)) as session:
+        deadline = time.monotonic() + duration
+
+        async def client_loop(seed):
+            rng = random.Random(seed)
+            while time.monotonic() < deadline:
+                if rng.random() < VERSION_LOOKUP_SHARE:
+                    route = 'version'
+                    request = session.get(f'{target}/does_version_exist/{rng.choice(versions)}')
+                else:
+                    route = 'url_content'
+                    request = session.post(f'{target}/get_url_content', json={'url': rng.choice(page_urls), 'max_depth': 0})
+                start = time.perf_counter()
+                try:
+                    async with request as response:
+                        await response.read()
+                        ok = response.status < 500
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    ok = False
+                if ok:
+                    latencies[route].append(time.perf_counter() - start)
+                else:
+                    errors[route] += 1
+
+        started = time.monotonic()
+        await asyncio.gather(*(client_loop(i) for i in range(concurrency)))
+        elapsed = time.monotonic() - started
+    return latencies, errors, elapsed
+
+
+def percentile(values:list, p:float):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def report(latencies:dict, errors:dict, elapsed:float):
+    total = sum(len(v) for v in latencies.values())
+    print(f"\n{'route':<14}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for route, values in latencies.items():
+        print(f"{route:<14}{len(values):>10}{errors[route]:>8}{len(values) / elapsed:>10.1f}"
+              f"{percentile(values, 50) * 1000:>10.1f}{percentile(values, 99) * 1000:>10.1f}")
+    every = [v for values in latencies.values() for v in values]
+    print(f"{'total':<14}{total:>10}{sum(errors.values()):>8}{total / elapsed:>10.1f}"
+          f"{percentile(every, 50) * 1000:>10.1f}{percentile(every, 99) * 1000:>10.1f}")
+
+
+async def main(args):
+    stub = stub_wiki.serve(latency_ms=args.latency_ms, pages=args.pages)
+    stub_base = f'http://127.0.0.1:{stub.server_port}'
+    page_urls = [f'{stub_base}/{stub_wiki.wiki_path(stub_wiki.DEFAULT_VERSIONS[0])}/index.php/{title}'
+                 for title in stub_wiki.StubWikiHandler.pages]
+    process = None
+    target = args.target
+    if not target:
+        port = free_port()
+        process = start_service(args.server, port, stub.server_port, args.workers)
+        target = f'http://127.0.0.1:{port}'
+    try:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=STARTUP_TIMEOUT_SECONDS)) as session:
+            version_map = await wait_until_up(session, target)
+        versions = list(version_map) + ['0.0']    # One lookup in a few misses
+        print(f"Load testing {args.server if process else target} with {args.concurrency} clients "
+              f"for {args.duration}s (stub latency {args.latency_ms} ms)")
+        report(*await run_load(target, args.concurrency, args.duration, page_urls, versions))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        stub.shutdown()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test the wiki endpoints')
+    parser.add_argument('--server', choices=('asgi', 'flask'), default='asgi', help='Service to start')
+    parser.add_argument('--target', help='Base url of an already running service, skips starting one')
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn workers for --server asgi')
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--latency-ms', type=float, default=50, help='Delay the stub wiki adds to every response')
+    parser.add_argument('--pages', type=int, default=50, help='Pages served by the stub wiki')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,108 @@
+"""
+Page sources for the benchmarks.
+
+Benchmarks run against saved MediaWiki pages (*.html files, e.g. saved from
+wiki.alkit.se with "Save page as") when a directory is given. Without one they
+fall back to synthetic pages that follow the MediaWiki skin layout: a content
+area with sections, paragraphs, lists and tables, plus the sidebar, personal
+tools and footer navigation every wiki page carries, and the HTML comments
+(editor notes, the NewPP limit report) MediaWiki leaves between the text.
+"""
+# Imports and Installs
+import os
+import glob
+import random
+
+# Constants
+WIKI_PATH = '/wice296/index.php/'
+_WORDS = ('signal logger sensor channel measurement vehicle portal configuration upload '
+          'trigger module firmware version release data file format storage network '
+          'diagnostic report account project fleet status interval buffer export').split()
+_NAVIGATION = [
+    ('Main page', 'Main_Page'), ('Recent changes', 'Special:RecentChanges'),
+    ('Random page', 'Special:Random'), ('Help about MediaWiki', 'https://www.mediawiki.org/wiki/Special:MyLanguage/Help:Contents'),
+    ('What links here', 'Special:WhatLinksHere'), ('Special pages', 'Special:SpecialPages'),
+    ('Printable version', '?printable=yes'), ('Log in', 'Special:UserLogin'),
+    ('View source', '?action=edit'), ('History', '?action=history'),
+]
+
+
+def _sentence(rng, link_titles):
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(6, 16))]
+    words[0] = words[0].capitalize()
+    if link_titles and rng.random() < 0.5:
+        title = rng.choice(link_titles)
+        position = rng.randrange(len(words))
+        words[position] = f'<a href="{WIKI_PATH}{title}" title="{title.replace("_", " ")}">{title.replace("_", " ")}</a>'
+    return ' '.join(words) + rng.choice('...!?')
+
+
+def synthetic_page(title:str, link_titles:list, sections:int=8, seed:int=0):
+    """
+    Renders a MediaWiki-style page for title that links to every page in link_titles.
+    """
+    rng = random.Random(seed)
+    body = []
+    for section in range(sections):
+        body.append(f'<h2><span class="mw-headline" id="Section_{section}">Section {section}</span>'
+                    f'<span class="mw-editsection">[<a href="{WIKI_PATH}{title}?action=edit&amp;section={section}">edit</a>]</span></h2>')
+        for _ in range(3):
+            body.append('<p>' + ' '.join(_sentence(rng, link_titles) for _ in range(4)) + '</p>')
+        # Editors' comments sit between text on real pages, the text after them must not be lost
+        body.append(f'<p>{_sentence(rng, link_titles)}<!-- TODO: check section {section} against the manual --> '
+                    f'{_sentence(rng, link_titles)}</p>')
+        body.append('<ul>' + ''.join(f'<li>{_sentence(rng, link_titles)}</li>' for _ in range(5)) + '</ul>')
+        rows = ''.join(f'<tr><td>{rng.choice(_WORDS)}</td><td>{rng.randint(0, 9999)}</td><td>{_sentence(rng, [])}</td></tr>' for _ in range(4))
+        body.append(f'<table class="wikitable"><tr><th>Name</th><th>Value</th><th>Description</th></tr>{rows}</table>')
+    # Every link target appears at least once in a "See also" list
+    body.append('<h2><span class="mw-headline" id="See_also">See also</span></h2><ul>'
+                + ''.join(f'<li><a href="{WIKI_PATH}{t}">{t.replace("_", " ")}</a></li>' for t in link_titles) + '</ul>')
+    navigation = ''.join(
+        f'<li><a href="{href if href.startswith("http") else (WIKI_PATH + title + href if href.startswith("?") else WIKI_PATH + href)}">{text}</a></li>'
+        for text, href in _NAVIGATION
+    )
+    return (
+        '<!DOCTYPE html><html class="client-nojs" lang="en" dir="ltr"><head><meta charset="UTF-8"/>'
+        f'<title>{title.replace("_", " ")} - WICE Wiki</title>'
+        '<script>document.documentElement.className="client-js";RLCONF={"wgPageName":"' + title + '"};</script>'
+        '<style>.mw-body{margin:0}</style></head><body class="mediawiki">'
+        f'<div id="content" class="mw-body"><h1 id="firstHeading">{title.replace("_", " ")}</h1>'
+        '<div id="bodyContent"><div id="mw-content-text"><div class="mw-parser-output">'
+        + ''.join(body) +
+        '\n<!-- \nNewPP limit report\nCached time: 20250101000000\nCPU time usage: 0.012 seconds\n-->\n'
+        '<!-- Saved in parser cache with key wice:pcache:idhash:1-0!canonical and timestamp 20250101000000 -->'
+        f' Retrieved from "{WIKI_PATH}{title}"</div></div></div></div>'
+        f'<div id="mw-navigation"><div id="p-navigation"><ul>{navigation}</ul></div></div>'
+        '<div id="footer"><ul><li>This page was last edited on 1 January 2025.</li>'
+        '<li><a href="https://www.mediawiki.org/">Powered by MediaWiki</a></li></ul></div>'
+        '</body></html>'
+    )
+
+
+def synthetic_wiki(pages:int=200, links_per_page:int=25, seed:int=0):
+    """
+    Returns {'title': html} for a synthetic wiki whose pages link to each other.
+    """
+    rng = random.Random(seed)
+    titles = ['Main_Page'] + [f'Page_{i}' for i in range(1, pages)]
+    wiki = {}
+    for i, title in enumerate(titles):
+        targets = rng.sample(titles, min(links_per_page, len(titles)))
+        wiki[title] = synthetic_page(title, targets, seed=seed + i)
+    return wiki
+
+
+def load_pages(pages_dir:str=None, count:int=50):
+    """
+    Returns a list of (name, html) pairs: the saved *.html pages in pages_dir, or synthetic pages.
+    """
+    if pages_dir:
+        paths = sorted(glob.glob(os.path.join(pages_dir, '*.htm*')))
+        if not paths:
+            raise FileNotFoundError(f"No saved .html pages found in {pages_dir}")
+        pages = []
+        for path in paths[:count]:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                pages.append((os.path.basename(path), f.read()))
+        return pages
+    return list(synthetic_wiki(pages=count).items())
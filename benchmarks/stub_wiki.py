@@ -0,0 +1,222 @@
+"""
+Local stand-in for the WICE wiki, for load tests and offline experiments.
+
+Usage:
+    python benchmarks/stub_wiki.py [--port 8900] [--latency-ms 50] [--pages 200]
+
+Serves:
+    /release_history                         Software release history with one <pre> card per version (ETag aware).
+    /release_notes/<portal|m2m|masterbox>     Release notes, each feed in another page layout (ETag aware).
+    /<wiceNNN>/index.php/<Title>              Synthetic MediaWiki pages (GET and HEAD) for every listed version.
+    /<wiceNNN>/api.php                        action=query&list=recentchanges, fed by edit_page / create_page / delete_page.
+
+Point the service at it with:
+    WIKI_RELEASE_HISTORY_URL=http://127.0.0.1:8900/release_history
+    WIKI_BASE_URL=http://127.0.0.1:8900/<VERSION_NUMBER>/index.php/Main_Page
+    WIKI_PORTAL_RELEASE_NOTES_URL=http://127.0.0.1:8900/release_notes/portal     (and M2M, MASTERBOX)
+"""
+# Imports and Installs
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit, unquote, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from mediawiki_pages import synthetic_wiki, WIKI_PATH
+
+# Constants
+DEFAULT_VERSIONS = ('2.9.6', '2.9.5', '2.9.4', '2.8.1', '2.7.0', '1.0.0')   # 1.0 is listed but has no wiki
+MISSING_VERSIONS = ('1.0',)
+RELEASE_HISTORY_ETAG = '"release-history-v1"'
+RELEASE_NOTES_FEEDS = ('portal', 'm2m', 'masterbox')       # Served on /release_notes/<feed>, one page layout each
+RELEASE_NOTES_COUNT = 40                                    # Releases per release notes page
+FEATURES = ('CAN FD support', 'GPS logging', 'dark mode', 'OTA updates', 'LIN bus decoding', 'CSV export',
+            'single sign-on', 'battery monitor', 'geofencing', 'remote diagnostics')
+
+
+def release_date(index:int):
+    return (datetime(2015, 1, 1) + timedelta(days=45 * index)).date()
+
+
+def release_history_html(versions=DEFAULT_VERSIONS):
+    # Newest first, like the real revision history
+    count = len(versions)
+    cards = ''.join(f'<pre>Version {version}\nDate: {release_date(count - i)}\n - Fixes and improvements</pre>'
+                    for i, version in enumerate(versions))
+    return f'<html><head><title>WICE WCU Software Revision History</title></head><body>{cards}</body></html>'
+
+
+def release_notes(feed:str, count:int=RELEASE_NOTES_COUNT):
+    """
+    Returns the synthetic releases of a release notes feed, oldest first, as (version, date, changes) tuples.
+    Release i introduces FEATURES[i] (while there are features left) and fixes a numbered issue.
+    """
+    offset = RELEASE_NOTES_FEEDS.index(feed) if feed in RELEASE_NOTES_FEEDS else 0
+    releases = []
+    for i in range(count):
+        version = f'{offset + 1}.{i // 10}.{i % 10}'
+        changes = [f'Fixed issue {feed.upper()}-{100 + i}']
+        if i < len(FEATURES):
+            changes.insert(0, f'Added {FEATURES[(i + offset) % len(FEATURES)]}')
+        releases.append((version, release_date(i), changes))
+    return releases
+
+
+def release_notes_html(feed:str, count:int=RELEASE_NOTES_COUNT):
+    """
+    The release notes page of a feed, newest release first. Each feed uses another MediaWiki layout:
+    portal new style headings, m2m a wikitable, masterbox old style headings with a dated paragraph.
+    """
+    releases = release_notes(feed, count)[::-1]
+    if feed == 'm2m':
+        rows = ''.join(f'<tr><td>{version}</td><td>{date.strftime("%d/%m/%Y")}</td><td>{"<br/>".join(changes)}</td></tr>'
+                       for version, date, changes in releases)
+        body = f'<table class="wikitable"><tr><th>Version</th><th>Date</th><th>Changes</th></tr>{rows}</table>'
+    elif feed == 'portal':
+        body = ''.join(f'<div class="mw-heading mw-heading2"><h2>Version {version} ({date.strftime("%B %d, %Y")})</h2></div>'
+                       f'<ul>{"".join(f"<li>{change}</li>" for change in changes)}</ul>' for version, date, changes in releases)
+    else:
+        body = ''.join(f'<h2><span class="mw-headline">Release {version}</span></h2><p>Released {date.day} {date.strftime("%B %Y")}</p>'
+                       f'<ul>{"".join(f"<li>{change}</li>" for change in changes)}</ul>' for version, date, changes in releases)
+    return (f'<html><head><title>{feed} release notes</title></head><body><div class="mw-parser-output">'
+            f'<p>Release notes of {feed}.</p>{body}<h2>See also</h2><p>Older releases are archived.</p></div></body></html>')
+
+
+def wiki_path(version:str):
+    return 'wice' + '.'.join(version.split('.')[:2]).replace('.', '')
+
+
+class StubWikiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'   # Keep-alive, like the real wiki
+    pages = {}                      # {'title': html}, set by serve()
+    wiki_paths = set()              # Version path prefixes that have a wiki
+    latency = 0.0                   # Seconds added to every response
+    changes = []                    # Recent changes, oldest first, in api.php format
+    release_notes_count = RELEASE_NOTES_COUNT   # Releases on every /release_notes/<feed> page
+    lock = threading.Lock()
+
+    def _send(self, status:int, body:str='', headers:dict=None):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(data)
+
+    def _route(self):
+        if self.latency:
+            time.sleep(self.latency)
+        path = unquote(urlsplit(self.path).path)
+        if path == '/release_history':
+            if self.headers.get('If-None-Match') == RELEASE_HISTORY_ETAG:
+                return self._send(304, headers={'ETag': RELEASE_HISTORY_ETAG})
+            return self._send(200, release_history_html(), {'ETag': RELEASE_HISTORY_ETAG})
+        parts = path.strip('/').split('/')
+        if len(parts) == 2 and parts[0] == 'release_notes' and parts[1] in RELEASE_NOTES_FEEDS:
+            etag = f'"{parts[1]}-{self.release_notes_count}"'
+            if self.headers.get('If-None-Match') == etag:
+                return self._send(304, headers={'ETag': etag})
+            return self._send(200, release_notes_html(parts[1], self.release_notes_count), {'ETag': etag})
+        if len(parts) == 2 and parts[0] in self.wiki_paths and parts[1] == 'api.php':
+            return self._send(200, json.dumps(self._recent_changes(parse_qs(urlsplit(self.path).query))),
+                              {'Content-Type': 'application/json'})
+        if len(parts) == 3 and parts[0] in self.wiki_paths and parts[1] == 'index.php' and parts[2] in self.pages:
+            # Pages are generated with wice296 links, serve them with the links of the requested version
+            return self._send(200, self.pages[parts[2]].replace(WIKI_PATH, f'/{parts[0]}/index.php/'))
+        return self._send(404, '<html><body>Not Found</body></html>')
+
+    def _recent_changes(self, query:dict):
+        # Newest first (rcdir=older), down to rcend, paged with an offset as rccontinue
+        rcend = query.get('rcend', [''])[0]
+        limit = int(query.get('rclimit', ['10'])[0])
+        offset = int(query.get('rccontinue', ['0'])[0])
+        with self.lock:
+            changes = [c for c in reversed(self.changes) if c['timestamp'] >= rcend]
+        data = {'batchcomplete': True, 'query': {'recentchanges': changes[offset:offset + limit]}}
+        if offset + limit < len(changes):
+            data['continue'] = {'rccontinue': str(offset + limit), 'continue': '-||'}
+        return data
+
+    do_GET = _route
+    do_HEAD = _route
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _record_change(change:dict):
+    change['timestamp'] = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    with StubWikiHandler.lock:
+        StubWikiHandler.changes.append(change)
+
+
+def _link(title:str):
+    return f'<a href="{WIKI_PATH}{title}">{title.replace("_", " ")}</a>'
+
+
+def edit_page(title:str, add_links=(), text:str='Edited paragraph.'):
+    """
+    Appends a paragraph (linking to add_links) to a stub page and records the edit.
+    """
+    paragraph = f'<p>{text} ' + ' '.join(_link(t) for t in add_links) + '</p>'
+    html = StubWikiHandler.pages[title]
+    StubWikiHandler.pages[title] = html.replace('</div></div></div></div>', paragraph + '</div></div></div></div>', 1)
+    _record_change({'type': 'edit', 'title': title.replace('_', ' ')})
+
+
+def create_page(title:str, linked_from:str=None):
+    """
+    Creates a stub page and, if linked_from is given, links it from that page (recorded as an edit).
+    """
+    StubWikiHandler.pages[title] = StubWikiHandler.pages['Main_Page'].replace('Main Page', title.replace('_', ' '))
+    _record_change({'type': 'new', 'title': title.replace('_', ' ')})
+    if linked_from:
+        edit_page(linked_from, add_links=[title], text='New page:')
+
+
+def delete_page(title:str):
+    """
+    Deletes a stub page and records the deletion log entry.
+    """
+    StubWikiHandler.pages.pop(title, None)
+    _record_change({'type': 'log', 'title': title.replace('_', ' '), 'logtype': 'delete'})
+
+
+def serve(port:int=0, latency_ms:float=0, pages:int=200, links_per_page:int=25, release_notes_count:int=RELEASE_NOTES_COUNT):
+    """
+    Starts the stub wiki on a background thread.
+
+    Returns:
+        ThreadingHTTPServer: The running server. Its port is server.server_port.
+    """
+    StubWikiHandler.pages = synthetic_wiki(pages=pages, links_per_page=links_per_page)
+    StubWikiHandler.wiki_paths = {wiki_path(v) for v in DEFAULT_VERSIONS if '.'.join(v.split('.')[:2]) not in MISSING_VERSIONS}
+    StubWikiHandler.latency = latency_ms / 1000
+    StubWikiHandler.changes = []
+    StubWikiHandler.release_notes_count = release_notes_count
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubWikiHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stub WICE wiki server')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency-ms', type=float, default=0, help='Delay added to every response')
+    parser.add_argument('--pages', type=int, default=200, help='Pages per wiki version')
+    args = parser.parse_args()
+    server = serve(args.port, args.latency_ms, args.pages)
+    print(f"Stub wiki on http://127.0.0.1:{server.server_port} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()